@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+
+from app.dal.snapshot import StockSnapshot
+from app.infra import events
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StockAlert:
+    item_id: int
+    code: str
+    name: str
+    min_stock: int
+    qty_available: Decimal
+    raised_at: datetime
+
+
+# Ta klasa pilnuje progów items.min_stock po każdym zaksięgowanym ruchu
+class StockAlertEngine:
+    """
+    Alerty minimalnego stanu sterowane zdarzeniami.
+
+    Na `movements.changed` sprawdza tylko towary dotknięte ruchem:
+    payload["item_ids"], a gdy go brak – towary z alokacji (movement_allocations
+    -> lots) ruchów o id większym niż ostatnio widziany; RETURN / SCRAP są
+    wielopozycyjne i mają movements.item_id = NULL. Zdarzenie tylko zgłasza
+    pracę – sprawdzenie wykonuje wątek w tle (publikacja idzie z wątku UI),
+    kolejne zdarzenia w trakcie są scalane. Dostępne = SUM(lots.qty_available)
+    - item_reservations.qty_reserved. Aktywne alerty są w pamięci i w tabeli
+    stock_alerts (przetrwają restart, widzą je inne stanowiska); zmiana zbioru
+    publikuje `stock.alerts_changed` (z wątku roboczego – UI przekazuje je
+    sygnałem Qt).
+    """
+
+    def __init__(self, engine: Engine, *, bus: events.EventBus = events.bus) -> None:
+        self.engine = engine
+        self.bus = bus
+        self._lock = threading.Lock()
+        self._active: Dict[int, StockAlert] = {}
+        self._last_movement_id = 0
+        self._unsubscribe = None
+        # praca zgłoszona przez zdarzenia: konkretne towary i/lub skan od znaku wody
+        self._pending: Set[int] = set()
+        self._scan = False
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- Cykl życia ----------
+    def start(self) -> None:
+        """Wczytuje zapisane alerty i znak wody ruchów; subskrybuje zdarzenia."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    """
+                    SELECT a.item_id, i.code, i.name, a.min_stock, a.qty_available, a.raised_at
+                    FROM stock_alerts a
+                    JOIN items i ON i.id = a.item_id
+                    """
+                )
+            ).mappings().all()
+            last = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM movements")).scalar()
+        with self._lock:
+            self._active = {int(r["item_id"]): self._alert(r) for r in rows}
+            self._last_movement_id = int(last or 0)
+        if self._unsubscribe is None:
+            self._unsubscribe = self.bus.subscribe(events.MOVEMENTS_CHANGED, self._on_movements)
+        if not (self._thread and self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="stock-alerts", daemon=True)
+            self._thread.start()
+        log.info("Alerty stanów: %s aktywnych", len(self._active))
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.process_pending()
+
+    # ---------- API ----------
+    def active_alerts(self) -> List[StockAlert]:
+        with self._lock:
+            return sorted(self._active.values(), key=lambda a: (a.name or "", a.item_id))
+
+    def check_items(self, item_ids: Iterable[int]) -> int:
+        """
+        Porównuje dostępną ilość wskazanych towarów z progiem; podnosi / gasi
+        alerty i zapisuje zmiany. Zwraca liczbę zmienionych alertów.
+        """
+        ids = sorted({int(i) for i in item_ids if i})
+        if not ids:
+            return 0
+        now = datetime.now()
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    """
+                    SELECT i.id AS item_id, i.code, i.name, COALESCE(i.min_stock, 0) AS min_stock,
+                           COALESCE((SELECT SUM(l.qty_available) FROM lots l WHERE l.item_id = i.id), 0)
+                         - COALESCE((SELECT r.qty_reserved FROM item_reservations r WHERE r.item_id = i.id), 0)
+                           AS qty_available
+                    FROM items i
+                    WHERE i.id IN :ids
+                    """
+                ).bindparams(bindparam("ids", expanding=True)),
+                {"ids": ids},
+            ).mappings().all()
+
+            raised, cleared = self._diff(rows, now)
+            self._persist(conn, raised, cleared)
+        return self._apply(raised, cleared)
+
+    def sync_from_snapshot(self, snap: StockSnapshot) -> int:
+        """
+        Pełne uzgodnienie alertów ze spójnej migawki (app.dal.snapshot):
+        wszystkie towary z progiem, bez ponownego odczytu stanów. Przesuwa
+        znak wody ruchów do chwili migawki.
+        """
+        now = datetime.now()
+        available = snap.available()
+        rows = [
+            {
+                "item_id": iid,
+                "code": code,
+                "name": name,
+                "min_stock": min_stock,
+                "qty_available": Decimal(available.get(iid, 0)).scaleb(-3),
+            }
+            for iid, (code, name, min_stock, _active) in snap.items.items()
+        ]
+        raised, cleared = self._diff(rows, now)
+        with self._lock:
+            # alerty towarów, których nie ma już w kartotece
+            cleared += [iid for iid in self._active if iid not in snap.items]
+            self._last_movement_id = max(self._last_movement_id, snap.movement_mark)
+        if raised or cleared:
+            with self.engine.begin() as conn:
+                self._persist(conn, raised, cleared)
+        return self._apply(raised, cleared)
+
+    def _diff(self, rows, now: datetime) -> Tuple[List[StockAlert], List[int]]:
+        """Nowe / zmienione alerty i towary do zgaszenia względem stanu w pamięci."""
+        raised: List[StockAlert] = []
+        cleared: List[int] = []
+        with self._lock:
+            for r in rows:
+                iid = int(r["item_id"])
+                low = int(r["min_stock"]) > 0 and Decimal(str(r["qty_available"])) < int(r["min_stock"])
+                prev = self._active.get(iid)
+                if low:
+                    alert = self._alert({**r, "raised_at": prev.raised_at if prev else now})
+                    if alert != prev:
+                        raised.append(alert)
+                elif prev is not None:
+                    cleared.append(iid)
+        return raised, cleared
+
+    @staticmethod
+    def _persist(conn, raised: List[StockAlert], cleared: List[int]) -> None:
+        if raised:
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO stock_alerts (item_id, min_stock, qty_available, raised_at)
+                    VALUES (:item_id, :min_stock, :qty_available, :raised_at)
+                    ON DUPLICATE KEY UPDATE
+                      min_stock = VALUES(min_stock), qty_available = VALUES(qty_available)
+                    """
+                ),
+                [
+                    {
+                        "item_id": a.item_id,
+                        "min_stock": a.min_stock,
+                        "qty_available": a.qty_available,
+                        "raised_at": a.raised_at,
+                    }
+                    for a in raised
+                ],
+            )
+        if cleared:
+            conn.execute(
+                text("DELETE FROM stock_alerts WHERE item_id IN :ids").bindparams(
+                    bindparam("ids", expanding=True)
+                ),
+                {"ids": cleared},
+            )
+
+    def _apply(self, raised: List[StockAlert], cleared: List[int]) -> int:
+        if not raised and not cleared:
+            return 0
+        with self._lock:
+            for a in raised:
+                self._active[a.item_id] = a
+            for iid in cleared:
+                self._active.pop(iid, None)
+            active = len(self._active)
+        log.info("Alerty stanów: +%s / -%s (aktywne: %s)", len(raised), len(cleared), active)
+        self.bus.publish(
+            events.STOCK_ALERTS_CHANGED,
+            raised=[a.item_id for a in raised],
+            cleared=cleared,
+            active=active,
+        )
+        return len(raised) + len(cleared)
+
+    # ---------- Zdarzenia ----------
+    def _on_movements(self, _topic: str, payload: dict) -> None:
+        """Tylko zgłasza pracę (wątek publikującego, zwykle UI) – bez zapytań."""
+        ids = payload.get("item_ids")
+        with self._lock:
+            if ids is None:
+                self._scan = True
+            else:
+                self._pending.update(int(i) for i in ids if i)
+        self._wake.set()
+
+    def process_pending(self) -> int:
+        """Sprawdza zgłoszone towary (wątek roboczy). Zwraca liczbę zmienionych alertów."""
+        with self._lock:
+            ids, scan = self._pending, self._scan
+            self._pending, self._scan = set(), False
+        try:
+            if scan:
+                ids |= set(self._items_since_last_check())
+            return self.check_items(ids)
+        except Exception:
+            log.exception("Alerty stanów: błąd sprawdzania po ruchu")
+            return 0
+
+    def _items_since_last_check(self) -> List[int]:
+        """
+        Towary z ruchów o id > ostatnio widziany (przesuwa znak wody). Towar bierzemy
+        z alokacji (partia -> item_id), bo ruchy wielopozycyjne mają item_id = NULL.
+        """
+        with self._lock:
+            last = self._last_movement_id
+        with self.engine.connect() as conn:
+            mark = int(
+                conn.execute(
+                    text("SELECT COALESCE(MAX(id), :last) FROM movements WHERE id > :last"),
+                    {"last": last},
+                ).scalar()
+                or last
+            )
+            if mark <= last:
+                return []
+            rows = conn.execute(
+                text(
+                    """
+                    SELECT l.item_id
+                    FROM movement_allocations ma
+                    JOIN lots l ON l.id = ma.lot_id
+                    WHERE ma.movement_id > :last AND ma.movement_id <= :mark
+                    UNION
+                    SELECT item_id
+                    FROM movements
+                    WHERE id > :last AND id <= :mark AND item_id IS NOT NULL
+                    """
+                ),
+                {"last": last, "mark": mark},
+            ).all()
+        with self._lock:
+            self._last_movement_id = max(self._last_movement_id, mark)
+        return [int(r[0]) for r in rows if r[0] is not None]
+
+    @staticmethod
+    def _alert(r) -> StockAlert:
+        return StockAlert(
+            item_id=int(r["item_id"]),
+            code=r.get("code") or "",
+            name=r.get("name") or "",
+            min_stock=int(r["min_stock"] or 0),
+            qty_available=Decimal(str(r["qty_available"] or 0)),
+            raised_at=r["raised_at"],
+        )
+
+
+def format_alerts(alerts: Iterable[StockAlert], limit: int = 20) -> str:
+    """Lista alertów do podpowiedzi (tooltip)."""
+    alerts = list(alerts)
+    lines = [
+        f"{a.code} {a.name}: {a.qty_available.normalize():f} / min {a.min_stock}"
+        for a in alerts[:limit]
+    ]
+    if len(alerts) > limit:
+        lines.append(f"… i {len(alerts) - limit} więcej")
+    return "\n".join(lines)
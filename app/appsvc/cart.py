@@ -1,18 +1,107 @@
 ﻿from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
 import logging
+import uuid
 
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 from sqlalchemy.engine import Engine
 
+from app.dal.catalog_search import match_clause, ranked_search, substring_fallback
+from app.infra import events
+
+# Okno (ms), w którym edycje koszyka są zbierane przed zapisem do issue_session_lines
+CART_SYNC_DEBOUNCE_MS = 400
+# Czas życia nieaktywnej sesji koszyka (min); każda edycja przesuwa expires_at
+CART_SESSION_TTL_MIN = 30
+# Skala ilości w issue_session_lines / item_reservations (DECIMAL(12,3))
+QTY_STEP = Decimal("0.001")
+ZERO = Decimal("0")
+
+
+class CartSessionClosedError(RuntimeError):
+    """Sesja koszyka nie jest już OPEN (zatwierdzona, anulowana lub wygasła)."""
+
+
+# ---------- Liczniki rezerwacji (item_reservations) ----------
+def to_qty(x: Any) -> Decimal:
+    """Ilość jako Decimal w skali kolumn rezerwacji (float z UI przez str – bez 0.1 + 0.2)."""
+    return (x if isinstance(x, Decimal) else Decimal(str(x or 0))).quantize(QTY_STEP)
+
+
+def touch_session(conn: Any, session_id: int, ttl_minutes: int = CART_SESSION_TTL_MIN) -> bool:
+    """
+    Przedłuża expires_at sesji OPEN i blokuje jej wiersz do końca transakcji
+    (kolejność blokad: sesja -> linie -> liczniki, tak samo jak w sweeperze).
+    Zwraca False, gdy sesja nie jest już otwarta.
+    """
+    res = conn.execute(
+        text(
+            """
+            UPDATE issue_sessions
+               SET expires_at = CURRENT_TIMESTAMP() + INTERVAL :ttl MINUTE
+             WHERE id = :id AND status = 'OPEN'
+            """
+        ),
+        {"id": int(session_id), "ttl": int(ttl_minutes)},
+    )
+    return bool(res.rowcount)
+
+
+def apply_reservation_deltas(conn: Any, deltas: Dict[int, Decimal]) -> None:
+    """Koryguje liczniki item_reservations o podane różnice (jeden batch upsertów)."""
+    rows = [{"iid": int(iid), "d": to_qty(d)} for iid, d in sorted(deltas.items()) if to_qty(d)]
+    if not rows:
+        return
+    conn.execute(
+        text(
+            """
+            INSERT INTO item_reservations (item_id, qty_reserved)
+            VALUES (:iid, GREATEST(:d, 0))
+            ON DUPLICATE KEY UPDATE qty_reserved = GREATEST(qty_reserved + :d, 0)
+            """
+        ),
+        rows,
+    )
+
+
+def release_session_reservations(conn: Any, session_ids: List[int]) -> Dict[int, Decimal]:
+    """
+    Zwalnia liczniki dla linii wskazanych sesji (wywoływać przed zmianą statusu
+    z OPEN, z zablokowanymi wierszami sesji). Zwraca zwolnione ilości per pozycja.
+    """
+    if not session_ids:
+        return {}
+    rows = conn.execute(
+        text(
+            """
+            SELECT item_id, SUM(qty_reserved) AS qty
+              FROM issue_session_lines
+             WHERE session_id IN :ids
+             GROUP BY item_id
+            """
+        ).bindparams(bindparam("ids", expanding=True)),
+        {"ids": [int(i) for i in session_ids]},
+    ).all()
+    released = {int(r[0]): to_qty(r[1]) for r in rows}
+    apply_reservation_deltas(conn, {iid: -qty for iid, qty in released.items()})
+    return released
+
 
 # Ta klasa odpowiada za utrzymanie sesji koszyka w tabeli issue_sessions
 class SessionManager:
-    def __init__(self, engine: Engine, station_id: str, operator_user_id: int) -> None:
+    def __init__(
+        self,
+        engine: Engine,
+        station_id: str,
+        operator_user_id: int,
+        ttl_minutes: int = CART_SESSION_TTL_MIN,
+    ) -> None:
         self.engine = engine
         self.station_id = station_id
         self.operator_user_id = int(operator_user_id)
+        self.ttl_minutes = int(ttl_minutes)
 
     def ensure_open_session(self, employee_id: Optional[int] = None) -> Dict:
         """
@@ -37,6 +126,7 @@ class SessionManager:
                 {"op": self.operator_user_id, "st": self.station_id or None},
             ).mappings().first()
             if row:
+                touch_session(conn, int(row["id"]), self.ttl_minutes)
                 # jeĹĽeli mamy employee_id i w sesji jest puste â€“ dopisz
                 if employee_id and not row.get("employee_id"):
                     conn.execute(
@@ -51,16 +141,16 @@ class SessionManager:
             res = conn.execute(
                 text(
                     """
-                    INSERT INTO issue_sessions (station_id, operator_user_id, employee_id, status, started_at)
-                    VALUES (:st, :op, :emp, 'OPEN', CURRENT_TIMESTAMP())
+                    INSERT INTO issue_sessions (station_id, operator_user_id, employee_id, status, started_at, expires_at)
+                    VALUES (:st, :op, :emp, 'OPEN', CURRENT_TIMESTAMP(), CURRENT_TIMESTAMP() + INTERVAL :ttl MINUTE)
                     """
                 ),
-                {"st": self.station_id or None, "op": self.operator_user_id, "emp": employee_id},
+                {"st": self.station_id or None, "op": self.operator_user_id, "emp": employee_id, "ttl": self.ttl_minutes},
             )
             new_id = int(res.lastrowid)
             row = conn.execute(
                 text(
-                    "SELECT id, station_id, operator_user_id, employee_id, status, started_at FROM issue_sessions WHERE id=:id"
+                    "SELECT id, station_id, operator_user_id, employee_id, status, started_at, expires_at FROM issue_sessions WHERE id=:id"
                 ),
                 {"id": new_id},
             ).mappings().first()
@@ -72,6 +162,12 @@ class SessionManager:
         pozostajÄ… do audytu, ale sesja nie moĹĽe byÄ‡ juĹĽ zatwierdzona.
         """
         with self.engine.begin() as conn:
+            status = conn.execute(
+                text("SELECT status FROM issue_sessions WHERE id=:id FOR UPDATE"),
+                {"id": int(session_id)},
+            ).scalar()
+            if status == "OPEN":
+                release_session_reservations(conn, [int(session_id)])
             conn.execute(
                 text("UPDATE issue_sessions SET status='CANCELLED', expires_at=CURRENT_TIMESTAMP() WHERE id=:id"),
                 {"id": int(session_id)},
@@ -97,67 +193,149 @@ class CartRepository:
         """
         ZwiÄ™ksza rezerwacjÄ™ danej pozycji o `delta`. Zwraca nowÄ… iloĹ›Ä‡. Gdy wynik <=0 â€“ usuwa liniÄ™.
         """
-        current = self._get_current_qty(session_id, item_id)
-        new_qty = (current or 0.0) + float(delta)
+        iid = int(item_id)
         with self.engine.begin() as conn:
-            if new_qty <= 0:
-                conn.execute(
-                    text("DELETE FROM issue_session_lines WHERE session_id=:sid AND item_id=:iid"),
-                    {"sid": int(session_id), "iid": int(item_id)},
-                )
-                return 0.0
-            if current is None:
-                conn.execute(
-                    text(
-                        "INSERT INTO issue_session_lines (session_id, item_id, qty_reserved) VALUES (:sid, :iid, :q)"
-                    ),
-                    {"sid": int(session_id), "iid": int(item_id), "q": new_qty},
-                )
-            else:
-                conn.execute(
-                    text(
-                        "UPDATE issue_session_lines SET qty_reserved=:q WHERE session_id=:sid AND item_id=:iid"
-                    ),
-                    {"sid": int(session_id), "iid": int(item_id), "q": new_qty},
-                )
-        return new_qty
+            self._require_open(conn, session_id)
+            old = self._lock_lines(conn, session_id, [iid])
+            new_qty = max(old.get(iid, ZERO) + to_qty(delta), ZERO)
+            self._apply_changes(conn, session_id, {iid: new_qty}, old)
+        return float(new_qty)
 
     def set_qty(self, session_id: int, item_id: int, qty: float) -> float:
         """
         Ustawia dokĹ‚adnÄ… iloĹ›Ä‡ rezerwacji. WartoĹ›Ä‡ 0 usuwa liniÄ™.
         """
+        iid = int(item_id)
+        new_qty = max(to_qty(qty), ZERO)
         with self.engine.begin() as conn:
-            if qty <= 0:
-                conn.execute(
-                    text("DELETE FROM issue_session_lines WHERE session_id=:sid AND item_id=:iid"),
-                    {"sid": int(session_id), "iid": int(item_id)},
-                )
-                return 0.0
-            cur_id = conn.execute(
+            self._require_open(conn, session_id)
+            old = self._lock_lines(conn, session_id, [iid])
+            self._apply_changes(conn, session_id, {iid: new_qty}, old)
+        return float(new_qty)
+
+    def clear(self, session_id: int) -> None:
+        with self.engine.begin() as conn:
+            is_open = touch_session(conn, session_id)
+            old = self._lock_lines(conn, session_id)
+            if is_open:
+                self._apply_changes(conn, session_id, {iid: ZERO for iid in old}, old)
+            else:
+                # sesja zamknięta – rezerwacje już zwolnione, usuwamy same linie
+                conn.execute(text("DELETE FROM issue_session_lines WHERE session_id=:sid"), {"sid": int(session_id)})
+
+    def session_state(self, session_id: int) -> Optional[str]:
+        """
+        Stan sesji: 'OPEN', 'EXPIRED' (OPEN, ale po expires_at – czeka na sweeper),
+        'CONFIRMED', 'CANCELLED' albo None, gdy sesji nie ma.
+        """
+        with self.engine.connect() as conn:
+            row = conn.execute(
                 text(
-                    "SELECT id FROM issue_session_lines WHERE session_id=:sid AND item_id=:iid LIMIT 1"
+                    """
+                    SELECT status,
+                           (expires_at IS NOT NULL AND expires_at <= CURRENT_TIMESTAMP()) AS expired
+                      FROM issue_sessions
+                     WHERE id = :id
+                    """
                 ),
-                {"sid": int(session_id), "iid": int(item_id)},
-            ).scalar()
-            if cur_id is None:
-                conn.execute(
-                    text(
-                        "INSERT INTO issue_session_lines (session_id, item_id, qty_reserved) VALUES (:sid, :iid, :q)"
-                    ),
-                    {"sid": int(session_id), "iid": int(item_id), "q": float(qty)},
-                )
-            else:
-                conn.execute(
-                    text(
-                        "UPDATE issue_session_lines SET qty_reserved=:q WHERE session_id=:sid AND item_id=:iid"
-                    ),
-                    {"sid": int(session_id), "iid": int(item_id), "q": float(qty)},
-                )
-        return float(qty)
+                {"id": int(session_id)},
+            ).first()
+        if row is None:
+            return None
+        status = str(row[0])
+        return "EXPIRED" if status == "OPEN" and row[1] else status
 
-    def clear(self, session_id: int) -> None:
+    def cancel_expired(self, session_id: int) -> bool:
+        """
+        Anuluje sesję OPEN po expires_at (jak sweeper) i zwalnia jej rezerwacje –
+        przed przeniesieniem linii do nowej sesji, żeby nie rezerwować podwójnie.
+        """
         with self.engine.begin() as conn:
-            conn.execute(text("DELETE FROM issue_session_lines WHERE session_id=:sid"), {"sid": int(session_id)})
+            row = conn.execute(
+                text(
+                    """
+                    SELECT status, (expires_at IS NOT NULL AND expires_at <= CURRENT_TIMESTAMP())
+                      FROM issue_sessions
+                     WHERE id = :id
+                     FOR UPDATE
+                    """
+                ),
+                {"id": int(session_id)},
+            ).first()
+            if row is None or row[0] != "OPEN" or not row[1]:
+                return False
+            release_session_reservations(conn, [int(session_id)])
+            conn.execute(
+                text("UPDATE issue_sessions SET status='CANCELLED' WHERE id=:id"),
+                {"id": int(session_id)},
+            )
+        return True
+
+    def sync_lines(self, session_id: int, changes: Dict[int, float]) -> None:
+        """
+        Zapisuje zbiorczo zmiany z bufora koszyka w jednej transakcji:
+        ilości <= 0 usuwa jednym DELETE ... IN, pozostałe wstawia jednym
+        wielowierszowym upsertem (wymaga uq_issue_lines_session_item).
+        Liczniki item_reservations są korygowane o różnice względem DB.
+        """
+        if not changes:
+            return
+        targets = {int(iid): max(to_qty(qty), ZERO) for iid, qty in changes.items()}
+        with self.engine.begin() as conn:
+            self._require_open(conn, session_id)
+            old = self._lock_lines(conn, session_id, list(targets))
+            self._apply_changes(conn, session_id, targets, old)
+
+    # ---------- wewnętrzne (w ramach otwartej transakcji) ----------
+    @staticmethod
+    def _require_open(conn: Any, session_id: int) -> None:
+        if not touch_session(conn, session_id):
+            raise CartSessionClosedError(f"Sesja koszyka {int(session_id)} nie jest już otwarta")
+
+    @staticmethod
+    def _lock_lines(conn: Any, session_id: int, item_ids: Optional[List[int]] = None) -> Dict[int, Decimal]:
+        """Blokuje (FOR UPDATE) i zwraca bieżące ilości linii sesji."""
+        params: Dict[str, Any] = {"sid": int(session_id)}
+        sql = "SELECT item_id, qty_reserved FROM issue_session_lines WHERE session_id=:sid"
+        stmt = text(sql + " FOR UPDATE")
+        if item_ids is not None:
+            if not item_ids:
+                return {}
+            stmt = text(sql + " AND item_id IN :ids FOR UPDATE").bindparams(bindparam("ids", expanding=True))
+            params["ids"] = [int(i) for i in item_ids]
+        rows = conn.execute(stmt, params).all()
+        return {int(r[0]): to_qty(r[1]) for r in rows}
+
+    @staticmethod
+    def _apply_changes(conn: Any, session_id: int, targets: Dict[int, Decimal], old: Dict[int, Decimal]) -> None:
+        sid = int(session_id)
+        deletes = [iid for iid, qty in targets.items() if qty <= 0 and iid in old]
+        upserts = [
+            {"sid": sid, "iid": iid, "q": qty}
+            for iid, qty in targets.items()
+            if qty > 0 and qty != old.get(iid)
+        ]
+        if deletes:
+            conn.execute(
+                text(
+                    "DELETE FROM issue_session_lines WHERE session_id=:sid AND item_id IN :ids"
+                ).bindparams(bindparam("ids", expanding=True)),
+                {"sid": sid, "ids": deletes},
+            )
+        if upserts:
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO issue_session_lines (session_id, item_id, qty_reserved)
+                    VALUES (:sid, :iid, :q)
+                    ON DUPLICATE KEY UPDATE qty_reserved = VALUES(qty_reserved)
+                    """
+                ),
+                upserts,
+            )
+        apply_reservation_deltas(
+            conn, {iid: qty - old.get(iid, ZERO) for iid, qty in targets.items()}
+        )
 
     def list_lines(self, session_id: int) -> List[Dict]:
         with self.engine.connect() as conn:
@@ -189,6 +367,144 @@ class CartRepository:
         return {int(r[0]): float(r[1]) for r in rows}
 
 
+# Ta klasa odpowiada za lokalny bufor koszyka (edycje w pamięci + zbiorcza synchronizacja)
+class CartBuffer:
+    """
+    Kopia linii koszyka w pamięci. Edycje (set_qty/add/remove) działają lokalnie
+    i są zapamiętywane jako "brudne"; flush() wysyła je do issue_session_lines
+    jednym wywołaniem CartRepository.sync_lines. O tym, co zostanie wydane,
+    decydują linie w DB – przed finalizacją bufor musi zostać opróżniony.
+    """
+
+    def __init__(self, cart: CartRepository, session_id: int) -> None:
+        self.cart = cart
+        self.session_id = int(session_id)
+        self._lines: Dict[int, Dict] = {}
+        self._dirty: set[int] = set()
+        # ilości zapisane w DB (= własna rezerwacja odjęta już w qty_available)
+        self._synced: Dict[int, float] = {}
+
+    def load(self) -> None:
+        """Wczytuje linie sesji z DB (porzuca niezapisane zmiany)."""
+        self._lines = {
+            int(ln["item_id"]): {
+                "item_id": int(ln["item_id"]),
+                "sku": ln.get("sku"),
+                "name": ln.get("name"),
+                "uom": ln.get("uom"),
+                "qty_reserved": float(ln.get("qty_reserved") or 0),
+            }
+            for ln in self.cart.list_lines(self.session_id)
+        }
+        self._synced = self.reserved_map()
+        self._dirty.clear()
+
+    def rebind(self, session_id: int) -> None:
+        """
+        Przełącza bufor na inną sesję.
+          - stara zatwierdzona (CONFIRMED – wydanie z tego koszyka): wczytuje nową,
+          - stara nadal OPEN: zapisuje do niej zaległe zmiany i wczytuje nową,
+          - stara wygasła / anulowana: cała zawartość bufora przechodzi do nowej
+            (także gdy nie było niezapisanych zmian – inaczej koszyk by zniknął).
+        """
+        new_id = int(session_id)
+        if new_id == self.session_id:
+            return
+        state = self.cart.session_state(self.session_id)
+        if state == "OPEN":
+            try:
+                self.flush()
+            except CartSessionClosedError:
+                state = "CANCELLED"   # zamknięta w międzyczasie
+        if state in ("OPEN", "CONFIRMED"):
+            self.session_id = new_id
+            self.load()
+            return
+        if state == "EXPIRED":
+            self.cart.cancel_expired(self.session_id)
+        # stara sesja zamknięta bez wydania – jej zawartość przechodzi do nowej
+        self.move_to(new_id)
+        self.flush()
+
+    def move_to(self, session_id: int) -> None:
+        """
+        Przenosi zawartość bufora do nowej sesji (np. po wygaśnięciu starej):
+        wszystkie linie zostaną zapisane przy najbliższym flush().
+        """
+        self.session_id = int(session_id)
+        self._dirty = set(self._lines)
+        self._synced = {}
+
+    # ---------- odczyt ----------
+    def qty(self, item_id: int) -> float:
+        ln = self._lines.get(int(item_id))
+        return float(ln["qty_reserved"]) if ln else 0.0
+
+    def lines(self) -> List[Dict]:
+        return sorted(
+            (dict(ln) for ln in self._lines.values()),
+            key=lambda ln: str(ln.get("name") or ln.get("sku") or ""),
+        )
+
+    def reserved_map(self) -> Dict[int, float]:
+        return {iid: float(ln["qty_reserved"]) for iid, ln in self._lines.items()}
+
+    def synced_map(self) -> Dict[int, float]:
+        """Ilości ostatnio zapisane w DB – bez niezapisanych edycji."""
+        return dict(self._synced)
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._dirty)
+
+    # ---------- edycja ----------
+    def set_qty(self, item_id: int, qty: float, meta: Optional[Dict] = None) -> float:
+        """Ustawia ilość lokalnie. Wartość <= 0 usuwa linię. Zwraca nową ilość."""
+        iid = int(item_id)
+        new_qty = max(float(qty), 0.0)
+        if new_qty <= 0:
+            if iid in self._lines:
+                del self._lines[iid]
+                self._dirty.add(iid)
+            return 0.0
+        ln = self._lines.get(iid)
+        if ln is None:
+            meta = meta or {}
+            ln = {
+                "item_id": iid,
+                "sku": meta.get("sku"),
+                "name": meta.get("name"),
+                "uom": meta.get("uom"),
+                "qty_reserved": 0.0,
+            }
+            self._lines[iid] = ln
+        if ln["qty_reserved"] != new_qty:
+            ln["qty_reserved"] = new_qty
+            self._dirty.add(iid)
+        return new_qty
+
+    def add(self, item_id: int, delta: float = 1.0, meta: Optional[Dict] = None) -> float:
+        return self.set_qty(item_id, self.qty(item_id) + float(delta), meta)
+
+    def remove(self, item_id: int) -> None:
+        self.set_qty(item_id, 0)
+
+    # ---------- synchronizacja ----------
+    def flush(self) -> int:
+        """Zapisuje zaległe zmiany jednym batchem. Zwraca liczbę zmienionych pozycji."""
+        if not self._dirty:
+            return 0
+        changes = {iid: self.qty(iid) for iid in self._dirty}
+        self.cart.sync_lines(self.session_id, changes)
+        for iid, qty in changes.items():
+            if qty > 0:
+                self._synced[iid] = qty
+            else:
+                self._synced.pop(iid, None)
+        self._dirty.clear()
+        return len(changes)
+
+
 # Ta klasa odpowiada za pobieranie dostępności z widoków magazynowych
 class StockRepository:
     def __init__(self, engine: Engine) -> None:
@@ -418,46 +734,244 @@ class StockRepository:
                 self.log.debug("stock.list_available_code_only: path=view(code/unit) rows=%s", len(out))
                 return out
 
+    def list_available_page(
+        self,
+        q: str = "",
+        after: Optional[Tuple[str, int]] = None,
+        limit: int = 200,
+    ) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """
+        Stronicowanie kluczem (keyset) po (items.name, items.id) zamiast OFFSET –
+        koszt kolejnej strony nie rośnie z jej numerem (indeks idx_items_name_id).
+        `after` = zakładka z poprzedniego wywołania (None = pierwsza strona).
+        Zwraca (wiersze, zakładka_następnej_strony | None gdy to ostatnia strona).
+
+        Wyszukiwanie jak ranked_search: indeks tokenów, a podciąg (skan) tylko
+        gdy po tokenach nie ma żadnego dostępnego towaru. Dla dalszych stron
+        tryb ustala jedno zapytanie LIMIT 1 po indeksie – strony się nie mieszają.
+        """
+        after_name, after_id = after if after else (None, 0)
+        sql = """
+            SELECT
+              i.id AS item_id,
+              i.code AS sku,
+              COALESCE(NULLIF(TRIM(i.name), ''), i.code) AS name,
+              i.name AS sort_name,
+              COALESCE(i.unit, 'SZT') AS uom,
+              (SELECT COALESCE(SUM(l.qty_available), 0)
+                 FROM lots l
+                WHERE l.item_id = i.id) AS qty_on_hand,
+              COALESCE(r.qty_reserved, 0) AS qty_reserved_open
+            FROM items i
+            LEFT JOIN item_reservations r ON r.item_id = i.id
+            WHERE {match}
+              AND (:after_name IS NULL
+                   OR i.name > :after_name
+                   OR (i.name = :after_name AND i.id > :after_id))
+            HAVING qty_on_hand - qty_reserved_open > 0
+            ORDER BY i.name, i.id
+            LIMIT :limit
+            """
+
+        def run(conn, clause, after_name, after_id, limit):
+            stmt = text(sql.replace("{match}", clause.where if clause else "1=1"))
+            params = dict(clause.params) if clause else {}
+            return conn.execute(
+                stmt,
+                {**params, "after_name": after_name, "after_id": int(after_id), "limit": int(limit)},
+            ).mappings().all()
+
+        clause = match_clause(q)
+        with self.engine.connect() as conn:
+            rows = run(conn, clause, after_name, after_id, limit)
+            if clause is not None and not rows and substring_fallback(q):
+                # dalsza strona: pusta po tokenach = koniec wyników albo tryb podciągu
+                if not after or not run(conn, clause, None, 0, 1):
+                    rows = run(conn, match_clause(q, substring=True), after_name, after_id, limit)
+        out: List[Dict] = []
+        for r in rows:
+            d = dict(r)
+            d["qty_available"] = float(d["qty_on_hand"] or 0) - float(d["qty_reserved_open"] or 0)
+            out.append(d)
+        nxt = (out[-1]["sort_name"], int(out[-1]["item_id"])) if len(out) >= int(limit) else None
+        self.log.debug("stock.list_available_page: after=%s rows=%s", after, len(out))
+        return out, nxt
+
 # Ta klasa odpowiada za finalizację wydania (zatwierdzenie koszyka)
 class CheckoutService:
     def __init__(self, engine: Engine, auth_repo_any: Any) -> None:
         self.engine = engine
         self.auth_repo = auth_repo_any
 
+    @staticmethod
+    def line_operation_uuid(session_id: int, item_id: int) -> str:
+        """Stały operation_uuid linii koszyka – ponowienie nie wyda jej drugi raz."""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"wydajnia:issue_session:{int(session_id)}:{int(item_id)}"))
+
     def finalize_issue(self, session_id: int, employee_id: int) -> Dict:
         """
-        PrzeksztaĹ‚ca linie w issue_session_lines na wywoĹ‚ania domenowe issue_tool.
-        Po sukcesie zamyka sesjÄ™ (status=CONFIRMED). Zwraca podsumowanie.
+        Przekształca linie w issue_session_lines na wywołania domenowe issue_tool.
+        Sesja musi być OPEN i przed expires_at – wiersz jest blokowany (FOR UPDATE)
+        i przedłużany, więc sweeper nie anuluje jej w trakcie wydania. Inaczej
+        zwraca {"status": "expired"} – UI przenosi linie do nowej sesji.
+
+        Każda linia ma stały operation_uuid (line_operation_uuid); linie już
+        zapisane w transactions są pomijane. Gdy wydanie linii się nie powiedzie,
+        zwraca {"status": "error", "posted": n} i zostawia sesję OPEN – ponowienie
+        wyda tylko brakujące linie. Po sukcesie zamyka sesję (status=CONFIRMED).
         """
-        with self.engine.connect() as conn:
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                text(
+                    """
+                    SELECT status, (expires_at IS NOT NULL AND expires_at <= CURRENT_TIMESTAMP()) AS expired
+                      FROM issue_sessions
+                     WHERE id=:id
+                     FOR UPDATE
+                    """
+                ),
+                {"id": int(session_id)},
+            ).first()
+            if row is None or row[0] != "OPEN" or row[1]:
+                return {"status": "expired", "lines": 0}
+            touch_session(conn, int(session_id))
             rows = conn.execute(
                 text("SELECT item_id, qty_reserved FROM issue_session_lines WHERE session_id=:sid ORDER BY item_id"),
                 {"sid": int(session_id)},
             ).all()
-        lines = [{"item_id": int(r[0]), "qty": float(r[1])} for r in rows]
-        if not lines:
-            return {"status": "empty", "lines": 0}
+            lines = [
+                {
+                    "item_id": int(r[0]),
+                    "qty": to_qty(r[1]),
+                    "operation_uuid": self.line_operation_uuid(session_id, int(r[0])),
+                }
+                for r in rows
+            ]
+            if not lines:
+                return {"status": "empty", "lines": 0}
+            # linie wydane przy poprzedniej, przerwanej próbie
+            posted = set(
+                conn.execute(
+                    text(
+                        "SELECT operation_uuid FROM transactions WHERE operation_uuid IN :uuids"
+                    ).bindparams(bindparam("uuids", expanding=True)),
+                    {"uuids": [ln["operation_uuid"] for ln in lines]},
+                ).scalars().all()
+            )
+            pending = [ln for ln in lines if ln["operation_uuid"] not in posted]
+            conflicts = self.check_availability(session_id, pending, conn=conn, session_open=True)
+        if conflicts:
+            return {"status": "conflict", "lines": len(lines), "conflicts": conflicts}
 
-        import uuid
         flagged = False
-        for ln in lines:
+        done = len(lines) - len(pending)
+        issued: List[int] = []
+        for ln in pending:
             res = self.auth_repo.issue_tool(
                 employee_id=int(employee_id),
                 item_id=int(ln["item_id"]),
                 qty=ln["qty"],
-                operation_uuid=str(uuid.uuid4()),
-            )
-            if res and res.get("flagged"):
+                operation_uuid=ln["operation_uuid"],
+            ) or {}
+            if res.get("status", "success") not in ("success", "duplicate"):
+                logging.getLogger(__name__).warning(
+                    "finalize_issue: sesja %s, pozycja %s nie wydana: %s", session_id, ln["item_id"], res
+                )
+                self._movements_changed(issued)
+                return {"status": "error", "lines": len(lines), "posted": done, "error": res}
+            done += 1
+            issued.append(int(ln["item_id"]))
+            if res.get("flagged"):
                 flagged = True
 
         with self.engine.begin() as conn:
-            conn.execute(
-                text("UPDATE issue_sessions SET status='CONFIRMED', confirmed_at=CURRENT_TIMESTAMP() WHERE id=:id"),
+            status = conn.execute(
+                text("SELECT status FROM issue_sessions WHERE id=:id FOR UPDATE"),
                 {"id": int(session_id)},
-            )
+            ).scalar()
+            if status == "OPEN":
+                # towar już zszedł ze stanu – rezerwacja tej sesji przestaje obowiązywać
+                release_session_reservations(conn, [int(session_id)])
+                conn.execute(
+                    text("UPDATE issue_sessions SET status='CONFIRMED', confirmed_at=CURRENT_TIMESTAMP() WHERE id=:id"),
+                    {"id": int(session_id)},
+                )
+            else:
+                logging.getLogger(__name__).warning(
+                    "finalize_issue: sesja %s zmieniła status na %s w trakcie wydania", session_id, status
+                )
 
+        self._movements_changed(issued)
         return {"status": "success", "lines": len(lines), "flagged": flagged}
 
+    @staticmethod
+    def _movements_changed(item_ids: List[int]) -> None:
+        """Po wydaniu koszyka: jedno zdarzenie z towarami wydanymi w tej próbie."""
+        if item_ids:
+            events.publish(events.MOVEMENTS_CHANGED, source="checkout", item_ids=item_ids)
+
+    def check_availability(
+        self,
+        session_id: int,
+        lines: List[Dict],
+        *,
+        conn: Any = None,
+        session_open: Optional[bool] = None,
+    ) -> List[Dict]:
+        """
+        Walidacja koszyka w momencie finalizacji (bufor klienta nie blokuje stanu).
+        Dla pozycji z koszyka liczy: stan z partii - rezerwacje innych otwartych sesji
+        (licznik item_reservations pomniejszony o linie tej sesji – tylko gdy sesja
+        jest OPEN; zamkniętej sweeper już zwolnił rezerwacje).
+        Zwraca listę konfliktów {item_id, requested, available}; pusta lista = OK.
+        """
+        ids = [int(ln["item_id"]) for ln in lines]
+        if not ids:
+            return []
+        if conn is None:
+            with self.engine.connect() as own_conn:
+                return self.check_availability(session_id, lines, conn=own_conn, session_open=session_open)
+        if session_open is None:
+            session_open = bool(
+                conn.execute(
+                    text(
+                        "SELECT 1 FROM issue_sessions WHERE id=:id AND status='OPEN' "
+                        "AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP())"
+                    ),
+                    {"id": int(session_id)},
+                ).scalar()
+            )
+        sql = text(
+            """
+            SELECT i.id AS item_id,
+                   COALESCE(oh.qty_on_hand, 0) AS qty_on_hand,
+                   COALESCE(r.qty_reserved, 0) AS qty_reserved
+            FROM items i
+            LEFT JOIN (
+                SELECT item_id, SUM(qty_available) AS qty_on_hand
+                FROM lots
+                WHERE item_id IN :ids
+                GROUP BY item_id
+            ) oh ON oh.item_id = i.id
+            LEFT JOIN item_reservations r ON r.item_id = i.id
+            WHERE i.id IN :ids
+            """
+        ).bindparams(bindparam("ids", expanding=True))
+        rows = conn.execute(sql, {"ids": ids}).mappings().all()
+        own = {int(ln["item_id"]): float(ln["qty"]) for ln in lines} if session_open else {}
+        available = {
+            int(r["item_id"]): float(r["qty_on_hand"] or 0)
+            - max(float(r["qty_reserved"] or 0) - own.get(int(r["item_id"]), 0.0), 0.0)
+            for r in rows
+        }
+        conflicts: List[Dict] = []
+        for ln in lines:
+            iid = int(ln["item_id"])
+            avail = available.get(iid, 0.0)
+            if float(ln["qty"]) > avail:
+                conflicts.append({"item_id": iid, "requested": float(ln["qty"]), "available": max(avail, 0.0)})
+        return conflicts
+
 
 # Ta klasa odpowiada za obsĹ‚ugÄ™ karty RFID / PIN (modal + mapowanie pracownika)
 class RfidService:
@@ -511,37 +1025,35 @@ class RfidService:
 
 # --- Override StockRepository.list_available to use vw_stock_available (lots-based) ---
 from typing import List, Dict
-from sqlalchemy import text as _text
 
 def _list_available_vw(self, q: str | None = None, limit: int = 100, offset: int = 0) -> List[Dict]:
     """
     Lista dostępnych pozycji do wydania z jednego źródła prawdy: vw_stock_available + items.
-    Zwraca: item_id, sku, name, uom, qty_available.
+    Zwraca: item_id, sku, name, uom, qty_on_hand, qty_reserved_open, qty_available.
     # LEGACY: stock – nieużywać
+    Ranking: dokładny kod -> prefiks -> podciąg (catalog_search); przy offset > 0
+    bez dopełniania podciągiem (stronicowanie tylko po ścieżce indeksowej).
+    """
+    sql = """
+        SELECT
+          i.id AS item_id,
+          i.code AS sku,
+          COALESCE(NULLIF(TRIM(i.name), ''), i.code) AS name,
+          COALESCE(i.unit, 'SZT') AS uom,
+          v.qty_on_hand,
+          v.qty_reserved_open,
+          v.qty_available
+        FROM vw_stock_available v
+        JOIN items i ON i.id = v.item_id
+        WHERE v.qty_available > 0
+          AND {match}
+        ORDER BY {rank}, name
+        LIMIT :lim OFFSET :offset
     """
-    like = f"%{q.strip()}%" if q else None
     with self.engine.connect() as conn:
-        sql = _text(
-            """
-            SELECT
-              i.id AS item_id,
-              i.code AS sku,
-              COALESCE(NULLIF(TRIM(i.name), ''), i.code) AS name,
-              COALESCE(i.unit, 'SZT') AS uom,
-              v.available AS qty_available
-            FROM vw_stock_available v
-            JOIN items i ON i.id = v.item_id
-            WHERE v.available > 0
-              AND (:q IS NULL OR i.code LIKE :like OR i.name LIKE :like)
-            ORDER BY name
-            LIMIT :limit OFFSET :offset
-            """
+        return ranked_search(
+            conn, sql, q, {"offset": int(offset)}, limit=limit, fallback=not offset
         )
-        rows = conn.execute(
-            sql,
-            {"q": q if q else None, "like": like, "limit": int(limit), "offset": int(offset)},
-        ).mappings().all()
-        return [dict(r) for r in rows]
 
 # Monkey-patch replacement (surgical)
 StockRepository.list_available = _list_available_vw
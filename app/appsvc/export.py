@@ -0,0 +1,180 @@
+# app/appsvc/export.py
+"""
+Eksport raportów i audytu do CSV/PDF strumieniowo – prosto z bazy.
+
+Źródło to generator wierszy (słowników), zwykle app.dal.stream.stream_query(): kursor po
+stronie serwera (stream_results) czytany partiami, więc pamięć nie zależy od
+liczby wierszy, a tabela w UI nie musi być załadowana. Pisarze (write_csv,
+write_pdf) konsumują generator wiersz po wierszu i raportują postęp.
+Uruchamianie w tle z postępem i anulowaniem: app/ui/widgets/export_runner.py.
+"""
+from __future__ import annotations
+
+import csv
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+log = logging.getLogger(__name__)
+
+Columns = Sequence[Tuple[str, str]]          # [(klucz, nagłówek)]
+Progress = Optional[Callable[[int], None]]   # liczba zapisanych wierszy
+Cancelled = Optional[Callable[[], bool]]
+
+PROGRESS_EVERY = 500
+
+
+class ExportCancelled(Exception):
+    """Eksport przerwany przez użytkownika (plik częściowy jest usuwany)."""
+
+
+# ---------- Formatowanie ----------
+def cell(v: Any) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, datetime):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(v, date):
+        return v.isoformat()
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    if isinstance(v, Decimal):
+        return format(v.normalize(), "f") if v == v.to_integral() else str(v)
+    return str(v)
+
+
+def _check(n: int, progress: Progress, cancelled: Cancelled) -> None:
+    if n % PROGRESS_EVERY == 0:
+        if cancelled and cancelled():
+            raise ExportCancelled()
+        if progress:
+            progress(n)
+
+
+# ---------- Pisarze ----------
+def write_csv(
+    rows: Iterable[Dict],
+    columns: Columns,
+    path: Path | str,
+    *,
+    progress: Progress = None,
+    cancelled: Cancelled = None,
+    delimiter: str = ",",
+) -> int:
+    """Zapisuje wiersze do CSV (UTF-8). Zwraca liczbę wierszy."""
+    keys = [k for k, _ in columns]
+    n = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=delimiter)
+        writer.writerow([h for _, h in columns])
+        for row in rows:
+            writer.writerow([cell(row.get(k)) for k in keys])
+            n += 1
+            _check(n, progress, cancelled)
+    if progress:
+        progress(n)
+    return n
+
+
+def write_pdf(
+    rows: Iterable[Dict],
+    columns: Columns,
+    path: Path | str,
+    *,
+    title: str = "",
+    progress: Progress = None,
+    cancelled: Cancelled = None,
+    font_pt: int = 8,
+) -> int:
+    """
+    Tabela w PDF (A4 poziomo) stronami: nagłówek kolumn na każdej stronie,
+    numer strony w stopce. Szerokości kolumn z nagłówków (strumień – bez
+    wcześniejszego przejścia po danych); dłuższe wartości są skracane „…”.
+    """
+    from PySide6.QtCore import QMarginsF, Qt
+    from PySide6.QtGui import QFont, QFontMetrics, QPageLayout, QPageSize, QPainter, QPdfWriter
+
+    keys = [k for k, _ in columns]
+    writer = QPdfWriter(str(path))
+    writer.setPageLayout(
+        QPageLayout(QPageSize(QPageSize.A4), QPageLayout.Landscape, QMarginsF(10, 10, 10, 10))
+    )
+    writer.setResolution(150)
+    writer.setTitle(title)
+
+    painter = QPainter()
+    if not painter.begin(writer):
+        raise IOError(f"Nie można utworzyć pliku PDF: {path}")
+    try:
+        font = QFont("Helvetica", font_pt)
+        painter.setFont(font)
+        fm = QFontMetrics(font, writer)
+        page = writer.pageLayout().paintRectPixels(writer.resolution())
+        width, height = page.width(), page.height()
+        line_h = int(fm.height() * 1.3)
+        # szerokości: proporcjonalnie do nagłówka, min. 6 znaków
+        weights = [max(len(h), 6) for _, h in columns]
+        total = float(sum(weights))
+        col_w = [int(width * w / total) for w in weights]
+        col_x = [sum(col_w[:i]) for i in range(len(col_w))]
+        bold = QFont(font)
+        bold.setBold(True)
+
+        page_no = 0
+        y = height  # wymusza pierwszą stronę
+
+        def new_page():
+            nonlocal page_no, y
+            if page_no:
+                writer.newPage()
+            page_no += 1
+            y = 0
+            painter.setFont(bold)
+            if title:
+                painter.drawText(0, y + fm.ascent(), title)
+                y += line_h * 2
+            for x, w, (_, h) in zip(col_x, col_w, columns):
+                painter.drawText(x, y + fm.ascent(), fm.elidedText(h, Qt.ElideRight, w - 4))
+            y += line_h
+            painter.drawLine(0, y - line_h // 4, width, y - line_h // 4)
+            painter.setFont(font)
+            painter.drawText(width - fm.horizontalAdvance("Strona 0000"), height - fm.descent(), f"Strona {page_no}")
+
+        n = 0
+        for row in rows:
+            if y + line_h > height - line_h:
+                new_page()
+            for x, w, k in zip(col_x, col_w, keys):
+                painter.drawText(x, y + fm.ascent(), fm.elidedText(cell(row.get(k)), Qt.ElideRight, w - 4))
+            y += line_h
+            n += 1
+            _check(n, progress, cancelled)
+        if page_no == 0:
+            new_page()  # pusty raport – sam nagłówek
+    finally:
+        painter.end()
+    if progress:
+        progress(n)
+    return n
+
+
+WRITERS = {"csv": write_csv, "pdf": write_pdf}
+
+
+def export_rows(
+    rows: Iterable[Dict],
+    columns: Columns,
+    path: Path | str,
+    *,
+    title: str = "",
+    progress: Progress = None,
+    cancelled: Cancelled = None,
+) -> int:
+    """Wybiera pisarza po rozszerzeniu pliku (.csv / .pdf)."""
+    fmt = Path(path).suffix.lower().lstrip(".")
+    if fmt not in WRITERS:
+        raise ValueError(f"Nieobsługiwany format eksportu: .{fmt}")
+    kw = {"title": title} if fmt == "pdf" else {}
+    return WRITERS[fmt](rows, columns, path, progress=progress, cancelled=cancelled, **kw)
@@ -0,0 +1,381 @@
+"""
+Sesja inwentaryzacji (spis z natury) dla tysięcy pozycji.
+
+  1. freeze()  – zamrożenie stanów systemowych: jeden spójny odczyt
+                 (REPEATABLE READ, START TRANSACTION WITH CONSISTENT SNAPSHOT)
+                 SUM(lots.qty_available) per towar + znak wody movements.id,
+  2. record() / scan() – liczenia offline do lokalnego bufora SQLite
+                 (przetrwa restart / brak sieci; kolejne skany sumują się),
+  3. diffs()   – różnice jednym zapytaniem zbiorowym w buforze
+                 (ilości w tysięcznych, bez Decimal na wiersz),
+  4. post()    – jedno potwierdzenie kierownika, potem ADJUST przez
+                 sp_inventory_count partiami po `batch_size` pozycji w transakcji.
+
+Stan docelowy przy księgowaniu = policzone + (stan bieżący - stan z migawki),
+więc ruchy wykonane po zamrożeniu nie są „cofane” korektą. Pozycje z takimi
+ruchami diffs() oznacza (moved_after_snapshot) do przejrzenia.
+operation_uuid pozycji = uuid5(sesja, towar) – ponowne księgowanie po błędzie
+nie dubluje korekt (idempotencja procedury po operation_uuid).
+"""
+from __future__ import annotations
+
+import logging
+import sqlite3
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+
+from app.dal.snapshot import StockSnapshot, consistent_snapshot
+
+log = logging.getLogger(__name__)
+
+QTY_SCALE = 1000
+DEFAULT_BATCH = 200
+
+_BUFFER_DDL = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS snapshot (
+    item_id     INTEGER PRIMARY KEY,
+    code        TEXT,
+    name        TEXT,
+    qty_milli   INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshot_code ON snapshot(code);
+CREATE TABLE IF NOT EXISTS counts (
+    item_id     INTEGER PRIMARY KEY,
+    qty_milli   INTEGER NOT NULL,
+    scans       INTEGER NOT NULL DEFAULT 1,
+    counted_at  TEXT NOT NULL,
+    operator    TEXT,
+    posted_at   TEXT
+);
+CREATE TABLE IF NOT EXISTS moved (item_id INTEGER PRIMARY KEY);
+"""
+
+
+@dataclass(frozen=True)
+class CountDiff:
+    item_id: int
+    code: str
+    name: str
+    qty_system: Decimal
+    qty_counted: Decimal
+    diff: Decimal
+    moved_after_snapshot: bool
+    posted: bool
+
+
+def _milli(qty) -> int:
+    return int((Decimal(str(qty)) * QTY_SCALE).to_integral_value())
+
+
+def _qty(milli: int) -> Decimal:
+    return Decimal(int(milli)).scaleb(-3)
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class InventorySession:
+    """Bufor jednej sesji spisu (plik SQLite) + księgowanie różnic."""
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self._db = sqlite3.connect(str(self.path))
+        self._db.executescript(_BUFFER_DDL)
+
+    # ---------- Tworzenie ----------
+    @classmethod
+    def create(
+        cls,
+        path: Path | str,
+        snapshot: Iterable[Tuple[int, str, str, int]],
+        *,
+        movement_mark: int,
+        session_uuid: Optional[str] = None,
+        operator: str = "",
+    ) -> "InventorySession":
+        """Nowy bufor z gotowej migawki: (item_id, code, name, qty_milli)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            raise FileExistsError(f"Sesja inwentaryzacji już istnieje: {path}")
+        s = cls(path)
+        with s._db:
+            s._db.executemany(
+                "INSERT INTO snapshot(item_id, code, name, qty_milli) VALUES (?, ?, ?, ?)",
+                ((int(i), c or "", n or "", int(q or 0)) for i, c, n, q in snapshot),
+            )
+            s._db.executemany(
+                "INSERT INTO meta(key, value) VALUES (?, ?)",
+                [
+                    ("session_uuid", session_uuid or str(uuid.uuid4())),
+                    ("movement_mark", str(int(movement_mark))),
+                    ("frozen_at", _now()),
+                    ("operator", operator),
+                ],
+            )
+        log.info("Inwentaryzacja: migawka %s pozycji -> %s", s.item_count(), path)
+        return s
+
+    @classmethod
+    def freeze(
+        cls,
+        engine: Engine,
+        path: Path | str,
+        *,
+        item_ids: Optional[Sequence[int]] = None,
+        operator: str = "",
+    ) -> "InventorySession":
+        """Zamraża stany systemowe (wszystkie aktywne towary albo wskazane)."""
+        where = "WHERE i.active = 1" if item_ids is None else "WHERE i.id IN :ids"
+        sql = text(
+            f"""
+            SELECT i.id, i.code, i.name,
+                   CAST(ROUND(COALESCE(SUM(l.qty_available), 0) * 1000) AS SIGNED) AS qty_milli
+            FROM items i
+            LEFT JOIN lots l ON l.item_id = i.id
+            {where}
+            GROUP BY i.id, i.code, i.name
+            """
+        )
+        params: dict = {}
+        if item_ids is not None:
+            sql = sql.bindparams(bindparam("ids", expanding=True))
+            params["ids"] = [int(i) for i in item_ids]
+        with consistent_snapshot(engine) as conn:
+            # jeden spójny widok: stany partii i znak wody ruchów z tej samej chwili
+            mark = int(conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM movements")).scalar() or 0)
+            rows = conn.execute(sql, params).all()
+        return cls.create(path, rows, movement_mark=mark, operator=operator)
+
+    @classmethod
+    def from_snapshot(
+        cls,
+        path: Path | str,
+        snap: StockSnapshot,
+        *,
+        item_ids: Optional[Sequence[int]] = None,
+        operator: str = "",
+    ) -> "InventorySession":
+        """Arkusz spisu z gotowej migawki (app.dal.snapshot) – bez ponownego odczytu bazy."""
+        on_hand = snap.on_hand()
+        if item_ids is None:
+            ids = [i for i, (_c, _n, _m, active) in snap.items.items() if active]
+        else:
+            ids = [int(i) for i in item_ids if int(i) in snap.items]
+        rows = ((i, snap.items[i][0], snap.items[i][1], on_hand.get(i, 0)) for i in ids)
+        return cls.create(path, rows, movement_mark=snap.movement_mark, operator=operator)
+
+    # ---------- Metadane ----------
+    def meta(self, key: str, default: str = "") -> str:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value: str) -> None:
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def session_uuid(self) -> str:
+        return self.meta("session_uuid")
+
+    @property
+    def movement_mark(self) -> int:
+        return int(self.meta("movement_mark", "0"))
+
+    def item_count(self) -> int:
+        return int(self._db.execute("SELECT COUNT(*) FROM snapshot").fetchone()[0])
+
+    def close(self) -> None:
+        self._db.close()
+
+    # ---------- Liczenie (offline) ----------
+    def record(self, item_id: int, qty, *, add: bool = False, operator: str = "") -> Decimal:
+        """
+        Zapisuje policzoną ilość (add=True – dolicza do dotychczasowej, np. kolejny skan).
+        Zwraca ilość po zapisie.
+        """
+        m = _milli(qty)
+        if m < 0:
+            raise ValueError("Ilość policzona nie może być ujemna")
+        if self._db.execute("SELECT 1 FROM snapshot WHERE item_id = ?", (int(item_id),)).fetchone() is None:
+            raise KeyError(f"Towar {item_id} nie należy do sesji")
+        new_qty = "qty_milli + excluded.qty_milli" if add else "excluded.qty_milli"
+        with self._db:
+            self._db.execute(
+                f"""
+                INSERT INTO counts(item_id, qty_milli, counted_at, operator) VALUES (?, ?, ?, ?)
+                ON CONFLICT(item_id) DO UPDATE SET
+                  qty_milli = {new_qty},
+                  scans = scans + 1,
+                  counted_at = excluded.counted_at,
+                  operator = excluded.operator,
+                  posted_at = NULL
+                """,
+                (int(item_id), m, _now(), operator),
+            )
+        return _qty(self._db.execute("SELECT qty_milli FROM counts WHERE item_id = ?", (int(item_id),)).fetchone()[0])
+
+    def scan(self, code: str, qty=1, *, operator: str = "") -> Tuple[int, Decimal]:
+        """Skan kodu towaru: dolicza `qty`. Zwraca (item_id, ilość po skanie)."""
+        row = self._db.execute(
+            "SELECT item_id FROM snapshot WHERE code = ? COLLATE NOCASE", ((code or "").strip(),)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"Nieznany kod: {code}")
+        return int(row[0]), self.record(int(row[0]), qty, add=True, operator=operator)
+
+    def progress(self) -> Tuple[int, int]:
+        """(policzone pozycje, wszystkie pozycje migawki)."""
+        counted = self._db.execute("SELECT COUNT(*) FROM counts").fetchone()[0]
+        return int(counted), self.item_count()
+
+    # ---------- Różnice ----------
+    def refresh_moved(self, engine: Engine) -> int:
+        """
+        Zapamiętuje towary z ruchami po migawce (poza ADJUST) – do oznaczenia w diffs().
+        Towar bierzemy także z alokacji (partia -> item_id), bo ruchy wielopozycyjne
+        (RETURN/SCRAP) mają item_id = NULL.
+        """
+        with engine.connect() as conn:
+            ids = conn.execute(
+                text(
+                    """
+                    SELECT l.item_id
+                    FROM movements m
+                    JOIN movement_allocations ma ON ma.movement_id = m.id
+                    JOIN lots l ON l.id = ma.lot_id
+                    WHERE m.id > :mark AND m.movement_type <> 'ADJUST'
+                    UNION
+                    SELECT item_id
+                    FROM movements
+                    WHERE id > :mark AND movement_type <> 'ADJUST' AND item_id IS NOT NULL
+                    """
+                ),
+                {"mark": self.movement_mark},
+            ).scalars().all()
+        with self._db:
+            self._db.execute("DELETE FROM moved")
+            self._db.executemany("INSERT OR IGNORE INTO moved(item_id) VALUES (?)", ((int(i),) for i in ids))
+        return len(ids)
+
+    def diffs(self, *, only_nonzero: bool = True, include_uncounted: bool = False) -> List[CountDiff]:
+        """
+        Różnice policzone - systemowe (jedno zapytanie w buforze).
+        include_uncounted=True traktuje niepoliczone pozycje jak 0 (pełny spis).
+        """
+        join = "LEFT JOIN" if include_uncounted else "JOIN"
+        cond = "WHERE COALESCE(c.qty_milli, 0) <> s.qty_milli" if only_nonzero else ""
+        rows = self._db.execute(
+            f"""
+            SELECT s.item_id, s.code, s.name, s.qty_milli, COALESCE(c.qty_milli, 0),
+                   COALESCE(c.qty_milli, 0) - s.qty_milli,
+                   m.item_id IS NOT NULL, c.posted_at IS NOT NULL
+            FROM snapshot s
+            {join} counts c ON c.item_id = s.item_id
+            LEFT JOIN moved m ON m.item_id = s.item_id
+            {cond}
+            ORDER BY s.name, s.item_id
+            """
+        ).fetchall()
+        return [
+            CountDiff(
+                item_id=int(r[0]), code=r[1], name=r[2],
+                qty_system=_qty(r[3]), qty_counted=_qty(r[4]), diff=_qty(r[5]),
+                moved_after_snapshot=bool(r[6]), posted=bool(r[7]),
+            )
+            for r in rows
+        ]
+
+    # ---------- Księgowanie ----------
+    def op_uuid(self, item_id: int) -> str:
+        return str(uuid.uuid5(uuid.UUID(self.session_uuid), str(int(item_id))))
+
+    def post(
+        self,
+        engine: Engine,
+        *,
+        confirm: Callable[[], bool],
+        approved: Optional[Iterable[int]] = None,
+        include_uncounted: bool = False,
+        batch_size: int = DEFAULT_BATCH,
+        approved_by: str = "",
+        apply_batch: Optional[Callable[[object, List[Tuple[int, int, str]]], None]] = None,
+    ) -> dict:
+        """
+        Księguje różnice (wszystkie albo `approved` item_id) po jednym potwierdzeniu.
+        Każda partia: blokada partii towarów, stan bieżący, CALL sp_inventory_count
+        ze stanem docelowym, commit; po commicie pozycje oznaczane w buforze.
+        """
+        allowed = None if approved is None else {int(i) for i in approved}
+        pending = [
+            d for d in self.diffs(include_uncounted=include_uncounted)
+            if not d.posted and (allowed is None or d.item_id in allowed)
+        ]
+        if not pending:
+            return {"status": "nothing", "posted": 0}
+        if not confirm():
+            return {"status": "rfid_unconfirmed", "posted": 0}
+        apply_batch = apply_batch or _apply_batch_sp
+        snap = {d.item_id: _milli(d.qty_system) for d in pending}
+        counted = {d.item_id: _milli(d.qty_counted) for d in pending}
+
+        posted = 0
+        for i in range(0, len(pending), int(batch_size)):
+            ids = [d.item_id for d in pending[i:i + int(batch_size)]]
+            with engine.begin() as conn:
+                now = _current_qty_milli(conn, ids)
+                batch = [
+                    (iid, counted[iid] + (now.get(iid, 0) - snap[iid]), self.op_uuid(iid))
+                    for iid in ids
+                ]
+                apply_batch(conn, batch)
+            stamp = _now()
+            with self._db:
+                self._db.executemany(
+                    "UPDATE counts SET posted_at = ? WHERE item_id = ?", ((stamp, iid) for iid in ids)
+                )
+                # niepoliczone (pełny spis) – wpis 0, by nie księgować ponownie
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO counts(item_id, qty_milli, counted_at, posted_at) VALUES (?, 0, ?, ?)",
+                    ((iid, stamp, stamp) for iid in ids),
+                )
+            posted += len(ids)
+            log.info("Inwentaryzacja %s: zaksięgowano %s/%s", self.session_uuid, posted, len(pending))
+        self._set_meta("posted_at", _now())
+        if approved_by:
+            self._set_meta("approved_by", approved_by)
+        return {"status": "success", "posted": posted}
+
+
+def _current_qty_milli(conn, item_ids: List[int]) -> Dict[int, int]:
+    """Bieżący stan partii wskazanych towarów (z blokadą do końca transakcji partii)."""
+    rows = conn.execute(
+        text(
+            """
+            SELECT item_id, CAST(ROUND(SUM(qty_available) * 1000) AS SIGNED)
+            FROM lots
+            WHERE item_id IN :ids
+            GROUP BY item_id
+            FOR UPDATE
+            """
+        ).bindparams(bindparam("ids", expanding=True)),
+        {"ids": item_ids},
+    ).all()
+    return {int(r[0]): int(r[1] or 0) for r in rows}
+
+
+def _apply_batch_sp(conn, batch: List[Tuple[int, int, str]]) -> None:
+    """(item_id, stan docelowy w tysięcznych, operation_uuid) -> sp_inventory_count w transakcji partii."""
+    conn.execute(
+        text("CALL sp_inventory_count(:item_id, :qty, :op)"),
+        [{"item_id": iid, "qty": str(_qty(max(target, 0))), "op": op} for iid, target, op in batch],
+    )
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import List, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+
+from app.appsvc.cart import CART_SESSION_TTL_MIN, release_session_reservations
+
+log = logging.getLogger(__name__)
+
+
+# Ta klasa odpowiada za zamykanie porzuconych koszyków i zwalnianie ich rezerwacji
+class ReservationSweeper:
+    """
+    Cyklicznie (wątek w tle) anuluje sesje OPEN, którym minął expires_at,
+    partiami po `batch_size`. Każda partia to jedna transakcja: blokada sesji,
+    zwolnienie liczników item_reservations, zmiana statusu na CANCELLED.
+    Sesje bez expires_at (starsi klienci) wygasają po TTL od started_at.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        *,
+        interval_s: float = 60.0,
+        batch_size: int = 200,
+        ttl_minutes: int = CART_SESSION_TTL_MIN,
+    ) -> None:
+        self.engine = engine
+        self.interval_s = float(interval_s)
+        self.batch_size = int(batch_size)
+        self.ttl_minutes = int(ttl_minutes)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- Cykl życia ----------
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="reservation-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                n = self.sweep_once()
+                if n:
+                    log.info("Sweeper: anulowano %s wygasłych sesji koszyka", n)
+            except Exception:
+                log.exception("Sweeper: błąd podczas zamykania wygasłych sesji")
+            self._stop.wait(self.interval_s)
+
+    # ---------- Praca ----------
+    def sweep_once(self) -> int:
+        """Przetwarza wszystkie wygasłe sesje (partiami). Zwraca liczbę anulowanych."""
+        total = 0
+        while not self._stop.is_set():
+            n = self._sweep_batch()
+            total += n
+            if n < self.batch_size:
+                break
+        return total
+
+    def _sweep_batch(self) -> int:
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    """
+                    SELECT id
+                      FROM issue_sessions
+                     WHERE status = 'OPEN'
+                       AND (expires_at <= CURRENT_TIMESTAMP()
+                            OR (expires_at IS NULL
+                                AND started_at < CURRENT_TIMESTAMP() - INTERVAL :ttl MINUTE))
+                     ORDER BY id
+                     LIMIT :lim
+                     FOR UPDATE
+                    """
+                ),
+                {"ttl": self.ttl_minutes, "lim": self.batch_size},
+            ).all()
+            ids: List[int] = [int(r[0]) for r in rows]
+            if not ids:
+                return 0
+            release_session_reservations(conn, ids)
+            conn.execute(
+                text(
+                    "UPDATE issue_sessions SET status='CANCELLED', expires_at=COALESCE(expires_at, CURRENT_TIMESTAMP()) WHERE id IN :ids"
+                ).bindparams(bindparam("ids", expanding=True)),
+                {"ids": ids},
+            )
+        return len(ids)
+
+    def rebuild_counters(self) -> None:
+        """Przelicza item_reservations od zera z linii otwartych sesji (naprawa dryfu)."""
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "SELECT id FROM issue_sessions WHERE status='OPEN' FOR UPDATE"
+                )
+            )
+            conn.execute(text("DELETE FROM item_reservations"))
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO item_reservations (item_id, qty_reserved)
+                    SELECT l.item_id, SUM(l.qty_reserved)
+                      FROM issue_sessions s
+                      JOIN issue_session_lines l ON l.session_id = s.id
+                     WHERE s.status = 'OPEN'
+                     GROUP BY l.item_id
+                    """
+                )
+            )
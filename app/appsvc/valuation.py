@@ -0,0 +1,195 @@
+"""
+Wycena zapasu metodą FIFO (koszt partii) w arytmetyce stałoprzecinkowej.
+
+Pozycje (towar, lokalizacja, ilość, koszt jednostkowy) trafiają do kolumn
+array('q') – bez obiektu Decimal na wiersz:
+  - ilość w tysięcznych (decimal(12,3) * 1000 – dokładnie),
+  - koszt w 1/10000 PLN (decimal(12,4) * 10000 – dokładnie),
+  - wartość pozycji = qty_milli * cost_e4 w 1e-7 PLN (int Pythona, bez przepełnień).
+
+Zasada zaokrągleń: sumy liczone są dokładnie, do groszy (ROUND_HALF_UP)
+zaokrąglana jest dopiero suma grupy. Suma całkowita to zaokrąglenie sumy
+dokładnej – może różnić się o grosze od sumy zaokrąglonych grup.
+
+Źródła (load_positions):
+  - stan bieżący: magazyn z lots.qty_available, u pracowników saldo
+    movement_allocations (przyjęte - oddane) po lokalizacjach EMPLOYEE,
+  - as_of: saldo movement_allocations wszystkich lokalizacji (bez SCRAP)
+    z ruchów o ts < as_of (data => koniec tego dnia),
+  - migawka (app.dal.snapshot) – StockValuation.from_snapshot, bez zapytań.
+"""
+from __future__ import annotations
+
+import logging
+from array import array
+from datetime import date, datetime, time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.dal.snapshot import StockSnapshot, ledger_stmt
+
+log = logging.getLogger(__name__)
+
+QTY_SCALE = 1000          # ilość: tysięczne
+COST_SCALE = 10_000       # koszt: 1/10000 PLN
+VALUE_EXP = 7             # wartość: 1e-7 PLN (3 + 4 miejsca)
+DEC2 = Decimal("0.01")
+
+GROUPS = ("item", "location")   # items nie ma kolumny kategorii
+
+Total = Tuple[int, int]   # (qty_milli, value_e7)
+
+
+def to_qty(qty_milli: int) -> Decimal:
+    return Decimal(qty_milli).scaleb(-3)
+
+
+def to_pln(value_e7: int) -> Decimal:
+    """Wartość dokładna -> PLN zaokrąglone do groszy (połówki w górę)."""
+    return Decimal(value_e7).scaleb(-VALUE_EXP).quantize(DEC2, rounding=ROUND_HALF_UP)
+
+
+def fixed(x, scale: int) -> int:
+    """Decimal/str/liczba -> int w skali (dokładnie dla wartości o tylu miejscach)."""
+    return int((Decimal(str(x)) * scale).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+class StockValuation:
+    """Kolumny pozycji wyceny i sumy per towar / lokalizacja."""
+
+    def __init__(self) -> None:
+        self.item_id = array("q")
+        self.location_id = array("q")
+        self.qty_milli = array("q")
+        self.cost_e4 = array("q")
+
+    def __len__(self) -> int:
+        return len(self.item_id)
+
+    def append(self, item_id: int, location_id: int, qty_milli: int, cost_e4: int) -> None:
+        self.item_id.append(item_id)
+        self.location_id.append(location_id)
+        self.qty_milli.append(qty_milli)
+        self.cost_e4.append(cost_e4)
+
+    def extend(self, rows: Iterable[Sequence[int]]) -> None:
+        """Wiersze (item_id, location_id, qty_milli, cost_e4); pomija zerowe ilości."""
+        ia, la, qa, ca = self.item_id.append, self.location_id.append, self.qty_milli.append, self.cost_e4.append
+        for item, loc, qm, ce in rows:
+            if qm:
+                ia(int(item or 0))
+                la(int(loc or 0))
+                qa(int(qm))
+                ca(int(ce))
+
+    def totals(self, by: str = "item") -> Dict[int, Total]:
+        """Sumy dokładne {item_id | location_id: (qty_milli, value_e7)}."""
+        if by not in GROUPS:
+            raise ValueError(f"Nieznane grupowanie: {by!r} (dozwolone: {', '.join(GROUPS)})")
+        keys: Iterable = self.location_id if by == "location" else self.item_id
+        qty: Dict[int, int] = {}
+        val: Dict[int, int] = {}
+        qget, vget = qty.get, val.get
+        for k, qm, ce in zip(keys, self.qty_milli, self.cost_e4):
+            qty[k] = qget(k, 0) + qm
+            val[k] = vget(k, 0) + qm * ce
+        return {k: (qty[k], val[k]) for k in qty}
+
+    @classmethod
+    def from_snapshot(cls, snap: StockSnapshot) -> "StockValuation":
+        """Pozycje stanu bieżącego ze spójnej migawki (bez ponownego odczytu bazy)."""
+        val = cls()
+        val.extend(snap.positions())
+        return val
+
+    def grand_total(self) -> Total:
+        return sum(self.qty_milli), sum(q * c for q, c in zip(self.qty_milli, self.cost_e4))
+
+
+# ---------- Źródła ----------
+_WAREHOUSE_SQL = """
+    SELECT l.item_id,
+           COALESCE((SELECT MIN(id) FROM locations WHERE type = 'WAREHOUSE'), 0),
+           ROUND(l.qty_available * 1000),
+           ROUND(l.unit_cost_netto * 10000)
+    FROM lots l
+    WHERE l.qty_available <> 0
+"""
+
+def _as_of_bound(as_of: date | datetime) -> datetime:
+    if isinstance(as_of, datetime):
+        return as_of
+    return datetime.combine(as_of + timedelta(days=1), time.min)
+
+
+def _stream(engine: Engine, stmt, params: dict, batch_size: int) -> Iterable[tuple]:
+    with engine.connect() as conn:
+        res = conn.execution_options(stream_results=True, yield_per=int(batch_size)).execute(stmt, params)
+        for part in res.partitions():
+            yield from part
+
+
+def load_positions(
+    engine: Engine,
+    *,
+    as_of: date | datetime | None = None,
+    batch_size: int = 5000,
+) -> StockValuation:
+    """Strumieniuje pozycje z bazy do kolumn wyceny (stan bieżący albo na dzień)."""
+    val = StockValuation()
+    if as_of is None:
+        val.extend(_stream(engine, text(_WAREHOUSE_SQL), {}, batch_size))
+        val.extend(_stream(engine, ledger_stmt(), {"types": ["EMPLOYEE"]}, batch_size))
+    else:
+        val.extend(
+            _stream(
+                engine,
+                ledger_stmt("AND m.ts < :as_of"),
+                {"types": ["WAREHOUSE", "EMPLOYEE"], "as_of": _as_of_bound(as_of)},
+                batch_size,
+            )
+        )
+    log.info("Wycena FIFO: %s pozycji (as_of=%s)", len(val), as_of)
+    return val
+
+
+def valuation_report(
+    engine: Engine,
+    *,
+    by: str = "item",
+    as_of: date | datetime | None = None,
+    loader: Callable[..., StockValuation] = load_positions,
+    snapshot: Optional[StockSnapshot] = None,
+) -> List[dict]:
+    """
+    Wiersze raportu wyceny: klucz grupy, nazwa, ilość, wartość (PLN, grosze).
+    Z `snapshot` (stan bieżący) pozycje i nazwy towarów pochodzą z migawki.
+    Wywołanie: tools/valuation_report.py.
+    """
+    if snapshot is not None and as_of is not None:
+        raise ValueError("Migawka to stan bieżący – nie łączy się z as_of")
+    val = StockValuation.from_snapshot(snapshot) if snapshot is not None else loader(engine, as_of=as_of)
+    totals = val.totals(by)
+    names: Dict[int, str] = {}
+    if by == "item" and snapshot is not None:
+        names = {i: f"{code} {name}" for i, (code, name, _m, _a) in snapshot.items.items()}
+    elif totals:
+        table, label = (
+            ("items", "CONCAT(code, ' ', name)") if by == "item" else ("locations", "name")
+        )
+        with engine.connect() as conn:
+            names = {r[0]: r[1] for r in conn.execute(text(f"SELECT id, {label} FROM {table}"))}
+    out = [
+        {
+            "key": k,
+            "name": names.get(k, str(k)),
+            "qty": to_qty(qm),
+            "value": to_pln(ve),
+        }
+        for k, (qm, ve) in totals.items()
+    ]
+    out.sort(key=lambda r: (-r["value"], str(r["name"])))
+    return out
@@ -6,16 +6,19 @@ from importlib import import_module
 import bcrypt
 from sqlalchemy import create_engine, text
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.engine import URL
+from sqlalchemy.engine import URL, Engine
 
 log = logging.getLogger("app.core.auth")
 
 # ===== domena (usługi) – importy cienkiej warstwy wywołań =====
 from app.domain.services.issue import issue_tool as svc_issue_tool
 from app.domain.services.scrap import scrap_tool as svc_scrap_tool
+from app.domain.services.scrap import scrap_protocol as svc_scrap_protocol
 from app.domain.services.rw import record_rw_receipt as svc_record_rw_receipt
 from app.domain.services.inventory import inventory_count as svc_inventory_count
+from app.domain.services.inventory import inventory_post_session as svc_inventory_post_session
 from app.domain.services.bundle import issue_return_bundle as svc_issue_return_bundle  # NEW
+from app.domain.services.bundle import shift_return_bundle as svc_shift_return_bundle
 
 # UWAGA: moduł nazywa się 'return' (słowo kluczowe) – używamy import_module
 try:
@@ -26,6 +29,8 @@ except Exception as _e:  # pragma: no cover
 
 # alias typu – już normalny import (żeby Pylance był zadowolony)
 from app.core.rfid_stub import RFIDReader
+from app.dal.catalog_search import ranked_search
+from app.infra import events
 
 
 # ========= pomocnicze debugi =========
@@ -44,6 +49,14 @@ def _mask(s: str, keep_left: int = 4, keep_right: int = 2) -> str:
     return f"{s[:keep_left]}***{s[-keep_right:]}"
 
 
+def _movements_changed(res: dict, source: str, item_ids) -> None:
+    """Po commicie: zgłasza zmianę stanów dotkniętych towarów (alerty, raporty)."""
+    if res.get("status") in ("success", "partial"):
+        events.publish(
+            events.MOVEMENTS_CHANGED, source=source, item_ids=sorted({int(i) for i in item_ids})
+        )
+
+
 def _dbg_hash(label: str, h) -> None:
     if h is None:
         _dbg(f"{label}: <None>")
@@ -130,11 +143,23 @@ def verify_secret(stored: str | None, provided: str):
         return False, "error"
 
 
+REPEATABLE_READ = "REPEATABLE READ"
+
+
 # ========= AuthRepo =========
 class AuthRepo:
-    def __init__(self, cfg: dict):
+    def __init__(self, cfg: dict, *, engine: Engine | None = None, replica=None):
         db = cfg["db"]
         self.cfg = cfg
+        self.replica = replica  # CatalogReplica | None – kartoteka towarów lokalnie
+        if engine is not None:
+            # wspólny silnik ze startu (już po pingu) – bez drugiej puli połączeń.
+            # make_engine ustawia READ COMMITTED; operacje magazynowe i logowanie
+            # działają jak dotąd na domyślnym poziomie MariaDB (REPEATABLE READ).
+            if engine.dialect.name in ("mysql", "mariadb"):
+                engine = engine.execution_options(isolation_level=REPEATABLE_READ)
+            self.engine = engine
+            return
 
         # Budowanie DSN z obsługą znaków specjalnych w haśle
         url = URL.create(
@@ -265,11 +290,47 @@ class AuthRepo:
                     features=features,
                 )
             _dbg(f"[REPO.bundle] status={res.get('status')} flagged={res.get('flagged')}")
+            _movements_changed(res, "bundle", [i for i, _q in [*returns, *issues]])
             return res
         except Exception as e:
             _dbg(f"[REPO.bundle][ERROR] {e}\n{traceback.format_exc()}")
             return {"status": "error", "error": str(e)}
 
+    # Zwroty/wydania wielu pracowników (zmiana zmiany) – transakcja na porcję
+    def shift_return_bundle(
+        self,
+        entries: list[tuple[int, list[tuple[int, int]], list[tuple[int, int]]]],
+        *,
+        chunk_size: int = 20,
+        reader: Optional[RFIDReader] = None,
+        features: Any = None,
+    ) -> dict:
+        _dbg(f"[REPO.shift_bundle] employees={len(entries)} chunk={chunk_size}")
+        # DB-API przez Connection – raw_connection() pominąłby poziom izolacji repo
+        conn = self.engine.connect()
+        raw = conn.connection
+        try:
+            res = svc_shift_return_bundle(
+                raw,
+                entries,
+                chunk_size=chunk_size,
+                rfid_confirmed=None,
+                reader=reader,
+                features=features,
+            )
+            _dbg(
+                f"[REPO.shift_bundle] status={res.get('status')} returns={res.get('returns')} "
+                f"issues={res.get('issues')} failed={len(res.get('failed') or [])}"
+            )
+            # partial: część porcji wycofana – sprawdzenie nadmiarowych towarów nie szkodzi
+            _movements_changed(res, "shift_return", [i for _e, r, iss in entries for i, _q in [*r, *iss]])
+            return res
+        except Exception as e:
+            _dbg(f"[REPO.shift_bundle][ERROR] {e}\n{traceback.format_exc()}")
+            return {"status": "error", "error": str(e)}
+        finally:
+            conn.close()
+
     # NEW: pomocniczo – bieżące saldo otwartych sztuk u pracownika
     def get_employee_open_qty(self, employee_id: int) -> int:
         with self.engine.connect() as conn:
@@ -321,6 +382,44 @@ class AuthRepo:
             _dbg(f"[REPO.scrap][ERROR] {e}\n{traceback.format_exc()}")
             return {"status": "error", "error": str(e)}
 
+    # Protokół złomowania: wiele pozycji, jeden powód, jedna transakcja
+    def scrap_protocol(
+        self,
+        employee_id: int,
+        lines: list[tuple[int, Any]],
+        *,
+        reason: str | None = None,
+        protocol_uuid: str | None = None,
+        reader: Optional[RFIDReader] = None,
+        features: Any = None,
+    ) -> dict:
+        _dbg(
+            f"[REPO.scrap_protocol] emp={employee_id} lines={len(lines)} "
+            f"uuid={_mask(protocol_uuid)} reason={reason!r}"
+        )
+        # DB-API przez Connection – raw_connection() pominąłby poziom izolacji repo
+        conn = self.engine.connect()
+        raw = conn.connection
+        try:
+            res = svc_scrap_protocol(
+                raw,
+                employee_id,
+                lines,
+                reason=reason,
+                protocol_uuid=protocol_uuid,
+                rfid_confirmed=None,
+                reader=reader,
+                features=features,
+            )
+            _dbg(f"[REPO.scrap_protocol] status={res.get('status')} lines={res.get('lines')}")
+            _movements_changed(res, "scrap", [i for i, _q in lines])
+            return res
+        except Exception as e:
+            _dbg(f"[REPO.scrap_protocol][ERROR] {e}\n{traceback.format_exc()}")
+            return {"status": "error", "error": str(e)}
+        finally:
+            conn.close()
+
     def record_rw_receipt(
         self,
         document_id: int,
@@ -387,6 +486,36 @@ class AuthRepo:
             _dbg(f"[REPO.inventory][ERROR] {e}\n{traceback.format_exc()}")
             return {"status": "error", "error": str(e)}
 
+    def inventory_post(
+        self,
+        session,
+        *,
+        approved=None,
+        reader: Optional[RFIDReader] = None,
+        features: Any = None,
+        approved_by: str = "",
+    ) -> dict:
+        """Księgowanie sesji spisu (InventorySession) – jedno potwierdzenie, partie ADJUST."""
+        _dbg(f"[REPO.inventory_post] session={session.session_uuid} approved_by={approved_by}")
+        try:
+            item_ids = [d.item_id for d in session.diffs() if not d.posted]
+            if approved is not None:
+                item_ids = [int(i) for i in approved]
+            res = svc_inventory_post_session(
+                self.engine,
+                session,
+                approved=approved,
+                reader=reader,
+                features=features,
+                approved_by=approved_by,
+            )
+            _dbg(f"[REPO.inventory_post] status={res.get('status')} posted={res.get('posted')}")
+            _movements_changed(res, "inventory", item_ids)
+            return res
+        except Exception as e:
+            _dbg(f"[REPO.inventory_post][ERROR] {e}\n{traceback.format_exc()}")
+            return {"status": "error", "error": str(e)}
+
     # ===== API pomocnicze
     def login_auto(self, token: str, station_id: str):
         """
@@ -571,6 +700,7 @@ class AuthRepo:
             # przy zbyt restrykcyjnym schemacie (rfid_uid NOT NULL) zwróci błąd spójny dla UI
             return None, f"Błąd zapisu użytkownika: {e}"
 
+        events.publish(events.EMPLOYEES_CHANGED, employee_id=new_id)
         return self.get_employee(new_id), None
 
     def update_employee_basic(
@@ -606,6 +736,7 @@ class AuthRepo:
                 ),
                 dict(u=login, fn=first_name, ln=last_name, role=role, adm=int(is_admin), act=int(active), id=emp_id),
             )
+        events.publish(events.EMPLOYEES_CHANGED, employee_id=emp_id)
         return None
 
     def reset_password(self, emp_id: int, new_password: str):
@@ -651,6 +782,7 @@ class AuthRepo:
                 return f"Karta przypisana do {conflict['username']} (id={conflict['id']})."
         with self.engine.begin() as c:
             c.execute(text("UPDATE employees SET rfid_uid=:uid WHERE id=:id"), dict(uid=uid, id=emp_id))
+        events.publish(events.EMPLOYEES_CHANGED, employee_id=emp_id)
         return None
 
     def count_active_admins(self) -> int:
@@ -854,36 +986,44 @@ class AuthRepo:
         _dbg(f"[SESS] created {sess}")
         return sess
 
+    # Kartoteka: najpierw lokalna replika, brak trafienia (np. towar sprzed synchronizacji) -> DB
+    def get_item_by_sku(self, sku: str) -> dict | None:
+        sku = (sku or "").strip()
+        if not sku:
+            return None
+        if self.replica is not None and self.replica.ready:
+            try:
+                item = self.replica.get_item_by_code(sku)
+                if item:
+                    return item
+            except Exception:
+                log.exception("Replika: błąd odczytu towaru %s – odczyt z DB", sku)
+        return self._fetchone(
+            """
+            SELECT id, code AS sku, COALESCE(NULLIF(TRIM(name), ''), code) AS name,
+                   COALESCE(unit, 'SZT') AS uom
+            FROM items WHERE code = :c LIMIT 1
+        """,
+            c=sku,
+        )
+
+    def get_item_id_by_sku(self, sku: str) -> int | None:
+        item = self.get_item_by_sku(sku)
+        return int(item["id"]) if item else None
+
     # NEW: szybkie wyszukiwanie stanów po nazwie/SKU
     def search_stock(self, q: str, limit: int = 200) -> list[dict]:
-        pattern = f"%{q.strip()}%" if q else "%"
-        try:
-            sql = """
-                SELECT i.id AS item_id, i.code AS sku,
-                       COALESCE(NULLIF(TRIM(i.name), ''), i.code) AS name,
-                       COALESCE(i.unit, 'SZT') AS uom,
-                       v.available AS qty_available
-                FROM vw_stock_available v
-                JOIN items i ON i.id = v.item_id
-                WHERE (i.name LIKE :q OR i.code LIKE :q) AND v.available > 0
-                ORDER BY name
-                LIMIT :lim
-            """
-            with self.engine.connect() as c:
-                rows = c.execute(text(sql), {"q": pattern, "lim": int(limit)}).mappings().all()
-            return [dict(r) for r in rows]
-        except Exception:
-            sql = """
-                SELECT i.id AS item_id, i.code AS sku,
-                       COALESCE(NULLIF(TRIM(i.name), ''), i.code) AS name,
-                       COALESCE(i.unit, 'SZT') AS uom,
-                       v.available AS qty_available
-                FROM vw_stock_available v
-                JOIN items i ON i.id = v.item_id
-                WHERE (i.name LIKE :q OR i.code LIKE :q) AND v.available > 0
-                ORDER BY name
-                LIMIT :lim
-            """
-            with self.engine.connect() as c:
-                rows = c.execute(text(sql), {"q": pattern, "lim": int(limit)}).mappings().all()
-            return [dict(r) for r in rows]
+        """Ranking: dokładny kod -> prefiks -> podciąg (indeks kartoteki, catalog_search)."""
+        sql = """
+            SELECT i.id AS item_id, i.code AS sku,
+                   COALESCE(NULLIF(TRIM(i.name), ''), i.code) AS name,
+                   COALESCE(i.unit, 'SZT') AS uom,
+                   v.available AS qty_available
+            FROM vw_stock_available v
+            JOIN items i ON i.id = v.item_id
+            WHERE {match} AND v.available > 0
+            ORDER BY {rank}, name
+            LIMIT :lim
+        """
+        with self.engine.connect() as c:
+            return ranked_search(c, sql, q, limit=limit)
@@ -0,0 +1,379 @@
+# app/dal/catalog_replica.py
+"""
+Lokalna (SQLite) kopia kartoteki towarów i listy pracowników na stanowisku.
+
+Wyszukiwanie towarów, odczyt po kodzie i lista pracowników nie idą przez sieć:
+czytamy z pliku SQLite (np. cache/catalog.sqlite3). MariaDB pozostaje źródłem
+prawdy dla stanów, rezerwacji i ruchów – replika ich nie zawiera.
+
+Synchronizacja przyrostowa po kluczu (updated_at, id) > znacznik z tabeli `meta`.
+updated_at ma rozdzielczość sekundy, a transakcja może zatwierdzić wiersz ze
+znacznikiem sprzed ostatniej synchronizacji – dlatego okno `overlap_s` sekund
+przed znacznikiem jest sprawdzane osobno: pobieramy tylko (id, updated_at),
+a pełne wiersze dociągamy (i reindeksujemy) wyłącznie dla tych, których
+updated_at różni się od repliki. Usunięte wiersze wykrywa reconcile().
+
+Pracownicy bez sekretów: bez haseł, PIN-ów i UID kart RFID.
+
+SQLite nie ma kolacji *_general_ci, a LIKE jest tu czuły na wielkość liter
+(indeks tokenów) – kod, nazwę i dane pracowników porównujemy po fold().
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, create_engine, event, text
+from sqlalchemy.engine import Engine
+
+from app.dal.catalog_search import fold, ranked_search, reindex_items
+
+log = logging.getLogger(__name__)
+
+_LOCAL_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS items (
+      id INTEGER PRIMARY KEY,
+      code TEXT NOT NULL,
+      name TEXT,
+      unit TEXT,
+      active INTEGER,
+      updated_at TEXT,
+      search_key TEXT,
+      code_key TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS item_search_tokens (
+      token TEXT NOT NULL,
+      item_id INTEGER NOT NULL,
+      PRIMARY KEY (token, item_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_item_search_tokens_item ON item_search_tokens(item_id, token)",
+    """
+    CREATE TABLE IF NOT EXISTS employees (
+      id INTEGER PRIMARY KEY,
+      first_name TEXT,
+      last_name TEXT,
+      login TEXT,
+      role TEXT,
+      active INTEGER,
+      updated_at TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_employees_name ON employees(last_name, first_name)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+]
+
+# tabela -> (SELECT kolumn z MariaDB, kolumny lokalne)
+_TABLES = {
+    "items": (
+        "id, code, name, unit, active, updated_at",
+        ("id", "code", "name", "unit", "active", "updated_at"),
+    ),
+    "employees": (
+        "id, first_name, last_name, username AS login, role, active, updated_at",
+        ("id", "first_name", "last_name", "login", "role", "active", "updated_at"),
+    ),
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class CatalogReplica:
+    """Replika kartoteki w SQLite + synchronizacja przyrostowa (również w tle)."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        path: Path | str,
+        *,
+        batch_size: int = 2000,
+        overlap_s: int = 2,
+        interval_s: float = 300.0,
+    ) -> None:
+        self.remote = engine
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = int(batch_size)
+        self.overlap_s = int(overlap_s)
+        self.interval_s = float(interval_s)
+        self.local = create_engine(
+            f"sqlite:///{self.path}", connect_args={"check_same_thread": False}
+        )
+        event.listen(self.local, "connect", _sqlite_pragmas)
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        with self.local.begin() as conn:
+            for ddl in _LOCAL_SCHEMA:
+                conn.execute(text(ddl))
+            _ensure_code_key(conn)
+
+    # ---------- Stan ----------
+    @property
+    def ready(self) -> bool:
+        """Czy replika ma komplet danych z co najmniej jednej pełnej synchronizacji."""
+        return self._meta("synced_at") is not None
+
+    def _meta(self, key: str) -> Optional[str]:
+        with self.local.connect() as conn:
+            return conn.execute(
+                text("SELECT value FROM meta WHERE key = :k"), {"k": key}
+            ).scalar_one_or_none()
+
+    # ---------- Cykl życia ----------
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="catalog-replica", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        try:
+            self.reconcile()
+        except Exception:
+            log.exception("Replika: błąd uzgadniania usuniętych wierszy")
+        while not self._stop.is_set():
+            try:
+                n = self.sync()
+                if any(n.values()):
+                    log.info("Replika: zsynchronizowano %s", n)
+            except Exception:
+                log.exception("Replika: błąd synchronizacji kartoteki")
+            self._stop.wait(self.interval_s)
+
+    # ---------- Synchronizacja ----------
+    def sync(self) -> Dict[str, int]:
+        """Dociąga zmiany od ostatniego znacznika. Zwraca {tabela: liczba wierszy}."""
+        with self._sync_lock:
+            out = {t: self._sync_table(t) for t in _TABLES}
+            if not self._stop.is_set():
+                with self.local.begin() as lc:
+                    lc.execute(
+                        text("INSERT OR REPLACE INTO meta(key, value) VALUES ('synced_at', :v)"),
+                        {"v": _iso(datetime.now())},
+                    )
+            return out
+
+    def _sync_table(self, table: str) -> int:
+        cols_sql = _TABLES[table][0]
+        hwm = self._meta(f"{table}.hwm")  # "updated_at#id" ostatniego wiersza
+        ts, after_id = _EPOCH, 0
+        total = 0
+        if hwm:
+            hwm_ts, _, hwm_id = hwm.partition("#")
+            ts, after_id = datetime.fromisoformat(hwm_ts), int(hwm_id or 0)
+            if self.overlap_s:
+                total += self._recheck_window(table, ts - timedelta(seconds=self.overlap_s), ts)
+        select = text(
+            f"""
+            SELECT {cols_sql}
+              FROM {table}
+             WHERE updated_at > :ts OR (updated_at = :ts AND id > :id)
+             ORDER BY updated_at, id
+             LIMIT :lim
+            """
+        )
+        while not self._stop.is_set():
+            with self.remote.connect() as rc:
+                rows = [
+                    dict(r)
+                    for r in rc.execute(
+                        select, {"ts": ts, "id": after_id, "lim": self.batch_size}
+                    ).mappings().all()
+                ]
+            if not rows:
+                break
+            ts, after_id = rows[-1]["updated_at"] or ts, int(rows[-1]["id"])
+            for r in rows:
+                r["updated_at"] = _iso(r.get("updated_at"))
+            with self.local.begin() as lc:
+                self._store(lc, table, rows)
+                lc.execute(
+                    text("INSERT OR REPLACE INTO meta(key, value) VALUES (:k, :v)"),
+                    {"k": f"{table}.hwm", "v": f"{_iso(ts)}#{after_id}"},
+                )
+            total += len(rows)
+            if len(rows) < self.batch_size:
+                break
+        return total
+
+    def _recheck_window(self, table: str, lo: datetime, hi: datetime) -> int:
+        """
+        Okno przed znacznikiem: porównuje (id, updated_at) z repliką i dociąga tylko
+        wiersze zmienione / brakujące. Znacznika nie przesuwa. Zwraca liczbę wierszy.
+        """
+        cols_sql = _TABLES[table][0]
+        with self.remote.connect() as rc:
+            remote_ts = {
+                int(i): _iso(u)
+                for i, u in rc.execute(
+                    text(f"SELECT id, updated_at FROM {table} WHERE updated_at >= :lo AND updated_at <= :hi"),
+                    {"lo": lo, "hi": hi},
+                )
+            }
+        if not remote_ts:
+            return 0
+        by_ids = bindparam("ids", expanding=True)
+        with self.local.connect() as lc:
+            local_ts = dict(
+                lc.execute(
+                    text(f"SELECT id, updated_at FROM {table} WHERE id IN :ids").bindparams(by_ids),
+                    {"ids": list(remote_ts)},
+                ).all()
+            )
+        changed = sorted(i for i, u in remote_ts.items() if local_ts.get(i) != u)
+        if not changed:
+            return 0
+        with self.remote.connect() as rc:
+            rows = [
+                dict(r)
+                for r in rc.execute(
+                    text(f"SELECT {cols_sql} FROM {table} WHERE id IN :ids").bindparams(by_ids),
+                    {"ids": changed},
+                ).mappings().all()
+            ]
+        for r in rows:
+            r["updated_at"] = _iso(r.get("updated_at"))
+        with self.local.begin() as lc:
+            self._store(lc, table, rows)
+        log.debug("Replika: %s – okno nakładki, dociągnięto %s wierszy", table, len(rows))
+        return len(rows)
+
+    def _store(self, lc, table: str, rows: List[dict]) -> None:
+        if not rows:
+            return
+        cols = _TABLES[table][1]
+        if table == "items":
+            # kod po fold() – porównania jak kolacja *_general_ci w MariaDB
+            cols = cols + ("code_key",)
+            for r in rows:
+                r["code_key"] = fold(r.get("code"))
+        lc.execute(
+            text(
+                f"INSERT OR REPLACE INTO {table}({', '.join(cols)}) "
+                f"VALUES ({', '.join(':' + c for c in cols)})"
+            ),
+            rows,
+        )
+        if table == "items":
+            reindex_items(lc, [r["id"] for r in rows])
+
+    def reconcile(self) -> int:
+        """Usuwa lokalnie wiersze skasowane w MariaDB (porównanie zbiorów id)."""
+        removed = 0
+        with self._sync_lock:
+            for table in _TABLES:
+                with self.remote.connect() as rc:
+                    remote_ids = set(rc.execute(text(f"SELECT id FROM {table}")).scalars())
+                with self.local.begin() as lc:
+                    local_ids = set(lc.execute(text(f"SELECT id FROM {table}")).scalars())
+                    gone = sorted(local_ids - remote_ids)
+                    for i in range(0, len(gone), 500):
+                        chunk = gone[i:i + 500]
+                        lc.execute(
+                            text(f"DELETE FROM {table} WHERE id IN :ids").bindparams(
+                                bindparam("ids", expanding=True)
+                            ),
+                            {"ids": chunk},
+                        )
+                        if table == "items":
+                            lc.execute(
+                                text("DELETE FROM item_search_tokens WHERE item_id IN :ids").bindparams(
+                                    bindparam("ids", expanding=True)
+                                ),
+                                {"ids": chunk},
+                            )
+                    removed += len(gone)
+        return removed
+
+    # ---------- Odczyty (lokalnie) ----------
+    def find_items(self, q: str, limit: int = 50) -> List[Dict]:
+        """Jak ItemsRepo.find_items: id, sku, name, uom – ranking catalog_search."""
+        sql = """
+            SELECT i.id, i.code AS sku, COALESCE(NULLIF(TRIM(i.name), ''), i.code) AS name,
+                   COALESCE(i.unit, 'SZT') AS uom
+              FROM items i
+             WHERE {match}
+             ORDER BY {rank}, i.name
+             LIMIT :lim
+        """
+        with self.local.connect() as conn:
+            return ranked_search(conn, sql, q, limit=limit, code_col="code_key", folded_code=True)
+
+    def get_item_by_code(self, code: str) -> Optional[Dict]:
+        code = (code or "").strip()
+        if not code:
+            return None
+        with self.local.connect() as conn:
+            row = conn.execute(
+                text(
+                    """
+                    SELECT id, code AS sku, COALESCE(NULLIF(TRIM(name), ''), code) AS name,
+                           COALESCE(unit, 'SZT') AS uom
+                      FROM items
+                     WHERE code_key = :c
+                     LIMIT 1
+                    """
+                ),
+                {"c": fold(code)},
+            ).mappings().first()
+        return dict(row) if row else None
+
+    def employees(self, q: str = "", limit: int = 200) -> List[Dict]:
+        """Jak ReportsRepo.employees (bez rfid_uid – nie trzymamy go lokalnie)."""
+        with self.local.connect() as conn:
+            rows = conn.execute(
+                text(
+                    """
+                    SELECT id, first_name, last_name, login
+                      FROM employees
+                     WHERE (:q = ''
+                            OR instr(fold(COALESCE(first_name, '') || ' ' || COALESCE(last_name, '')
+                                          || ' ' || COALESCE(login, '')), :q) > 0)
+                     ORDER BY last_name, first_name
+                     LIMIT :lim
+                    """
+                ),
+                {"q": fold((q or "").strip()), "lim": int(limit)},
+            ).mappings().all()
+        return [dict(r) for r in rows]
+
+
+def _sqlite_pragmas(dbapi_conn, _record) -> None:
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode = WAL")     # odczyty UI nie czekają na zapis synchronizacji
+    cur.execute("PRAGMA synchronous = NORMAL")
+    cur.execute("PRAGMA case_sensitive_like = ON")  # tokeny znormalizowane – LIKE 'abc%' po indeksie
+    cur.close()
+    # LOWER() w SQLite zna tylko ASCII – polskie litery porównujemy po fold()
+    dbapi_conn.create_function("fold", 1, fold, deterministic=True)
+
+
+def _ensure_code_key(conn) -> None:
+    """Replika sprzed kolumny code_key: dodaje ją i wypełnia z code."""
+    cols = {r[1] for r in conn.execute(text("PRAGMA table_info(items)"))}
+    if "code_key" not in cols:
+        conn.execute(text("ALTER TABLE items ADD COLUMN code_key TEXT"))
+        conn.execute(text("UPDATE items SET code_key = fold(code)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_items_code_key ON items(code_key)"))
+
+
+def _iso(v) -> Optional[str]:
+    if v is None:
+        return None
+    if isinstance(v, datetime):
+        return v.isoformat(sep=" ")
+    return str(v)
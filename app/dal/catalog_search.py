@@ -0,0 +1,279 @@
+# app/dal/catalog_search.py
+"""
+Wyszukiwanie w kartotece towarów (items.code / items.name) bez pełnego skanu.
+
+Zamiast `name LIKE '%q%' OR code LIKE '%q%'` (nie korzysta z indeksu):
+  - items.search_key    – nazwa po normalizacji (małe litery, bez polskich znaków),
+  - item_search_tokens  – słowa z nazwy i kodu (+ kod bez separatorów),
+                          PK (token, item_id) => `token LIKE 'abc%'` to zakres w indeksie.
+Kolejność wyników: dokładny kod -> prefiks kodu/nazwy -> prefiks słowa.
+Dopasowanie podciągu (pełny skan items) idzie tylko wtedy, gdy indeks nie
+znalazł nic albo zapytanie nie ma słów (same znaki interpunkcyjne) – trafienia
+z indeksu nie są już dopełniane skanem. Tę samą regułę stosują listy
+stronicowane (StockRepository.list_available_page) i zawężanie po stronie
+klienta (filter_rows, TypeaheadController).
+
+Indeks utrzymuje reindex_items() (wołane przy zapisie towaru, np.
+RWImportRepo.upsert_item) oraz narzędzie tools/reindex_catalog.py
+dla towarów dodanych poza aplikacją (search_key IS NULL).
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, text
+
+MAX_TOKEN_LEN = 64
+MAX_QUERY_TOKENS = 4       # więcej słów = więcej złączeń; reszta zawęża się rankingiem
+SUBSTRING_MIN_LEN = 3      # krótsze zapytania nie schodzą do skanu podciągu
+ESCAPE = "!"
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+# ---------- Normalizacja ----------
+def fold(s: Optional[str]) -> str:
+    """Małe litery, bez znaków diakrytycznych (ł -> l), jak kolacja *_general_ci."""
+    s = unicodedata.normalize("NFKD", (s or "").replace("ł", "l").replace("Ł", "L"))
+    return "".join(ch for ch in s if not unicodedata.combining(ch)).casefold()
+
+
+def tokenize(s: Optional[str]) -> List[str]:
+    return [t[:MAX_TOKEN_LEN] for t in _TOKEN_RE.findall(fold(s))]
+
+
+def item_tokens(code: Optional[str], name: Optional[str]) -> set[str]:
+    """Tokeny towaru: słowa nazwy i kodu oraz kod bez spacji/kresek ('0 641-210' -> '0641210')."""
+    toks = set(tokenize(code)) | set(tokenize(name))
+    compact = "".join(tokenize(code))
+    if compact:
+        toks.add(compact[:MAX_TOKEN_LEN])
+    return toks
+
+
+
+def matches(q: Optional[str], code: Optional[str], name: Optional[str], *, substring: bool = False) -> bool:
+    """
+    Odpowiednik match_clause dla jednego wiersza po stronie klienta:
+    substring=False – prefiksy słów jak indeks tokenów,
+    substring=True  – podciąg w nazwie/kodzie (od SUBSTRING_MIN_LEN znaków).
+    """
+    q = (q or "").strip()
+    if not q:
+        return True
+    words = tokenize(q)
+    if substring:
+        key = fold(q)
+        if len(key.strip()) < SUBSTRING_MIN_LEN:
+            return False
+        return key in fold(name or code) or key in fold(code)
+    toks = sorted(dict.fromkeys(words), key=len, reverse=True)[:MAX_QUERY_TOKENS]
+    own = item_tokens(code, name)
+    if toks and all(any(t.startswith(w) for t in own) for w in toks):
+        return True
+    if len(words) > 1:
+        compact = "".join(words)[:MAX_TOKEN_LEN]
+        return any(t.startswith(compact) for t in own)
+    return False
+
+
+def filter_rows(q: Optional[str], rows: Iterable[Dict], *, code_key: str = "code", name_key: str = "name") -> List[Dict]:
+    """Zawężenie listy wierszy jak ranked_search: trafienia z indeksu, a gdy ich brak – podciąg."""
+    rows = list(rows)
+    hits = [r for r in rows if matches(q, r.get(code_key), r.get(name_key))]
+    if hits or not rows:
+        return hits
+    return [r for r in rows if matches(q, r.get(code_key), r.get(name_key), substring=True)]
+
+
+def substring_fallback(q: Optional[str]) -> bool:
+    """Czy dla `q` wolno zejść do skanu podciągu (gdy indeks nic nie znalazł)."""
+    return len(fold(q).strip()) >= SUBSTRING_MIN_LEN
+
+
+def _like_escape(s: str) -> str:
+    return s.replace(ESCAPE, ESCAPE * 2).replace("%", ESCAPE + "%").replace("_", ESCAPE + "_")
+
+
+# ---------- Utrzymanie indeksu ----------
+def reindex_items(
+    conn,
+    item_ids: Optional[Iterable[int]] = None,
+    *,
+    code_col: str = "code",
+    name_col: str = "name",
+) -> int:
+    """
+    Przelicza search_key i tokeny dla wskazanych towarów (None = wszystkie).
+    Działa w transakcji wołającego. Zwraca liczbę przeindeksowanych towarów.
+    """
+    if item_ids is None:
+        rows = conn.execute(text(f"SELECT id, {code_col}, {name_col} FROM items")).fetchall()
+    else:
+        ids = sorted({int(i) for i in item_ids})
+        if not ids:
+            return 0
+        rows = conn.execute(
+            text(f"SELECT id, {code_col}, {name_col} FROM items WHERE id IN :ids").bindparams(
+                bindparam("ids", expanding=True)
+            ),
+            {"ids": ids},
+        ).fetchall()
+    if not rows:
+        return 0
+
+    ids = [int(r[0]) for r in rows]
+    conn.execute(
+        text("UPDATE items SET search_key = :k WHERE id = :id"),
+        [{"k": fold(r[2] or r[1])[:255], "id": int(r[0])} for r in rows],
+    )
+    conn.execute(
+        text("DELETE FROM item_search_tokens WHERE item_id IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        ),
+        {"ids": ids},
+    )
+    tokens = [
+        {"t": t, "id": int(r[0])}
+        for r in rows
+        for t in sorted(item_tokens(r[1], r[2]))
+    ]
+    if tokens:
+        conn.execute(
+            text("INSERT INTO item_search_tokens(token, item_id) VALUES (:t, :id)"),
+            tokens,
+        )
+    return len(ids)
+
+
+def reindex_missing(conn, *, batch_size: int = 1000, **cols: str) -> int:
+    """Indeksuje towary bez search_key (dodane poza aplikacją), partiami."""
+    total = 0
+    while True:
+        ids = conn.execute(
+            text("SELECT id FROM items WHERE search_key IS NULL ORDER BY id LIMIT :lim"),
+            {"lim": int(batch_size)},
+        ).scalars().all()
+        if not ids:
+            return total
+        total += reindex_items(conn, ids, **cols)
+
+
+# ---------- Zapytania ----------
+@dataclass(frozen=True)
+class SearchClause:
+    where: str
+    rank: str
+    params: Dict[str, Any]
+
+
+def match_clause(
+    q: Optional[str],
+    *,
+    alias: str = "i",
+    code_col: str = "code",
+    substring: bool = False,
+    folded_code: bool = False,
+) -> Optional[SearchClause]:
+    """
+    Fragment WHERE + wyrażenie rankingu dla zapytania `q` (None gdy q puste).
+    substring=False – dopasowanie po indeksie tokenów (prefiksy słów),
+    substring=True  – zapasowo: podciąg w nazwie/kodzie (skan), gdy po
+                      tokenach nie znaleziono nic.
+    folded_code=True – `code_col` trzyma kod po fold() (replika SQLite bez
+                      kolacji *_general_ci) – porównujemy ze znormalizowanym q.
+    """
+    q = (q or "").strip()
+    if not q:
+        return None
+    words = tokenize(q)
+    # najdłuższy (najbardziej selektywny) token prowadzi złączenie
+    toks = sorted(dict.fromkeys(words), key=len, reverse=True)[:MAX_QUERY_TOKENS]
+    key = fold(q)
+    code_q = key if folded_code else q
+    params: Dict[str, Any] = {
+        "cs_q": code_q,
+        "cs_prefix": _like_escape(code_q) + "%",
+        "cs_kprefix": _like_escape(key) + "%",
+    }
+    col = f"{alias}.{code_col}"
+    esc = f" ESCAPE '{ESCAPE}'"
+
+    if toks:
+        joins = "".join(
+            f" JOIN item_search_tokens t{n} ON t{n}.item_id = t0.item_id"
+            f" AND t{n}.token LIKE :cs_t{n}{esc}"
+            for n in range(1, len(toks))
+        )
+        indexed = (
+            f"{alias}.id IN (SELECT t0.item_id FROM item_search_tokens t0{joins}"
+            f" WHERE t0.token LIKE :cs_t0{esc})"
+        )
+        params.update({f"cs_t{n}": _like_escape(t) + "%" for n, t in enumerate(toks)})
+        if len(words) > 1:
+            # kod wpisany ze spacjami/kreskami ('0 641 210') -> token kodu bez separatorów
+            indexed = (
+                f"({indexed} OR {alias}.id IN (SELECT tc.item_id FROM item_search_tokens tc"
+                f" WHERE tc.token LIKE :cs_c{esc}))"
+            )
+            params["cs_c"] = _like_escape("".join(words)[:MAX_TOKEN_LEN]) + "%"
+    else:
+        indexed = "1=0"  # same znaki interpunkcyjne – zostaje tylko podciąg
+
+    if not substring:
+        rank = (
+            f"CASE WHEN {col} = :cs_q THEN 0"
+            f" WHEN {col} LIKE :cs_prefix{esc} OR {alias}.search_key LIKE :cs_kprefix{esc} THEN 1"
+            f" ELSE 2 END"
+        )
+        return SearchClause(indexed, rank, params)
+
+    params["cs_sub"] = "%" + _like_escape(key) + "%"
+    params["cs_csub"] = "%" + _like_escape(code_q) + "%"
+    # towar jeszcze nie zindeksowany (search_key IS NULL) – podciąg w surowej nazwie
+    where = (
+        f"({alias}.search_key LIKE :cs_sub{esc}"
+        f" OR ({alias}.search_key IS NULL AND {alias}.name LIKE :cs_csub{esc})"
+        f" OR {col} LIKE :cs_csub{esc})"
+    )
+    return SearchClause(where, "3", params)
+
+
+def ranked_search(
+    conn,
+    sql: str,
+    q: Optional[str],
+    params: Optional[Dict[str, Any]] = None,
+    *,
+    limit: int,
+    alias: str = "i",
+    code_col: str = "code",
+    fallback: bool = True,
+    folded_code: bool = False,
+) -> List[Dict]:
+    """
+    Wykonuje `sql` z placeholderami {match} (warunek) i {rank} (do ORDER BY)
+    oraz parametrem :lim. Najpierw ścieżka po indeksie tokenów; dopasowanie
+    podciągu (skan) tylko gdy ta nie zwróciła żadnego wiersza albo zapytanie
+    nie ma słów do indeksu.
+    """
+    base = dict(params or {})
+
+    def run(clause: Optional[SearchClause], lim: int) -> List[Dict]:
+        where, rank, extra = ("1=1", "0", {}) if clause is None else (
+            clause.where, clause.rank, clause.params
+        )
+        stmt = text(sql.replace("{match}", where).replace("{rank}", rank))
+        rows = conn.execute(stmt, {**base, **extra, "lim": int(lim)}).mappings().all()
+        return [dict(r) for r in rows]
+
+    clause = match_clause(q, alias=alias, code_col=code_col, folded_code=folded_code)
+    # bez słów (same znaki interpunkcyjne) indeks i tak nic nie zwróci
+    out = run(clause, limit) if clause is None or tokenize(q) else []
+    if clause is not None and fallback and not out and substring_fallback(q):
+        sub = match_clause(q, alias=alias, code_col=code_col, substring=True, folded_code=folded_code)
+        out = run(sub, limit)
+    return out
@@ -0,0 +1,238 @@
+# app/dal/consumption_facts.py
+"""
+Przyrostowa miesięczna tabela faktów zużycia (fact_consumption_monthly).
+
+Ziarno: (miesiąc, towar, pracownik, typ ruchu) -> qty, value_fifo, movements.
+  - towar: movements.item_id, a dla ruchów wielopozycyjnych (RETURN/SCRAP)
+    lots.item_id z alokacji – jeden ruch liczy się raz na każdy swój towar,
+  - pracownik: ISSUE -> lokalizacja docelowa, RETURN/SCRAP -> źródłowa
+    (locations.employee_id); 0 gdy ruch nie dotyczy pracownika,
+  - value_fifo: SUM(movement_allocations.qty * unit_cost_netto) – koszt partii
+    pobranych przez FIFO (0 dla ruchów bez alokacji).
+
+refresh() dolicza ruchy o id > znak wody (fact_watermarks) do górnej granicy
+MAX(id) ruchów zapisanych co najmniej `lag_s` sekund temu – wg movements.created_at
+(czas nadany przez bazę przy INSERT, porównywany z NOW() tego samego serwera;
+movements.ts ustawia klient i może się rozjeżdżać). id przydzielone w transakcji,
+która jeszcze trwa, nie zostaną pominięte, o ile transakcja nie trwa dłużej.
+Ewentualne rozjazdy wykrywa check(), naprawia rebuild().
+
+Wszystkie funkcje działają w transakcji wołającego (conn z engine.begin()).
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+log = logging.getLogger(__name__)
+
+FACT = "fact_consumption_monthly"
+DEFAULT_LAG_S = 60
+
+# Agregat ruchów z przedziału id (lo, hi] – wspólny dla refresh / rebuild / check.
+# Ruchy wielopozycyjne (RETURN/SCRAP: item_id i qty NULL) rozkładane są na towary
+# z alokacji (movement_allocations -> lots); bez alokacji trafiają do item_id = 0.
+_AGG_SQL = """
+    SELECT
+      DATE_FORMAT(s.ts, '%Y-%m-01')                          AS month,
+      s.item_id                                              AS item_id,
+      COALESCE(CASE WHEN s.movement_type = 'ISSUE' THEN lt.employee_id
+                    ELSE lf.employee_id END,
+               lt.employee_id, lf.employee_id, 0)            AS employee_id,
+      s.movement_type                                        AS movement_type,
+      COALESCE(SUM(s.qty), 0)                                AS qty,
+      COALESCE(SUM(s.value_fifo), 0)                         AS value_fifo,
+      COUNT(*)                                               AS movements
+    FROM (
+        SELECT m.id, m.ts, m.item_id, m.qty, a.value_fifo,
+               m.from_location_id, m.to_location_id, m.movement_type
+        FROM movements m
+        LEFT JOIN (
+            SELECT movement_id, SUM(qty * unit_cost_netto) AS value_fifo
+            FROM movement_allocations
+            WHERE movement_id > :lo AND movement_id <= :hi
+            GROUP BY movement_id
+        ) a ON a.movement_id = m.id
+        WHERE m.id > :lo AND m.id <= :hi AND m.item_id IS NOT NULL {extra}
+        UNION ALL
+        SELECT m.id, m.ts, COALESCE(l.item_id, 0), SUM(ma.qty), SUM(ma.qty * ma.unit_cost_netto),
+               m.from_location_id, m.to_location_id, m.movement_type
+        FROM movements m
+        LEFT JOIN movement_allocations ma ON ma.movement_id = m.id
+        LEFT JOIN lots l ON l.id = ma.lot_id
+        WHERE m.id > :lo AND m.id <= :hi AND m.item_id IS NULL {extra}
+        GROUP BY m.id, m.ts, COALESCE(l.item_id, 0), m.from_location_id,
+                 m.to_location_id, m.movement_type
+    ) s
+    LEFT JOIN locations lt ON lt.id = s.to_location_id
+    LEFT JOIN locations lf ON lf.id = s.from_location_id
+    GROUP BY 1, 2, 3, 4
+"""
+
+Key = Tuple[date, int, int, str]
+
+
+@dataclass(frozen=True)
+class Mismatch:
+    key: Key
+    fact: Tuple[Decimal, Decimal, int]      # (qty, value_fifo, movements) w tabeli faktów
+    ledger: Tuple[Decimal, Decimal, int]    # to samo policzone z movements
+
+
+def month_start(d: date | datetime) -> date:
+    return date(d.year, d.month, 1)
+
+
+# ---------- Znak wody ----------
+def watermark(conn, *, lock: bool = False) -> int:
+    sql = "SELECT last_id FROM fact_watermarks WHERE name = :n"
+    if lock:
+        sql += " FOR UPDATE"  # serializuje równoległe odświeżenia
+    val = conn.execute(text(sql), {"n": FACT}).scalar()
+    if val is None:
+        conn.execute(
+            text("INSERT IGNORE INTO fact_watermarks(name, last_id) VALUES (:n, 0)"), {"n": FACT}
+        )
+        return 0
+    return int(val)
+
+
+def _set_watermark(conn, last_id: int) -> None:
+    conn.execute(
+        text("UPDATE fact_watermarks SET last_id = :id WHERE name = :n"),
+        {"id": int(last_id), "n": FACT},
+    )
+
+
+def _upper_bound(conn, lo: int, lag_s: int) -> int:
+    # zakres PK od znaku wody; created_at i NOW() – zegar serwera, nie stanowiska
+    return int(
+        conn.execute(
+            text(
+                "SELECT COALESCE(MAX(id), :lo) FROM movements "
+                "WHERE id > :lo AND created_at <= NOW() - INTERVAL :lag SECOND"
+            ),
+            {"lo": int(lo), "lag": int(lag_s)},
+        ).scalar()
+        or lo
+    )
+
+
+def _merge(conn, lo: int, hi: int, extra: str = "", params: Optional[dict] = None) -> int:
+    """Dolicza agregat ruchów (lo, hi] do faktów; zwraca liczbę wierszy faktów."""
+    res = conn.execute(
+        text(
+            f"""
+            INSERT INTO {FACT} (month, item_id, employee_id, movement_type, qty, value_fifo, movements)
+            SELECT * FROM ({_AGG_SQL.format(extra=extra)}) agg
+            ON DUPLICATE KEY UPDATE
+              qty        = {FACT}.qty        + VALUES(qty),
+              value_fifo = {FACT}.value_fifo + VALUES(value_fifo),
+              movements  = {FACT}.movements  + VALUES(movements)
+            """
+        ),
+        {"lo": int(lo), "hi": int(hi), **(params or {})},
+    )
+    return int(res.rowcount or 0)
+
+
+# ---------- Utrzymanie ----------
+def refresh(conn, *, lag_s: int = DEFAULT_LAG_S, max_batch: int = 50_000) -> int:
+    """
+    Dolicza nowe ruchy (id > znak wody) partiami po `max_batch` id.
+    Zwraca nowy znak wody.
+    """
+    start = lo = watermark(conn, lock=True)
+    hi = _upper_bound(conn, lo, lag_s)
+    while lo < hi:
+        step = min(hi, lo + int(max_batch))
+        _merge(conn, lo, step)
+        lo = step
+    if lo != start:
+        _set_watermark(conn, lo)
+        log.info("Fakty zużycia: znak wody -> %s", lo)
+    return lo
+
+
+def rebuild(conn, *, since: Optional[date] = None, lag_s: int = DEFAULT_LAG_S) -> int:
+    """
+    Backfill: przelicza fakty od zera (since=None) albo od miesiąca `since`
+    (usuwa te miesiące i liczy je ponownie z ruchów do bieżącego znaku wody).
+    Zwraca znak wody po przeliczeniu.
+    """
+    wm = watermark(conn, lock=True)
+    if since is None:
+        conn.execute(text(f"DELETE FROM {FACT}"))
+        _set_watermark(conn, 0)
+        return refresh(conn, lag_s=lag_s)
+    m0 = month_start(since)
+    conn.execute(text(f"DELETE FROM {FACT} WHERE month >= :m"), {"m": m0})
+    _merge(conn, 0, wm, "AND m.ts >= :m0", {"m0": m0})
+    return refresh(conn, lag_s=lag_s)
+
+
+def check(
+    conn,
+    *,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    tolerance: Decimal = Decimal("0.0001"),
+) -> List[Mismatch]:
+    """
+    Porównuje fakty z agregatem policzonym z movements (id <= znak wody)
+    w zakresie pełnych miesięcy [date_from, date_to). Pusta lista = zgodne.
+    """
+    wm = watermark(conn)
+    cond, params = "", {}
+    fcond = ""
+    if date_from is not None:
+        cond += " AND m.ts >= :df"
+        fcond += " AND month >= :df"
+        params["df"] = month_start(date_from)
+    if date_to is not None:
+        cond += " AND m.ts < :dt"
+        fcond += " AND month < :dt"
+        params["dt"] = month_start(date_to)
+
+    def _key(r) -> Key:
+        m = r["month"]
+        if isinstance(m, str):
+            m = date.fromisoformat(m)
+        elif isinstance(m, datetime):
+            m = m.date()
+        return (m, int(r["item_id"]), int(r["employee_id"]), str(r["movement_type"]))
+
+    def _val(r) -> Tuple[Decimal, Decimal, int]:
+        return (Decimal(str(r["qty"])), Decimal(str(r["value_fifo"])), int(r["movements"]))
+
+    ledger: Dict[Key, Tuple[Decimal, Decimal, int]] = {
+        _key(r): _val(r)
+        for r in conn.execute(
+            text(_AGG_SQL.format(extra=cond)), {"lo": 0, "hi": wm, **params}
+        ).mappings()
+    }
+    facts: Dict[Key, Tuple[Decimal, Decimal, int]] = {
+        _key(r): _val(r)
+        for r in conn.execute(
+            text(
+                f"SELECT month, item_id, employee_id, movement_type, qty, value_fifo, movements "
+                f"FROM {FACT} WHERE 1=1 {fcond}"
+            ),
+            params,
+        ).mappings()
+    }
+
+    zero = (Decimal(0), Decimal(0), 0)
+    out: List[Mismatch] = []
+    for key in sorted(set(ledger) | set(facts)):
+        f, l = facts.get(key, zero), ledger.get(key, zero)
+        if abs(f[0] - l[0]) > tolerance or abs(f[1] - l[1]) > tolerance or f[2] != l[2]:
+            out.append(Mismatch(key, f, l))
+    if out:
+        log.warning("Fakty zużycia: %s rozbieżności względem movements", len(out))
+    return out
@@ -43,7 +43,6 @@ def create_engine_and_session(cfg: dict, *, log_sql: bool = False) -> tuple[Engi
         log_sql: Jeśli ``True``, podnosi poziom logów SQLAlchemy do ``INFO``.
     """
     engine = make_engine(cfg, log_sql=log_sql)
-    engine = make_engine(cfg)
     SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
     return engine, SessionLocal
 
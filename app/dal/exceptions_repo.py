@@ -7,6 +7,9 @@ from sqlalchemy import text
 from sqlalchemy.engine import Engine
 import logging
 
+from app.dal.keyset import keyset_where, next_bookmark
+from app.dal.stream import stream_query
+
 log = logging.getLogger(__name__)
 
 
@@ -43,17 +46,19 @@ class ExceptionsRepo:
                 return c
         return None
 
-    # --- API ----------------------------------------------------------------
-    def list_exceptions(
+    def _query(
         self,
         *,
-        employee_id: int | None = None,
-        item_id: int | None = None,
-        date_from: datetime | None = None,
-        date_to: datetime | None = None,
-    ):
+        employee_id: int | None,
+        item_id: int | None,
+        date_from: datetime | None,
+        date_to: datetime | None,
+        since_id: int | None = None,
+    ) -> tuple[list[str], dict[str, object], list[str]]:
+        """SELECT…WHERE (bez ORDER BY), parametry i kolumny sortowania (malejąco)."""
         cols = self._get_columns()
 
+        id_col = self._pick(cols, "id", "transaction_id")
         uuid_col = self._pick(cols, "operation_uuid", "op_uuid", "uuid", "operation_id")
         emp_name_col = self._pick(
             cols, "employee", "employee_name", "employee_fullname", "emp_name", "full_name", "name"
@@ -78,6 +83,7 @@ class ExceptionsRepo:
             select_parts.append("CURRENT_TIMESTAMP AS created_at")
         select_parts.append(f"{mvt_col} AS movement_type" if mvt_col else "'' AS movement_type")
         select_parts.append(f"{reason_col} AS reason" if reason_col else "'' AS reason")
+        select_parts.append(f"{id_col} AS id" if id_col else "0 AS id")
 
         sql_parts = [f"SELECT {', '.join(select_parts)}", "FROM vw_exceptions", "WHERE 1=1"]
         params: dict[str, object] = {}
@@ -95,16 +101,12 @@ class ExceptionsRepo:
         if date_to is not None and ts_col:
             sql_parts.append(f"AND {ts_col} < :d_to")
             params["d_to"] = date_to
+        if since_id is not None and id_col:
+            sql_parts.append(f"AND {id_col} > :since")
+            params["since"] = int(since_id)
 
-        # sortowanie — po kolumnie czasu jeśli jest, inaczej po pierwszej kolumnie
-        if ts_col:
-            sql_parts.append(f"ORDER BY {ts_col} DESC")
-        elif uuid_col:
-            sql_parts.append(f"ORDER BY {uuid_col} DESC")
-        else:
-            sql_parts.append("ORDER BY 1 DESC")
-
-        sql = " ".join(sql_parts)
+        # sortowanie — po kolumnie czasu jeśli jest, dalej uuid/item_id (jednoznaczność dla keyset)
+        order = [c for c in (ts_col, uuid_col, "item_id" if "item_id" in cols else None) if c]
 
         # log diagnostyczny (raz, gdy wykryjemy brak jakiejś kolumny)
         missing = [name for name, col in {
@@ -119,5 +121,152 @@ class ExceptionsRepo:
         if missing and not getattr(self, "_warned_missing", False):
             log.warning("vw_exceptions: brak kolumn %s – używam pustych aliasów", ", ".join(missing))
             self._warned_missing = True
+        return sql_parts, params, order
+
+    # --- API ----------------------------------------------------------------
+    def max_id(self) -> int:
+        """
+        Znak wody wyjątków: MAX(transactions.id) z flagą issued_without_return.
+        Tania sonda (ostatni wpis indeksu idx_transactions_iwr) do cyklicznego odpytywania.
+        """
+        with self.engine.connect() as conn:
+            return int(
+                conn.execute(
+                    text("SELECT COALESCE(MAX(id), 0) FROM transactions WHERE issued_without_return = 1")
+                ).scalar()
+                or 0
+            )
+
+    def count_since(self, since_id: int) -> int:
+        """Liczba wyjątków o id > since_id (zakres w indeksie (issued_without_return, id))."""
+        with self.engine.connect() as conn:
+            return int(
+                conn.execute(
+                    text(
+                        "SELECT COUNT(*) FROM transactions "
+                        "WHERE issued_without_return = 1 AND id > :since"
+                    ),
+                    {"since": int(since_id)},
+                ).scalar()
+                or 0
+            )
+
+    def list_exceptions_since(
+        self,
+        since_id: int,
+        *,
+        date_from: datetime | None = None,
+        limit: int = 500,
+    ) -> list[dict]:
+        """
+        Wszystkie wyjątki nowsze niż znak wody (id > since_id), od najnowszych –
+        do dopisania na górze listy. Czyta rosnąco po id stronami po `limit`
+        wierszy, aż strona wróci niepełna (nic starszego nie ginie za limitem).
+
+        Uwaga: transakcja oznaczona później (UPDATE issued_without_return = 1)
+        zachowuje swoje dawne id – jeśli jest <= since_id, ta metoda jej nie zwróci.
+        Takie wpisy pojawiają się dopiero po pełnym przeładowaniu listy (refresh()).
+        """
+        sql_parts, params, _order = self._query(
+            employee_id=None, item_id=None, date_from=date_from, date_to=None, since_id=since_id
+        )
+        if "since" not in params:
+            # widok bez kolumny id – brak znaku wody, jedna strona od najnowszych
+            sql = " ".join(sql_parts + ["ORDER BY 1 DESC", "LIMIT :lim"])
+            with self.engine.connect() as conn:
+                return [
+                    dict(r)
+                    for r in conn.execute(text(sql), {**params, "lim": int(limit)}).mappings().all()
+                ]
+        sql = text(" ".join(sql_parts + ["ORDER BY id ASC", "LIMIT :lim"]))
+        out: list[dict] = []
+        with self.engine.connect() as conn:
+            while True:
+                page = [
+                    dict(r)
+                    for r in conn.execute(sql, {**params, "lim": int(limit)}).mappings().all()
+                ]
+                out.extend(page)
+                if len(page) < int(limit):
+                    break
+                params["since"] = int(page[-1]["id"])
+        out.reverse()
+        return out
+
+    def list_exceptions(
+        self,
+        *,
+        employee_id: int | None = None,
+        item_id: int | None = None,
+        date_from: datetime | None = None,
+        date_to: datetime | None = None,
+    ):
+        sql_parts, params, order = self._query(
+            employee_id=employee_id, item_id=item_id, date_from=date_from, date_to=date_to
+        )
+        sql_parts.append(f"ORDER BY {order[0]} DESC" if order else "ORDER BY 1 DESC")
+        with self.engine.connect() as conn:
+            return conn.execute(text(" ".join(sql_parts)), params).fetchall()
+
+    def iter_exceptions(
+        self,
+        *,
+        employee_id: int | None = None,
+        item_id: int | None = None,
+        date_from: datetime | None = None,
+        date_to: datetime | None = None,
+        batch_size: int = 1000,
+    ):
+        """Wszystkie wyjątki (słowniki) kursorem strumieniowym – do eksportu."""
+        sql_parts, params, order = self._query(
+            employee_id=employee_id, item_id=item_id, date_from=date_from, date_to=date_to
+        )
+        sql_parts.append(
+            "ORDER BY " + ", ".join(f"{c} DESC" for c in order) if order else "ORDER BY 1 DESC"
+        )
+        return stream_query(self.engine, " ".join(sql_parts), params, batch_size=batch_size)
+
+    def list_exceptions_page(
+        self,
+        *,
+        after: tuple | None = None,
+        limit: int = 200,
+        employee_id: int | None = None,
+        item_id: int | None = None,
+        date_from: datetime | None = None,
+        date_to: datetime | None = None,
+    ) -> tuple[list[dict], tuple | None]:
+        """
+        Strona wyjątków (słowniki z aliasami jak list_exceptions) + zakładka następnej.
+        Keyset po kolumnach sortowania; gdy widok nie ma żadnej z nich – OFFSET
+        (zakładka = (liczba pominiętych wierszy,)).
+        """
+        sql_parts, params, order = self._query(
+            employee_id=employee_id, item_id=item_id, date_from=date_from, date_to=date_to
+        )
+        if order:
+            # kolumny sortowania nie zawsze są w aliasach SELECT – dołączamy je jako _ks0.._ksN
+            sql_parts[0] += "".join(f", {c} AS _ks{n}" for n, c in enumerate(order))
+            cond, kp = keyset_where(order, after)
+            sql_parts.append(f"AND {cond}")
+            sql_parts.append("ORDER BY " + ", ".join(f"{c} DESC" for c in order))
+            sql_parts.append("LIMIT :lim")
+        else:
+            kp = {"off": int(after[0]) if after else 0}
+            sql_parts.append("ORDER BY 1 DESC LIMIT :lim OFFSET :off")
         with self.engine.connect() as conn:
-            return conn.execute(text(sql), params).fetchall()
+            rows = [
+                dict(r)
+                for r in conn.execute(
+                    text(" ".join(sql_parts)), {**params, **kp, "lim": int(limit)}
+                ).mappings().all()
+            ]
+        if not order:
+            nxt = ((int(after[0]) if after else 0) + len(rows),) if len(rows) >= int(limit) else None
+            return rows, nxt
+        ks = [f"_ks{n}" for n in range(len(order))]
+        nxt = next_bookmark(rows, ks, limit)
+        for r in rows:
+            for k in ks:
+                r.pop(k, None)
+        return rows, nxt
@@ -5,6 +5,8 @@ from sqlalchemy import text
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.engine import Engine
 
+from app.dal.catalog_search import ranked_search
+
 
 class ItemsRepo:
     """Access layer for basic items lookup operations."""
@@ -14,33 +16,26 @@ class ItemsRepo:
 
     def find_items(self, q: str, limit: int = 50) -> list[dict]:
         """Wyszukiwanie po SKU/kodzie lub nazwie. Zwraca id, sku, name (sku aliasuje code)."""
-        q = q or ""
-        pattern = f"%{q}%"
+        q = (q or "").strip()
         with self.engine.connect() as conn:
             try:
-                sql = text(
-                    """
-                    SELECT id, sku, name
-                      FROM items
-                     WHERE (:q = '' OR sku LIKE :q OR name LIKE :q)
-                     ORDER BY name, sku
+                sql = """
+                    SELECT i.id, i.sku, i.name
+                      FROM items i
+                     WHERE {match}
+                     ORDER BY {rank}, i.name, i.sku
                      LIMIT :lim
-                    """
-                )
-                rows = conn.execute(sql, {"q": pattern if q else "", "lim": int(limit)}).mappings().all()
-                return [dict(r) for r in rows]
+                """
+                return ranked_search(conn, sql, q, limit=limit, code_col="sku")
             except OperationalError:
-                sql = text(
-                    """
-                    SELECT id, code AS sku, NULLIF(TRIM(name),'') AS name
-                      FROM items
-                     WHERE (:q = '' OR code LIKE :q OR name LIKE :q)
-                     ORDER BY name, code
+                sql = """
+                    SELECT i.id, i.code AS sku, NULLIF(TRIM(i.name),'') AS name
+                      FROM items i
+                     WHERE {match}
+                     ORDER BY {rank}, i.name, i.code
                      LIMIT :lim
-                    """
-                )
-                rows = conn.execute(sql, {"q": pattern if q else "", "lim": int(limit)}).mappings().all()
-                return [dict(r) for r in rows]
+                """
+                return ranked_search(conn, sql, q, limit=limit, code_col="code")
 
     def get_item_id_by_sku(self, sku: str) -> int | None:
         """Zwraca ID po SKU/kodzie (obsługuje 'sku' i 'code')."""
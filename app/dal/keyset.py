@@ -0,0 +1,44 @@
+# app/dal/keyset.py
+"""
+Stronicowanie kluczem (keyset) dla list raportowych.
+
+Zakładka = wartości kolumn sortowania ostatniego wiersza strony; kolejna strona
+to `WHERE (c1, c2, …) < zakładka` w postaci rozwiniętej (OR/AND), którą MariaDB
+potrafi zawęzić indeksem – w przeciwieństwie do OFFSET koszt strony nie rośnie
+z jej numerem. Konwencja jak StockRepository.list_available_page:
+metoda *_page(..., after=None, limit) -> (wiersze, zakładka | None).
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+def keyset_where(
+    cols: Sequence[str],
+    after: Optional[Sequence[Any]],
+    *,
+    desc: bool = True,
+    prefix: str = "ks",
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Warunek „za zakładką” dla sortowania po `cols` (wszystkie DESC albo ASC).
+    after=None -> ("1=1", {}) – pierwsza strona.
+    """
+    if not after:
+        return "1=1", {}
+    if len(after) != len(cols):
+        raise ValueError(f"Zakładka {after!r} nie pasuje do kolumn {list(cols)!r}")
+    op = "<" if desc else ">"
+    params = {f"{prefix}{n}": v for n, v in enumerate(after)}
+    cond = f"{cols[-1]} {op} :{prefix}{len(cols) - 1}"
+    for n in range(len(cols) - 2, -1, -1):
+        cond = f"{cols[n]} {op} :{prefix}{n} OR ({cols[n]} = :{prefix}{n} AND ({cond}))"
+    return f"({cond})", params
+
+
+def next_bookmark(rows: List[Dict], keys: Sequence[str], limit: int) -> Optional[tuple]:
+    """Zakładka następnej strony albo None, gdy strona była niepełna (koniec wyników)."""
+    if len(rows) < int(limit) or not rows:
+        return None
+    last = rows[-1]
+    return tuple(last[k] for k in keys)
@@ -0,0 +1,181 @@
+# app/dal/locations.py
+"""
+Katalog lokalizacji (magazyn, złom, lokalizacje pracowników) w pamięci procesu.
+
+Identyfikatory lokalizacji praktycznie się nie zmieniają, a ścieżki ruchów
+(wydanie, zwrot, złomowanie) pytały o nie przy każdej operacji. `directory`
+wczytuje całą tabelę locations raz i odpowiada z pamięci; brakującą
+lokalizację pracownika tworzy atomowo:
+
+    INSERT ... ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+
+(klucz uq_locations_employee) – dwa stanowiska tworzące ją naraz dostaną
+ten sam wiersz, bez SELECT-a przed INSERT-em.
+
+Unieważnianie:
+  - id utworzone w transakcji, która została wycofana, wypada z pamięci
+    (zdarzenia rollback Session / Connection),
+  - `employees.changed` (app.infra.events) czyści wpisy pracowników,
+  - invalidate() / clear() ręcznie (np. po imporcie lokalizacji).
+
+Wszystkie metody przyjmują `conn` – Session albo Connection w transakcji
+wołającego (ten sam obiekt, w którym odbywa się ruch).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.infra import events
+
+log = logging.getLogger(__name__)
+
+_PENDING = "locations_created"   # klucz w conn.info: [(katalog, typ, employee_id)] z bieżącej transakcji
+
+
+class LocationDirectory:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._warehouse: Optional[int] = None
+        self._scrap: Optional[int] = None
+        self._employee: Dict[int, int] = {}
+
+    # ---------- Wczytanie ----------
+    def load(self, conn) -> None:
+        rows = conn.execute(text("SELECT id, type, employee_id FROM locations ORDER BY id")).all()
+        warehouse = scrap = None
+        employee: Dict[int, int] = {}
+        for lid, typ, emp in rows:
+            if typ == "WAREHOUSE" and warehouse is None:
+                warehouse = int(lid)
+            elif typ == "SCRAP" and scrap is None:
+                scrap = int(lid)
+            elif typ == "EMPLOYEE" and emp is not None:
+                employee[int(emp)] = int(lid)
+        with self._lock:
+            self._warehouse, self._scrap, self._employee = warehouse, scrap, employee
+            self._loaded = True
+        log.debug("Lokalizacje: wczytano %s (pracownicy: %s)", len(rows), len(employee))
+
+    def _ensure_loaded(self, conn) -> None:
+        if not self._loaded:
+            self.load(conn)
+
+    # ---------- API ----------
+    def warehouse_id(self, conn) -> int:
+        self._ensure_loaded(conn)
+        if self._warehouse is None:
+            self._warehouse = self._create_singleton(conn, "WAREHOUSE", "Magazyn")
+        return self._warehouse
+
+    def scrap_id(self, conn) -> int:
+        self._ensure_loaded(conn)
+        if self._scrap is None:
+            self._scrap = self._create_singleton(conn, "SCRAP", "Złom")
+        return self._scrap
+
+    def employee_location_id(
+        self, conn, employee_id: int, name: str | None = None, *, create: bool = True
+    ) -> Optional[int]:
+        """Id lokalizacji pracownika; przy create=True brakująca jest tworzona atomowo."""
+        self._ensure_loaded(conn)
+        emp = int(employee_id)
+        lid = self._employee.get(emp)
+        if lid is not None or not create:
+            return lid
+        res = conn.execute(
+            text(
+                """
+                INSERT INTO locations (name, type, employee_id)
+                VALUES (:name, 'EMPLOYEE', :emp)
+                ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+                """
+            ),
+            {"name": name or f"Pracownik {emp}", "emp": emp},
+        )
+        lid = int(conn.execute(text("SELECT LAST_INSERT_ID()")).scalar())
+        if res.rowcount == 1:   # 1 = nowy wiersz, 0/2 = istniał (inne stanowisko)
+            _pending(conn).append((self, "EMPLOYEE", emp))
+        with self._lock:
+            self._employee[emp] = lid
+        return lid
+
+    def cached_employee(self, employee_id: int) -> Optional[int]:
+        return self._employee.get(int(employee_id))
+
+    def remember_employee(self, employee_id: int, location_id: int) -> None:
+        with self._lock:
+            self._employee[int(employee_id)] = int(location_id)
+
+    def invalidate(self, employee_id: int | None = None) -> None:
+        """Usuwa wpis pracownika (albo wszystkie wpisy pracowników)."""
+        with self._lock:
+            if employee_id is None:
+                self._employee.clear()
+            else:
+                self._employee.pop(int(employee_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._loaded = False
+            self._warehouse = self._scrap = None
+            self._employee.clear()
+
+    # ---------- Wewnętrzne ----------
+    def _create_singleton(self, conn, typ: str, name: str) -> int:
+        """Magazyn / złom (bez klucza unikalnego): SELECT, a gdy brak – INSERT."""
+        lid = conn.execute(
+            text("SELECT MIN(id) FROM locations WHERE type = :t"), {"t": typ}
+        ).scalar()
+        if lid is None:
+            res = conn.execute(
+                text("INSERT INTO locations (name, type) VALUES (:n, :t)"), {"n": name, "t": typ}
+            )
+            lid = res.lastrowid
+            _pending(conn).append((self, typ, None))
+        return int(lid)
+
+    def _forget(self, typ: str, emp: Optional[int]) -> None:
+        with self._lock:
+            if typ == "WAREHOUSE":
+                self._warehouse = None
+            elif typ == "SCRAP":
+                self._scrap = None
+            else:
+                self._employee.pop(emp, None)
+
+
+directory = LocationDirectory()
+
+
+def _pending(conn) -> list:
+    return conn.info.setdefault(_PENDING, [])
+
+
+# ---------- Haki unieważniania ----------
+def _on_commit(target, *_args) -> None:
+    target.info.pop(_PENDING, None)
+
+
+def _on_rollback(target, *_args) -> None:
+    created = target.info.pop(_PENDING, None)
+    for owner, typ, emp in created or ():
+        owner._forget(typ, emp)
+        log.debug("Lokalizacje: wycofane utworzenie %s (pracownik %s)", typ, emp)
+
+
+def _on_employees_changed(_topic: str, payload: dict) -> None:
+    directory.invalidate(payload.get("employee_id"))
+
+
+event.listen(Session, "after_commit", _on_commit)
+event.listen(Session, "after_rollback", _on_rollback)
+event.listen(Engine, "commit", _on_commit)
+event.listen(Engine, "rollback", _on_rollback)
+events.bus.subscribe(events.EMPLOYEES_CHANGED, _on_employees_changed)
@@ -0,0 +1,83 @@
+# app/dal/lots.py
+"""
+Utrzymanie partii (lots): archiwizacja zużytych partii.
+
+Zużyta partia (qty_available = 0) nie jest usuwana – odwołują się do niej
+movement_allocations, linie dokumentów i widoki historii pracownika. compact()
+oznacza ją archived = 1, przez co wypada z gorącego indeksu FIFO
+idx_lots_fifo (item_id, archived, ts, id) używanego przez issue_to_employee.
+
+Zadanie okresowe: tools/compact_lots.py (np. nocą z harmonogramu zadań).
+Partie młodsze niż `min_age_days` zostają – pusta partia zwrotów (ZWROT) może
+jeszcze przyjąć kolejny zwrot (return_from_employee ponownie jej używa).
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MIN_AGE_DAYS = 30
+
+
+@dataclass(frozen=True)
+class LotStats:
+    active: int          # partie w indeksie FIFO
+    empty_active: int    # w tym zużyte (kandydaci do archiwizacji)
+    archived: int
+
+
+def stats(conn) -> LotStats:
+    r = conn.execute(
+        text(
+            """
+            SELECT COALESCE(SUM(archived = 0), 0),
+                   COALESCE(SUM(archived = 0 AND qty_available = 0), 0),
+                   COALESCE(SUM(archived = 1), 0)
+            FROM lots
+            """
+        )
+    ).one()
+    return LotStats(int(r[0]), int(r[1]), int(r[2]))
+
+
+def compact(
+    engine: Engine,
+    *,
+    min_age_days: int = DEFAULT_MIN_AGE_DAYS,
+    batch_size: int = 5000,
+    dry_run: bool = False,
+) -> int:
+    """
+    Archiwizuje zużyte partie starsze niż `min_age_days` partiami po `batch_size`
+    wierszy (każda partia we własnej krótkiej transakcji – FIFO nie czeka na
+    blokady). Zwraca liczbę zarchiwizowanych (albo kandydatów przy dry_run).
+    """
+    now = datetime.now()
+    params = {"cutoff": now - timedelta(days=int(min_age_days)), "lim": int(batch_size)}
+    where = "archived = 0 AND qty_available = 0 AND ts < :cutoff"
+    if dry_run:
+        with engine.connect() as conn:
+            return int(
+                conn.execute(text(f"SELECT COUNT(*) FROM lots WHERE {where}"), params).scalar() or 0
+            )
+    pick = text(f"SELECT id FROM lots WHERE {where} ORDER BY id LIMIT :lim")
+    archive = text(
+        "UPDATE lots SET archived = 1, archived_at = :now WHERE id IN :ids AND qty_available = 0"
+    ).bindparams(bindparam("ids", expanding=True))
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            ids = conn.execute(pick, params).scalars().all()
+            if ids:
+                total += int(conn.execute(archive, {"ids": list(ids), "now": now}).rowcount or 0)
+        if len(ids) < int(batch_size):
+            break
+    if total:
+        log.info("Partie: zarchiwizowano %s zużytych (starszych niż %s dni)", total, min_age_days)
+    return total
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, String, Date, DateTime, Numeric, Enum, JSON, ForeignKey
+from sqlalchemy import Column, BigInteger, Boolean, String, Date, DateTime, Numeric, Enum, JSON, ForeignKey, func
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -58,6 +58,8 @@ class Lot(Base):
     unit_cost_netto = Column(Numeric(12, 4), nullable=False)
     currency = Column(String(3), default='PLN')
     ts = Column(DateTime)
+    archived = Column(Boolean, nullable=False, default=False)  # zużyta, poza indeksem FIFO
+    archived_at = Column(DateTime)
 
     source_line = relationship("DocumentLine", back_populates="lots")
 
@@ -66,11 +68,13 @@ class Movement(Base):
     __tablename__ = 'movements'
     id = Column(BigInteger, primary_key=True)
     ts = Column(DateTime)
-    item_id = Column(BigInteger, nullable=False)
-    qty = Column(Numeric(12, 3), nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.current_timestamp())  # zegar bazy
+    item_id = Column(BigInteger)              # NULL: ruch wielopozycyjny (RETURN/SCRAP)
+    qty = Column(Numeric(12, 3))
     from_location_id = Column(BigInteger)
     to_location_id = Column(BigInteger)
     movement_type = Column(MoveType, nullable=False)
+    reason = Column(String(255))              # np. powód protokołu złomowania
     operation_uuid = Column(String(36))  # ⬅️ nowa kolumna na idempotencję
     document_line_id = Column(BigInteger, ForeignKey('document_lines.id'))
 
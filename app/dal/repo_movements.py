@@ -1,14 +1,15 @@
 from __future__ import annotations
 from datetime import date, datetime
 from decimal import Decimal
-from sqlalchemy import select, update, and_, func
+from sqlalchemy import select, update, and_, or_, case, func, insert
 from sqlalchemy.orm import Session
 import uuid
 
-from app.dal.models import Document, DocumentLine, Lot, Movement, MovementAllocation, Location
+from app.dal.models import Document, DocumentLine, Lot, Movement, MovementAllocation
 from app.dal.tx import for_update
 from app.dal.retry import retry_deadlock
 from app.dal.errors import NegativeStockError
+from app.dal.locations import directory as location_directory
 
 DEC2 = Decimal('0.01'); DEC3 = Decimal('0.001'); DEC4 = Decimal('0.0001')
 
@@ -18,31 +19,15 @@ def q(x: Decimal, qexp=DEC3) -> Decimal:
 # --- Helpers
 
 def get_warehouse_location_id(session: Session) -> int:
-    wid = session.execute(select(Location.id).where(Location.type=='WAREHOUSE')).scalar()
-    if not wid:
-        # utwórz magazyn jeśli nie istnieje
-        loc = Location(name='Magazyn', type='WAREHOUSE')
-        session.add(loc); session.flush()
-        wid = loc.id
-    return wid
+    # z katalogu w pamięci (app/dal/locations.py); tworzy magazyn, jeśli nie istnieje
+    return location_directory.warehouse_id(session)
 
 def ensure_scrap_location(session: Session) -> int:
-    sid = session.execute(select(Location.id).where(Location.type=='SCRAP')).scalar()
-    if not sid:
-        loc = Location(name='Złom', type='SCRAP')
-        session.add(loc); session.flush()
-        sid = loc.id
-    return sid
+    return location_directory.scrap_id(session)
 
 def ensure_employee_location(session: Session, employee_id: int, name: str) -> int:
-    lid = session.execute(
-        select(Location.id).where(and_(Location.type=='EMPLOYEE', Location.employee_id==employee_id))
-    ).scalar()
-    if not lid:
-        loc = Location(name=name, type='EMPLOYEE', employee_id=employee_id)
-        session.add(loc); session.flush()
-        lid = loc.id
-    return lid
+    # atomowe get-or-create po uq_locations_employee
+    return location_directory.employee_location_id(session, employee_id, name)
 
 def create_document(session: Session, *, doc_type: str, number: str, doc_date: date,
                     currency='PLN', suma_netto=None, suma_vat=None, suma_brutto=None,
@@ -98,11 +83,11 @@ def issue_to_employee(
     if qty <= 0:
         raise ValueError("qty must be > 0")
 
-    # blokujemy partie FIFO do odczytu/aktualizacji
+    # blokujemy partie FIFO do odczytu/aktualizacji (zarchiwizowane są poza indeksem idx_lots_fifo)
     lots = session.execute(
         for_update(
             select(Lot)
-            .where(and_(Lot.item_id == item_id, Lot.qty_available > 0))
+            .where(and_(Lot.item_id == item_id, Lot.archived == False, Lot.qty_available > 0))  # noqa: E712
             .order_by(Lot.ts.asc(), Lot.id.asc())
         )
     ).scalars().all()
@@ -157,6 +142,112 @@ def issue_to_employee(
 
 # --- RETURN: odwzorowanie KONKRETNYCH alokacji z wcześniejszych ISSUE danego pracownika
 
+def _held_by_item_cost(session: Session, emp_loc: int, item_ids: list[int]) -> dict[tuple[int, Decimal], Decimal]:
+    """
+    Saldo pracownika per (towar, koszt) z księgi alokacji: przyjęte (TO) - oddane (FROM),
+    jak snapshot.LEDGER_SQL. Nie per partia – zwrot alokuje do partii zwrotów
+    (ZWROT), więc saldo partii źródłowej nie maleje po zwrocie.
+    """
+    held = func.sum(
+        case((Movement.to_location_id == emp_loc, MovementAllocation.qty), else_=-MovementAllocation.qty)
+    )
+    rows = session.execute(
+        select(Lot.item_id, MovementAllocation.unit_cost_netto, held)
+        .select_from(MovementAllocation)
+        .join(Movement, Movement.id == MovementAllocation.movement_id)
+        .join(Lot, Lot.id == MovementAllocation.lot_id)
+        .where(and_(Lot.item_id.in_(item_ids),
+                    or_(Movement.to_location_id == emp_loc, Movement.from_location_id == emp_loc)))
+        .group_by(Lot.item_id, MovementAllocation.unit_cost_netto)
+    ).all()
+    return {(int(item_id), q(Decimal(cost), DEC4)): Decimal(qty or 0) for item_id, cost, qty in rows}
+
+
+def _returnable(session: Session, *, emp_loc: int, allocations: list[dict]) -> tuple[dict, list[dict]]:
+    """
+    Walidacja zbiorowa zwrotu: blokada partii (IN), ruchy ISSUE, ich alokacje
+    i saldo pracownika (GROUP BY towar, koszt) – stała liczba zapytań
+    niezależnie od liczby pozycji. Zwraca (partie, pozycje do zwrotu).
+    """
+    wanted: dict[tuple[int, int], Decimal] = {}
+    for a in allocations:
+        qty = q(Decimal(str(a["qty"])))
+        if qty <= 0:
+            continue
+        key = (int(a["movement_id"]), int(a["lot_id"]))
+        wanted[key] = q(wanted.get(key, Decimal('0')) + qty)
+    if not wanted:
+        return {}, []
+
+    lot_ids = sorted({lot_id for _mv, lot_id in wanted})
+    mv_ids = sorted({mv_id for mv_id, _lot in wanted})
+
+    # blokujemy wszystkie partie jednym zapytaniem (stała kolejność id – mniej zakleszczeń)
+    lots = {
+        lot.id: lot
+        for lot in session.execute(
+            for_update(select(Lot).where(Lot.id.in_(lot_ids)).order_by(Lot.id))
+        ).scalars()
+    }
+    missing = [i for i in lot_ids if i not in lots]
+    if missing:
+        raise ValueError(f"Nie ma partii lot_id={missing[0]}")
+
+    issues = {
+        r.id: r
+        for r in session.execute(
+            select(Movement.id, Movement.movement_type, Movement.to_location_id)
+            .where(Movement.id.in_(mv_ids))
+        )
+    }
+    for mv_id in mv_ids:
+        mv = issues.get(mv_id)
+        if mv is None or mv.movement_type != 'ISSUE':
+            raise ValueError(f"movement_id={mv_id} nie jest ISSUE")
+        # weryfikacja: pracownik jest FROM w RETURN i TO w ISSUE
+        if mv.to_location_id != emp_loc:
+            raise ValueError("Alokacja nie należy do tego pracownika")
+
+    issued = {
+        (r.movement_id, r.lot_id): r
+        for r in session.execute(
+            select(MovementAllocation.movement_id, MovementAllocation.lot_id,
+                   MovementAllocation.qty, MovementAllocation.unit_cost_netto)
+            .where(and_(MovementAllocation.movement_id.in_(mv_ids),
+                        MovementAllocation.lot_id.in_(lot_ids)))
+        )
+    }
+
+    # saldo pracownika per (towar, koszt) – obejmuje wcześniejsze zwroty
+    # zaalokowane do partii zwrotów
+    held = _held_by_item_cost(session, emp_loc, sorted({int(lot.item_id) for lot in lots.values()}))
+    need: dict[tuple[int, Decimal], Decimal] = {}
+
+    to_process = []
+    for (mv_id, lot_id), qty in wanted.items():
+        alloc = issued.get((mv_id, lot_id))
+        if alloc is None:
+            raise ValueError("Brak alokacji ISSUE dla wskazanego movement/lot")
+        # nie można oddać więcej niż wydano z tej partii tym movementem
+        if qty > q(Decimal(alloc.qty)):
+            raise ValueError(f"Za duża ilość do zwrotu (max {q(Decimal(alloc.qty))}) dla lot {lot_id}")
+        lot = lots[lot_id]
+        key = (int(lot.item_id), q(Decimal(alloc.unit_cost_netto), DEC4))
+        need[key] = q(need.get(key, Decimal('0')) + qty)
+        # ... ani więcej niż pracownik nadal ma (po wcześniejszych zwrotach/złomowaniach)
+        max_returnable = q(held.get(key, Decimal('0')))
+        if need[key] > max_returnable:
+            raise ValueError(f"Za duża ilość do zwrotu (max {max_returnable}) dla lot {lot_id}")
+        to_process.append({
+            "lot_id": lot_id,
+            "item_id": lot.item_id,
+            "qty": qty,
+            "unit_cost": Decimal(lot.unit_cost_netto),
+            "currency": lot.currency,
+        })
+    return lots, to_process
+
+
 @retry_deadlock()
 def return_from_employee(
     session: Session,
@@ -166,66 +257,26 @@ def return_from_employee(
     allocations_to_return: list[dict],
     doc_number: str | None = None,
     operation_uuid: str | None = None,
+    reuse_lots: bool = True,
 ) -> Movement:
     """
     allocations_to_return: lista słowników:
       { "movement_id": <ISSUE movement id>, "lot_id": <lot>, "qty": <Decimal> }
 
-    Zasada: tworzymy dokument ZWROT + linię na każdy (item, lot) zestaw,
-    a następnie dla każdej pozycji ZWROTU tworzymy NOWĄ partię (lot) z tym samym kosztem,
-    i alokujemy RETURN do nowej partii.
+    Zasada: tworzymy dokument ZWROT + linię na każdy (item, koszt) zestaw.
+    Domyślnie (reuse_lots=True) ilość trafia do istniejącej partii zwrotów
+    (lot z linii dokumentu ZWROT, ten sam towar i koszt, niezarchiwizowany),
+    a RETURN alokuje do niej – bez mnożenia drobnych partii. Gdy takiej nie ma
+    (albo przy reuse_lots=False), tworzymy jedną nową partię na (towar, koszt).
+    Partie z przyjęcia (PZ) nigdy nie są modyfikowane zwrotem.
+
+    Walidacja i zapis są zbiorowe (_returnable + wstawienia wielowierszowe),
+    więc liczba zapytań nie rośnie z liczbą zwracanych pozycji.
     """
     emp_loc = ensure_employee_location(session, employee_id, employee_name)
     wid = get_warehouse_location_id(session)
 
-    # Grupa według item_id i unit_cost (z oryginalnych partii) aby zminimalizować liczbę linii
-    # Pobierz meta dla każdej alokacji
-    to_process = []
-    for a in allocations_to_return:
-        lot = session.execute(
-            for_update(select(Lot).where(Lot.id == a["lot_id"]))
-        ).scalar_one_or_none()
-        if not lot:
-            raise ValueError(f"Nie ma partii lot_id={a['lot_id']}")
-        mv_issue = session.get(Movement, a["movement_id"])
-        if not mv_issue or mv_issue.movement_type != 'ISSUE':
-            raise ValueError(f"movement_id={a['movement_id']} nie jest ISSUE")
-        qty = q(Decimal(str(a["qty"])))
-        if qty <= 0:
-            continue
-        # weryfikacja: pracownik jest FROM w RETURN i TO w ISSUE
-        if mv_issue.to_location_id != emp_loc:
-            raise ValueError("Alokacja nie należy do tego pracownika")
-
-        # weryfikacja limitu: nie można oddać więcej niż wydano z tej partii do tego movementu
-        alloc = session.execute(
-            select(MovementAllocation).where(
-                and_(MovementAllocation.movement_id==mv_issue.id,
-                     MovementAllocation.lot_id==lot.id)
-            )
-        ).scalar_one_or_none()
-        if not alloc:
-            raise ValueError("Brak alokacji ISSUE dla wskazanego movement/lot")
-        # policz ile już zwrócono z tej alokacji
-        already_ret = session.execute(
-            select(func.coalesce(func.sum(MovementAllocation.qty), 0)).join(Movement).where(
-                and_(MovementAllocation.lot_id==lot.id,
-                     Movement.movement_type=='RETURN',
-                     Movement.from_location_id==emp_loc,  # return od tego pracownika
-                     MovementAllocation.unit_cost_netto==alloc.unit_cost_netto)
-            )
-        ).scalar()
-        max_returnable = q(Decimal(alloc.qty) - Decimal(already_ret))
-        if qty > max_returnable:
-            raise ValueError(f"Za duża ilość do zwrotu (max {max_returnable}) dla lot {lot.id}")
-
-        to_process.append({
-            "item_id": lot.item_id,
-            "qty": qty,
-            "unit_cost": Decimal(lot.unit_cost_netto),
-            "currency": lot.currency
-        })
-
+    lots, to_process = _returnable(session, emp_loc=emp_loc, allocations=allocations_to_return)
     if not to_process:
         raise ValueError("Nic do zwrotu")
 
@@ -234,15 +285,12 @@ def return_from_employee(
         doc_number = f"ZW/{datetime.now().strftime('%Y%m%d-%H%M%S')}"
     d = create_document(session, doc_type='ZWROT', number=doc_number, doc_date=date.today(), currency='PLN')
 
-    total_net = Decimal('0.00')
-
-    # Utwórz jedną linię dokumentu per (item_id, unit_cost)
-    grouped = {}
+    # Jedna linia dokumentu per (item_id, unit_cost) – minimalna liczba linii
+    grouped: dict[tuple[int, Decimal], dict] = {}
     for x in to_process:
-        key = (x["item_id"], x["unit_cost"])
-        g = grouped.get(key, {"qty": Decimal('0'), "currency": x["currency"]})
+        key = (int(x["item_id"]), q(x["unit_cost"], DEC4))
+        g = grouped.setdefault(key, {"qty": Decimal('0'), "currency": x["currency"]})
         g["qty"] = q(g["qty"] + x["qty"])
-        grouped[key] = g
 
     return_mov = Movement(
         item_id=0, qty=0,  # uzupełnimy niżej
@@ -252,26 +300,72 @@ def return_from_employee(
     )
     session.add(return_mov); session.flush()
 
-    # Dla każdej grupy twórz linię, NOWĄ partię i alokację RETURN -> nowa partia
+    # linie dokumentu – jedno wstawienie wielowierszowe, id odczytane po document_id
+    total_net = Decimal('0.00')
+    line_rows = []
     for (item_id, unit_cost), g in grouped.items():
-        qty = g["qty"]
-        line_net = (qty * unit_cost).quantize(DEC2)
+        line_net = (g["qty"] * unit_cost).quantize(DEC2)
         total_net += line_net
-
-        dl = DocumentLine(document_id=d.id, item_id=item_id,
-                          qty=qty, unit_price_netto=unit_cost,
-                          line_netto=line_net, currency=g["currency"])
-        session.add(dl); session.flush()
-
-        # NOWA partia z kosztu zwracanego
-        lot_new = Lot(item_id=item_id, document_line_id=dl.id,
-                      qty_received=qty, qty_available=qty,
-                      unit_cost_netto=unit_cost, currency=g["currency"])
-        session.add(lot_new); session.flush()
-
-        # Alokacja zwrotu (RETURN) do nowej partii
-        session.add(MovementAllocation(movement_id=return_mov.id, lot_id=lot_new.id,
-                                       qty=qty, unit_cost_netto=unit_cost))
+        line_rows.append({"document_id": d.id, "item_id": item_id, "qty": g["qty"],
+                          "unit_price_netto": unit_cost, "line_netto": line_net,
+                          "currency": g["currency"]})
+    session.execute(insert(DocumentLine), line_rows)
+    lines = session.execute(
+        select(DocumentLine.id, DocumentLine.item_id, DocumentLine.unit_price_netto)
+        .where(DocumentLine.document_id == d.id)
+    ).all()
+    line_of = {(r.item_id, q(Decimal(r.unit_price_netto), DEC4)): r.id for r in lines}
+
+    # Ponowne użycie partii zwrotów: tylko partie założone z linii ZWROT (ten sam
+    # towar i koszt, niezarchiwizowane). Partii z przyjęcia nie ruszamy – jej
+    # qty_received ma zgadzać się z dokumentem PZ.
+    alloc_rows = []
+    fresh = dict(grouped)
+    if reuse_lots:
+        return_lots = session.execute(
+            for_update(
+                select(Lot)
+                .join(DocumentLine, DocumentLine.id == Lot.document_line_id)
+                .join(Document, Document.id == DocumentLine.document_id)
+                .where(and_(Document.doc_type == 'ZWROT',
+                            Document.id != d.id,
+                            Lot.item_id.in_(sorted({item_id for item_id, _c in grouped})),
+                            Lot.archived.is_(False)))
+                .order_by(Lot.id)
+            )
+        ).scalars().all()
+        for lot in return_lots:
+            key = (int(lot.item_id), q(Decimal(lot.unit_cost_netto), DEC4))
+            g = fresh.pop(key, None)
+            if g is None:
+                continue  # inny koszt albo partia już użyta dla tego klucza
+            # partia zwrotów: przyjęte = suma zwrotów do niej zaalokowanych
+            lot.qty_received = q(Decimal(lot.qty_received) + g["qty"])
+            lot.qty_available = q(Decimal(lot.qty_available) + g["qty"])
+            alloc_rows.append({"movement_id": return_mov.id, "lot_id": lot.id,
+                               "qty": g["qty"], "unit_cost_netto": lot.unit_cost_netto})
+
+    # NOWE partie zwrotów z kosztu zwracanego (jedna na (towar, koszt) bez partii do użycia)
+    lot_rows = []
+    for (item_id, unit_cost), g in fresh.items():
+        lot_rows.append({"item_id": item_id, "document_line_id": line_of[(item_id, q(unit_cost, DEC4))],
+                         "qty_received": g["qty"], "qty_available": g["qty"],
+                         "unit_cost_netto": unit_cost, "currency": g["currency"]})
+    if lot_rows:
+        session.execute(insert(Lot), lot_rows)
+        new_lots = session.execute(
+            select(Lot.id, Lot.document_line_id).where(
+                Lot.document_line_id.in_([r["document_line_id"] for r in lot_rows]))
+        ).all()
+        lot_of_line = {r.document_line_id: r.id for r in new_lots}
+        alloc_rows += [
+            {"movement_id": return_mov.id, "lot_id": lot_of_line[row["document_line_id"]],
+             "qty": row["qty_received"], "unit_cost_netto": row["unit_cost_netto"]}
+            for row in lot_rows
+        ]
+
+    # Alokacje zwrotu (RETURN) – do partii źródłowych albo nowych
+    session.execute(insert(MovementAllocation), alloc_rows)
 
     # uzupełnij movement item_id/qty (0 → wielopozycyjny; zostaw 0/None jako „zbiorczy”)
     return_mov.item_id = None
@@ -285,22 +379,87 @@ def return_from_employee(
     return return_mov
 
 # --- SCRAP (ze wskazaniem pracownika lub magazynu, odwzorowanie alokacji jak w RETURN)
-def scrap_from_employee(session: Session, *, employee_id: int, employee_name: str,
-                        allocations_to_scrap: list[dict], reason: str | None = None) -> Movement:
+
+@retry_deadlock()
+def scrap_batch(
+    session: Session,
+    *,
+    employee_id: int,
+    employee_name: str,
+    allocations_to_scrap: list[dict],
+    reason: str | None = None,
+    operation_uuid: str | None = None,
+    validate: bool = True,
+) -> Movement:
+    """
+    Protokół złomowania: wiele pozycji { "lot_id", "qty" } jednym ruchem SCRAP.
+
+    Partie są blokowane i wczytywane jednym zapytaniem (IN ... FOR UPDATE),
+    ilości sprawdzane względem salda pracownika per (towar, koszt) z księgi
+    alokacji (validate),
+    alokacje wstawiane jednym INSERT wielowierszowym. Powód protokołu trafia
+    do movements.reason. Całość w transakcji wołającego. Powtórzony
+    operation_uuid zwraca istniejący ruch.
+    """
+    op_uuid = operation_uuid or str(uuid.uuid4())
+    existing = session.execute(
+        select(Movement).where(Movement.operation_uuid == op_uuid)
+    ).scalar_one_or_none()
+    if existing:
+        return existing
+
+    wanted: dict[int, Decimal] = {}
+    for a in allocations_to_scrap:
+        qty = q(Decimal(str(a["qty"])))
+        if qty <= 0:
+            continue
+        wanted[int(a["lot_id"])] = q(wanted.get(int(a["lot_id"]), Decimal('0')) + qty)
+    if not wanted:
+        raise ValueError("Nic do złomowania")
+
     emp_loc = ensure_employee_location(session, employee_id, employee_name)
     scrap_loc = ensure_scrap_location(session)
 
+    lot_ids = sorted(wanted)
+    lots = {
+        lot.id: lot
+        for lot in session.execute(
+            for_update(select(Lot).where(Lot.id.in_(lot_ids)).order_by(Lot.id))
+        ).scalars()
+    }
+    missing = [i for i in lot_ids if i not in lots]
+    if missing:
+        raise ValueError(f"Nie ma partii lot_id={missing[0]}")
+
+    if validate:
+        need: dict[tuple[int, Decimal], Decimal] = {}
+        for lot_id, qty in wanted.items():
+            key = (int(lots[lot_id].item_id), q(Decimal(lots[lot_id].unit_cost_netto), DEC4))
+            need[key] = q(need.get(key, Decimal('0')) + qty)
+        held = _held_by_item_cost(session, emp_loc, sorted({item_id for item_id, _c in need}))
+        for (item_id, cost), qty in need.items():
+            have = q(held.get((item_id, cost), Decimal('0')))
+            if qty > have:
+                raise ValueError(
+                    f"Za duża ilość do złomowania (u pracownika {have}) dla towaru {item_id} po {cost}"
+                )
+
     mv = Movement(item_id=None, qty=None,
                   from_location_id=emp_loc, to_location_id=scrap_loc,
-                  movement_type='SCRAP', ts=datetime.now())
+                  movement_type='SCRAP', reason=reason[:255] if reason else None,
+                  ts=datetime.now(), operation_uuid=op_uuid)
     session.add(mv); session.flush()
 
-    for a in allocations_to_scrap:
-        lot = session.get(Lot, a["lot_id"])
-        qty = q(Decimal(str(a["qty"])))
-        if qty <= 0: 
-            continue
-        # nic nie przywracamy do magazynu; tylko alokacja zużycia
-        session.add(MovementAllocation(movement_id=mv.id, lot_id=lot.id,
-                                       qty=qty, unit_cost_netto=lot.unit_cost_netto))
+    # nic nie przywracamy do magazynu; tylko alokacje zużycia
+    session.execute(insert(MovementAllocation), [
+        {"movement_id": mv.id, "lot_id": lot_id, "qty": qty,
+         "unit_cost_netto": lots[lot_id].unit_cost_netto}
+        for lot_id, qty in wanted.items()
+    ])
     return mv
+
+
+def scrap_from_employee(session: Session, *, employee_id: int, employee_name: str,
+                        allocations_to_scrap: list[dict], reason: str | None = None) -> Movement:
+    return scrap_batch(session, employee_id=employee_id, employee_name=employee_name,
+                       allocations_to_scrap=allocations_to_scrap, reason=reason, validate=False)
@@ -6,6 +6,7 @@ from decimal import Decimal
 import uuid  # legacy / przyszłe użycie
 import pymysql
 from app.core.auth import AuthRepo
+from app.dal.locations import directory as location_directory
 
 
 class RepoMySQL:
@@ -70,9 +71,14 @@ class RepoMySQL:
 
     # ---------- Zapytania pod GUI ----------
     def get_employee_location_id(self, employee_id: int) -> Optional[int]:
+        cached = location_directory.cached_employee(employee_id)
+        if cached is not None:
+            return cached
         cur = self.conn.cursor()
         cur.execute("SELECT id FROM locations WHERE type='EMPLOYEE' AND employee_id=%s", (employee_id,))
         row = cur.fetchone()
+        if row:
+            location_directory.remember_employee(employee_id, row["id"])
         return row["id"] if row else None
 
     def list_employee_allocations(self, employee_id: int) -> List[dict]:
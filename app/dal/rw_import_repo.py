@@ -10,6 +10,8 @@ from decimal import Decimal, ROUND_HALF_UP
 from sqlalchemy import text
 from sqlalchemy.engine import Engine
 
+from app.dal.catalog_search import reindex_items
+
 
 DEFAULT_LOCATION_ID = 1  # TODO: pobrać z configu aplikacji
 
@@ -89,6 +91,7 @@ class RWImportRepo:
                         text(f"UPDATE items SET {name_col}=:n WHERE id=:id"),
                         {"n": name, "id": item_id},
                     )
+                    self._reindex_item(item_id)
             return item_id
 
         # INSERT — jeżeli unit jest NOT NULL, ustaw 'SZT'
@@ -102,7 +105,21 @@ class RWImportRepo:
                 text(f"INSERT INTO items({code_col},{name_col}) VALUES (:s,:n)"),
                 {"s": sku, "n": name or sku},
             )
-        return int(getattr(res, "lastrowid", 0))
+        item_id = int(getattr(res, "lastrowid", 0))
+        self._reindex_item(item_id)
+        return item_id
+
+    def _reindex_item(self, item_id: int) -> None:
+        """Indeks wyszukiwania kartoteki; brak tabel (stara baza) nie blokuje importu."""
+        if not item_id:
+            return
+        try:
+            with self.conn.begin_nested():
+                reindex_items(
+                    self.conn, [item_id], code_col=self.items_code_col, name_col=self.items_name_col
+                )
+        except Exception:
+            self.log.warning("Nie udało się zaindeksować towaru id=%s (tools/reindex_catalog.py)", item_id)
 
     # ---------- documents ----------
     def insert_rw_header(
@@ -0,0 +1,173 @@
+# app/dal/snapshot.py
+"""
+Spójna migawka stanów magazynu (jeden odczyt, jedna chwila).
+
+Silnik pracuje w READ COMMITTED (make_engine) – kolejne zapytania widzą
+zmiany innych stanowisk, więc arkusz spisu czy raport złożony z wielu
+zapytań potrafi „pływać”. consistent_snapshot() otwiera transakcję
+REPEATABLE READ WITH CONSISTENT SNAPSHOT: wszystkie zapytania w bloku
+widzą bazę z tej samej chwili.
+
+take_snapshot() czyta w jednym przebiegu towary, partie, rezerwacje
+i salda u pracowników do zwartego obiektu StockSnapshot (kolumny array('q'),
+ilości w tysięcznych, koszt w 1/10000 PLN). Z migawki korzystają bez
+ponownych zapytań: wycena (appsvc.valuation.StockValuation.from_snapshot),
+spis (appsvc.inventory_session.InventorySession.from_snapshot) i alerty
+minimalnego stanu (appsvc.alerts.StockAlertEngine.sync_from_snapshot).
+"""
+from __future__ import annotations
+
+import logging
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection, Engine
+
+log = logging.getLogger(__name__)
+
+# saldo alokacji per (lokalizacja, towar, koszt): wejścia (to_location) minus wyjścia (from_location)
+LEDGER_SQL = """
+    SELECT x.item_id, x.loc, SUM(x.qty_milli), x.cost_e4
+    FROM (
+        SELECT l.item_id, m.to_location_id AS loc,
+               ROUND(ma.qty * 1000) AS qty_milli, ROUND(ma.unit_cost_netto * 10000) AS cost_e4
+        FROM movement_allocations ma
+        JOIN movements m ON m.id = ma.movement_id
+        JOIN lots l ON l.id = ma.lot_id
+        WHERE m.to_location_id IS NOT NULL {ts}
+        UNION ALL
+        SELECT l.item_id, m.from_location_id,
+               -ROUND(ma.qty * 1000), ROUND(ma.unit_cost_netto * 10000)
+        FROM movement_allocations ma
+        JOIN movements m ON m.id = ma.movement_id
+        JOIN lots l ON l.id = ma.lot_id
+        WHERE m.from_location_id IS NOT NULL {ts}
+    ) x
+    JOIN locations loc ON loc.id = x.loc
+    WHERE loc.type IN :types
+    GROUP BY x.item_id, x.loc, x.cost_e4
+    HAVING SUM(x.qty_milli) <> 0
+"""
+
+
+def ledger_stmt(ts: str = ""):
+    return text(LEDGER_SQL.format(ts=ts)).bindparams(bindparam("types", expanding=True))
+
+
+@contextmanager
+def consistent_snapshot(engine: Engine) -> Iterator[Connection]:
+    """Połączenie w transakcji REPEATABLE READ z migawką z chwili otwarcia (tylko odczyt)."""
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        conn.exec_driver_sql("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+        try:
+            yield conn
+        finally:
+            conn.exec_driver_sql("COMMIT")
+
+
+@dataclass
+class StockSnapshot:
+    taken_at: datetime
+    movement_mark: int                       # MAX(movements.id) w chwili migawki
+    warehouse_id: int
+    # towary: item_id -> (code, name, min_stock, active)
+    items: Dict[int, Tuple[str, str, int, bool]] = field(default_factory=dict)
+    # partie magazynowe (qty_available <> 0)
+    lot_id: array = field(default_factory=lambda: array("q"))
+    lot_item: array = field(default_factory=lambda: array("q"))
+    lot_qty: array = field(default_factory=lambda: array("q"))
+    lot_cost: array = field(default_factory=lambda: array("q"))
+    # salda u pracowników: (towar, lokalizacja, ilość, koszt)
+    hold_item: array = field(default_factory=lambda: array("q"))
+    hold_loc: array = field(default_factory=lambda: array("q"))
+    hold_qty: array = field(default_factory=lambda: array("q"))
+    hold_cost: array = field(default_factory=lambda: array("q"))
+    reserved: Dict[int, int] = field(default_factory=dict)   # item_id -> qty_milli
+
+    # ---------- Agregaty ----------
+    def on_hand(self) -> Dict[int, int]:
+        """Stan magazynu per towar (tysięczne) – wszystkie towary, także z zerem."""
+        out = dict.fromkeys(self.items, 0)
+        for it, q in zip(self.lot_item, self.lot_qty):
+            out[it] = out.get(it, 0) + q
+        return out
+
+    def available(self) -> Dict[int, int]:
+        """Stan magazynu minus otwarte rezerwacje (tysięczne)."""
+        out = self.on_hand()
+        for it, r in self.reserved.items():
+            out[it] = out.get(it, 0) - r
+        return out
+
+    def held(self) -> Dict[int, int]:
+        """Ilość u pracowników per towar (tysięczne)."""
+        out: Dict[int, int] = {}
+        for it, q in zip(self.hold_item, self.hold_qty):
+            out[it] = out.get(it, 0) + q
+        return out
+
+    def positions(self) -> Iterator[Tuple[int, int, int, int]]:
+        """(item_id, location_id, qty_milli, cost_e4): partie magazynu + salda u pracowników."""
+        wh = self.warehouse_id
+        for it, q, c in zip(self.lot_item, self.lot_qty, self.lot_cost):
+            yield it, wh, q, c
+        yield from zip(self.hold_item, self.hold_loc, self.hold_qty, self.hold_cost)
+
+
+def take_snapshot(engine: Engine, *, batch_size: int = 5000) -> StockSnapshot:
+    """Wszystkie towary, partie, rezerwacje i salda u pracowników z jednej chwili."""
+    with consistent_snapshot(engine) as conn:
+        mark = int(conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM movements")).scalar() or 0)
+        wh = int(
+            conn.execute(text("SELECT COALESCE(MIN(id), 0) FROM locations WHERE type = 'WAREHOUSE'")).scalar()
+            or 0
+        )
+        snap = StockSnapshot(taken_at=datetime.now(), movement_mark=mark, warehouse_id=wh)
+        stream = conn.execution_options(stream_results=True, yield_per=int(batch_size))
+
+        for part in stream.execute(
+            text("SELECT id, code, name, COALESCE(min_stock, 0), COALESCE(active, 1) FROM items")
+        ).partitions():
+            for i, code, name, min_stock, active in part:
+                snap.items[int(i)] = (code or "", name or "", int(min_stock), bool(active))
+
+        for part in stream.execute(
+            text(
+                """
+                SELECT id, item_id, ROUND(qty_available * 1000), ROUND(unit_cost_netto * 10000)
+                FROM lots
+                WHERE qty_available <> 0
+                """
+            )
+        ).partitions():
+            for lid, it, q, c in part:
+                snap.lot_id.append(int(lid))
+                snap.lot_item.append(int(it))
+                snap.lot_qty.append(int(q))
+                snap.lot_cost.append(int(c))
+
+        try:
+            for it, r in conn.execute(
+                text("SELECT item_id, ROUND(qty_reserved * 1000) FROM item_reservations WHERE qty_reserved <> 0")
+            ):
+                snap.reserved[int(it)] = int(r)
+        except Exception:
+            log.debug("Migawka: brak item_reservations – bez rezerwacji", exc_info=True)
+
+        for part in stream.execute(ledger_stmt(), {"types": ["EMPLOYEE"]}).partitions():
+            for it, loc, q, c in part:
+                snap.hold_item.append(int(it))
+                snap.hold_loc.append(int(loc))
+                snap.hold_qty.append(int(q))
+                snap.hold_cost.append(int(c))
+
+    log.info(
+        "Migawka stanów: %s towarów, %s partii, %s sald u pracowników (mark=%s)",
+        len(snap.items), len(snap.lot_id), len(snap.hold_item), mark,
+    )
+    return snap
@@ -0,0 +1,29 @@
+# app/dal/stream.py
+"""Odczyt dużych wyników kursorem po stronie serwera (bez ładowania całości do pamięci)."""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+
+def stream_query(
+    engine: Engine,
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    *,
+    batch_size: int = 1000,
+) -> Iterator[Dict]:
+    """
+    Wiersze zapytania jako słowniki, pobierane partiami po batch_size
+    (stream_results => pymysql SSCursor). Połączenie jest otwarte do końca
+    iteracji (lub zamknięcia generatora) – konsumuj w wątku, który go utworzył.
+    """
+    with engine.connect() as conn:
+        res = conn.execution_options(stream_results=True, yield_per=int(batch_size)).execute(
+            text(sql), params or {}
+        )
+        for part in res.mappings().partitions():
+            for r in part:
+                yield dict(r)
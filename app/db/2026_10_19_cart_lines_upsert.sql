@@ -0,0 +1,22 @@
+-- Koszyk: jedna linia na (sesja, pozycja) – wymagane przez zbiorczy upsert z bufora klienta
+-- 1) scal ewentualne duplikaty (suma ilości trafia do linii o najniższym id)
+UPDATE issue_session_lines l
+  JOIN (
+    SELECT session_id, item_id, MIN(id) AS keep_id, SUM(qty_reserved) AS qty
+    FROM issue_session_lines
+    GROUP BY session_id, item_id
+    HAVING COUNT(*) > 1
+  ) d ON d.keep_id = l.id
+SET l.qty_reserved = d.qty;
+
+DELETE l
+FROM issue_session_lines l
+  JOIN issue_session_lines k
+    ON k.session_id = l.session_id
+   AND k.item_id = l.item_id
+   AND k.id < l.id;
+
+-- 2) klucz unikalny zastępuje dotychczasowy indeks nieunikalny
+ALTER TABLE issue_session_lines
+  ADD UNIQUE KEY IF NOT EXISTS uq_issue_lines_session_item (session_id, item_id),
+  DROP INDEX IF EXISTS idx_issue_lines_session_item;
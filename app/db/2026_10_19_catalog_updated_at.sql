@@ -0,0 +1,10 @@
+-- Znacznik zmian dla lokalnej repliki kartoteki (app/dal/catalog_replica.py):
+-- stanowiska dociągają tylko wiersze z (updated_at, id) > ostatni znacznik.
+-- Istniejące wiersze dostają bieżący czas => pierwsza synchronizacja pobiera całość.
+ALTER TABLE items
+  ADD COLUMN IF NOT EXISTS updated_at timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
+  ADD INDEX IF NOT EXISTS idx_items_updated_at (updated_at, id);
+
+ALTER TABLE employees
+  ADD COLUMN IF NOT EXISTS updated_at timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
+  ADD INDEX IF NOT EXISTS idx_employees_updated_at (updated_at, id);
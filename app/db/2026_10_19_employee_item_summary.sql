@@ -0,0 +1,52 @@
+-- Karta pracownika bez vw_employee_card: podsumowanie (pracownik, towar) utrzymywane
+-- triggerami na transaction_items (wypełniane także przez procedury sp_issue_tool itp.).
+-- ReportsRepo.employee_card czyta po PK/idx (employee_id, last_op), historię
+-- (ReportsRepo.employee_history_page) po idx_transactions_emp_created.
+CREATE TABLE IF NOT EXISTS employee_item_summary (
+  employee_id  INT           NOT NULL,
+  item_id      INT           NOT NULL,
+  balance_qty  DECIMAL(14,3) NOT NULL DEFAULT 0,   -- OUT (wydane) - IN (zwrócone)
+  first_op     TIMESTAMP     NULL DEFAULT NULL,
+  last_op      TIMESTAMP     NULL DEFAULT NULL,
+  ops_count    INT           NOT NULL DEFAULT 0,
+  PRIMARY KEY (employee_id, item_id),
+  KEY idx_eis_emp_last_op (employee_id, last_op)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+ALTER TABLE transactions
+  ADD INDEX IF NOT EXISTS idx_transactions_emp_created (employee_id, created_at, id);
+
+DROP TRIGGER IF EXISTS `trg_ti_summary_ins`;
+CREATE TRIGGER `trg_ti_summary_ins` AFTER INSERT ON `transaction_items` FOR EACH ROW BEGIN
+  INSERT INTO employee_item_summary (employee_id, item_id, balance_qty, first_op, last_op, ops_count)
+  SELECT t.employee_id, NEW.item_id,
+         CASE NEW.direction WHEN 'OUT' THEN NEW.quantity WHEN 'IN' THEN -NEW.quantity ELSE 0 END,
+         t.created_at, t.created_at, 1
+  FROM transactions t
+  WHERE t.operation_uuid = NEW.operation_uuid
+  ON DUPLICATE KEY UPDATE
+    balance_qty = balance_qty + VALUES(balance_qty),
+    first_op    = LEAST(COALESCE(first_op, VALUES(first_op)), VALUES(first_op)),
+    last_op     = GREATEST(COALESCE(last_op, VALUES(last_op)), VALUES(last_op)),
+    ops_count   = ops_count + 1;
+END;
+
+-- Usunięcie pozycji: saldo korygujemy, first/last_op zostają (ewentualnie
+-- przelicza je ponownie backfill poniżej). Kaskada z transactions triggerów nie wywołuje.
+DROP TRIGGER IF EXISTS `trg_ti_summary_del`;
+CREATE TRIGGER `trg_ti_summary_del` AFTER DELETE ON `transaction_items` FOR EACH ROW BEGIN
+  UPDATE employee_item_summary s
+  JOIN transactions t ON t.operation_uuid = OLD.operation_uuid
+  SET s.balance_qty = s.balance_qty - CASE OLD.direction WHEN 'OUT' THEN OLD.quantity WHEN 'IN' THEN -OLD.quantity ELSE 0 END,
+      s.ops_count   = GREATEST(s.ops_count - 1, 0)
+  WHERE s.employee_id = t.employee_id AND s.item_id = OLD.item_id;
+END;
+
+-- Backfill (idempotentny – można uruchomić ponownie w celu uzgodnienia)
+REPLACE INTO employee_item_summary (employee_id, item_id, balance_qty, first_op, last_op, ops_count)
+SELECT t.employee_id, ti.item_id,
+       SUM(CASE ti.direction WHEN 'OUT' THEN ti.quantity WHEN 'IN' THEN -ti.quantity ELSE 0 END),
+       MIN(t.created_at), MAX(t.created_at), COUNT(*)
+FROM transactions t
+JOIN transaction_items ti ON ti.operation_uuid = t.operation_uuid
+GROUP BY t.employee_id, ti.item_id;
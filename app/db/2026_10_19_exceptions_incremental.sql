@@ -0,0 +1,22 @@
+-- Przyrostowe odświeżanie panelu wyjątków: widok wystawia transactions.id (znak wody),
+-- sonda MAX(id) / COUNT(id > :since) idzie po indeksie (issued_without_return, id).
+CREATE OR REPLACE VIEW vw_exceptions AS
+  SELECT
+    t.id,
+    t.operation_uuid,
+    t.employee_id,
+    CONCAT(e.first_name,' ',e.last_name) AS employee,
+    e.username AS login,
+    t.item_id,
+    i.name AS item,
+    t.quantity,
+    t.movement_type,
+    t.reason,
+    t.created_at
+  FROM transactions t
+  JOIN employees e ON e.id = t.employee_id
+  JOIN items i ON i.id = t.item_id
+  WHERE t.issued_without_return = 1;
+
+ALTER TABLE transactions
+  ADD INDEX IF NOT EXISTS idx_transactions_iwr_id (issued_without_return, id);
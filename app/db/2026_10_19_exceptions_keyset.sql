@@ -0,0 +1,4 @@
+-- Stronicowanie wyjątków kluczem (created_at, operation_uuid, item_id) malejąco –
+-- ExceptionsRepo.list_exceptions_page / ReportsRepo.exceptions_page (vw_exceptions)
+ALTER TABLE transactions
+  ADD INDEX IF NOT EXISTS idx_transactions_iwr_created (issued_without_return, created_at, operation_uuid, item_id);
@@ -0,0 +1,24 @@
+-- Miesięczna tabela faktów zużycia: (miesiąc, towar, pracownik, typ ruchu) -> ilość i wartość FIFO.
+-- Utrzymywana przyrostowo z movements (id > znak wody) – app/dal/consumption_facts.py,
+-- zasilenie / kontrola: tools/consumption_facts.py (backfill | refresh | check).
+CREATE TABLE IF NOT EXISTS fact_consumption_monthly (
+  month          DATE          NOT NULL,            -- pierwszy dzień miesiąca
+  item_id        BIGINT        NOT NULL DEFAULT 0,  -- 0 = ruch bez towaru
+  employee_id    BIGINT        NOT NULL DEFAULT 0,  -- 0 = bez pracownika (np. przyjęcie)
+  movement_type  VARCHAR(16)   NOT NULL,
+  qty            DECIMAL(14,3) NOT NULL DEFAULT 0,
+  value_fifo     DECIMAL(16,4) NOT NULL DEFAULT 0,  -- SUM(movement_allocations.qty * unit_cost_netto)
+  movements      INT           NOT NULL DEFAULT 0,
+  PRIMARY KEY (month, item_id, employee_id, movement_type),
+  KEY idx_fcm_item (item_id, month),
+  KEY idx_fcm_employee (employee_id, month)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Znaki wysokiej wody tabel faktów (ostatnie przetworzone movements.id)
+CREATE TABLE IF NOT EXISTS fact_watermarks (
+  name        VARCHAR(64) NOT NULL PRIMARY KEY,
+  last_id     BIGINT      NOT NULL DEFAULT 0,
+  updated_at  TIMESTAMP   NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+INSERT IGNORE INTO fact_watermarks(name, last_id) VALUES ('fact_consumption_monthly', 0);
@@ -0,0 +1,38 @@
+-- Liczniki rezerwacji per pozycja (utrzymywane przez CartRepository / checkout / sweeper)
+-- zamiast przeliczania wszystkich otwartych sesji przy każdym odczycie vw_stock_available
+CREATE TABLE IF NOT EXISTS item_reservations (
+  item_id int(11) NOT NULL,
+  qty_reserved decimal(12,3) NOT NULL DEFAULT 0,
+  updated_at timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
+  PRIMARY KEY (item_id),
+  CONSTRAINT fk_item_reservations_item FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- sweeper wybiera wygasłe sesje po (status, expires_at)
+ALTER TABLE issue_sessions
+  ADD INDEX IF NOT EXISTS idx_issue_sessions_status_expires (status, expires_at);
+
+-- sesje OPEN bez expires_at (sprzed TTL) dostają termin liczony od startu
+UPDATE issue_sessions
+   SET expires_at = started_at + INTERVAL 30 MINUTE
+ WHERE status = 'OPEN' AND expires_at IS NULL;
+
+-- stan początkowy liczników = linie aktualnie otwartych sesji
+DELETE FROM item_reservations;
+INSERT INTO item_reservations (item_id, qty_reserved)
+SELECT l.item_id, SUM(l.qty_reserved)
+  FROM issue_sessions s
+  JOIN issue_session_lines l ON l.session_id = s.id
+ WHERE s.status = 'OPEN'
+ GROUP BY l.item_id;
+
+-- widok czyta licznik zamiast agregować sesje; `available` = alias dla starszych zapytań
+CREATE OR REPLACE VIEW vw_stock_available AS
+  SELECT
+    oh.item_id,
+    oh.qty_on_hand,
+    COALESCE(r.qty_reserved, 0) AS qty_reserved_open,
+    oh.qty_on_hand - COALESCE(r.qty_reserved, 0) AS qty_available,
+    oh.qty_on_hand - COALESCE(r.qty_reserved, 0) AS available
+  FROM vw_stock_on_hand oh
+  LEFT JOIN item_reservations r ON r.item_id = oh.item_id;
@@ -0,0 +1,20 @@
+-- Wyszukiwanie w kartotece po indeksie zamiast `name/code LIKE '%q%'` (app/dal/catalog_search.py)
+-- search_key = nazwa znormalizowana (małe litery, bez polskich znaków);
+-- dokładny/prefiksowy kod korzysta z istniejącego UNIQUE KEY `code`
+ALTER TABLE items
+  ADD COLUMN IF NOT EXISTS search_key varchar(255) DEFAULT NULL,
+  ADD INDEX IF NOT EXISTS idx_items_search_key (search_key);
+
+-- słowa nazwy/kodu; tokeny są już znormalizowane, więc porównanie binarne
+-- (`token LIKE 'abc%'` = zakres w kluczu głównym; (item_id, token) dla kolejnych słów)
+CREATE TABLE IF NOT EXISTS item_search_tokens (
+  token varchar(64) NOT NULL,
+  item_id int(11) NOT NULL,
+  PRIMARY KEY (token, item_id),
+  KEY idx_item_search_tokens_item (item_id, token),
+  CONSTRAINT fk_item_search_tokens_item FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin;
+
+-- Normalizacja jest po stronie Pythona – aplikacja przy starcie indeksuje w tle
+-- towary z search_key IS NULL (do tego czasu podciąg szuka w surowej nazwie);
+-- ręcznie / całość: python tools/reindex_catalog.py [--all]
@@ -0,0 +1,3 @@
+-- Stronicowanie listy stanów kluczem (name, id) – StockRepository.list_available_page
+ALTER TABLE items
+  ADD INDEX IF NOT EXISTS idx_items_name_id (name, id);
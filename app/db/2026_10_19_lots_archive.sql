@@ -0,0 +1,9 @@
+-- Archiwizacja zużytych partii (app/dal/lots.py, tools/compact_lots.py).
+-- Partia z qty_available = 0 zostaje w tabeli (alokacje, dokumenty, widoki
+-- historii dalej ją widzą), ale wypada z gorącego indeksu FIFO:
+-- issue_to_employee skanuje tylko (item_id, archived = 0, ts, id).
+ALTER TABLE lots
+  ADD COLUMN IF NOT EXISTS archived    TINYINT(1) NOT NULL DEFAULT 0 AFTER ts,
+  ADD COLUMN IF NOT EXISTS archived_at DATETIME   NULL AFTER archived,
+  ADD KEY IF NOT EXISTS idx_lots_fifo (item_id, archived, ts, id),
+  ADD KEY IF NOT EXISTS idx_lots_compact (archived, qty_available, ts);
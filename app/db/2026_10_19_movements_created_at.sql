@@ -0,0 +1,6 @@
+-- Czas zapisu ruchu nadawany przez bazę (movements.ts ustawia klient – zegar
+-- stanowiska). consumption_facts.refresh liczy górną granicę przyrostu po
+-- created_at <= NOW() - lag, czyli oba czasy z zegara serwera. Istniejące
+-- wiersze dostają czas migracji – to tylko opóźnia je o lag w pierwszym odświeżeniu.
+ALTER TABLE movements
+  ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP AFTER ts;
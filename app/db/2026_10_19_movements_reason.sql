@@ -0,0 +1,4 @@
+-- Powód ruchu (repo_movements.scrap_batch: protokół złomowania – wiele pozycji,
+-- jeden powód zapisany na ruchu SCRAP).
+ALTER TABLE movements
+  ADD COLUMN IF NOT EXISTS reason VARCHAR(255) NULL AFTER movement_type;
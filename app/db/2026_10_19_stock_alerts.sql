@@ -0,0 +1,23 @@
+-- Aktywne alerty minimalnego stanu (items.min_stock) – StockAlertEngine (app/appsvc/alerts.py).
+-- Wiersz istnieje, dopóki dostępna ilość towaru jest poniżej progu.
+CREATE TABLE IF NOT EXISTS stock_alerts (
+  item_id        INT           NOT NULL,
+  min_stock      INT           NOT NULL,
+  qty_available  DECIMAL(12,3) NOT NULL,
+  raised_at      DATETIME      NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  updated_at     TIMESTAMP     NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (item_id),
+  CONSTRAINT fk_stock_alerts_item FOREIGN KEY (item_id) REFERENCES items (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- stan początkowy: jednorazowe porównanie całej kartoteki (dalej tylko zdarzenia)
+INSERT IGNORE INTO stock_alerts (item_id, min_stock, qty_available)
+SELECT item_id, min_stock, qty_available
+FROM (
+  SELECT i.id AS item_id, i.min_stock,
+         COALESCE((SELECT SUM(l.qty_available) FROM lots l WHERE l.item_id = i.id), 0)
+       - COALESCE((SELECT r.qty_reserved FROM item_reservations r WHERE r.item_id = i.id), 0) AS qty_available
+  FROM items i
+  WHERE COALESCE(i.min_stock, 0) > 0
+) s
+WHERE s.qty_available < s.min_stock;
@@ -2,7 +2,8 @@
 """Bundle RETURN+ISSUE operations in a single transaction."""
 
 from __future__ import annotations
-from typing import Iterable, Optional
+from typing import Iterable, Optional, Sequence
+import logging
 import uuid
 
 from app.core.rfid_stub import RFIDReader
@@ -99,3 +100,133 @@ def issue_return_bundle(
         db_conn.commit()
 
     return {"status": "success", "flagged": flagged, "returns": ret_cnt, "issues": iss_cnt}
+
+
+log = logging.getLogger(__name__)
+
+ShiftEntry = tuple[int, Sequence[tuple[int, int]], Sequence[tuple[int, int]]]
+
+
+def _placeholders(n: int) -> str:
+    return ", ".join(["%s"] * n)
+
+
+def _flag_chunk(cur, issued: list[tuple[int, int, str]]) -> list[tuple[int, int]]:
+    """
+    Salda (pracownik, pozycja) dla wydań całej porcji jednym zapytaniem
+    zbiorczym i flagi issued_without_return dwoma UPDATE ... IN.
+    Zwraca pary z otwartym saldem.
+    """
+    if not issued:
+        return []
+    emps = sorted({e for e, _i, _op in issued})
+    items = sorted({i for _e, i, _op in issued})
+    cur.execute(
+        "SELECT employee_id, item_id, "
+        "COALESCE(SUM(CASE WHEN movement_type='ISSUE' THEN quantity ELSE -quantity END),0) "
+        f"FROM transactions WHERE employee_id IN ({_placeholders(len(emps))}) "
+        f"AND item_id IN ({_placeholders(len(items))}) "
+        "GROUP BY employee_id, item_id",
+        (*emps, *items),
+    )
+    balance = {(int(r[0]), int(r[1])): r[2] for r in cur.fetchall() or []}
+    # IN x IN to nadzbiór – liczą się tylko pary faktycznie wydane w porcji
+    open_pairs = {(e, i) for e, i, _op in issued if balance.get((e, i), 0) > 0}
+    for flag in (1, 0):
+        ops = [op for e, i, op in issued if ((e, i) in open_pairs) == bool(flag)]
+        if ops:
+            cur.execute(
+                "UPDATE transactions SET issued_without_return=%s "
+                f"WHERE operation_uuid IN ({_placeholders(len(ops))})",
+                (flag, *ops),
+            )
+    return sorted(open_pairs)
+
+
+def shift_return_bundle(
+    db_conn,
+    entries: Iterable[ShiftEntry],
+    *,
+    chunk_size: int = 20,
+    rfid_confirmed: bool | None = None,
+    reader: RFIDReader | None = None,
+    features: FeaturesSettings | None = None,
+) -> dict:
+    """Zwroty i wydania wielu pracowników (zmiana zmiany) porcjami.
+
+    Parameters
+    ----------
+    db_conn:
+        Połączenie DB-API (cursor/commit/rollback).
+    entries:
+        Iterable[(employee_id, returns, issues)] – returns/issues jak w
+        :func:`issue_return_bundle`.
+    chunk_size:
+        Liczba pracowników w jednej transakcji.
+
+    Każda porcja to jedna transakcja: najpierw zwroty, potem wydania, na końcu
+    jedno zapytanie o salda (pracownik, pozycja) i zbiorcze ustawienie flag
+    issued_without_return (zamiast SUM po każdym wydaniu). Błąd porcji cofa
+    tylko ją – pozostałe są księgowane dalej.
+
+    Returns
+    -------
+    dict
+        {"status": "success" | "partial" | "error", "employees": int,
+         "returns": int, "issues": int, "flagged": [(employee_id, item_id)],
+         "chunks": int, "failed": [{"employees": [...], "error": str}]}
+    """
+
+    if rfid_confirmed is None:
+        rfid_confirmed = _confirm(reader, features)
+    if not rfid_confirmed:
+        return {"status": "rfid_unconfirmed"}
+
+    entries = [(int(e), list(r or []), list(i or [])) for e, r, i in entries]
+    size = max(1, int(chunk_size))
+    summary: dict = {
+        "employees": len({e for e, _r, _i in entries}),
+        "returns": 0,
+        "issues": 0,
+        "flagged": [],
+        "chunks": 0,
+        "failed": [],
+    }
+
+    for start in range(0, len(entries), size):
+        chunk = entries[start:start + size]
+        ret_cnt = 0
+        issued: list[tuple[int, int, str]] = []
+        cur = db_conn.cursor()
+        try:
+            # najpierw zwroty całej porcji
+            for employee_id, returns, _issues in chunk:
+                for item_id, qty in returns:
+                    cur.callproc("sp_return_tool", (employee_id, item_id, str(qty), str(uuid.uuid4())))
+                    ret_cnt += 1
+            # potem wydania
+            for employee_id, _returns, issues in chunk:
+                for item_id, qty in issues:
+                    op_uuid = str(uuid.uuid4())
+                    cur.callproc("sp_issue_tool", (employee_id, item_id, str(qty), op_uuid))
+                    issued.append((employee_id, int(item_id), op_uuid))
+            flagged = _flag_chunk(cur, issued)
+            db_conn.commit()
+        except Exception as e:
+            rollback = getattr(db_conn, "rollback", None)
+            if rollback is not None:
+                rollback()
+            emps = [e_id for e_id, _r, _i in chunk]
+            log.exception("Zwrot zmianowy: porcja %s wycofana", emps)
+            summary["failed"].append({"employees": emps, "error": str(e)})
+            continue
+        summary["chunks"] += 1
+        summary["returns"] += ret_cnt
+        summary["issues"] += len(issued)
+        summary["flagged"] += flagged
+
+    if not summary["failed"]:
+        summary["status"] = "success"
+    else:
+        summary["status"] = "partial" if summary["chunks"] else "error"
+    return summary
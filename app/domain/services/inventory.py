@@ -60,3 +60,24 @@ def inventory_count(
 
     _processed_ops.add(operation_uuid)
     return {"status": "success"}
+
+
+def inventory_post_session(
+    engine,
+    session,
+    *,
+    approved=None,
+    reader: RFIDReader | None = None,
+    features: FeaturesSettings | None = None,
+    approved_by: str = "",
+) -> dict:
+    """
+    Księguje różnice sesji spisu (app.appsvc.inventory_session.InventorySession)
+    partiami – z JEDNYM potwierdzeniem RFID/PIN kierownika zamiast modala na pozycję.
+    """
+    return session.post(
+        engine,
+        confirm=lambda: _confirm(reader, features),
+        approved=approved,
+        approved_by=approved_by,
+    )
@@ -4,8 +4,9 @@ z obsługą potwierdzenia RFID/PIN oraz feature‑flag.
 """
 
 from __future__ import annotations
-from typing import Set, Optional
+from typing import Iterable, Set, Optional
 import uuid
+from decimal import Decimal
 
 from app.core.rfid_stub import RFIDReader
 from app.infra.config import FeaturesSettings
@@ -62,3 +63,50 @@ def scrap_tool(
 
     _processed_ops.add(operation_uuid)
     return {"status": "success"}
+
+
+def scrap_protocol(
+    db_conn,
+    employee_id: int,
+    lines: Iterable[tuple[int, object]],
+    *,
+    reason: str | None = None,
+    protocol_uuid: str | None = None,
+    rfid_confirmed: bool | None = None,
+    reader: RFIDReader | None = None,
+    features: FeaturesSettings | None = None,
+) -> dict:
+    """Protokół złomowania: wiele pozycji (item_id, qty), jeden powód,
+    jedno potwierdzenie i jedna transakcja (błąd dowolnej pozycji cofa całość).
+
+    operation_uuid pozycji = uuid5(protokół, item_id) – ponowienie protokołu
+    po błędzie nie dubluje złomowania (idempotencja procedury).
+    """
+    protocol_uuid = protocol_uuid or str(uuid.uuid4())
+
+    if rfid_confirmed is None:
+        rfid_confirmed = _confirm(reader, features)
+    if not rfid_confirmed:
+        return {"status": "rfid_unconfirmed"}
+
+    if protocol_uuid in _processed_ops:
+        return {"status": "duplicate"}
+
+    # ta sama pozycja kilka razy w protokole -> jedna linia
+    qty_by_item: dict[int, Decimal] = {}
+    for item_id, qty in lines or []:
+        qty_by_item[int(item_id)] = qty_by_item.get(int(item_id), Decimal(0)) + Decimal(str(qty))
+    qty_by_item = {i: q for i, q in qty_by_item.items() if q > 0}
+    if not qty_by_item:
+        return {"status": "empty"}
+
+    ns = uuid.UUID(protocol_uuid)
+    with db_conn:
+        cur = db_conn.cursor()
+        for item_id, qty in sorted(qty_by_item.items()):
+            op_uuid = str(uuid.uuid5(ns, str(item_id)))
+            cur.callproc("sp_scrap_tool", (employee_id, item_id, str(qty), reason, op_uuid))
+        db_conn.commit()
+
+    _processed_ops.add(protocol_uuid)
+    return {"status": "success", "protocol_uuid": protocol_uuid, "lines": len(qty_by_item)}
@@ -0,0 +1,113 @@
+# app/infra/cache.py
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Iterator, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_MISSING = object()
+
+
+class LRUCache(Generic[K, V]):
+    """
+    Mały, bezpieczny wątkowo cache LRU (OrderedDict).
+    get() przesuwa wpis na koniec (ostatnio używany); put() po przekroczeniu
+    `maxsize` usuwa najdawniej używany wpis.
+    """
+
+    def __init__(self, maxsize: int = 128) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize musi być > 0")
+        self.maxsize = int(maxsize)
+        self._data: "OrderedDict[K, V]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K, default: Any = None) -> Any:
+        with self._lock:
+            val = self._data.get(key, _MISSING)
+            if val is _MISSING:
+                return default
+            self._data.move_to_end(key)
+            return val
+
+    def put(self, key: K, value: V) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: K, default: Any = None) -> Any:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def find(self, predicate: Callable[[K, V], bool]) -> Optional[Tuple[K, V]]:
+        """Najświeższy wpis spełniający predykat (bez zmiany kolejności LRU)."""
+        with self._lock:
+            for key in reversed(self._data):
+                val = self._data[key]
+                if predicate(key, val):
+                    return key, val
+        return None
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def __iter__(self) -> Iterator[K]:
+        with self._lock:
+            return iter(list(self._data))
+
+
+class TTLCache(LRUCache[K, V]):
+    """
+    LRUCache z czasem życia wpisów: wpis starszy niż `ttl_s` jest traktowany
+    jak brak (i usuwany przy odczycie). Rozmiar ograniczony jak w LRUCache.
+    `clock` do testów (domyślnie time.monotonic).
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 128,
+        ttl_s: float = 300.0,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        super().__init__(maxsize)
+        self.ttl_s = float(ttl_s)
+        self._clock = clock
+
+    def get(self, key: K, default: Any = None) -> Any:
+        entry = super().get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        expires, val = entry
+        if self._clock() >= expires:
+            self.pop(key)
+            return default
+        return val
+
+    def put(self, key: K, value: V, ttl_s: Optional[float] = None) -> None:
+        ttl = self.ttl_s if ttl_s is None else float(ttl_s)
+        super().put(key, (self._clock() + ttl, value))
+
+    def pop(self, key: K, default: Any = None) -> Any:
+        entry = super().pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def find(self, predicate: Callable[[K, V], bool]) -> Optional[Tuple[K, V]]:
+        now = self._clock()
+        hit = super().find(lambda k, e: now < e[0] and predicate(k, e[1]))
+        return (hit[0], hit[1][1]) if hit else None
@@ -22,6 +22,19 @@ class FeaturesSettings(BaseModel):
     exceptions_panel: bool = False
 
 
+class ReplicaSettings(BaseModel):
+    """Lokalna kopia kartoteki (SQLite) – app/dal/catalog_replica.py."""
+    enabled: bool = True
+    path: str = "cache/catalog.sqlite3"   # względem katalogu aplikacji
+    sync_interval_s: int = 300
+
+
+class ExceptionsSettings(BaseModel):
+    """Panel wyjątków – app/ui/exceptions_widget.py."""
+    poll_interval_s: int = 30   # sonda MAX(id) nowych wyjątków (0 = wyłączona)
+    default_days: int = 30      # zakres listy po otwarciu
+
+
 class AppSettings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix="WYD_", env_nested_delimiter="__")
     app_name: str = "Wydajnia Narzędzi"
@@ -31,6 +44,9 @@ class AppSettings(BaseSettings):
     log_sql: bool = False
     alerts: dict = Field(default_factory=dict)
     features: FeaturesSettings = Field(default_factory=FeaturesSettings)
+    replica: ReplicaSettings = Field(default_factory=ReplicaSettings)
+    exceptions: ExceptionsSettings = Field(default_factory=ExceptionsSettings)
+    startup_budget_ms: int = 2500   # docelowy czas do okna logowania (app/infra/startup.py)
 
 
 def load_settings(config_path: Path) -> AppSettings:
@@ -0,0 +1,64 @@
+# app/infra/events.py
+"""
+Prosta magistrala zdarzeń domenowych (publish/subscribe) w obrębie procesu.
+
+Tematy (kropkowane nazwy):
+  movements.changed  – wydanie / zwrot / import RW / złomowanie zmieniły stany
+                       (payload: source, item_ids – publikują metody księgujące
+                       AuthRepo / CheckoutService po commicie; bez item_ids –
+                       odbiorca sam ustala dotknięte towary)
+  employees.changed  – zmiana danych pracowników
+  stock.alerts_changed – zmiana zbioru alertów minimalnego stanu (StockAlertEngine)
+Subskrybent dostaje (temat, payload). Wywołanie jest synchroniczne w wątku
+publikującego – UI, które może dostać zdarzenie z wątku roboczego, przekazuje
+je dalej sygnałem Qt (patrz MainWindow._on_event).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any, Callable, Dict, List
+
+log = logging.getLogger(__name__)
+
+MOVEMENTS_CHANGED = "movements.changed"
+EMPLOYEES_CHANGED = "employees.changed"
+STOCK_ALERTS_CHANGED = "stock.alerts_changed"
+
+Handler = Callable[[str, Dict[str, Any]], None]
+
+
+class EventBus:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subs: Dict[str, List[Handler]] = {}
+
+    def subscribe(self, topic: str, handler: Handler) -> Callable[[], None]:
+        """Rejestruje handler; zwraca funkcję wyrejestrowującą."""
+        with self._lock:
+            self._subs.setdefault(topic, []).append(handler)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                subs = self._subs.get(topic, [])
+                if handler in subs:
+                    subs.remove(handler)
+
+        return unsubscribe
+
+    def publish(self, topic: str, **payload: Any) -> int:
+        """Wywołuje subskrybentów tematu; błąd jednego nie blokuje pozostałych."""
+        with self._lock:
+            subs = list(self._subs.get(topic, []))
+        log.debug("Zdarzenie %s %s -> %s subskr.", topic, payload, len(subs))
+        for h in subs:
+            try:
+                h(topic, payload)
+            except Exception:
+                log.exception("Błąd obsługi zdarzenia %s", topic)
+        return len(subs)
+
+
+bus = EventBus()
+subscribe = bus.subscribe
+publish = bus.publish
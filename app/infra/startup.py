@@ -0,0 +1,105 @@
+# app/infra/startup.py
+"""
+Profil startu aplikacji: czasy importów i faz inicjalizacji aż do pokazania
+okna logowania (time-to-login-window).
+
+    from app.infra.startup import profiler
+    with profiler.phase("config"):
+        ...
+    profiler.mark("login_window")
+    profiler.report(budget_ms=settings.startup_budget_ms)
+
+Raport trafia do logu, a pojedynczy wiersz JSON do logs/startup_profile.jsonl
+(porównanie kolejnych uruchomień / stanowisk).
+"""
+from __future__ import annotations
+
+import importlib
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    def __init__(self) -> None:
+        self.t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        # (nazwa, początek ms od t0, czas trwania ms, wątek)
+        self.phases: List[Tuple[str, float, float, str]] = []
+        self.marks: Dict[str, float] = {}
+
+    def _now_ms(self) -> float:
+        return (time.perf_counter() - self.t0) * 1000.0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = self._now_ms()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append(
+                    (name, start, self._now_ms() - start, threading.current_thread().name)
+                )
+
+    def mark(self, name: str) -> float:
+        """Punkt na osi czasu (ms od startu procesu profilera)."""
+        t = self._now_ms()
+        with self._lock:
+            self.marks.setdefault(name, t)
+        return t
+
+    def import_module(self, name: str):
+        """Import z pomiarem czasu (faza 'import:<moduł>')."""
+        with self.phase(f"import:{name}"):
+            return importlib.import_module(name)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "ts": datetime.now().isoformat(timespec="seconds"),
+                "marks": {k: round(v, 1) for k, v in self.marks.items()},
+                "phases": [
+                    {"name": n, "start_ms": round(s, 1), "ms": round(d, 1), "thread": th}
+                    for n, s, d, th in sorted(self.phases, key=lambda p: p[1])
+                ],
+            }
+
+    def report(
+        self,
+        *,
+        target: str = "login_window",
+        budget_ms: Optional[float] = None,
+        out_path: Optional[Path] = None,
+    ) -> Optional[float]:
+        """Loguje fazy i czas do `target`; ostrzega przy przekroczeniu budżetu."""
+        data = self.summary()
+        for p in data["phases"]:
+            log.info(
+                "Start: %-32s %8.1f ms (od %7.1f ms, %s)",
+                p["name"], p["ms"], p["start_ms"], p["thread"],
+            )
+        total = data["marks"].get(target)
+        if total is not None:
+            if budget_ms and total > budget_ms:
+                log.warning("Start: %s po %.0f ms – przekroczony budżet %.0f ms", target, total, budget_ms)
+            else:
+                log.info("Start: %s po %.0f ms (budżet %s ms)", target, total, budget_ms or "—")
+        if out_path is not None:
+            try:
+                out_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(out_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({**data, "budget_ms": budget_ms}, ensure_ascii=False) + "\n")
+            except OSError:
+                log.exception("Nie udało się zapisać profilu startu: %s", out_path)
+        return total
+
+
+profiler = StartupProfiler()
@@ -3,28 +3,35 @@ from __future__ import annotations
 
 import logging
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 
-from PySide6.QtCore import QTimer
-from PySide6.QtGui import QKeySequence, QShortcut
-from PySide6.QtWidgets import QApplication, QFileDialog, QMessageBox
-
 # pozwala uruchamiać main.py bezpośrednio (Run Python File)
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from app.core.auth import AuthRepo  # noqa: E402
-from app.core.rfid_stub import RFIDReader  # noqa: E402
-from app.dal.db import create_engine_and_session, ping  # noqa: E402
-from app.infra.config import load_settings  # noqa: E402
-from app.infra.logging import (  # noqa: E402
-    set_station,
-    set_user,
-    setup_logging,
+from app.infra.startup import profiler  # noqa: E402  – pierwszy: t0 profilu startu
+
+with profiler.phase("import:PySide6"):
+    from PySide6.QtCore import QEventLoop, Qt, QTimer  # noqa: E402
+    from PySide6.QtGui import QColor, QKeySequence, QPixmap, QShortcut  # noqa: E402
+    from PySide6.QtWidgets import QApplication, QFileDialog, QMessageBox, QSplashScreen  # noqa: E402
+
+with profiler.phase("import:config+logging"):
+    from app.infra.config import load_settings  # noqa: E402
+    from app.infra.logging import (  # noqa: E402
+        set_station,
+        set_user,
+        setup_logging,
+    )
+
+# Reszta (SQLAlchemy, repozytoria, UI) ładowana w _warmup_* równolegle za splashem;
+# stos PDF (pdfplumber/PyPDF2) dopiero przy pierwszym imporcie RW.
+UI_MODULES = (
+    "app.ui.login_dialog",
+    "app.ui.shell",
+    "app.core.rfid_stub",
 )
-from app.repo.reports_repo import ReportsRepo  # noqa: E402
-from app.services.rw.importer import import_rw_pdf  # noqa: E402
-from app.ui.login_dialog import LoginDialog  # noqa: E402
-from app.ui.shell import MainWindow, apply_theme  # noqa: E402
 
 log = logging.getLogger(__name__)
 
@@ -49,6 +56,9 @@ def _do_import_rw(
      - import RW przez app.services.rw.importer.import_rw_pdf
      - komunikaty o brakach / sukcesie
     """
+    with profiler.phase("import:rw_importer"):
+        from app.services.rw.importer import import_rw_pdf  # stos PDF – tylko tutaj
+
     dlg = QFileDialog(parent_window)
     dlg.setWindowTitle("Wybierz plik RW (PDF)")
     dlg.setFileMode(QFileDialog.ExistingFile)
@@ -135,10 +145,100 @@ def _do_import_rw(
     log.info("Import RW zakończony powodzeniem")
 
 
+def _start_replica(app, engine, base_dir: Path, settings):
+    """Lokalna kopia kartoteki (SQLite) + synchronizacja w tle; błąd = praca bez repliki."""
+    if not settings.replica.enabled:
+        return None
+    from app.dal.catalog_replica import CatalogReplica
+
+    try:
+        replica = CatalogReplica(
+            engine,
+            base_dir / settings.replica.path,
+            interval_s=settings.replica.sync_interval_s,
+        )
+    except Exception:
+        log.exception("Replika kartoteki niedostępna – odczyty z DB")
+        return None
+    replica.start()
+    app.aboutToQuit.connect(replica.stop)
+    return replica
+
+
+def _reindex_catalog(engine) -> None:
+    """Indeks wyszukiwania dla towarów bez search_key (po migracji / spoza aplikacji) – w tle."""
+
+    def run():
+        from app.dal.catalog_search import reindex_missing
+
+        try:
+            with engine.begin() as conn:
+                n = reindex_missing(conn)
+            if n:
+                log.info("Kartoteka: zindeksowano %s towarów bez search_key", n)
+        except Exception:
+            log.exception("Kartoteka: indeksowanie brakujących towarów nieudane")
+
+    threading.Thread(target=run, name="catalog-reindex", daemon=True).start()
+
+
+def _db_cfg(settings) -> dict:
+    # Konfiguracja DB dla create_engine_and_session (bezpieczne URL.create pod spodem)
+    return {
+        "db": {
+            "host": settings.db.host,
+            "port": settings.db.port,
+            "user": settings.db.user,
+            "password": settings.db.password,
+            "database": settings.db.database,
+        }
+    }
+
+
+def _warmup_db(settings):
+    """Wątek startowy: SQLAlchemy + silnik + healthcheck (SELECT 1) – jeden ping na start."""
+    with profiler.phase("import:sqlalchemy+dal"):
+        from app.dal.db import create_engine_and_session, ping
+    cfg = _db_cfg(settings)
+    with profiler.phase("db:engine"):
+        engine, _ = create_engine_and_session(cfg, log_sql=settings.log_sql)
+    with profiler.phase("db:ping"):
+        ping(engine)
+    return cfg, engine
+
+
+def _warmup_ui():
+    """Wątek startowy: import modułów UI (bez tworzenia widżetów – to tylko w wątku GUI)."""
+    for name in UI_MODULES:
+        profiler.import_module(name)
+
+
+def _splash(app) -> QSplashScreen:
+    pm = QPixmap(420, 140)
+    pm.fill(QColor("#1f2329"))
+    splash = QSplashScreen(pm)
+    splash.show()
+    splash.showMessage(
+        "Wydajnia Narzędzi\nŁączenie z bazą danych…",
+        Qt.AlignCenter,
+        QColor("white"),
+    )
+    app.processEvents()
+    return splash
+
+
+def _wait_responsive(app, futures) -> None:
+    """Czeka na zadania startowe, obsługując zdarzenia (splash nie „zamarza”)."""
+    while wait(futures, timeout=0.03).not_done:
+        app.processEvents(QEventLoop.AllEvents, 30)
+
+
 def main():
     base_dir = Path(__file__).resolve().parents[1]
+    profile_only = "--startup-profile" in sys.argv  # pomiar: wyjście po pokazaniu okna logowania
 
-    app = QApplication(sys.argv)
+    with profiler.phase("qt:application"):
+        app = QApplication(sys.argv)
 
     # --- Wczytanie configu
     config_path = base_dir / "config" / "app.json"
@@ -153,7 +253,8 @@ def main():
         )
         sys.exit(2)
 
-    settings = load_settings(config_path)
+    with profiler.phase("config"):
+        settings = load_settings(config_path)
     setup_logging(
         app_name="Wydajnia Narzędzi",
         station=settings.workstation_id or "UNKNOWN",
@@ -175,40 +276,77 @@ def main():
         settings.workstation_id,
     )
 
-    # --- Inicjalizacja repo / połączenie z DB (healthcheck przez SELECT 1)
+    # --- Rozgrzewka równoległa: DB (silnik + ping) i importy UI
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup") as pool:
+        f_db = pool.submit(_warmup_db, settings)
+        f_ui = pool.submit(_warmup_ui)
+        # pierwszy render (inicjalizacja fontów) idzie równolegle z łączeniem
+        with profiler.phase("qt:splash"):
+            splash = _splash(app)
+        _wait_responsive(app, [f_db, f_ui])
+    f_ui.result()  # błąd importu UI = błąd instalacji – niech się zgłosi
+
+    from app.ui.login_dialog import LoginDialog
+    from app.ui.shell import MainWindow, apply_theme
+    from app.core.rfid_stub import RFIDReader
+
+    # --- Inicjalizacja repo na wspólnym silniku
     repo = None
     reports_repo = None
+    alert_engine = None
     db_ok = False
     db_error = None
     try:
-        # Konfiguracja DB dla create_engine_and_session
-        # (bezpieczne URL.create pod spodem)
-        cfg = {
-            "db": {
-                "host": settings.db.host,
-                "port": settings.db.port,
-                "user": settings.db.user,
-                "password": settings.db.password,
-                "database": settings.db.database,
-            }
-        }
-        engine, _ = create_engine_and_session(cfg, log_sql=settings.log_sql)
-        ping(engine)  # SELECT 1
-        repo = AuthRepo(cfg)
-        reports_repo = ReportsRepo(engine)  # <-- tworzymy repo raportów
+        cfg, engine = f_db.result()
+        with profiler.phase("repos"):
+            from app.appsvc.alerts import StockAlertEngine
+            from app.appsvc.reservations import ReservationSweeper
+            from app.core.auth import AuthRepo
+            from app.repo.reports_repo import ReportsRepo
+
+            replica = _start_replica(app, engine, base_dir, settings)
+            _reindex_catalog(engine)
+            repo = AuthRepo(cfg, engine=engine, replica=replica)  # bez drugiego silnika i pingu
+            reports_repo = ReportsRepo(engine, replica=replica)  # <-- tworzymy repo raportów
         db_ok = True
         log.info("Połączenie z DB: OK")
+        # porzucone koszyki: wygaszanie sesji i zwalnianie rezerwacji w tle
+        sweeper = ReservationSweeper(engine)
+        sweeper.start()
+        app.aboutToQuit.connect(sweeper.stop)
+        # alerty minimalnego stanu: sprawdzane po każdym ruchu (movements.changed)
+        try:
+            alert_engine = StockAlertEngine(engine)
+            alert_engine.start()
+            app.aboutToQuit.connect(alert_engine.stop)
+        except Exception:
+            alert_engine = None
+            log.exception("Alerty stanów niedostępne (brak tabeli stock_alerts?)")
     except Exception as e:
         db_error = str(e)
         log.error("Błąd połączenia z DB – start w trybie offline", exc_info=e)
 
     # --- Motyw UI
-    apply_theme(settings.theme)
+    with profiler.phase("theme"):
+        apply_theme(settings.theme)
+    splash.close()
+
+    def _startup_done(target: str, dlg=None):
+        profiler.mark(target)
+        profiler.report(
+            target=target,
+            budget_ms=settings.startup_budget_ms,
+            out_path=base_dir / "logs" / "startup_profile.jsonl",
+        )
+        if profile_only and dlg is not None:
+            dlg.reject()
 
     # --- Logowanie (tylko gdy DB i repo gotowe)
     session_data = None
     if db_ok and repo:
         login_dlg = LoginDialog(repo=repo, station_id=settings.workstation_id)
+        # pierwszy obieg pętli zdarzeń dialogu = okno logowania jest na ekranie
+        QTimer.singleShot(0, lambda: _startup_done("login_window", login_dlg))
         if login_dlg.exec() == LoginDialog.Accepted:
             session_data = login_dlg.session or {}
             name = _display_name(session_data)
@@ -233,9 +371,14 @@ def main():
         reports_repo=reports_repo,  # <-- przekazujemy ReportsRepo do UI
         settings=settings,  # konfiguracja do UI
         rfid_reader=rfid_reader,  # stub czytnika
+        alerts=alert_engine,
     )
     win.request_logout.connect(win.handle_logout)
     win.show()
+    if not db_ok:
+        QTimer.singleShot(0, lambda: _startup_done("main_window"))
+        if profile_only:
+            QTimer.singleShot(0, app.quit)
 
     # komunikat o trybie offline
     if not db_ok and db_error:
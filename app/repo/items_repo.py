@@ -5,53 +5,60 @@ from sqlalchemy import text
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.engine import Engine
 
+from app.dal.catalog_search import ranked_search
+
 
 class ItemsRepo:
     """Repository for basic items lookups."""
 
-    def __init__(self, engine: Engine):
+    def __init__(self, engine: Engine, *, replica=None):
         self.engine = engine
+        self.replica = replica  # CatalogReplica | None – odczyty kartoteki lokalnie
 
     # ---------- API ----------
     def find_items(self, q: str, limit: int = 200) -> list[dict]:
         """Wyszukiwanie po SKU/kodzie lub nazwie, zgodnie ze schematem (sku/code, unit/uom).
 
         Zwracamy zawsze klucze: id, sku, name (sku jest aliasem na code, jeżeli brak kolumny sku).
+        Dopasowanie po indeksie kartoteki (catalog_search): dokładny kod, prefiks, podciąg.
         """
         q = q or ""
+        if self.replica is not None and self.replica.ready:
+            return [
+                {"id": r["id"], "sku": r["sku"], "name": r["name"]}
+                for r in self.replica.find_items(q, limit)
+            ]
         with self.engine.connect() as conn:
             try:
-                sql = text(
-                    """
-                    SELECT id, sku, name
-                      FROM items
-                     WHERE (sku LIKE CONCAT('%', :q, '%') OR name LIKE CONCAT('%', :q, '%'))
-                     ORDER BY sku
+                sql = """
+                    SELECT i.id, i.sku, i.name
+                      FROM items i
+                     WHERE {match}
+                     ORDER BY {rank}, i.sku
                      LIMIT :lim
-                    """
-                )
-                rows = conn.execute(sql, {"q": q, "lim": int(limit)}).mappings().all()
-                return [dict(r) for r in rows]
+                """
+                return ranked_search(conn, sql, q, limit=limit, code_col="sku")
             except OperationalError:
                 # fallback na kolumny 'code' i alias do 'sku'
-                sql = text(
-                    """
-                    SELECT id, code AS sku, NULLIF(TRIM(name),'') AS name
-                      FROM items
-                     WHERE (code LIKE CONCAT('%', :q, '%') OR name LIKE CONCAT('%', :q, '%'))
-                     ORDER BY code
+                sql = """
+                    SELECT i.id, i.code AS sku, NULLIF(TRIM(i.name),'') AS name
+                      FROM items i
+                     WHERE {match}
+                     ORDER BY {rank}, i.code
                      LIMIT :lim
-                    """
-                )
-                rows = conn.execute(sql, {"q": q, "lim": int(limit)}).mappings().all()
-                return [dict(r) for r in rows]
+                """
+                return ranked_search(conn, sql, q, limit=limit, code_col="code")
 
     def get_item_by_sku(self, sku: str) -> dict | None:
         """Zwraca dict z ``id``, ``name``, ``uom`` i ``sku``."""
         sku = (sku or "").strip()
         if not sku:
             return None
-        
+        if self.replica is not None and self.replica.ready:
+            item = self.replica.get_item_by_code(sku)
+            if item:
+                return {"id": item["id"], "name": item["name"], "uom": item["uom"], "sku": item["sku"]}
+
         params = {"sku": sku}
         with self.engine.connect() as conn:
             try:
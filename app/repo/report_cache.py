@@ -0,0 +1,140 @@
+# app/repo/report_cache.py
+"""
+Cache wyników raportów (ReportsRepo) unieważniany „znakiem wysokiej wody”.
+
+Klucz: (nazwa raportu, znormalizowane parametry). Przed każdym odczytem
+wykonywane jest jedno tanie zapytanie o MAX(id) z movements / transactions /
+documents – jeśli którakolwiek wartość wzrosła, cały cache jest czyszczony.
+Powtórne otwarcie raportu kosztuje więc jeden round-trip, dopóki dane się
+nie zmienią.
+
+Metody repozytorium oznacza się dekoratorem @cached_report("nazwa");
+parametry wywołania (z domyślnymi) tworzą klucz. Repo bez `self.cache`
+(None) działa bez cache.
+
+Uwaga: MAX(id) wykrywa tylko nowe wiersze (wydania, zwroty, importy RW).
+Zmiany przez UPDATE/DELETE bez nowych operacji pokrywa TTL wpisu.
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+import logging
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Mapping
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.infra.cache import TTLCache
+
+log = logging.getLogger(__name__)
+
+WATERMARK_SQL = text(
+    """
+    SELECT
+      (SELECT COALESCE(MAX(id), 0) FROM movements)    AS movements,
+      (SELECT COALESCE(MAX(id), 0) FROM transactions) AS transactions,
+      (SELECT COALESCE(MAX(id), 0) FROM documents)    AS documents
+    """
+)
+
+
+def _norm(v: Any) -> Any:
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return str(v)
+    if isinstance(v, (list, tuple)):
+        return tuple(_norm(x) for x in v)
+    return v
+
+
+def cache_key(report: str, params: Mapping[str, Any]) -> tuple:
+    """(raport, posortowane parametry) – daty jako ISO, listy jako krotki."""
+    return (report, tuple(sorted((k, _norm(v)) for k, v in params.items())))
+
+
+def _copy(result: Any) -> Any:
+    """Płytka kopia wierszy – wywołujący może modyfikować słowniki bez psucia cache."""
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], list):
+        rows, bookmark = result
+        return [dict(r) for r in rows], bookmark
+    if isinstance(result, list):
+        return [dict(r) if isinstance(r, dict) else r for r in result]
+    return result
+
+
+class ReportCache:
+    def __init__(self, engine: Engine, *, maxsize: int = 64, ttl_s: float = 300.0) -> None:
+        self.engine = engine
+        self._cache: TTLCache[tuple, Any] = TTLCache(maxsize, ttl_s)
+        self._lock = threading.Lock()
+        self._mark: tuple | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def watermark(self) -> tuple:
+        with self.engine.connect() as conn:
+            row = conn.execute(WATERMARK_SQL).one()
+        return tuple(int(x or 0) for x in row)
+
+    def _check(self) -> bool:
+        """Aktualizuje znak wody; False = nie da się go ustalić (omijamy cache)."""
+        try:
+            mark = self.watermark()
+        except Exception:
+            log.debug("Cache raportów: brak znaku wody – odczyt bez cache", exc_info=True)
+            return False
+        with self._lock:
+            if mark != self._mark:
+                if self._mark is not None:
+                    log.debug("Cache raportów: nowe dane %s -> %s, czyszczę", self._mark, mark)
+                self._cache.clear()
+                self._mark = mark
+        return True
+
+    def get_or_load(self, report: str, params: Mapping[str, Any], loader: Callable[[], Any]) -> Any:
+        if not self._check():
+            return loader()
+        key = cache_key(report, params)
+        mark = self._mark
+        hit = self._cache.get(key)
+        if hit is not None:
+            self.hits += 1
+            return _copy(hit)
+        self.misses += 1
+        result = loader()
+        with self._lock:
+            # wynik policzony przy starym znaku wody nie trafia do cache
+            if self._mark == mark:
+                self._cache.put(key, _copy(result))
+        return result
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._mark = None
+
+
+def cached_report(report: str):
+    """Dekorator metody repo: wynik przez `self.cache` (ReportCache | None)."""
+
+    def deco(fn):
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            cache = getattr(self, "cache", None)
+            if cache is None:
+                return fn(self, *args, **kwargs)
+            bound = sig.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            params = {k: v for k, v in bound.arguments.items() if k != "self"}
+            return cache.get_or_load(report, params, lambda: fn(self, *args, **kwargs))
+
+        return wrapper
+
+    return deco
@@ -5,16 +5,36 @@ from datetime import date, datetime
 from typing import Iterable
 
 import logging
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import ProgrammingError
+
+from app.dal import consumption_facts
+from app.dal.keyset import keyset_where, next_bookmark
+from app.dal.stream import stream_query
+from app.repo.report_cache import ReportCache, cached_report
 
 log = logging.getLogger(__name__)
 
+ER_NO_SUCH_TABLE = 1146  # MariaDB: Table '...' doesn't exist
+
+
+def _missing_table(exc: ProgrammingError) -> bool:
+    orig = getattr(exc, "orig", None)
+    return bool(orig is not None and orig.args and orig.args[0] == ER_NO_SUCH_TABLE)
+
 
 class ReportsRepo:
-    def __init__(self, engine: Engine):
+    def __init__(self, engine: Engine, *, replica=None, cache: ReportCache | None | bool = True):
         self.engine = engine
+        self.replica = replica  # CatalogReplica | None – lista pracowników lokalnie
+        # cache wyników raportów (True = domyślny, False/None = wyłączony)
+        self.cache: ReportCache | None = (
+            ReportCache(engine) if cache is True else (cache or None)
+        )
         self._ts_cache: dict[str, str | None] = {}  # view_name -> ts col or None
+        # False po 1146 na employee_item_summary (baza bez migracji) – karta z widoku
+        self._card_summary = True
 
     # ---------- helpers ----------
     def _detect_ts_col(self, view_name: str, candidates: Iterable[str]) -> str | None:
@@ -48,6 +68,7 @@ class ReportsRepo:
         return None
 
     # ---------- API ----------
+    @cached_report("rw_summary")
     def rw_summary(
         self,
         date_from: datetime | date,
@@ -75,6 +96,36 @@ class ReportsRepo:
             )
         return [dict(r) for r in rows]
 
+    @cached_report("rw_summary_page")
+    def rw_summary_page(
+        self,
+        date_from: datetime | date,
+        date_to: datetime | date,
+        after: tuple | None = None,
+        limit: int = 200,
+    ) -> tuple[list[dict], tuple | None]:
+        """Jak rw_summary, stronicowane kluczem (rw_date, rw_id, item_id) malejąco."""
+        keys = ("rw_date", "rw_id", "item_id")
+        cond, kp = keyset_where(keys, after)
+        sql = text(
+            f"""
+            SELECT *
+            FROM vw_rw_summary
+            WHERE rw_date >= :df
+              AND rw_date <  :dt
+              AND {cond}
+            ORDER BY rw_date DESC, rw_id DESC, item_id DESC
+            LIMIT :lim
+            """
+        )
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                sql, {"df": date_from, "dt": date_to, "lim": int(limit), **kp}
+            ).mappings().all()
+        out = [dict(r) for r in rows]
+        return out, next_bookmark(out, keys, limit)
+
+    @cached_report("exceptions")
     def exceptions(
         self,
         date_from: datetime | date,
@@ -111,7 +162,152 @@ class ReportsRepo:
             rows = conn.execute(sql, params).mappings().all()
         return [dict(r) for r in rows]
 
+    @cached_report("exceptions_page")
+    def exceptions_page(
+        self,
+        date_from: datetime | date,
+        date_to: datetime | date,
+        employee_id: int | None = None,
+        item_id: int | None = None,
+        after: tuple | None = None,
+        limit: int = 200,
+    ) -> tuple[list[dict], tuple | None]:
+        """Jak exceptions, stronicowane kluczem (created_at, operation_uuid, item_id) malejąco."""
+        keys = ("created_at", "operation_uuid", "item_id")
+        cond, kp = keyset_where(keys, after)
+        sql = text(
+            f"""
+            SELECT *
+            FROM vw_exceptions
+            WHERE created_at >= :df
+              AND created_at <  :dt
+              AND (:emp IS NULL OR employee_id = :emp)
+              AND (:itm IS NULL OR item_id = :itm)
+              AND {cond}
+            ORDER BY created_at DESC, operation_uuid DESC, item_id DESC
+            LIMIT :lim
+            """
+        )
+        params = {
+            "df": date_from,
+            "dt": date_to,
+            "emp": employee_id,
+            "itm": item_id,
+            "lim": int(limit),
+            **kp,
+        }
+        with self.engine.connect() as conn:
+            rows = conn.execute(sql, params).mappings().all()
+        out = [dict(r) for r in rows]
+        return out, next_bookmark(out, keys, limit)
+
+    def refresh_consumption_facts(self) -> int:
+        """
+        Dolicza do fact_consumption_monthly ruchy nowsze niż znak wody (akcja
+        „Odśwież” / zadanie okresowe, jak tools/consumption_facts.py refresh).
+        Błąd (np. brak uprawnień do zapisu) przechodzi do wołającego. Zwraca znak wody.
+        """
+        with self.engine.begin() as conn:
+            return consumption_facts.refresh(conn)
+
+    def monthly_consumption(
+        self,
+        date_from: datetime | date,
+        date_to: datetime | date,
+        employee_id: int | None = None,
+        item_id: int | None = None,
+        movement_types: Iterable[str] = ("ISSUE", "RETURN", "SCRAP"),
+        refresh: bool = False,
+    ) -> list[dict]:
+        """
+        Zużycie miesięczne z tabeli faktów (fact_consumption_monthly) – miesiące
+        [date_from, date_to), opcjonalnie dla pracownika / towaru. Sam odczyt:
+        fakty dolicza narzędzie / zadanie okresowe albo refresh=True
+        (refresh_consumption_facts – błąd odświeżenia nie jest ukrywany).
+        """
+        if refresh:
+            self.refresh_consumption_facts()
+        types = list(movement_types)
+        sql = text(
+            """
+            SELECT f.month, f.item_id, i.code, i.name, f.employee_id, f.movement_type,
+                   f.qty, f.value_fifo, f.movements
+            FROM fact_consumption_monthly f
+            LEFT JOIN items i ON i.id = f.item_id
+            WHERE f.month >= :mf
+              AND f.month <  :mt
+              AND (:emp IS NULL OR f.employee_id = :emp)
+              AND (:itm IS NULL OR f.item_id = :itm)
+              AND f.movement_type IN :types
+            ORDER BY f.month, i.name, f.employee_id, f.movement_type
+            """
+        ).bindparams(bindparam("types", expanding=True))
+        params = {
+            "mf": consumption_facts.month_start(date_from),
+            "mt": consumption_facts.month_start(date_to),
+            "emp": employee_id,
+            "itm": item_id,
+            "types": types,
+        }
+        with self.engine.connect() as conn:
+            rows = conn.execute(sql, params).mappings().all()
+        return [dict(r) for r in rows]
+
+    # ---------- Eksport (kursor strumieniowy, bez limitu) ----------
+    def iter_rw_summary(self, date_from: datetime | date, date_to: datetime | date):
+        return stream_query(
+            self.engine,
+            """
+            SELECT *
+            FROM vw_rw_summary
+            WHERE rw_date >= :df
+              AND rw_date <  :dt
+            ORDER BY rw_date DESC, rw_id DESC, item_id DESC
+            """,
+            {"df": date_from, "dt": date_to},
+        )
+
+    def iter_exceptions(
+        self,
+        date_from: datetime | date,
+        date_to: datetime | date,
+        employee_id: int | None = None,
+        item_id: int | None = None,
+    ):
+        return stream_query(
+            self.engine,
+            """
+            SELECT *
+            FROM vw_exceptions
+            WHERE created_at >= :df
+              AND created_at <  :dt
+              AND (:emp IS NULL OR employee_id = :emp)
+              AND (:itm IS NULL OR item_id = :itm)
+            ORDER BY created_at DESC, operation_uuid DESC, item_id DESC
+            """,
+            {"df": date_from, "dt": date_to, "emp": employee_id, "itm": item_id},
+        )
+
+    def iter_audit_logs(self, date_from: datetime | date, date_to: datetime | date):
+        """Dziennik audytu (audit_logs) za okres – eksport CSV/PDF."""
+        return stream_query(
+            self.engine,
+            """
+            SELECT id, ts, os_user, workstation_id, action, result, details
+            FROM audit_logs
+            WHERE ts >= :df
+              AND ts <  :dt
+            ORDER BY ts, id
+            """,
+            {"df": date_from, "dt": date_to},
+        )
+
     def employees(self, q: str = "", limit: int = 200) -> list[dict]:
+        if self.replica is not None and self.replica.ready:
+            try:
+                return self.replica.employees(q, limit)
+            except Exception:
+                log.exception("Replika: błąd odczytu pracowników – odczyt z DB")
         sql = text(
             """
             SELECT id, first_name, last_name, username AS login, rfid_uid
@@ -136,12 +332,25 @@ class ReportsRepo:
             )
         return [dict(r) for r in rows]
 
+    @cached_report("employee_card")
     def employee_card(self, employee_id: int, date_from: datetime | date, date_to: datetime | date) -> list[dict]:
         """Karta pracownika — filtruje po ``last_op``.
 
-        Zwraca rekordy z widoku ``vw_employee_card`` dla wskazanego pracownika,
-        których ``last_op`` mieści się w przedziale ``[date_from, date_to)``.
+        Czyta podsumowanie ``employee_item_summary`` (utrzymywane triggerami
+        na transaction_items) po indeksie (employee_id, last_op) – koszt nie
+        zależy od rozmiaru historii firmy. Gdy tabeli brak (baza bez migracji,
+        błąd 1146), repo zapamiętuje to i dalej czyta widok ``vw_employee_card``.
         """
+        params = {"emp": int(employee_id), "df": date_from, "dt": date_to}
+        if self._card_summary:
+            try:
+                return self._employee_card_summary(params)
+            except ProgrammingError as exc:
+                if not _missing_table(exc):
+                    raise
+                log.warning("Brak employee_item_summary – karta pracownika z vw_employee_card")
+                self._card_summary = False
+
         sql = text(
             """
             SELECT *
@@ -152,8 +361,59 @@ class ReportsRepo:
             ORDER BY last_op DESC, item_id DESC
             """
         )
-        params = {"emp": int(employee_id), "df": date_from, "dt": date_to}
+        with self.engine.connect() as conn:
+            rows = conn.execute(sql, params).mappings().all()
+        return [dict(r) for r in rows]
 
+    def _employee_card_summary(self, params: dict) -> list[dict]:
+        sql = text(
+            """
+            SELECT s.employee_id, e.first_name, e.last_name, s.item_id,
+                   s.balance_qty, s.first_op, s.last_op
+            FROM employee_item_summary s
+            JOIN employees e ON e.id = s.employee_id
+            WHERE s.employee_id = :emp
+              AND s.last_op >= :df
+              AND s.last_op <  :dt
+            ORDER BY s.last_op DESC, s.item_id DESC
+            """
+        )
         with self.engine.connect() as conn:
             rows = conn.execute(sql, params).mappings().all()
         return [dict(r) for r in rows]
+
+    @cached_report("employee_history_page")
+    def employee_history_page(
+        self,
+        employee_id: int,
+        date_from: datetime | date,
+        date_to: datetime | date,
+        after: tuple | None = None,
+        limit: int = 200,
+    ) -> tuple[list[dict], tuple | None]:
+        """
+        Historia operacji pracownika (pozycje transakcji), stronicowana kluczem
+        (created_at, id, item_id) malejąco – zakres w idx_transactions_emp_created.
+        """
+        keys = ("created_at", "id", "item_id")
+        cond, kp = keyset_where(("t.created_at", "t.id", "ti.item_id"), after)
+        sql = text(
+            f"""
+            SELECT t.created_at, t.id, ti.item_id, i.name AS item,
+                   ti.direction, ti.quantity, t.movement_type, t.operation_uuid
+            FROM transactions t
+            JOIN transaction_items ti ON ti.operation_uuid = t.operation_uuid
+            LEFT JOIN items i ON i.id = ti.item_id
+            WHERE t.employee_id = :emp
+              AND t.created_at >= :df
+              AND t.created_at <  :dt
+              AND {cond}
+            ORDER BY t.created_at DESC, t.id DESC, ti.item_id DESC
+            LIMIT :lim
+            """
+        )
+        params = {"emp": int(employee_id), "df": date_from, "dt": date_to, "lim": int(limit), **kp}
+        with self.engine.connect() as conn:
+            rows = conn.execute(sql, params).mappings().all()
+        out = [dict(r) for r in rows]
+        return out, next_bookmark(out, keys, limit)
@@ -15,6 +15,11 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtCore import Qt
 
+# pozwala uruchamiać skrypt bezpośrednio (python app/scripts/import_rw_gui.py)
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from app.ui.widgets.typeahead import TypeaheadController, filter_items  # noqa: E402
+
 # ============================
 #   PDF extract (plumber→PyPDF2)
 # ============================
@@ -350,7 +355,6 @@ class RWMapDialog(QDialog):
         top = QHBoxLayout()
         top.addWidget(QLabel("Filtr listy towarów:"))
         self.ed_filter = QLineEdit()
-        self.ed_filter.textChanged.connect(self._refill_combos)
         top.addWidget(self.ed_filter, 1)
         lay.addLayout(top)
 
@@ -360,7 +364,6 @@ class RWMapDialog(QDialog):
         self.table.setColumnWidth(3, 70);  self.table.setColumnWidth(4, 320)
         self.table.setColumnWidth(5, 120)
 
-        self._all_items = self._load_items("")
         self._combo_widgets: List[QComboBox] = []
 
         for r, it in enumerate(unresolved_items):
@@ -383,20 +386,25 @@ class RWMapDialog(QDialog):
         btns.accepted.connect(self._on_ok); btns.rejected.connect(self.reject)
         lay.addWidget(btns)
 
-        self._refill_combos()
+        # filtr -> zapytanie w tle (debounce), combosy odświeżane po wyniku
+        self.search = TypeaheadController(self._load_items, parent=self)
+        self.search.bind(self.ed_filter)
+        self.search.results.connect(lambda q, items: self._refill_combos(items))
+        self.search.failed.connect(
+            lambda q, msg: QMessageBox.warning(self, "Błąd", f"Nie udało się pobrać towarów:\n{msg}")
+        )
+        self.search.submit("")
 
     def _load_items(self, q: str) -> List[dict]:
+        # wołane w wątku puli – bez dostępu do widżetów
         if hasattr(self.repo, "search_items"):
             return self.repo.search_items(q) or []
         if hasattr(self.repo, "list_all_items"):
-            return self.repo.list_all_items() or []
+            items = self.repo.list_all_items() or []
+            return filter_items(items, q)
         return []
 
-    def _refill_combos(self):
-        flt = (self.ed_filter.text() or "").strip().lower()
-        items = self._all_items
-        if flt:
-            items = [x for x in items if flt in (x.get("sku","") + " " + x.get("name","")).lower()]
+    def _refill_combos(self, items: List[dict]):
         for combo in self._combo_widgets:
             cur = combo.currentData() if combo.count() else None
             combo.blockSignals(True); combo.clear()
@@ -422,8 +430,8 @@ class RWMapDialog(QDialog):
             new_id = self.repo.create_item(sku_n, name_n, uom_n)
         except Exception as e:
             QMessageBox.critical(self, "Błąd", f"Nie udało się utworzyć towaru:\n{e}"); return
-        self._all_items = self._load_items("")
-        self._refill_combos()
+        self.search.invalidate()
+        self._refill_combos(self._load_items(self.ed_filter.text().strip()))
         combo = self._combo_widgets[row]
         ix = combo.findData(new_id)
         if ix >= 0: combo.setCurrentIndex(ix)
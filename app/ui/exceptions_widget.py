@@ -1,12 +1,16 @@
 # app/ui/exceptions_widget.py
 from __future__ import annotations
 
+from datetime import datetime, timedelta
 from typing import TYPE_CHECKING
 from PySide6 import QtWidgets, QtCore
 from PySide6.QtWidgets import QWidget
-import csv
 import logging
 
+from app.ui.table_model import LazyTableModel
+from app.ui.widgets.export_runner import start_export
+from app.ui.widgets.query_runner import query_runner
+
 log = logging.getLogger(__name__)
 
 if TYPE_CHECKING:
@@ -15,11 +19,37 @@ if TYPE_CHECKING:
 
 
 class ExceptionsWidget(QWidget):
-    """Panel wyświetlający operacje oznaczone jako issued_without_return."""
+    """
+    Panel wyświetlający operacje oznaczone jako issued_without_return.
+
+    refresh() – pełne przeładowanie (ostatnie `days` dni), zapamiętuje znak wody
+    (ExceptionsRepo.max_id); poll() – dociąga tylko wyjątki o id > znak wody
+    i wstawia je na górze listy. Sygnał `seen` = znak wody po załadowaniu.
+    Transakcja oznaczona wyjątkiem później (UPDATE flagi) ma stare id – poll()
+    jej nie zobaczy; pojawi się po refresh() (przycisk „Odśwież”).
+    """
+
+    seen = QtCore.Signal(int)
 
-    def __init__(self, repo: ExceptionsRepo | None, parent: MainWindow):
+    COLUMNS = [
+        ("operation_uuid", "UUID"),
+        ("employee", "Pracownik"),
+        ("login", "Login"),
+        ("item", "Pozycja"),
+        ("quantity", "Ilość"),
+        ("created_at", "Data"),
+        ("movement_type", "Ruch"),
+        ("reason", "Powód"),
+    ]
+    PAGE_SIZE = 200
+    DEFAULT_DAYS = 30
+
+    def __init__(self, repo: ExceptionsRepo | None, parent: MainWindow, *, days: int | None = None):
         super().__init__(parent)
         self.repo = repo
+        self.days = int(days or self.DEFAULT_DAYS)
+        self.last_id: int | None = None
+        self._runner = query_runner()
         if not self.repo:
             lay = QtWidgets.QVBoxLayout(self)
             lbl = QtWidgets.QLabel("Brak połączenia z DB")
@@ -32,76 +62,97 @@ class ExceptionsWidget(QWidget):
     def _build(self):
         tools = QtWidgets.QHBoxLayout()
         self.btn_refresh = QtWidgets.QPushButton("Odśwież")
-        self.btn_export = QtWidgets.QPushButton("Eksport CSV")
+        self.btn_export = QtWidgets.QPushButton("Eksport CSV/PDF")
         self.btn_refresh.clicked.connect(self.refresh)
-        self.btn_export.clicked.connect(self.export_csv)
+        self.btn_export.clicked.connect(self.export)
         tools.addWidget(self.btn_refresh)
         tools.addWidget(self.btn_export)
         tools.addStretch(1)
+        self.lbl_range = QtWidgets.QLabel(f"Ostatnie {self.days} dni")
+        tools.addWidget(self.lbl_range)
 
-        self.table = QtWidgets.QTableWidget(0, 8)
-        self.table.setHorizontalHeaderLabels(
-            [
-                "UUID",
-                "Pracownik",
-                "Login",
-                "Pozycja",
-                "Ilość",
-                "Data",
-                "Ruch",
-                "Powód",
-            ]
-        )
+        # wiersze dociągane blokami przy przewijaniu (keyset: list_exceptions_page)
+        self.model = LazyTableModel(self.COLUMNS, block_size=self.PAGE_SIZE)
+        self.model.failed.connect(self._on_load_failed)
+        self.model.loaded.connect(self._on_loaded)
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         header = self.table.horizontalHeader()
-        header.setSectionResizeMode(QtWidgets.QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(QtWidgets.QHeaderView.Interactive)
         header.setSectionResizeMode(1, QtWidgets.QHeaderView.Stretch)
+        self._sized = False
 
         layout = QtWidgets.QVBoxLayout(self)
         layout.addLayout(tools)
         layout.addWidget(self.table, 1)
 
+    def _date_from(self) -> datetime:
+        return datetime.now() - timedelta(days=self.days)
+
     def refresh(self):
-        try:
-            rows = self.repo.list_exceptions() or []
-        except Exception as e:
-            log.exception("Błąd ładowania wyjątków")
-            QtWidgets.QMessageBox.warning(self, "Błąd ładowania wyjątków", str(e))
-            return
-        self.table.setRowCount(len(rows))
-        for r, row in enumerate(rows):
-            for c in range(self.table.columnCount()):
-                val = row[c] if c < len(row) else ""
-                self.table.setItem(r, c, QtWidgets.QTableWidgetItem(str(val)))
-        self.table.resizeColumnsToContents()
-        log.info("Załadowano wyjątki: %s wierszy", len(rows))
-
-    def export_csv(self):
-        path, _ = QtWidgets.QFileDialog.getSaveFileName(
-            self, "Eksport CSV", filter="CSV Files (*.csv)"
+        # znak wody przed pierwszą stroną – wiersze dopisane w międzyczasie
+        # wrócą w poll() i zostaną pominięte jako duplikaty (operation_uuid)
+        self._runner.cancel((id(self), "exceptions.poll"))
+        self._runner.run(
+            (id(self), "exceptions.max_id"), self.repo.max_id,
+            on_done=self._start_reload, on_error=self._on_load_failed, owner=self,
+        )
+
+    def _start_reload(self, max_id: int):
+        self.last_id = int(max_id)
+        self._sized = False
+        date_from = self._date_from()
+        self.model.set_source(
+            lambda after, limit: self.repo.list_exceptions_page(
+                after=after, limit=limit, date_from=date_from
+            )
         )
-        if not path:
+        self.seen.emit(self.last_id)
+
+    def poll(self):
+        """Dociąga wyjątki nowsze niż znak wody (bez przeładowania listy)."""
+        if self.repo is None:
+            return
+        if self.last_id is None:
+            self.refresh()
             return
-        try:
-            with open(path, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                headers = [
-                    "operation_uuid",
-                    "employee",
-                    "login",
-                    "item",
-                    "quantity",
-                    "created_at",
-                    "movement_type",
-                    "reason",
-                ]
-                writer.writerow(headers)
-                for r in range(self.table.rowCount()):
-                    row = [
-                        self.table.item(r, c).text() if self.table.item(r, c) else ""
-                        for c in range(self.table.columnCount())
-                    ]
-                    writer.writerow(row)
-            log.info("Wyeksportowano CSV: %s (wiersze=%s)", path, self.table.rowCount())
-        except Exception:
-            log.exception("Błąd zapisu CSV: %s", path)
-            QtWidgets.QMessageBox.critical(self, "Eksport CSV – błąd", f"Nie udało się zapisać pliku:\n{path}")
+        self._runner.run(
+            (id(self), "exceptions.poll"), self.repo.list_exceptions_since, self.last_id,
+            date_from=self._date_from(),
+            on_done=self._on_new_rows, on_error=self._on_poll_failed, owner=self,
+        )
+
+    def _on_new_rows(self, rows: list[dict]):
+        if rows:
+            self.last_id = max([self.last_id or 0] + [int(r.get("id") or 0) for r in rows])
+            n = self.model.prepend_rows(rows, key="operation_uuid")
+            log.info("Nowe wyjątki: %s", n)
+        self.seen.emit(self.last_id or 0)
+
+    def _on_poll_failed(self, msg: str):
+        # cykliczne odpytywanie – bez okna z błędem, kolejna próba przy następnym cyklu
+        log.warning("Błąd dociągania nowych wyjątków: %s", msg)
+
+    def _on_load_failed(self, msg: str):
+        log.error("Błąd ładowania wyjątków: %s", msg)
+        QtWidgets.QMessageBox.warning(self, "Błąd ładowania wyjątków", msg)
+
+    def _on_loaded(self, n: int):
+        if not self._sized and n:
+            # szerokości wg pierwszego bloku – ResizeToContents liczyłby po całym modelu
+            self.table.resizeColumnsToContents()
+            self._sized = True
+        log.info("Załadowano wyjątki: %s wierszy%s", n, " (są kolejne)" if self.model.has_more() else "")
+
+    def export(self):
+        # pełny wynik kursorem strumieniowym w tle – niezależnie od tego, co załadował model,
+        # ale z tym samym oknem czasowym co lista
+        date_from = self._date_from()
+        start_export(
+            self,
+            lambda: self.repo.iter_exceptions(date_from=date_from),
+            [(c, label) for c, label in self.COLUMNS],
+            title="Eksport wyjątków",
+            default_name="wyjatki.csv",
+        )
@@ -2,11 +2,17 @@
 from __future__ import annotations
 from PySide6 import QtWidgets
 from typing import Any
+import logging
+
+from app.ui.widgets.query_runner import query_runner
+
+log = logging.getLogger(__name__)
 
 class HoldingsTab(QtWidgets.QWidget):
     def __init__(self, repo: Any, parent=None):
         super().__init__(parent)
         self.repo = repo
+        self.runner = query_runner()
 
         self.empLoc = QtWidgets.QLineEdit()
         self.empLoc.setPlaceholderText("opcjonalnie: ID lokacji pracownika")
@@ -29,10 +35,20 @@ class HoldingsTab(QtWidgets.QWidget):
         layout.addWidget(self.table)
 
     def on_load(self):
-        self.table.setRowCount(0)
         loc_id = self.empLoc.text().strip()
         loc = int(loc_id) if loc_id else None
-        data = self.repo.list_v_employee_holdings(loc)
+        self.runner.run(
+            (id(self), "holdings"),
+            self.repo.list_v_employee_holdings, loc,
+            on_done=self._set_rows, on_error=self._on_load_failed, owner=self,
+        )
+
+    def _on_load_failed(self, msg: str):
+        log.error("Błąd ładowania stanów na pracownikach: %s", msg)
+        QtWidgets.QMessageBox.warning(self, "Błąd ładowania", msg)
+
+    def _set_rows(self, data):
+        self.table.setRowCount(0)
         for row in data:
             r = self.table.rowCount()
             self.table.insertRow(r)
@@ -1,13 +1,18 @@
 # app/ui/movements_tab.py
 from __future__ import annotations
+import logging
 from PySide6 import QtWidgets
 from app.services.movements import MovementsService
+from app.ui.widgets.query_runner import query_runner
+
+log = logging.getLogger(__name__)
 
 
 class MovementsTab(QtWidgets.QWidget):
     def __init__(self, service: MovementsService, parent=None):
         super().__init__(parent)
         self.service = service
+        self.runner = query_runner()
 
         self.limit = QtWidgets.QSpinBox()
         self.limit.setRange(1, 1000)
@@ -39,8 +44,18 @@ class MovementsTab(QtWidgets.QWidget):
         layout.addWidget(self.table)
 
     def on_load(self):
+        self.runner.run(
+            (id(self), "movements"),
+            self.service.list_recent, int(self.limit.value()),
+            on_done=self._set_rows, on_error=self._on_load_failed, owner=self,
+        )
+
+    def _on_load_failed(self, msg: str):
+        log.error("Błąd ładowania ruchów: %s", msg)
+        QtWidgets.QMessageBox.warning(self, "Błąd ładowania", msg)
+
+    def _set_rows(self, data):
         self.table.setRowCount(0)
-        data = self.service.list_recent(int(self.limit.value()))
         for row in data:
             r = self.table.rowCount()
             self.table.insertRow(r)
@@ -4,16 +4,22 @@ import logging
 from typing import Any, Dict, List
 
 from PySide6 import QtWidgets
-from PySide6.QtCore import Qt
+from PySide6.QtCore import QSortFilterProxyModel, Qt, QTimer
 
 from app.appsvc.cart import (
+    CART_SYNC_DEBOUNCE_MS,
+    CartBuffer,
     CartRepository,
+    CartSessionClosedError,
     CheckoutService,
     RfidService,
     SessionManager,
     StockRepository,
 )
 from app.ui.stock_picker import StockPickerDialog
+from app.ui.table_model import CartTableModel, StockTableModel
+from app.ui.widgets.delegates import QtySpinDelegate, StepButtonsDelegate
+from app.ui.widgets.typeahead import TypeaheadController
 
 
 class OpsIssueDialog(QtWidgets.QDialog):
@@ -48,6 +54,13 @@ class OpsIssueDialog(QtWidgets.QDialog):
         self.session = self.session_mgr.ensure_open_session(None)
         self.session_id = int(self.session["id"])
 
+        # lokalny bufor koszyka – edycje trafiają do DB zbiorczo (debounce)
+        self.buffer = CartBuffer(self.cart, self.session_id)
+        self._sync_timer = QTimer(self)
+        self._sync_timer.setSingleShot(True)
+        self._sync_timer.setInterval(CART_SYNC_DEBOUNCE_MS)
+        self._sync_timer.timeout.connect(self._flush_cart)
+
         self.setWindowTitle("Wydanie narzędzi")
         self.resize(900, 560)
 
@@ -84,22 +97,27 @@ class OpsIssueDialog(QtWidgets.QDialog):
         top.addWidget(self.btnPickStock)
 
         # --- stock table ---
-        self.table = QtWidgets.QTableWidget(0, 7)
-        self.table.setHorizontalHeaderLabels(
-            [
-                "SKU",
-                "Nazwa",
-                "JM",
-                "Na stanie",
-                "Zarezerw.",
-                "Dostępne",
-                "W koszyku",
-            ]
-        )
+        self.stock_model = StockTableModel()
+        self.stock_proxy = QSortFilterProxyModel(self)
+        self.stock_proxy.setSourceModel(self.stock_model)
+        self.stock_proxy.setSortRole(Qt.EditRole)
+        self.stock_proxy.setSortCaseSensitivity(Qt.CaseInsensitive)
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.stock_proxy)
         self.table.horizontalHeader().setSectionResizeMode(1, QtWidgets.QHeaderView.Stretch)
         self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
-        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.setEditTriggers(
+            QtWidgets.QAbstractItemView.DoubleClicked
+            | QtWidgets.QAbstractItemView.SelectedClicked
+            | QtWidgets.QAbstractItemView.EditKeyPressed
+        )
         self.table.setSortingEnabled(True)
+        self.qty_delegate = QtySpinDelegate(self.table, max_fn=self._max_qty_for)
+        self.step_delegate = StepButtonsDelegate(self.table)
+        self.table.setItemDelegateForColumn(self.stock_model.column("in_cart"), self.qty_delegate)
+        self.table.setItemDelegateForColumn(self.stock_model.column("_step"), self.step_delegate)
+        self.stock_model.qtyEdited.connect(self._on_qty_edited)
+        self.step_delegate.stepped.connect(self._on_step)
         try:
             self.table.verticalHeader().setVisible(False)
         except Exception:
@@ -107,22 +125,21 @@ class OpsIssueDialog(QtWidgets.QDialog):
 
         # pagination controls
         self.page_size = page_size
-        self.limit = page_size
+        self._bookmark = None  # (name, id) ostatniego wiersza – keyset dla "Załaduj więcej"
         self.btnLoadMore = QtWidgets.QPushButton("Załaduj więcej")
         self.btnLoadMore.clicked.connect(self._load_more)
         if self.page_size is None:
             self.btnLoadMore.hide()
 
         # --- cart table ---
-        self.cart_table = QtWidgets.QTableWidget(0, 4)
-        self.cart_table.setHorizontalHeaderLabels(
-            [
-                "SKU",
-                "Nazwa",
-                "JM",
-                "Ilość",
-            ]
-        )
+        self.cart_model = CartTableModel()
+        self.cart_proxy = QSortFilterProxyModel(self)
+        self.cart_proxy.setSourceModel(self.cart_model)
+        self.cart_proxy.setSortRole(Qt.EditRole)
+        self.cart_table = QtWidgets.QTableView()
+        self.cart_table.setModel(self.cart_proxy)
+        self.cart_table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.cart_table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.cart_table.horizontalHeader().setStretchLastSection(True)
         try:
             self.cart_table.verticalHeader().setVisible(False)
@@ -159,22 +176,40 @@ class OpsIssueDialog(QtWidgets.QDialog):
         lay.addWidget(self.cart_table, 1)
         lay.addWidget(btn_box, 0, Qt.AlignRight)
 
+        # wyszukiwanie w tle: debounce wpisywania, cache ostatnich wyników
+        self._query = ""
+        self.search = TypeaheadController(
+            self._search_first_page, parent=self, limit=self.page_size
+        )
+        self.search.bind(self.q)
+        self.search.results.connect(self._on_search_results)
+        self.search.failed.connect(self._on_search_failed)
+        self.search.busyChanged.connect(
+            lambda busy: self.btnFind.setText("Szukam…" if busy else "Szukaj")
+        )
         self.btnFind.clicked.connect(self._reload_search)
-        self.q.returnPressed.connect(self._reload_search)
         self.employee_cb.currentIndexChanged.connect(self._on_employee_changed)
 
         self._items: List[Dict] = []
-        self._reload_search()
         self._refresh_cart()
+        self._reload_search()
 
     # ---------- helper selection ----------
-    def _selected_rows(self) -> List[int]:
+    def _selected_ids(self, view: QtWidgets.QTableView) -> List[int]:
+        """item_id zaznaczonych wierszy (indeksy proxy -> model źródłowy)."""
         try:
-            sel = self.table.selectionModel().selectedRows()
-            return [i.row() for i in sel] if sel else []
+            proxy = view.model()
+            model = proxy.sourceModel()
+            sel = view.selectionModel().selectedRows()
+            ids = [model.key_at(proxy.mapToSource(i).row()) for i in sel or []]
+            return [int(i) for i in ids if i is not None]
         except Exception:
             return []
 
+    def _max_qty_for(self, index) -> int:
+        row = self.stock_model.row_dict(index.data(Qt.UserRole))
+        return int(row["max_qty"]) if row else 999999
+
     def _on_employee_changed(self) -> None:
         try:
             emp_id = self.employee_cb.currentData()
@@ -182,81 +217,113 @@ class OpsIssueDialog(QtWidgets.QDialog):
                 int(emp_id) if emp_id is not None else None
             )
             self.session_id = int(self.session["id"])
+            self.buffer.rebind(self.session_id)
         except Exception:
             pass
 
     # ---------- data loading ----------
     def _reload_search(self) -> None:
-        self.limit = self.page_size
-        self._reload()
+        self.search.submit(self.q.text())
+
+    def _search_first_page(self, q: str) -> List[Dict]:
+        """Wywoływane w wątku puli (TypeaheadController) – bez dostępu do widżetów."""
+        lim = self.page_size if self.page_size is not None else 1_000_000
+        return self.stock.list_available_page(q, None, limit=lim)[0]
+
+    def _on_search_results(self, q: str, rows: List[Dict]) -> None:
+        self._query = q
+        self._items = list(rows)
+        full = self.page_size is not None and len(rows) >= self.page_size
+        self._bookmark = (
+            (rows[-1]["sort_name"], int(rows[-1]["item_id"])) if full else None
+        )
+        self.stock_model.set_rows(
+            StockTableModel.build_rows(
+                self._items, self.buffer.reserved_map(), self.buffer.synced_map()
+            )
+        )
+        self.table.resizeColumnsToContents()
+        self._update_load_more()
+
+    def _on_search_failed(self, q: str, msg: str) -> None:
+        QtWidgets.QMessageBox.critical(
+            self, "Błąd", f"Nie udało się pobrać danych: {msg}"
+        )
 
     def _load_more(self) -> None:
-        if self.page_size is None:
+        if self.page_size is None or self._bookmark is None:
             return
-        self.limit = (self.limit or 0) + self.page_size
-        self._reload()
+        self._fetch_page()
 
     def _reload(self) -> None:
+        """Odświeża już wczytane wiersze (np. po wydaniu) – jedna kwerenda na tyle wierszy."""
+        self.search.invalidate()  # stany się zmieniły – wyniki w cache są nieaktualne
         try:
-            lim = self.limit if self.limit is not None else 1_000_000
-            self._items = self.stock.list_available(self.q.text().strip(), limit=lim)
-            reserved = self.cart.reserved_map(self.session_id)
+            lim = (
+                1_000_000
+                if self.page_size is None
+                else max(len(self._items), self.page_size)
+            )
+            self._items, self._bookmark = self.stock.list_available_page(
+                self._query, None, limit=lim
+            )
+            reserved = self.buffer.reserved_map()
+            synced = self.buffer.synced_map()
         except Exception as e:
             self.log.exception("OpsIssueDialog._reload: błąd pobierania listy")
             QtWidgets.QMessageBox.critical(
                 self, "Błąd", f"Nie udało się pobrać danych: {e}"
             )
             return
+        self.stock_model.set_rows(StockTableModel.build_rows(self._items, reserved, synced))
+        self._update_load_more()
 
-        self.table.setRowCount(0)
-        for it in self._items:
-            r = self.table.rowCount()
-            self.table.insertRow(r)
-
-            sku = it.get("sku") or ""
-            name = it.get("name") or (it.get("sku") or "")
-            uom = it.get("uom") or ""
-            qty_on_hand = it.get("qty_on_hand") or 0
-            qty_res = it.get("qty_reserved_open") or 0
-            qty_av = it.get("qty_available") or 0
-            in_cart = reserved.get(int(it["item_id"]), 0.0)
-
-            c0 = QtWidgets.QTableWidgetItem(str(sku))
-            c0.setData(Qt.UserRole, int(it["item_id"]))
-            self.table.setItem(r, 0, c0)
-            self.table.setItem(r, 1, QtWidgets.QTableWidgetItem(str(name)))
-            self.table.setItem(r, 2, QtWidgets.QTableWidgetItem(str(uom)))
-            self.table.setItem(r, 3, QtWidgets.QTableWidgetItem(str(qty_on_hand)))
-            self.table.setItem(r, 4, QtWidgets.QTableWidgetItem(str(qty_res)))
-            self.table.setItem(r, 5, QtWidgets.QTableWidgetItem(str(qty_av)))
-
-            spin = QtWidgets.QSpinBox()
-            spin.setRange(0, int(qty_av) if isinstance(qty_av, (int, float)) else 999999)
-            spin.setValue(int(in_cart))
-            spin.setProperty("item_id", int(it["item_id"]))
-            spin.valueChanged.connect(self._spin_changed)
-            self.table.setCellWidget(r, 6, spin)
+    def _fetch_page(self) -> None:
+        """Pobiera kolejną stronę od zakładki; dopisuje tylko nowe wiersze."""
+        try:
+            page, self._bookmark = self.stock.list_available_page(
+                self._query, self._bookmark, limit=self.page_size
+            )
+            reserved = self.buffer.reserved_map()
+            synced = self.buffer.synced_map()
+        except Exception as e:
+            self.log.exception("OpsIssueDialog._fetch_page: błąd pobierania listy")
+            QtWidgets.QMessageBox.critical(
+                self, "Błąd", f"Nie udało się pobrać danych: {e}"
+            )
+            return
+        self._items.extend(page)
+        self.stock_model.append_rows(StockTableModel.build_rows(page, reserved, synced))
+        self._update_load_more()
 
-        self.table.resizeColumnsToContents()
+    def _update_load_more(self) -> None:
         try:
-            if self.limit is not None:
-                self.btnLoadMore.setEnabled(len(self._items) >= self.limit)
-            else:
-                self.btnLoadMore.setEnabled(False)
+            self.btnLoadMore.setEnabled(
+                self.page_size is not None and self._bookmark is not None
+            )
         except Exception:
             pass
 
     # ---------- cart actions ----------
-    def _spin_changed(self, val: int) -> None:
-        spin = self.sender()
-        if not isinstance(spin, QtWidgets.QSpinBox):
-            return
-        item_id = spin.property("item_id")
+    def _set_item_qty(self, item_id: int, qty: float, meta: Dict | None = None) -> None:
+        row = self.stock_model.row_dict(int(item_id))
+        if row is not None and row.get("max_qty") is not None:
+            # ten sam limit co edytor (QtySpinDelegate): dostępne + własny koszyk
+            qty = min(float(qty), float(row["max_qty"]))
+        new_qty = self.buffer.set_qty(int(item_id), qty, meta or row)
+        self.stock_model.set_in_cart(int(item_id), new_qty)
+
+    def _on_qty_edited(self, item_id: int, qty: float) -> None:
+        self._set_item_qty(item_id, qty)
+        self._cart_changed()
+
+    def _on_step(self, index, delta: int) -> None:
+        item_id = index.data(Qt.UserRole)
         if item_id is None:
             return
-        self.cart.set_qty(self.session_id, int(item_id), int(val))
-        self._refresh_cart()
-        
+        self._set_item_qty(int(item_id), self.buffer.qty(int(item_id)) + delta)
+        self._cart_changed()
+
     def _add_line(self) -> None:
         sku = self.q.text().strip()
         if not sku:
@@ -269,89 +336,79 @@ class OpsIssueDialog(QtWidgets.QDialog):
         if not item or item.get("id") is None:
             QtWidgets.QMessageBox.warning(self, "Błąd", "Nie znaleziono pozycji")
             return
-        try:
-            self.cart.add(self.session_id, int(item["id"]), +1)
-        except Exception:
-            self.log.exception("Błąd dodawania do koszyka")
-            QtWidgets.QMessageBox.critical(self, "Błąd", "Nie udało się dodać pozycji")
-            return
+        meta = {
+            "sku": item.get("sku") or item.get("code") or sku,
+            "name": item.get("name"),
+            "uom": item.get("uom") or item.get("unit"),
+        }
+        self._set_item_qty(int(item["id"]), self.buffer.qty(int(item["id"])) + 1, meta)
         self.q.clear()
+        self._cart_changed()
         self._reload()
-        self._refresh_cart()
 
     def _add_selected(self) -> None:
-        rows = self._selected_rows()
-        if not rows:
+        ids = self._selected_ids(self.table)
+        if not ids:
             return
-        for row in rows:
-            it = self.table.item(row, 0)
-            item_id = it.data(Qt.UserRole) if it else None
-            if item_id is None:
-                continue
-            new_qty = self.cart.add(self.session_id, int(item_id), +1)
-            w = self.table.cellWidget(row, 6)
-            if isinstance(w, QtWidgets.QSpinBox):
-                try:
-                    w.blockSignals(True)
-                    w.setValue(int(new_qty))
-                finally:
-                    w.blockSignals(False)
-        self._refresh_cart()
+        for item_id in ids:
+            self._set_item_qty(item_id, self.buffer.qty(item_id) + 1)
+        self._cart_changed()
 
     def _remove_selected(self) -> None:
-        rows = self._selected_rows()
-        if rows:
-            for row in rows:
-                it = self.table.item(row, 0)
-                item_id = it.data(Qt.UserRole) if it else None
-                if item_id is None:
-                    continue
-                self.cart.set_qty(self.session_id, int(item_id), 0)
-                w = self.table.cellWidget(row, 6)
-                if isinstance(w, QtWidgets.QSpinBox):
-                    try:
-                        w.blockSignals(True)
-                        w.setValue(0)
-                    finally:
-                        w.blockSignals(False)
-            self._refresh_cart()
-            return
+        ids = self._selected_ids(self.table) or self._selected_ids(self.cart_table)
+        for item_id in ids:
+            self._set_item_qty(item_id, 0)
+        self._cart_changed()
+
+    # ---------- cart table ----------
+    def _cart_changed(self) -> None:
+        """Zmiana w buforze: odśwież widok od razu, zapis do DB po debounce."""
+        self._render_cart()
+        self._sync_timer.start()
+
+    def _flush_cart(self) -> bool:
+        """Wysyła zaległe zmiany bufora do DB. Przy błędzie zmiany zostają w buforze."""
+        self._sync_timer.stop()
         try:
-            sel = self.cart_table.selectionModel().selectedRows()
+            try:
+                self.buffer.flush()
+            except CartSessionClosedError:
+                # sesja wygasła (sweeper) – otwórz nową i przenieś do niej koszyk
+                emp_id = self.employee_cb.currentData()
+                self.session = self.session_mgr.ensure_open_session(
+                    int(emp_id) if emp_id is not None else None
+                )
+                self.session_id = int(self.session["id"])
+                self.buffer.move_to(self.session_id)
+                self.buffer.flush()
+            return True
         except Exception:
-            sel = []
-        for idx in (sel or []):
-            r = idx.row()
-            itm = self.cart_table.item(r, 0)
-            item_id = itm.data(Qt.UserRole) if itm else None
-            if item_id is None:
-                continue
-            self.cart.set_qty(self.session_id, int(item_id), 0)
-        self._refresh_cart()
+            self.log.exception("OpsIssueDialog._flush_cart: błąd zapisu koszyka")
+            return False
 
-    # ---------- cart table ----------
     def _refresh_cart(self) -> None:
         try:
-            lines = self.cart.list_lines(self.session_id)
+            self._flush_cart()
+            self.buffer.load()
+            reserved = self.buffer.reserved_map()
+            for it in self._items:
+                iid = int(it["item_id"])
+                self.stock_model.set_in_cart(iid, reserved.get(iid, 0.0))
         except Exception:
             self.log.exception("OpsIssueDialog._refresh_cart: błąd listowania linii")
-            lines = []
-        self.cart_table.setRowCount(0)
-        for ln in lines:
-            r = self.cart_table.rowCount()
-            self.cart_table.insertRow(r)
-            sku_item = QtWidgets.QTableWidgetItem(str(ln.get("sku") or ""))
-            try:
-                sku_item.setData(Qt.UserRole, int(ln.get("item_id")))
-            except Exception:
-                pass
-            self.cart_table.setItem(r, 0, sku_item)
-            display_name = ln.get("name") or ln.get("sku") or ""
-            self.cart_table.setItem(r, 1, QtWidgets.QTableWidgetItem(str(display_name)))
-            self.cart_table.setItem(r, 2, QtWidgets.QTableWidgetItem(str(ln.get("uom") or "")))
-            self.cart_table.setItem(
-                r, 3, QtWidgets.QTableWidgetItem(str(ln.get("qty_reserved") or 0))
-            )
+        self._render_cart()
+
+    def _render_cart(self) -> None:
+        self.cart_model.set_rows(
+            [
+                {**ln, "name": ln.get("name") or ln.get("sku") or ""}
+                for ln in self.buffer.lines()
+            ]
+        )
+
+    def done(self, r: int) -> None:  # noqa: D401 - Qt API
+        self._flush_cart()
+        super().done(r)
 
     # ---------- finalize ----------
     def _checkout_safe(self) -> None:
@@ -373,6 +430,13 @@ class OpsIssueDialog(QtWidgets.QDialog):
             return
         self.session = self.session_mgr.ensure_open_session(int(emp_id))
         self.session_id = int(self.session["id"])
+        self.buffer.rebind(self.session_id)
+        # o wydaniu decydują linie w DB – najpierw zapisz bufor
+        if not self._flush_cart():
+            QtWidgets.QMessageBox.critical(
+                self, "Błąd", "Nie udało się zapisać koszyka. Spróbuj ponownie."
+            )
+            return
         if not RfidService().verify_employee(self.repo, int(emp_id), self):
             return
         res = CheckoutService(self.engine, self.repo).finalize_issue(
@@ -384,6 +448,23 @@ class OpsIssueDialog(QtWidgets.QDialog):
                 msg += "\nDodano do Wyjątki"
             QtWidgets.QMessageBox.information(self, "OK", msg)
             self.accept()
+        elif res.get("status") == "conflict":
+            self._show_conflicts(res.get("conflicts") or [])
+            self._refresh_cart()
+            self._reload()
+        elif res.get("status") == "expired":
+            # sesja wygasła / anulowana w międzyczasie – linie przechodzą do nowej
+            self.session = self.session_mgr.ensure_open_session(int(emp_id))
+            self.session_id = int(self.session["id"])
+            self.buffer.rebind(self.session_id)
+            self._refresh_cart()
+            self._reload()
+            QtWidgets.QMessageBox.warning(
+                self,
+                "Sesja wygasła",
+                "Sesja koszyka wygasła przed wydaniem. Pozycje przeniesiono do "
+                "nowej sesji – sprawdź koszyk i zatwierdź ponownie.",
+            )
         elif res.get("status") == "empty":
             QtWidgets.QMessageBox.warning(
                 self, "Koszyk pusty", "Brak pozycji do wydania."
@@ -410,6 +491,22 @@ class OpsIssueDialog(QtWidgets.QDialog):
                     self, "Info", "Nie wybrano pozycji lub ilości."
                 )
                 return
-            self.cart.add(self.session_id, int(item_id), int(qty))
+            self._set_item_qty(int(item_id), self.buffer.qty(int(item_id)) + int(qty), sel)
+            self._cart_changed()
             self._reload()
-            self._refresh_cart()
+
+    def _show_conflicts(self, conflicts: List[Dict]) -> None:
+        rows = []
+        for c in conflicts:
+            it = self.stock_model.row_dict(int(c["item_id"])) or {}
+            label = it.get("name") or it.get("sku") or f"ID {c['item_id']}"
+            rows.append(
+                f"• {label}: w koszyku {c['requested']:g}, dostępne {c['available']:g}"
+            )
+        QtWidgets.QMessageBox.warning(
+            self,
+            "Brak dostępności",
+            "Stan zmienił się od dodania do koszyka:\n"
+            + "\n".join(rows)
+            + "\n\nPopraw ilości i spróbuj ponownie.",
+        )
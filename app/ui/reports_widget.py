@@ -10,29 +10,79 @@ import logging
 
 log = logging.getLogger(__name__)
 
-from .table_model import SimpleTableModel
+from .table_model import LazyTableModel, SimpleTableModel
+from .widgets.export_runner import start_export
+from .widgets.query_runner import query_runner
 
 
 class ReportsWidget(QWidget):
     """
     Widżet raportów korzystający z ReportsRepo:
-      - rw_summary(date_from, date_to, limit)
-      - exceptions(date_from, date_to, employee_id?, item_id?, limit)
+      - rw_summary_page(date_from, date_to, after, limit)
+      - exceptions_page(date_from, date_to, employee_id?, item_id?, after, limit)
       - employees(q?, limit)
       - employee_card(employee_id, date_from, date_to)
+      - employee_history_page(employee_id, date_from, date_to, after, limit)
+      - monthly_consumption(date_from, date_to, refresh=True) – fakty dociągane
+        przy każdym załadowaniu zakładki (także po zdarzeniu zmiany stanów)
+      - iter_rw_summary / iter_exceptions / iter_audit_logs – eksport CSV/PDF
+    Zapytania idą przez QueryRunner (poza wątkiem UI); ponowne „Odśwież”
+    porzuca wynik poprzedniego zapytania tej samej zakładki. RW i wyjątki
+    dociągają kolejne bloki przy przewijaniu (LazyTableModel), podobnie
+    historia operacji na karcie pracownika.
     """
-    def __init__(self, reports_repo, parent=None):
+    RW_COLUMNS = ["rw_date", "rw_id", "item_id", "qty_total"]
+    EXC_COLUMNS = [
+        "operation_uuid",
+        "employee_id",
+        "item_id",
+        "quantity",
+        "created_at",
+        "movement_type",
+        "reason",
+    ]
+    CONSUMPTION_COLUMNS = [
+        "month",
+        "code",
+        "name",
+        "employee_id",
+        "movement_type",
+        "qty",
+        "value_fifo",
+        "movements",
+    ]
+    HISTORY_COLUMNS = [
+        ("created_at", "Data"),
+        ("movement_type", "Operacja"),
+        ("item_id", "item_id"),
+        ("item", "Towar"),
+        ("direction", "Kierunek"),
+        ("quantity", "Ilość"),
+        ("operation_uuid", "operation_uuid"),
+    ]
+
+    def __init__(self, reports_repo, parent=None, runner=None):
         super().__init__(parent)
         self.repo = reports_repo  # ReportsRepo
+        self.runner = runner or query_runner()
 
         self.tabs = QTabWidget(self)
         self._init_rw_tab()
         self._init_exceptions_tab()
         self._init_card_tab()
+        self._init_consumption_tab()
+        self._init_audit_tab()
 
         lay = QVBoxLayout(self)
         lay.addWidget(self.tabs)
 
+    def refresh(self):
+        """Ponowne załadowanie zakładek z bieżącymi filtrami (np. po zdarzeniu zmiany stanów)."""
+        self._load_rw()
+        self._load_exc()
+        self._load_card()
+        self._load_consumption()
+
     # ---------- RW summary ----------
     def _init_rw_tab(self):
         w = QWidget()
@@ -52,12 +102,16 @@ class ReportsWidget(QWidget):
         btn = QPushButton("Odśwież")
         btn.clicked.connect(self._load_rw)
         fl.addWidget(btn)
+        btn_exp = QPushButton("Eksport CSV/PDF")
+        btn_exp.clicked.connect(self._export_rw)
+        fl.addWidget(btn_exp)
         fl.addStretch()
 
         v.addLayout(fl)
 
         self.tbl_rw = QTableView()
-        self.m_rw = SimpleTableModel()
+        self.m_rw = LazyTableModel([(c, c) for c in self.RW_COLUMNS])
+        self.m_rw.failed.connect(self._on_rw_failed)
         self.tbl_rw.setModel(self.m_rw)
         v.addWidget(self.tbl_rw)
 
@@ -67,20 +121,31 @@ class ReportsWidget(QWidget):
     def _load_rw(self):
         d_from = self.df.date().toPython()
         d_to = self.dt.date().toPython()
-        try:
-            rows = self.repo.rw_summary(date_from=d_from, date_to=d_to, limit=500) or []
-            normalized = []
+        self._rw_args = (d_from, d_to)
+
+        def fetch_page(after, limit):
+            rows, nxt = self.repo.rw_summary_page(d_from, d_to, after=after, limit=limit)
             for row in rows:
-                normalized.append({
-                    "rw_date": row.get("rw_date"),
-                    "rw_id": row.get("rw_id") or row.get("rw_number"),
-                    "item_id": row.get("item_id"),
-                    "qty_total": row.get("qty_total"),
-                })
-            self.m_rw.set_rows(normalized)
-        except Exception as e:
-            log.exception("Błąd ładowania raportu RW df=%s dt=%s lim=%s", d_from, d_to, 500)
-            QMessageBox.warning(self, "Błąd ładowania raportu RW", str(e))
+                row["rw_id"] = row.get("rw_id") or row.get("rw_number")
+            return rows, nxt
+
+        self.m_rw.set_source(fetch_page)
+
+    def _on_rw_failed(self, msg):
+        d_from, d_to = self._rw_args
+        log.error("Błąd ładowania raportu RW df=%s dt=%s: %s", d_from, d_to, msg)
+        QMessageBox.warning(self, "Błąd ładowania raportu RW", msg)
+
+    def _export_rw(self):
+        d_from = self.df.date().toPython()
+        d_to = self.dt.date().toPython()
+        start_export(
+            self,
+            lambda: self.repo.iter_rw_summary(d_from, d_to),
+            [(c, c) for c in self.RW_COLUMNS],
+            title=f"Konsumpcja RW {d_from} – {d_to}",
+            default_name=f"rw_{d_from}_{d_to}.csv",
+        )
 
     # ---------- Wyjątki ----------
     def _init_exceptions_tab(self):
@@ -105,14 +170,17 @@ class ReportsWidget(QWidget):
 
         btn = QPushButton("Odśwież")
         btn.clicked.connect(self._load_exc)
+        btn_exp = QPushButton("Eksport CSV/PDF")
+        btn_exp.clicked.connect(self._export_exc)
 
-        for wid in (self.e_emp, self.e_item, btn):
+        for wid in (self.e_emp, self.e_item, btn, btn_exp):
             fl.addWidget(wid)
         fl.addStretch()
         v.addLayout(fl)
 
         self.tbl_exc = QTableView()
-        self.m_exc = SimpleTableModel()
+        self.m_exc = LazyTableModel([(c, c) for c in self.EXC_COLUMNS])
+        self.m_exc.failed.connect(self._on_exc_failed)
         self.tbl_exc.setModel(self.m_exc)
         v.addWidget(self.tbl_exc)
 
@@ -124,34 +192,40 @@ class ReportsWidget(QWidget):
         d_to = self.dt_exc.date().toPython()
         eid = int(self.e_emp.text()) if self.e_emp.text().strip().isdigit() else None
         iid = int(self.e_item.text()) if self.e_item.text().strip().isdigit() else None
-        try:
-            rows = self.repo.exceptions(
+        self._exc_args = (d_from, d_to, eid, iid)
+
+        def fetch_page(after, limit):
+            return self.repo.exceptions_page(
                 date_from=d_from,
                 date_to=d_to,
                 employee_id=eid,
                 item_id=iid,
-                limit=500,
-            ) or []
-            desired_cols = (
-                "operation_uuid",
-                "employee_id",
-                "item_id",
-                "quantity",
-                "created_at",
-                "movement_type",
-                "reason",
+                after=after,
+                limit=limit,
             )
-            rows = [
-                {col: row.get(col) for col in desired_cols}
-                for row in rows
-            ]
-            self.m_exc.set_rows(rows)
-        except Exception as e:
-            log.exception(
-                "Błąd ładowania wyjątków df=%s dt=%s emp=%s itm=%s lim=%s",
-                d_from, d_to, eid, iid, 500,
-            )
-            QMessageBox.warning(self, "Błąd ładowania wyjątków", str(e))
+
+        self.m_exc.set_source(fetch_page)
+
+    def _on_exc_failed(self, msg):
+        d_from, d_to, eid, iid = self._exc_args
+        log.error(
+            "Błąd ładowania wyjątków df=%s dt=%s emp=%s itm=%s: %s",
+            d_from, d_to, eid, iid, msg,
+        )
+        QMessageBox.warning(self, "Błąd ładowania wyjątków", msg)
+
+    def _export_exc(self):
+        d_from = self.df_exc.date().toPython()
+        d_to = self.dt_exc.date().toPython()
+        eid = int(self.e_emp.text()) if self.e_emp.text().strip().isdigit() else None
+        iid = int(self.e_item.text()) if self.e_item.text().strip().isdigit() else None
+        start_export(
+            self,
+            lambda: self.repo.iter_exceptions(d_from, d_to, employee_id=eid, item_id=iid),
+            [(c, c) for c in self.EXC_COLUMNS],
+            title=f"Wyjątki {d_from} – {d_to}",
+            default_name=f"wyjatki_{d_from}_{d_to}.csv",
+        )
 
     # ---------- Karta pracownika ----------
     def _init_card_tab(self):
@@ -160,21 +234,7 @@ class ReportsWidget(QWidget):
 
         top = QHBoxLayout()
         self.cb_emp = QComboBox()
-
-        q = ""
-        limit = 200
-        try:
-            emps = self.repo.employees(q=q, limit=limit) or []
-        except Exception as e:
-            log.exception("Błąd ładowania pracowników q=%r lim=%s", q, limit)
-            emps = []
-            QMessageBox.warning(self, "Błąd ładowania pracowników", str(e))
-
-        self.cb_emp.addItems([
-            f"{e.get('last_name','')} {e.get('first_name','')} (id={e.get('id','?')})"
-            for e in emps
-        ])
-        self._emp_ids = [e.get("id") for e in emps]
+        self._emp_ids = []
 
         fl_dates = QHBoxLayout()
         fl_dates.addWidget(QLabel("Od:"))
@@ -203,7 +263,37 @@ class ReportsWidget(QWidget):
         self.tbl_card.setModel(self.m_card)
         v.addWidget(self.tbl_card)
 
+        v.addWidget(QLabel("Historia operacji:"))
+        self.tbl_hist = QTableView()
+        self.m_hist = LazyTableModel(self.HISTORY_COLUMNS)
+        self.m_hist.failed.connect(self._on_hist_failed)
+        self.tbl_hist.setModel(self.m_hist)
+        v.addWidget(self.tbl_hist)
+
         self.tabs.addTab(w, "Karta pracownika")
+        self._load_employees()
+
+    def _load_employees(self):
+        q = ""
+        limit = 200
+
+        def failed(msg):
+            log.error("Błąd ładowania pracowników q=%r lim=%s: %s", q, limit, msg)
+            QMessageBox.warning(self, "Błąd ładowania pracowników", msg)
+
+        self.runner.run(
+            (id(self), "reports.employees"),
+            lambda: self.repo.employees(q=q, limit=limit) or [],
+            on_done=self._set_employees, on_error=failed, owner=self,
+        )
+
+    def _set_employees(self, emps):
+        self.cb_emp.clear()
+        self.cb_emp.addItems([
+            f"{e.get('last_name','')} {e.get('first_name','')} (id={e.get('id','?')})"
+            for e in emps
+        ])
+        self._emp_ids = [e.get("id") for e in emps]
         if emps:
             self._load_card()
 
@@ -214,9 +304,10 @@ class ReportsWidget(QWidget):
         emp_id = self._emp_ids[idx]
         d_from = self.df_card.date().toPython()
         d_to = self.dt_card.date().toPython()
-        try:
+
+        def fetch():
             rows = self.repo.employee_card(employee_id=emp_id, date_from=d_from, date_to=d_to) or []
-            rows = [
+            return [
                 {
                     'item_id': r.get('item_id'),
                     'balance_qty': r.get('balance_qty'),
@@ -225,7 +316,119 @@ class ReportsWidget(QWidget):
                 }
                 for r in rows
             ]
-            self.m_card.set_rows(rows)
-        except Exception as e:
-            log.exception("Błąd ładowania karty emp=%s df=%s dt=%s", emp_id, d_from, d_to)
-            QMessageBox.warning(self, "Błąd ładowania karty", str(e))
+
+        def failed(msg):
+            log.error("Błąd ładowania karty emp=%s df=%s dt=%s: %s", emp_id, d_from, d_to, msg)
+            QMessageBox.warning(self, "Błąd ładowania karty", msg)
+
+        self.runner.run(
+            (id(self), "reports.card"), fetch,
+            on_done=self.m_card.set_rows, on_error=failed, owner=self,
+        )
+
+        self._hist_args = (emp_id, d_from, d_to)
+
+        def fetch_page(after, limit):
+            return self.repo.employee_history_page(
+                employee_id=emp_id, date_from=d_from, date_to=d_to, after=after, limit=limit,
+            )
+
+        self.m_hist.set_source(fetch_page)
+
+    def _on_hist_failed(self, msg):
+        emp_id, d_from, d_to = self._hist_args
+        log.error("Błąd ładowania historii emp=%s df=%s dt=%s: %s", emp_id, d_from, d_to, msg)
+        QMessageBox.warning(self, "Błąd ładowania historii", msg)
+
+    # ---------- Zużycie miesięczne ----------
+    def _init_consumption_tab(self):
+        w = QWidget()
+        v = QVBoxLayout(w)
+
+        fl = QHBoxLayout()
+        fl.addWidget(QLabel("Od:"))
+        self.df_cons = QDateEdit(QDate.currentDate().addMonths(-6))
+        self.df_cons.setCalendarPopup(True)
+        fl.addWidget(self.df_cons)
+
+        fl.addWidget(QLabel("Do:"))
+        self.dt_cons = QDateEdit(QDate.currentDate().addMonths(1))
+        self.dt_cons.setCalendarPopup(True)
+        fl.addWidget(self.dt_cons)
+
+        btn = QPushButton("Odśwież")
+        btn.clicked.connect(self._load_consumption)
+        fl.addWidget(btn)
+        fl.addStretch()
+        v.addLayout(fl)
+
+        self.tbl_cons = QTableView()
+        self.m_cons = SimpleTableModel()
+        self.tbl_cons.setModel(self.m_cons)
+        v.addWidget(self.tbl_cons)
+
+        self.tabs.addTab(w, "Zużycie miesięczne")
+        self._load_consumption()
+
+    def _load_consumption(self):
+        d_from = self.df_cons.date().toPython()
+        d_to = self.dt_cons.date().toPython()
+
+        def fetch():
+            rows = self.repo.monthly_consumption(d_from, d_to, refresh=True) or []
+            return [{c: r.get(c) for c in self.CONSUMPTION_COLUMNS} for r in rows]
+
+        def failed(msg):
+            log.error("Błąd ładowania zużycia df=%s dt=%s: %s", d_from, d_to, msg)
+            QMessageBox.warning(self, "Błąd ładowania zużycia", msg)
+
+        self.runner.run(
+            (id(self), "reports.consumption"), fetch,
+            on_done=self.m_cons.set_rows, on_error=failed, owner=self,
+        )
+
+    # ---------- Audyt ----------
+    AUDIT_COLUMNS = [
+        ("ts", "Czas"),
+        ("os_user", "Użytkownik OS"),
+        ("workstation_id", "Stanowisko"),
+        ("action", "Akcja"),
+        ("result", "Wynik"),
+        ("details", "Szczegóły"),
+    ]
+
+    def _init_audit_tab(self):
+        """Eksport dziennika audytu prosto z bazy – bez ładowania tabeli."""
+        w = QWidget()
+        v = QVBoxLayout(w)
+
+        fl = QHBoxLayout()
+        fl.addWidget(QLabel("Od:"))
+        self.df_audit = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.df_audit.setCalendarPopup(True)
+        fl.addWidget(self.df_audit)
+
+        fl.addWidget(QLabel("Do:"))
+        self.dt_audit = QDateEdit(QDate.currentDate().addDays(1))
+        self.dt_audit.setCalendarPopup(True)
+        fl.addWidget(self.dt_audit)
+
+        btn = QPushButton("Eksport CSV/PDF")
+        btn.clicked.connect(self._export_audit)
+        fl.addWidget(btn)
+        fl.addStretch()
+
+        v.addLayout(fl)
+        v.addStretch()
+        self.tabs.addTab(w, "Audyt")
+
+    def _export_audit(self):
+        d_from = self.df_audit.date().toPython()
+        d_to = self.dt_audit.date().toPython()
+        start_export(
+            self,
+            lambda: self.repo.iter_audit_logs(d_from, d_to),
+            self.AUDIT_COLUMNS,
+            title=f"Dziennik audytu {d_from} – {d_to}",
+            default_name=f"audyt_{d_from}_{d_to}.csv",
+        )
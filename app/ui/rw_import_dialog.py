@@ -6,7 +6,6 @@ from typing import List, Dict, Any
 from PySide6 import QtWidgets, QtCore
 from pathlib import Path
 
-from app.services.rw.parser import parse_rw_pdf
 from app.dal.rw_import_repo import RWImportRepo
 
 
@@ -88,6 +87,8 @@ class RWImportDialog(QtWidgets.QDialog):
         path = self.file_edit.text().strip()
         if not path:
             return
+        from app.services.rw.parser import parse_rw_pdf  # stos PDF ładowany dopiero tutaj
+
         dbg_path = str(Path(path).with_suffix(Path(path).suffix + ".dbg.txt"))
         pr = parse_rw_pdf(path, debug_path=dbg_path)
         # spłaszczamy na rekordy do UI/DB, zachowując unit_price
@@ -8,7 +8,10 @@ from PySide6.QtCore import Qt, Signal, QTimer, Slot
 from PySide6 import QtGui
 
 import logging
+from dataclasses import dataclass
+from app.infra import events
 from app.infra.logging import set_station, set_user
+from app.ui.widgets.query_runner import query_runner
 
 # qdarktheme opcjonalnie
 try:
@@ -42,8 +45,35 @@ PERMISSIONS = {
 ORDERED_MODULES = ["Operacje", "Inwentaryzacja", "Raporty", "Wyjątki", "Ustawienia", "Użytkownicy"]
 
 
+@dataclass(frozen=True)
+class RefreshPolicy:
+    """
+    Kiedy odświeżyć zbudowany (cache'owany) widżet modułu – woła jego refresh():
+      on_open    – przy każdym przełączeniu na moduł,
+      interval_s – cyklicznie, tylko gdy moduł jest widoczny,
+      events     – po zdarzeniu z app.infra.events (widoczny: od razu,
+                   niewidoczny: oznaczony jako nieaktualny i odświeżony przy otwarciu),
+      method     – metoda widżetu wołana przy odświeżeniu (np. przyrostowe poll()).
+    """
+    on_open: bool = False
+    interval_s: int | None = None
+    events: tuple[str, ...] = ()
+    method: str = "refresh"
+
+
+# Widżety modułów żyją przez całą sesję (do wylogowania); brak wpisu = bez odświeżania
+MODULE_POLICIES: dict[str, RefreshPolicy] = {
+    "Raporty": RefreshPolicy(events=(events.MOVEMENTS_CHANGED,)),
+    # nowe wyjątki wykrywa sonda MAX(id) w oknie (_on_exc_timer) – bez pełnego przeładowania
+    "Wyjątki": RefreshPolicy(events=(events.MOVEMENTS_CHANGED,), method="poll"),
+    "Użytkownicy": RefreshPolicy(events=(events.EMPLOYEES_CHANGED,)),
+}
+
+
 class MainWindow(QMainWindow):
     request_logout = Signal()
+    # zdarzenia z magistrali (dowolny wątek) -> wątek UI
+    _event_received = Signal(str)
 
     def __init__(
         self,
@@ -56,6 +86,7 @@ class MainWindow(QMainWindow):
         reports_repo=None,
         settings=None,          # <-- NOWE
         rfid_reader=None,       # <-- NOWE
+        alerts=None,            # StockAlertEngine | None
     ):
         super().__init__()
         self.db_ok = db_ok
@@ -65,7 +96,26 @@ class MainWindow(QMainWindow):
         self.reports_repo = reports_repo
         self.settings = settings          # <-- NOWE
         self.rfid_reader = rfid_reader    # <-- NOWE
+        self.alerts = alerts
         self.widgets: dict[str, QWidget] = {}
+        # cache modułów na sesję: zbudowane widżety (nie placeholdery) i nieaktualne
+        self._built: set[str] = set()
+        self._stale: set[str] = set()
+        self._current: str | None = None
+        self._exc_repo = None
+        self._exc_seen_id: int | None = None   # znak wody wyjątków widzianych przez użytkownika
+        self._exc_timer = QTimer(self)
+        self._exc_timer.timeout.connect(self._on_exc_timer)
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.timeout.connect(self._on_refresh_timer)
+        self._event_received.connect(self._on_event)
+        self._unsubscribe = [
+            events.subscribe(t, lambda topic, _payload: self._event_received.emit(topic))
+            for t in sorted(
+                {t for p in MODULE_POLICIES.values() for t in p.events} | {events.STOCK_ALERTS_CHANGED}
+            )
+        ]
+        self.destroyed.connect(lambda *_: [u() for u in self._unsubscribe])
 
         user_info = (
             f"{self.session.get('first_name','')} {self.session.get('last_name','')} "
@@ -93,9 +143,26 @@ class MainWindow(QMainWindow):
         self.lbl_db  = QLabel("DB: ✅ połączona" if self.db_ok else "DB: ❌ offline")
         self.lbl_ws  = QLabel(f"Stanowisko: {self.session.get('station','—')}")
         self.lbl_user= QLabel(f"Zalogowany: {self.session.get('name','—')}")
-        for w in (self.lbl_db, self.lbl_ws, self.lbl_user):
+        # wskaźnik zapytań w tle (QueryRunner) + czas ostatniego zapytania
+        self.lbl_busy = QLabel("")
+        # alerty minimalnego stanu (StockAlertEngine) – ukryte, gdy brak
+        self.lbl_alerts = QLabel("")
+        self.lbl_alerts.setStyleSheet("color:#E0A800; font-weight:600;")
+        self.lbl_alerts.setVisible(False)
+        sb.addPermanentWidget(self.lbl_alerts)
+        self.lbl_exc = QLabel("")
+        self.lbl_exc.setStyleSheet("color:#E05A5A; font-weight:600;")
+        self.lbl_exc.setToolTip("Nowe wyjątki (wydania bez zwrotu) – moduł „Wyjątki”")
+        self.lbl_exc.setVisible(False)
+        sb.addPermanentWidget(self.lbl_exc)
+        for w in (self.lbl_busy, self.lbl_db, self.lbl_ws, self.lbl_user):
             w.setStyleSheet("padding:0 8px;")
             sb.addPermanentWidget(w)
+        runner = query_runner()
+        runner.busyChanged.connect(self._on_queries_busy)
+        runner.timed.connect(self._on_query_timed)
+        self._last_query = ""
+        self._update_alerts_badge()
 
         # Zbuduj moduły zgodnie z rolą
         self._rebuild_modules()
@@ -205,33 +272,184 @@ class MainWindow(QMainWindow):
             self.modbar.removeAction(a)
             self._mod_group.removeAction(a)
 
+
+    # ---------- Zapytania w tle ----------
+    @Slot(bool)
+    def _on_queries_busy(self, busy: bool):
+        self.lbl_busy.setText("⏳ Ładowanie…" if busy else self._last_query)
+
+    @Slot(str, float, bool)
+    def _on_query_timed(self, key: str, ms: float, ok: bool):
+        self._last_query = f"{key}: {ms:.0f} ms" + ("" if ok else " ⚠")
+        if not query_runner().is_busy():
+            self.lbl_busy.setText(self._last_query)
+
+    # ---------- Moduły (cache na sesję) ----------
     def _rebuild_modules(self):
-        """Buduje listę modułów i widżetów zgodnie z obecną sesją/rolą."""
-        # 1) Wyczyść pasek modułów
+        """Buduje listę modułów zgodnie z obecną sesją/rolą; widżety powstają przy pierwszym otwarciu."""
+        # 1) Wyczyść pasek modułów i widżety poprzedniej sesji
         self._clear_modulebar()
+        self._dispose_modules()
 
-        # 2) Utwórz widżety tylko dla dozwolonych modułów
+        # 2) Akcje tylko dla dozwolonych modułów
         allowed = self._allowed_modules()
         for name in allowed:
-            if name == "Użytkownicy":
-                # Widżet dostępny tylko dla admina – ostrożnie z importem
-                try:
-                    from app.ui.users_widget import UsersWidget
-                    # Podmień placeholder (lub brak) na realny widget
-                    self._replace_widget("Użytkownicy", UsersWidget(self.repo, self))
-                except Exception as e:
-                    log.exception("Błąd ładowania modułu %s", "Użytkownicy")
-                    self._ensure_placeholder("Użytkownicy", details=f"Błąd ładowania:\n{e}")
-            else:
-                # dla pozostałych modułów na razie placeholder (podmiana gdy będą gotowe)
-                self._ensure_placeholder(name)
-
             self._add_module_action(name)
 
         # 3) Ustaw moduł domyślny
         default_module = allowed[0] if allowed else "Operacje"
         self._open_module(default_module)
 
+        # 4) Sonda nowych wyjątków (znaczek w stopce), gdy moduł jest dostępny
+        interval = int(getattr(getattr(self.settings, "exceptions", None), "poll_interval_s", 30) or 0)
+        if "Wyjątki" in allowed and self.db_ok and self.repo is not None and interval > 0:
+            self._exc_timer.start(interval * 1000)
+
+    def _dispose_modules(self):
+        """Usuwa widżety modułów (wylogowanie / zmiana roli) – dane nie zostają w pamięci."""
+        self._refresh_timer.stop()
+        self._exc_timer.stop()
+        self._exc_seen_id = None
+        self.lbl_exc.setVisible(False)
+        for name, w in list(self.widgets.items()):
+            idx = self.stack.indexOf(w)
+            if idx != -1:
+                self.stack.removeWidget(w)
+            w.deleteLater()
+        self.widgets.clear()
+        self._built.clear()
+        self._stale.clear()
+        self._current = None
+
+    def _build_module(self, name: str) -> QWidget | None:
+        """Tworzy widżet modułu (None = moduł w przygotowaniu -> placeholder)."""
+        if name == "Użytkownicy":
+            from app.ui.users_widget import UsersWidget
+            return UsersWidget(self.repo, self)
+        if name == "Operacje":
+            return self._build_ops_panel()
+        if name == "Wyjątki":
+            from app.ui.exceptions_widget import ExceptionsWidget
+
+            days = getattr(getattr(self.settings, "exceptions", None), "default_days", None)
+            w = ExceptionsWidget(self._exceptions_repo(), self, days=days)
+            w.seen.connect(self._on_exc_seen)
+            return w
+        if name == "Raporty":
+            from app.repo.reports_repo import ReportsRepo
+            from app.ui.reports_widget import ReportsWidget
+
+            if self.reports_repo is None:
+                self.reports_repo = ReportsRepo(self.repo.engine)
+            return ReportsWidget(self.reports_repo, self)
+        return None
+
+    def _exceptions_repo(self):
+        from app.dal.exceptions_repo import ExceptionsRepo
+
+        if self._exc_repo is None:  # repo trzyma wykryte kolumny widoku – jedno na okno
+            self._exc_repo = ExceptionsRepo(self.repo.engine)
+        return self._exc_repo
+
+    # ---------- Nowe wyjątki (sonda + znaczek) ----------
+    @Slot()
+    def _on_exc_timer(self):
+        query_runner().run(
+            (id(self), "exceptions.probe"), self._exceptions_repo().max_id,
+            on_done=self._on_exc_probe, owner=self,
+        )
+
+    def _on_exc_probe(self, max_id: int):
+        if self._exc_seen_id is None:
+            self._exc_seen_id = int(max_id)  # punkt odniesienia: stan przy logowaniu
+            return
+        if max_id <= self._exc_seen_id:
+            return
+        if self._current == "Wyjątki" and "Wyjątki" in self._built and not self._cover.isVisible():
+            self.widgets["Wyjątki"].poll()  # widoczny panel – dopisze nowe i zgłosi `seen`
+            return
+        if "Wyjątki" in self._built:
+            self._stale.add("Wyjątki")
+        query_runner().run(
+            (id(self), "exceptions.count"), self._exceptions_repo().count_since, self._exc_seen_id,
+            on_done=self._set_exc_badge, owner=self,
+        )
+
+    def _set_exc_badge(self, n: int):
+        self.lbl_exc.setText(f"🔔 Nowe wyjątki: {n}")
+        self.lbl_exc.setVisible(n > 0)
+
+    @Slot(int)
+    def _on_exc_seen(self, last_id: int):
+        self._exc_seen_id = max(self._exc_seen_id or 0, int(last_id))
+        self.lbl_exc.setVisible(False)
+
+    def _build_ops_panel(self) -> QWidget:
+        from PySide6 import QtWidgets
+        from app.ui.ops_issue_dialog import OpsIssueDialog
+
+        from app.ui.ops_return_dialog import OpsReturnDialog
+        from app.ui.rw_import_dialog import RWImportDialog
+
+        panel = QtWidgets.QWidget()
+        log.info("Operacje – otwarto panel")
+        lay = QtWidgets.QVBoxLayout(panel)
+        lay.setContentsMargins(24, 24, 24, 24)
+
+        params = {
+            "repo": self.repo,
+            "reports_repo": self.reports_repo,
+            "station_id": self.session.get("station", "UNKNOWN"),
+            "operator_user_id": int(
+                self.session.get("user_id")
+                or self.session.get("id")
+                or 0
+            ),
+        }
+
+        btn_issue = QtWidgets.QPushButton("Wydanie ręczne")
+        btn_issue.setMinimumHeight(42)
+        def _open_issue():
+            log.info("SHELL: opening OpsIssueDialog")
+            OpsIssueDialog(parent=self, **params).exec()
+            events.publish(events.MOVEMENTS_CHANGED, source="issue")
+
+        btn_issue.clicked.connect(_open_issue)
+
+        btn_return = QtWidgets.QPushButton("Zwrot")
+        btn_return.setMinimumHeight(42)
+
+        def _open_return():
+            log.info("Operacje – otwarto dialog: %s", "RETURN")
+            OpsReturnDialog(parent=self, **params).exec()
+            events.publish(events.MOVEMENTS_CHANGED, source="return")
+
+        btn_return.clicked.connect(_open_return)
+
+        btn_import = QtWidgets.QPushButton("Import RW (PDF)")
+        btn_import.setMinimumHeight(42)
+
+        def _open_import():
+            RWImportDialog(self.repo.engine, self).exec()
+            events.publish(events.MOVEMENTS_CHANGED, source="rw_import")
+
+        btn_import.clicked.connect(_open_import)
+
+        if self.repo is None or self.reports_repo is None:
+            for b in (btn_issue, btn_return):
+                b.setEnabled(False)
+                b.setToolTip("Brak połączenia z DB")
+        if self.repo is None:
+            btn_import.setEnabled(False)
+            btn_import.setToolTip("Brak połączenia z DB")
+
+        lay.addWidget(btn_issue, 0, Qt.AlignLeft)
+        lay.addWidget(btn_return, 0, Qt.AlignLeft)
+
+        lay.addWidget(btn_import, 0, Qt.AlignLeft)
+        lay.addStretch(1)
+        return panel
+
     def _open_module(self, name: str):
         log.info("Otwieram moduł: %s", name)
         # guard: tylko dozwolone moduły wg roli
@@ -243,131 +461,85 @@ class MainWindow(QMainWindow):
             if a.text() == name:
                 a.setChecked(True)
 
-        # domyślnie – bierz istniejący widżet (placeholder jeśli już utworzony)
-        w = self.widgets.get(name)
-
-        # --- Operacje ---
-        if name == "Operacje":
-            if not self.db_ok or not self.repo:
-                self._ensure_placeholder("Operacje", "Brak połączenia z DB")
-                w = self.widgets["Operacje"]
-            else:
-                try:
-                    from PySide6 import QtWidgets
-                    from app.ui.ops_issue_dialog import OpsIssueDialog
-
-                    from app.ui.ops_return_dialog import OpsReturnDialog
-                    from app.ui.rw_import_dialog import RWImportDialog
-
-                    panel = QtWidgets.QWidget()
-                    log.info("Operacje – otwarto panel")
-                    lay = QtWidgets.QVBoxLayout(panel)
-                    lay.setContentsMargins(24, 24, 24, 24)
-
-                    params = {
-                        "repo": self.repo,
-                        "reports_repo": self.reports_repo,
-                        "station_id": self.session.get("station", "UNKNOWN"),
-                        "operator_user_id": int(
-                            self.session.get("user_id")
-                            or self.session.get("id")
-                            or 0
-                        ),
-                    }
-
-                    btn_issue = QtWidgets.QPushButton("Wydanie ręczne")
-                    btn_issue.setMinimumHeight(42)
-                    def _open_issue():
-                        log.info("SHELL: opening OpsIssueDialog")
-                        OpsIssueDialog(parent=self, **params).exec()
-
-                    btn_issue.clicked.connect(_open_issue)                    
-
-                    btn_return = QtWidgets.QPushButton("Zwrot")
-                    btn_return.setMinimumHeight(42)
-
-                    def _open_return():
-                        log.info("Operacje – otwarto dialog: %s", "RETURN")
-                        OpsReturnDialog(parent=self, **params).exec()
-
-                    btn_return.clicked.connect(_open_return)
-
-
-                    btn_import = QtWidgets.QPushButton("Import RW (PDF)")
-                    btn_import.setMinimumHeight(42)
-                    btn_import.clicked.connect(lambda: RWImportDialog(self.repo.engine, self).exec())
-
-                    if self.repo is None or self.reports_repo is None:
-                        for b in (btn_issue, btn_return):
-                            b.setEnabled(False)
-                            b.setToolTip("Brak połączenia z DB")
-                    if self.repo is None:
-                        btn_import.setEnabled(False)
-                        btn_import.setToolTip("Brak połączenia z DB")
-                    
-                    lay.addWidget(btn_issue, 0, Qt.AlignLeft)
-                    lay.addWidget(btn_return, 0, Qt.AlignLeft)
-
-                    lay.addWidget(btn_import, 0, Qt.AlignLeft)
-                    lay.addStretch(1)
-
-                    self._replace_widget("Operacje", panel)
-                    w = self.widgets["Operacje"]
-                except Exception as e:
-                    log.exception("Błąd ładowania modułu %s", "Operacje")
-                    self._ensure_placeholder("Operacje", details=f"Błąd ładowania:\n{e}")
-                    w = self.widgets["Operacje"]
-
-        # --- Wyjątki ---
-        elif name == "Wyjątki":
-            if not self.db_ok or not self.repo:
-                self._ensure_placeholder("Wyjątki", "Brak połączenia z DB")
-                w = self.widgets["Wyjątki"]
+        needs_db = name in ("Operacje", "Wyjątki", "Raporty")
+        if name not in self._built:
+            # pierwsze otwarcie w tej sesji (albo ponowna próba po błędzie) – budowa
+            if needs_db and (not self.db_ok or not self.repo):
+                self._ensure_placeholder(name, "Brak połączenia z DB")
             else:
                 try:
-                    from app.dal.exceptions_repo import ExceptionsRepo
-                    from app.ui.exceptions_widget import ExceptionsWidget
-
-                    exc_repo = ExceptionsRepo(self.repo.engine)
-                    self._replace_widget("Wyjątki", ExceptionsWidget(exc_repo, self))
-                    w = self.widgets["Wyjątki"]
+                    w = self._build_module(name)
                 except Exception as e:
-                    log.exception("Błąd ładowania modułu %s", "Wyjątki")
-                    self._ensure_placeholder("Wyjątki", details=f"Błąd ładowania:\n{e}")
-                    w = self.widgets["Wyjątki"]
-
-        # --- Raporty ---
-        elif name == "Raporty":
-            if not self.db_ok or not (self.repo or self.reports_repo):
-                self._ensure_placeholder("Raporty", "Brak połączenia z DB")
-                w = self.widgets["Raporty"]
-            else:
-                try:
-                    from app.repo.reports_repo import ReportsRepo
-                    from app.ui.reports_widget import ReportsWidget
-
-                    rep_repo = self.reports_repo or ReportsRepo(self.repo.engine)
-                    self._replace_widget("Raporty", ReportsWidget(rep_repo, self))
-                    self.reports_repo = rep_repo
-                    w = self.widgets["Raporty"]
-                except Exception as e:
-                    log.exception("Błąd ładowania modułu %s", "Raporty")
-                    self._ensure_placeholder("Raporty", details=f"Błąd ładowania:\n{e}")
-                    w = self.widgets["Raporty"]
-
-        # --- Reszta (placeholdery na razie) ---
-        else:
-            if w is None:
-                self._ensure_placeholder(name)
-                w = self.widgets[name]
-
+                    log.exception("Błąd ładowania modułu %s", name)
+                    self._ensure_placeholder(name, details=f"Błąd ładowania:\n{e}")
+                else:
+                    if w is None:
+                        if name not in self.widgets:
+                            self._ensure_placeholder(name)
+                    else:
+                        self._replace_widget(name, w)
+                        self._built.add(name)
+                        self._stale.discard(name)  # świeżo zbudowany = świeże dane
+        elif name in self._stale or MODULE_POLICIES.get(name, RefreshPolicy()).on_open:
+            self._refresh_module(name)
+
+        w = self.widgets[name]
         # wstaw/ustaw w stacku
         if self.stack.indexOf(w) == -1:
             self.stack.addWidget(w)
         self.stack.setCurrentWidget(w)
+        self._current = name
+
+        # odświeżanie cykliczne tylko dla widocznego modułu
+        policy = MODULE_POLICIES.get(name)
+        if policy and policy.interval_s and name in self._built:
+            self._refresh_timer.start(int(policy.interval_s) * 1000)
+        else:
+            self._refresh_timer.stop()
 
+    def _refresh_module(self, name: str):
+        self._stale.discard(name)
+        w = self.widgets.get(name)
+        method = MODULE_POLICIES.get(name, RefreshPolicy()).method
+        fn = getattr(w, method, None) if name in self._built else None
+        if callable(fn):
+            log.debug("Odświeżam moduł: %s", name)
+            try:
+                fn()
+            except Exception:
+                log.exception("Błąd odświeżania modułu %s", name)
+
+    @Slot()
+    def _on_refresh_timer(self):
+        if self._current and self.isVisible() and not self._cover.isVisible():
+            self._refresh_module(self._current)
+
+    @Slot(str)
+    def _on_event(self, topic: str):
+        if topic == events.STOCK_ALERTS_CHANGED:
+            self._update_alerts_badge()
+            return
+        for name, policy in MODULE_POLICIES.items():
+            if topic not in policy.events or name not in self._built:
+                continue
+            if name == self._current:
+                self._refresh_module(name)
+            else:
+                self._stale.add(name)
 
     # ---------- Status/tytuł ----------
+    def _update_alerts_badge(self):
+        from app.appsvc.alerts import format_alerts
+
+        active = self.alerts.active_alerts() if self.alerts is not None else []
+        self.lbl_alerts.setVisible(bool(active))
+        if not active:
+            return
+        label = ((getattr(self.settings, "alerts", None) or {}).get("low_stock")
+                 or "⚠️ Niski stan magazynowy")
+        self.lbl_alerts.setText(f"{label}: {len(active)}")
+        self.lbl_alerts.setToolTip(format_alerts(active))
+
     def _update_statusbar(self):
         self.lbl_ws.setText(f"Stanowisko: {self.session.get('station','—')}")
         self.lbl_user.setText(f"Zalogowany: {self.session.get('name','—')}")
@@ -465,6 +637,7 @@ class MainWindow(QMainWindow):
         station = (self.session or {}).get("station", "UNKNOWN")
         self.session = {}
         set_user("-")
+        self._dispose_modules()  # dane poprzedniego użytkownika nie zostają w widżetach
         log.info("Wylogowano użytkownika")
         if self.statusBar():
             self.statusBar().showMessage("Wylogowano – zaloguj się ponownie.")
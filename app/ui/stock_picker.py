@@ -3,6 +3,8 @@ from typing import Any
 from PySide6 import QtWidgets
 from PySide6.QtCore import Qt
 
+from app.ui.widgets.typeahead import TypeaheadController
+
 class StockPickerDialog(QtWidgets.QDialog):
     def __init__(self, repo: Any, parent: QtWidgets.QWidget | None = None, search_limit: int = 1000):
         super().__init__(parent)
@@ -40,7 +42,16 @@ class StockPickerDialog(QtWidgets.QDialog):
         lay.addWidget(self.table)
         lay.addLayout(bottom)
 
-        self.btnFind.clicked.connect(self._search)
+        # wpisywanie -> zapytanie w tle (debounce); zawężenia z cache wyników
+        self.search = TypeaheadController(
+            lambda q: self.repo.search_stock(q, limit=self._search_limit),
+            parent=self,
+            limit=self._search_limit,
+        )
+        self.search.bind(self.q)
+        self.search.results.connect(lambda q, rows: self._apply_results(rows))
+        self.search.failed.connect(self._on_search_failed)
+        self.btnFind.clicked.connect(lambda: self.search.submit(self.q.text()))
         self.table.doubleClicked.connect(self._row_to_qty)
         self.btnOk.clicked.connect(self.accept)
         self.btnCancel.clicked.connect(self.reject)
@@ -49,12 +60,20 @@ class StockPickerDialog(QtWidgets.QDialog):
         self._search()
         
     def _search(self, limit: int | None = None):
+        """Synchroniczne wyszukiwanie (pierwsze otwarcie); dalej działa TypeaheadController."""
         limit = limit or self._search_limit
         try:
-            self._items = self.repo.search_stock(self.q.text().strip(), limit=limit)  # AuthRepo.search_stock
+            items = self.repo.search_stock(self.q.text().strip(), limit=limit)  # AuthRepo.search_stock
         except Exception:
-            QtWidgets.QMessageBox.critical(self, "Błąd", "Nie udało się pobrać stanów.")
+            self._on_search_failed("", "")
             return
+        self._apply_results(items)
+
+    def _on_search_failed(self, q: str, msg: str):
+        QtWidgets.QMessageBox.critical(self, "Błąd", "Nie udało się pobrać stanów.")
+
+    def _apply_results(self, items: list[dict]):
+        self._items = list(items or [])
         self.table.setRowCount(0)
         for it in self._items:
             r = self.table.rowCount()
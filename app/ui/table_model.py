@@ -1,5 +1,8 @@
 from __future__ import annotations
-from PySide6.QtCore import QAbstractTableModel, Qt, QModelIndex
+from typing import Callable, Iterator
+from PySide6.QtCore import QAbstractTableModel, Qt, QModelIndex, Signal
+
+from app.ui.widgets.query_runner import query_runner
 
 class SimpleTableModel(QAbstractTableModel):
     def __init__(self, rows: list[dict] | None = None):
@@ -22,3 +25,343 @@ class SimpleTableModel(QAbstractTableModel):
         if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole): return None
         row = self._rows[index.row()]
         return row.get(self._cols[index.column()], "")
+
+
+class KeyedTableModel(SimpleTableModel):
+    """
+    Model ze stałymi kolumnami [(klucz, nagłówek)] i indeksem klucz -> wiersz.
+    set_rows() porównuje nowe dane z bieżącymi i emituje tylko potrzebne
+    sygnały (dataChanged / insertRows / removeRows); reset tylko przy zmianie kolejności.
+    Klucz wiersza dostępny pod Qt.UserRole (w każdej kolumnie).
+    """
+
+    def __init__(self, columns: list[tuple[str, str]], key: str = "item_id"):
+        super().__init__()
+        self._key = key
+        self._cols = [c for c, _ in columns]
+        self._headers = [h for _, h in columns]
+        self._index: dict = {}
+
+    # ---------- dane ----------
+    def set_rows(self, rows: list[dict]):
+        rows = list(rows or [])
+        new_keys = [r[self._key] for r in rows]
+        old_keys = [r[self._key] for r in self._rows]
+        new_set = set(new_keys)
+
+        # 1) usuń wiersze, których już nie ma (od końca, blokami)
+        gone = [i for i, k in enumerate(old_keys) if k not in new_set]
+        for first, last in reversed(_blocks(gone)):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._rows[first:last + 1]
+            self.endRemoveRows()
+        kept = [r[self._key] for r in self._rows]
+
+        # 2) pozostałe muszą zachować kolejność – inaczej pełny reset
+        if kept != new_keys[:len(kept)]:
+            self.beginResetModel()
+            self._rows = rows
+            self._reindex()
+            self.endResetModel()
+            return
+
+        # 3) aktualizacja istniejących + dopisanie nowych na końcu
+        for i, row in enumerate(rows[:len(kept)]):
+            if row != self._rows[i]:
+                self._rows[i] = row
+                self._emit_row_changed(i)
+        if len(rows) > len(kept):
+            self.beginInsertRows(QModelIndex(), len(kept), len(rows) - 1)
+            self._rows.extend(rows[len(kept):])
+            self.endInsertRows()
+        self._reindex()
+
+    def append_rows(self, rows: list[dict]):
+        """Dopisuje wiersze na końcu (kolejna strona) bez odświeżania istniejących."""
+        rows = [r for r in rows or [] if r[self._key] not in self._index]
+        if not rows:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        for i, row in enumerate(rows, start=first):
+            self._index[row[self._key]] = i
+        self.endInsertRows()
+
+    def row_of(self, key) -> int | None:
+        return self._index.get(key)
+
+    def key_at(self, row: int):
+        return self._rows[row][self._key] if 0 <= row < len(self._rows) else None
+
+    def row_dict(self, key) -> dict | None:
+        r = self._index.get(key)
+        return self._rows[r] if r is not None else None
+
+    def update_row(self, key, **changes) -> bool:
+        """Zmienia pola jednego wiersza (O(1)) i odświeża tylko ten wiersz."""
+        r = self._index.get(key)
+        if r is None:
+            return False
+        self._rows[r] = {**self._rows[r], **changes}
+        self._emit_row_changed(r)
+        return True
+
+    def _reindex(self):
+        self._index = {row[self._key]: i for i, row in enumerate(self._rows)}
+
+    def _emit_row_changed(self, r: int):
+        self.dataChanged.emit(self.index(r, 0), self.index(r, len(self._cols) - 1))
+
+    # ---------- Qt API ----------
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole: return None
+        return self._headers[section] if orientation == Qt.Horizontal else section + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid(): return None
+        row = self._rows[index.row()]
+        if role == Qt.UserRole:
+            return row[self._key]
+        if role == Qt.EditRole:
+            return row.get(self._cols[index.column()])
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            val = row.get(self._cols[index.column()], "")
+            return "" if val is None else _fmt(val)
+        return None
+
+
+class StockTableModel(KeyedTableModel):
+    """Dostępne pozycje magazynowe; kolumna 'in_cart' edytowalna (delegat ilości)."""
+
+    COLUMNS = [
+        ("sku", "SKU"),
+        ("name", "Nazwa"),
+        ("uom", "JM"),
+        ("qty_on_hand", "Na stanie"),
+        ("qty_reserved_open", "Zarezerw."),
+        ("qty_available", "Dostępne"),
+        ("in_cart", "W koszyku"),
+        ("_step", "–/+"),
+    ]
+    # (item_id, nowa ilość) – zgłaszane przez edycję komórki 'W koszyku'
+    qtyEdited = Signal(int, float)
+
+    def __init__(self):
+        super().__init__(self.COLUMNS, key="item_id")
+
+    @staticmethod
+    def build_rows(
+        items: list[dict],
+        in_cart: dict[int, float],
+        synced: dict[int, float] | None = None,
+    ) -> list[dict]:
+        """
+        Wiersze modelu z wyniku StockRepository.list_available(_page) + ilości w koszyku.
+        `synced` – ilości zapisane w DB (CartBuffer.synced_map); domyślnie `in_cart`.
+        """
+        reserved = in_cart if synced is None else synced
+        rows = []
+        for it in items:
+            iid = int(it["item_id"])
+            qty_av = float(it.get("qty_available") or 0)
+            cart_qty = float(in_cart.get(iid, 0.0))
+            rows.append({
+                "item_id": iid,
+                "sku": it.get("sku") or "",
+                "name": it.get("name") or (it.get("sku") or ""),
+                "uom": it.get("uom") or "",
+                "qty_on_hand": float(it.get("qty_on_hand") or 0),
+                "qty_reserved_open": float(it.get("qty_reserved_open") or 0),
+                "qty_available": qty_av,
+                "in_cart": cart_qty,
+                # widok odejmuje zapisaną własną rezerwację – tylko ją wolno doliczyć
+                "max_qty": qty_av + float(reserved.get(iid, 0.0)),
+                "_step": "",
+            })
+        return rows
+
+    def column(self, key: str) -> int:
+        return self._cols.index(key)
+
+    def set_in_cart(self, item_id: int, qty: float) -> None:
+        row = self.row_dict(int(item_id))
+        if row is not None and row.get("in_cart") != qty:
+            self.update_row(int(item_id), in_cart=qty)
+
+    def flags(self, index):
+        f = super().flags(index)
+        if index.isValid() and self._cols[index.column()] == "in_cart":
+            f |= Qt.ItemIsEditable
+        return f
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid() or self._cols[index.column()] != "in_cart":
+            return False
+        self.qtyEdited.emit(int(self.key_at(index.row())), float(value or 0))
+        return True
+
+
+class CartTableModel(KeyedTableModel):
+    COLUMNS = [
+        ("sku", "SKU"),
+        ("name", "Nazwa"),
+        ("uom", "JM"),
+        ("qty_reserved", "Ilość"),
+    ]
+
+    def __init__(self):
+        super().__init__(self.COLUMNS, key="item_id")
+
+
+class LazyTableModel(QAbstractTableModel):
+    """
+    Model dociągający wiersze blokami podczas przewijania (canFetchMore/fetchMore).
+
+    Źródło: fetch_page(after, limit) -> (wiersze, zakładka | None) – konwencja
+    metod *_page repozytoriów (keyset). Bloki pobiera QueryRunner poza wątkiem UI;
+    widok sam prosi o kolejny, gdy dojdzie do końca załadowanych wierszy.
+    Bufor kolumnowy: jedna lista na kolumnę (bez słownika na wiersz) –
+    pamięć i czas pierwszego wyświetlenia zależą od przewiniętej części, nie od całego wyniku.
+    """
+
+    loaded = Signal(int)    # liczba wierszy w buforze po dołożeniu bloku
+    failed = Signal(str)
+
+    def __init__(self, columns: list[tuple[str, str]], *, block_size: int = 200, runner=None):
+        super().__init__()
+        self._cols = [c for c, _ in columns]
+        self._headers = [h for _, h in columns]
+        self._block = int(block_size)
+        self._runner = runner or query_runner()
+        self._source: Callable | None = None
+        self._clear_buffer()
+
+    def _clear_buffer(self):
+        self._data: list[list] = [[] for _ in self._cols]
+        self._n = 0
+        self._after = None
+        self._more = False
+        self._pending = False
+
+    # ---------- źródło ----------
+    def set_source(self, fetch_page: Callable) -> None:
+        """Nowe źródło (np. inne filtry) – czyści bufor i pobiera pierwszy blok."""
+        self._source = fetch_page
+        self.reload()
+
+    def reload(self) -> None:
+        self._runner.cancel(self._key())
+        self.beginResetModel()
+        self._clear_buffer()
+        self.endResetModel()
+        if self._source is not None:
+            self._more = True
+            self._request()
+
+    def _key(self):
+        return (id(self), "lazy.page")
+
+    def _request(self) -> None:
+        self._pending = True
+        self._runner.run(
+            self._key(), self._source, self._after, self._block,
+            on_done=self._on_page, on_error=self._on_error, owner=self,
+        )
+
+    def _on_page(self, result) -> None:
+        rows, nxt = result
+        self._pending = False
+        self._more = nxt is not None
+        self._after = nxt
+        if rows:
+            first = self._n
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            for c, col in enumerate(self._cols):
+                self._data[c].extend(r.get(col) for r in rows)
+            self._n += len(rows)
+            self.endInsertRows()
+        self.loaded.emit(self._n)
+
+    def prepend_rows(self, rows: list[dict], *, key: str | None = None) -> int:
+        """
+        Wstawia nowe wiersze na górze (np. nowsze niż znak wody) bez przeładowania.
+        `key` – kolumna identyfikująca: wiersze już obecne w buforze są pomijane.
+        Zwraca liczbę wstawionych wierszy.
+        """
+        rows = list(rows or [])
+        if key is not None and rows and self._n:
+            seen = set(self._data[self._cols.index(key)])
+            rows = [r for r in rows if r.get(key) not in seen]
+        if not rows:
+            return 0
+        self.beginInsertRows(QModelIndex(), 0, len(rows) - 1)
+        for c, col in enumerate(self._cols):
+            self._data[c][0:0] = [r.get(col) for r in rows]
+        self._n += len(rows)
+        self.endInsertRows()
+        return len(rows)
+
+    def _on_error(self, msg: str) -> None:
+        self._pending = False
+        self._more = False  # bez pętli ponowień przy przewijaniu; ponów przez reload()
+        self.failed.emit(msg)
+
+    # ---------- dostęp ----------
+    @property
+    def columns(self) -> list[str]:
+        return list(self._cols)
+
+    def row_dict(self, row: int) -> dict:
+        return {col: self._data[c][row] for c, col in enumerate(self._cols)}
+
+    def iter_rows(self) -> Iterator[tuple]:
+        """Wiersze z bufora (tylko już pobrane) jako krotki w kolejności kolumn."""
+        return zip(*self._data) if self._n else iter(())
+
+    def has_more(self) -> bool:
+        return self._more
+
+    # ---------- Qt API ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._n
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._cols)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._more and not self._pending
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self._request()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole: return None
+        return self._headers[section] if orientation == Qt.Horizontal else section + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid(): return None
+        val = self._data[index.column()][index.row()]
+        if role == Qt.EditRole:
+            return val
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return "" if val is None else _fmt(val)
+        return None
+
+
+def _blocks(indices: list[int]) -> list[tuple[int, int]]:
+    """[1,2,3,7,8] -> [(1,3),(7,8)] (indeksy posortowane rosnąco)."""
+    out: list[tuple[int, int]] = []
+    for i in indices:
+        if out and out[-1][1] == i - 1:
+            out[-1] = (out[-1][0], i)
+        else:
+            out.append((i, i))
+    return out
+
+
+def _fmt(val):
+    if isinstance(val, float) and val.is_integer():
+        return str(int(val))
+    return str(val)
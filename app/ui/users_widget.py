@@ -8,6 +8,8 @@ from PySide6.QtCore import Qt
 import re
 import logging
 
+from app.ui.widgets.query_runner import query_runner
+
 log = logging.getLogger(__name__)
 
 if TYPE_CHECKING:
@@ -19,6 +21,7 @@ class UsersWidget(QWidget):
         super().__init__(parent)
         self.repo = repo
         self.parent = parent
+        self.runner = query_runner()
 
         # Guard – tylko admin
         if not (parent.session.get("is_admin") or (parent.session.get("role", "").lower() == "admin")):
@@ -165,12 +168,17 @@ class UsersWidget(QWidget):
     # ---------- Dane ----------
     def refresh(self):
         q = self.search.text().strip() or None
-        try:
-            rows = self.repo.list_employees(q)
-        except Exception as e:
-            log.exception("Błąd ładowania użytkowników q=%r lim=%s", q, None)
-            QtWidgets.QMessageBox.warning(self, "Błąd ładowania użytkowników", str(e))
-            return    
+
+        def failed(msg):
+            log.error("Błąd ładowania użytkowników q=%r lim=%s: %s", q, None, msg)
+            QtWidgets.QMessageBox.warning(self, "Błąd ładowania użytkowników", msg)
+
+        self.runner.run(
+            (id(self), "users.list"), self.repo.list_employees, q,
+            on_done=self._set_rows, on_error=failed, owner=self,
+        )
+
+    def _set_rows(self, rows):
         self.table.setRowCount(len(rows))
         for r, u in enumerate(rows):
             # PIN w tabeli: jawny tylko jeśli zaznaczono checkbox; w przeciwnym razie status
@@ -203,13 +211,18 @@ class UsersWidget(QWidget):
         row = items[0].row()
         it_id = self.table.item(row, 0)
         emp_id = it_id.data(Qt.ItemDataRole.UserRole) or int(it_id.text())
-        try:
-            u = self.repo.get_employee(emp_id)
-        except Exception as e:
-            log.exception("Błąd ładowania użytkownika id=%s", emp_id)
-            QtWidgets.QMessageBox.warning(self, "Błąd ładowania użytkownika", str(e))
+
+        def failed(msg):
+            log.error("Błąd ładowania użytkownika id=%s: %s", emp_id, msg)
+            QtWidgets.QMessageBox.warning(self, "Błąd ładowania użytkownika", msg)
             self._clear_form()
-            return
+
+        self.runner.run(
+            (id(self), "users.detail"), self.repo.get_employee, emp_id,
+            on_done=self._fill_form, on_error=failed, owner=self,
+        )
+
+    def _fill_form(self, u):
         if not u:
             self._clear_form(); return
 
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from PySide6 import QtWidgets
+from PySide6.QtCore import QEvent, QModelIndex, QRect, Qt, Signal
+
+
+class QtySpinDelegate(QtWidgets.QStyledItemDelegate):
+    """
+    Edytor ilości (QSpinBox) tworzony tylko na czas edycji komórki –
+    zamiast stałego widżetu w każdym wierszu. Górny limit: `max_fn(index)`
+    (jeśli podano) albo `maximum`.
+    """
+
+    def __init__(self, parent=None, *, max_fn=None, maximum: int = 999999):
+        super().__init__(parent)
+        self._max_fn = max_fn
+        self._maximum = int(maximum)
+
+    def createEditor(self, parent, option, index):
+        spin = QtWidgets.QSpinBox(parent)
+        top = self._maximum
+        if self._max_fn is not None:
+            try:
+                top = int(self._max_fn(index))
+            except Exception:
+                pass
+        spin.setRange(0, max(top, 0))
+        spin.setFrame(False)
+        return spin
+
+    def setEditorData(self, editor, index):
+        try:
+            editor.setValue(int(float(index.data(Qt.EditRole) or 0)))
+        except Exception:
+            editor.setValue(0)
+
+    def setModelData(self, editor, model, index):
+        editor.interpretText()
+        model.setData(index, editor.value(), Qt.EditRole)
+
+    def updateEditorGeometry(self, editor, option, index):
+        editor.setGeometry(option.rect)
+
+
+class StepButtonsDelegate(QtWidgets.QStyledItemDelegate):
+    """
+    Rysuje w komórce parę przycisków "–" / "+" (bez tworzenia widżetów)
+    i zgłasza kliknięcie jako stepped(index, delta).
+    """
+
+    stepped = Signal(QModelIndex, int)
+
+    def _rects(self, rect: QRect) -> tuple[QRect, QRect]:
+        half = rect.width() // 2
+        left = QRect(rect.left() + 1, rect.top() + 1, half - 2, rect.height() - 2)
+        right = QRect(rect.left() + half + 1, rect.top() + 1, rect.width() - half - 2, rect.height() - 2)
+        return left, right
+
+    def paint(self, painter, option, index):
+        style = option.widget.style() if option.widget else QtWidgets.QApplication.style()
+        for rect, label in zip(self._rects(option.rect), ("–", "+")):
+            btn = QtWidgets.QStyleOptionButton()
+            btn.rect = rect
+            btn.text = label
+            btn.state = QtWidgets.QStyle.State_Enabled | QtWidgets.QStyle.State_Raised
+            style.drawControl(QtWidgets.QStyle.CE_PushButton, btn, painter, option.widget)
+
+    def sizeHint(self, option, index):
+        hint = super().sizeHint(option, index)
+        hint.setWidth(max(hint.width(), 64))
+        return hint
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            left, right = self._rects(option.rect)
+            pos = event.position().toPoint()
+            if left.contains(pos):
+                self.stepped.emit(index, -1)
+                return True
+            if right.contains(pos):
+                self.stepped.emit(index, +1)
+                return True
+        return super().editorEvent(event, model, option, index)
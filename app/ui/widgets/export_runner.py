@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from PySide6.QtWidgets import QFileDialog, QMessageBox, QProgressDialog, QWidget
+
+from app.appsvc.export import Columns, ExportCancelled, export_rows
+
+log = logging.getLogger(__name__)
+
+
+class _ExportSignals(QObject):
+    progress = Signal(int)
+    finished = Signal(int, str)
+    failed = Signal(str)
+    cancelled = Signal()
+
+
+class ExportTask(QRunnable):
+    """
+    Eksport w QThreadPool. `source` to funkcja zwracająca generator wierszy –
+    wołana w wątku roboczym, więc połączenie z bazą (kursor strumieniowy) żyje tylko tam.
+    """
+
+    def __init__(self, source: Callable[[], Iterable[Dict]], columns: Columns, path: Path | str, *, title: str = ""):
+        super().__init__()
+        self.source = source
+        self.columns = list(columns)
+        self.path = Path(path)
+        self.title = title
+        self.signals = _ExportSignals()
+        self._cancel = threading.Event()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def run(self) -> None:
+        try:
+            n = export_rows(
+                self.source(),
+                self.columns,
+                self.path,
+                title=self.title,
+                progress=self.signals.progress.emit,
+                cancelled=self._cancel.is_set,
+            )
+        except ExportCancelled:
+            self.path.unlink(missing_ok=True)
+            log.info("Eksport przerwany: %s", self.path)
+            self.signals.cancelled.emit()
+            return
+        except Exception as e:
+            log.exception("Błąd eksportu: %s", self.path)
+            self.path.unlink(missing_ok=True)
+            self.signals.failed.emit(str(e))
+            return
+        log.info("Wyeksportowano %s: %s wierszy", self.path, n)
+        self.signals.finished.emit(n, str(self.path))
+
+
+_running: set[ExportTask] = set()  # referencje do zakończenia (setAutoDelete(False))
+
+
+def start_export(
+    parent: QWidget,
+    source: Callable[[], Iterable[Dict]],
+    columns: Columns,
+    *,
+    title: str,
+    default_name: str = "eksport",
+    pool: Optional[QThreadPool] = None,
+) -> Optional[ExportTask]:
+    """
+    Pyta o plik (CSV/PDF), uruchamia eksport w tle i pokazuje postęp
+    (liczba wierszy – łącznej nie znamy bez dodatkowego COUNT). Anuluj przerywa
+    eksport i usuwa plik częściowy.
+    """
+    path, flt = QFileDialog.getSaveFileName(
+        parent, title, default_name, "CSV (*.csv);;PDF (*.pdf)"
+    )
+    if not path:
+        return None
+    if not Path(path).suffix:
+        path += ".pdf" if flt.startswith("PDF") else ".csv"
+
+    task = ExportTask(source, columns, path, title=title)
+    task.setAutoDelete(False)
+
+    dlg = QProgressDialog(f"Eksport: {Path(path).name}", "Anuluj", 0, 0, parent)
+    dlg.setWindowTitle(title)
+    dlg.setMinimumDuration(300)
+    dlg.canceled.connect(task.cancel)
+
+    def done():
+        _running.discard(task)
+        dlg.reset()
+        dlg.deleteLater()
+
+    def on_finished(n: int, p: str):
+        done()
+        QMessageBox.information(parent, title, f"Zapisano {n} wierszy do pliku:\n{p}")
+
+    def on_failed(msg: str):
+        done()
+        QMessageBox.critical(parent, f"{title} – błąd", f"Nie udało się zapisać pliku:\n{path}\n\n{msg}")
+
+    task.signals.progress.connect(lambda n: dlg.setLabelText(f"Eksport: {Path(path).name}\nZapisano wierszy: {n}"))
+    task.signals.finished.connect(on_finished)
+    task.signals.failed.connect(on_failed)
+    task.signals.cancelled.connect(done)
+
+    _running.add(task)
+    (pool or QThreadPool.globalInstance()).start(task)
+    return task
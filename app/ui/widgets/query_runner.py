@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import shiboken6
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+log = logging.getLogger(__name__)
+
+
+class _TaskSignals(QObject):
+    done = Signal(int, object)
+    failed = Signal(int, str)
+
+
+class _QueryTask(QRunnable):
+    def __init__(self, req: int, key: Hashable, fn: Callable, args: tuple, kwargs: dict) -> None:
+        super().__init__()
+        self.req = req
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = _TaskSignals()
+
+    def run(self) -> None:
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:  # błąd trafia do UI, nie do wątku puli
+            log.exception("QueryRunner: błąd zapytania %s", self.key)
+            self.signals.failed.emit(self.req, str(e))
+            return
+        self.signals.done.emit(self.req, result)
+
+
+class QueryRunner(QObject):
+    """
+    Zapytania do repozytoriów poza wątkiem UI (QThreadPool):
+      - run(key, fn, ...) -> id żądania; nowe żądanie o tym samym kluczu
+        zastępuje poprzednie (zakolejkowane jest wycofywane z puli, wynik
+        już wykonywanego – odrzucany),
+      - cancel(key) – jak wyżej, bez nowego żądania,
+      - on_done/on_error wołane w wątku UI, tylko gdy `owner` (widżet) jeszcze istnieje,
+      - busyChanged(bool) – czy cokolwiek jest w toku (wskaźnik w pasku stanu),
+      - timed(key, ms, ok) + `timings` – czasy ostatnich zapytań.
+    Zapytania już wysłane do DB nie są przerywane – anulowanie dotyczy wyniku.
+    """
+
+    busyChanged = Signal(bool)
+    timed = Signal(str, float, bool)
+
+    def __init__(
+        self,
+        parent: Optional[QObject] = None,
+        *,
+        pool: Optional[QThreadPool] = None,
+        history: int = 200,
+    ) -> None:
+        super().__init__(parent)
+        self._pool = pool or QThreadPool.globalInstance()
+        self._seq = 0
+        self._latest: Dict[Hashable, int] = {}
+        self._tasks: Dict[int, dict] = {}
+        self._busy = False
+        self.timings: deque[tuple[str, float, bool]] = deque(maxlen=int(history))
+
+    # ---------- API ----------
+    def run(
+        self,
+        key: Hashable,
+        fn: Callable[..., Any],
+        *args: Any,
+        on_done: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[str], None]] = None,
+        owner: Optional[QObject] = None,
+        **kwargs: Any,
+    ) -> int:
+        self.cancel(key)
+        self._seq += 1
+        req = self._seq
+        task = _QueryTask(req, key, fn, args, kwargs)
+        task.setAutoDelete(False)
+        task.signals.done.connect(self._on_done)
+        task.signals.failed.connect(self._on_failed)
+        self._tasks[req] = {
+            "task": task,
+            "key": key,
+            "on_done": on_done,
+            "on_error": on_error,
+            "owner": owner,
+            "t0": time.perf_counter(),
+        }
+        self._latest[key] = req
+        self._update_busy()
+        self._pool.start(task)
+        return req
+
+    def cancel(self, key: Hashable) -> bool:
+        """Porzuca bieżące żądanie dla klucza. True, jeśli było co anulować."""
+        req = self._latest.pop(key, None)
+        if req is None:
+            return False
+        entry = self._tasks.get(req)
+        if entry is not None and self._pool.tryTake(entry["task"]):
+            del self._tasks[req]  # nie wystartowało – nie będzie też sygnału
+        self._update_busy()
+        return True
+
+    def is_busy(self, key: Optional[Hashable] = None) -> bool:
+        return bool(self._latest) if key is None else key in self._latest
+
+    # ---------- wewnętrzne ----------
+    def _finish(self, req: int, ok: bool) -> Optional[dict]:
+        entry = self._tasks.pop(req, None)
+        if entry is None:
+            return None
+        ms = (time.perf_counter() - entry["t0"]) * 1000.0
+        key = _label(entry["key"])
+        self.timings.append((key, ms, ok))
+        self.timed.emit(key, ms, ok)
+        log.debug("QueryRunner: %s %.1f ms%s", key, ms, "" if ok else " (błąd)")
+        if self._latest.get(entry["key"]) != req:
+            return None  # zastąpione lub anulowane – wynik nieaktualny
+        del self._latest[entry["key"]]
+        self._update_busy()
+        owner = entry["owner"]
+        if owner is not None and not shiboken6.isValid(owner):
+            return None  # widżet już zamknięty
+        return entry
+
+    def _on_done(self, req: int, result: Any) -> None:
+        entry = self._finish(req, True)
+        if entry and entry["on_done"]:
+            entry["on_done"](result)
+
+    def _on_failed(self, req: int, msg: str) -> None:
+        entry = self._finish(req, False)
+        if entry and entry["on_error"]:
+            entry["on_error"](msg)
+
+    def _update_busy(self) -> None:
+        busy = bool(self._latest)
+        if busy != self._busy:
+            self._busy = busy
+            self.busyChanged.emit(busy)
+
+
+def _label(key: Hashable) -> str:
+    """Klucz (id(widżet), 'reports.rw') -> 'reports.rw' – do logów i paska stanu."""
+    if isinstance(key, tuple) and key:
+        return str(key[-1])
+    return str(key)
+
+
+_shared: Optional[QueryRunner] = None
+
+
+def query_runner() -> QueryRunner:
+    """Wspólny runner aplikacji (tworzony w wątku UI przy pierwszym użyciu)."""
+    global _shared
+    if _shared is None or not shiboken6.isValid(_shared):
+        _shared = QueryRunner()
+    return _shared
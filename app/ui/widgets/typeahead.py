@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Optional
+
+from PySide6 import QtWidgets
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from app.dal.catalog_search import filter_rows, matches as catalog_matches, substring_fallback
+from app.infra.cache import LRUCache
+from app.ui.widgets.query_runner import QueryRunner, query_runner
+
+
+def _code(row: dict) -> Optional[str]:
+    return row.get("sku") or row.get("code")
+
+
+def filter_items(rows: list, q: str) -> list:
+    """Zawężenie listy lokalnie – ta sama semantyka co serwer (catalog_search.ranked_search)."""
+    rows = list(rows)
+    code_key = "sku" if rows and "sku" in rows[0] else "code"
+    return filter_rows(q, rows, code_key=code_key) if q else rows
+
+
+def default_refine(rows: list, q0: str, q: str) -> Optional[list]:
+    """
+    Zawężenie kompletnego wyniku zapytania `q0` do `q` (q zaczyna się od q0)
+    albo None, gdy potrzebne jest zapytanie do bazy. Trafienia z indeksu dla q
+    są podzbiorem trafień q0; podciągu q w cache nie ma, jeśli q0 był
+    obsłużony przez indeks (albo był za krótki na podciąg).
+    """
+    hits = [r for r in rows if catalog_matches(q, _code(r), r.get("name"))]
+    if hits:
+        return hits
+    q0_indexed = any(catalog_matches(q0, _code(r), r.get("name")) for r in rows)
+    if q0_indexed or not substring_fallback(q0):
+        return None
+    return [r for r in rows if catalog_matches(q, _code(r), r.get("name"), substring=True)]
+
+
+class TypeaheadController(QObject):
+    """
+    Wyszukiwanie "w trakcie pisania" bez blokowania UI:
+      - debounce wpisywanego tekstu (`delay_ms`),
+      - zapytanie `fetch(q)` przez QueryRunner (klucz – kontroler): nowe
+        zapytanie zastępuje poprzednie, wynik nieaktualnego jest odrzucany,
+      - LRU ostatnich wyników: zapytanie zawężające (q zaczyna się od
+        wcześniejszego q0, a wynik q0 był kompletny, tj. < `limit` wierszy)
+        jest liczone lokalnie przez `refine(rows, q0, q)` bez zapytania do DB
+        (None z `refine` – wynik lokalny nie byłby pewny, idzie zapytanie).
+    Wynik: sygnał results(query, rows); błąd: failed(query, komunikat).
+    """
+
+    results = Signal(str, list)
+    failed = Signal(str, str)
+    busyChanged = Signal(bool)
+
+    def __init__(
+        self,
+        fetch: Callable[[str], list],
+        *,
+        parent: Optional[QObject] = None,
+        delay_ms: int = 250,
+        limit: Optional[int] = None,
+        refine: Callable[[list, str, str], Optional[list]] = default_refine,
+        cache_size: int = 32,
+        max_age_s: float = 30.0,
+        runner: Optional[QueryRunner] = None,
+    ) -> None:
+        super().__init__(parent)
+        self.fetch = fetch
+        self.limit = limit
+        self.refine = refine
+        self.max_age_s = float(max_age_s)
+        self._cache: LRUCache[str, tuple[float, list]] = LRUCache(cache_size)
+        self._runner = runner or query_runner()
+        self._busy = False
+        self._text = ""
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(int(delay_ms))
+        self._timer.timeout.connect(lambda: self.submit(self._text))
+
+    # ---------- API ----------
+    def bind(self, edit: QtWidgets.QLineEdit, *, live: bool = True) -> None:
+        """Podpina pole tekstowe: zmiana tekstu -> debounce, Enter -> od razu."""
+        if live:
+            edit.textChanged.connect(self.schedule)
+        edit.returnPressed.connect(lambda: self.submit(edit.text()))
+
+    def schedule(self, text: str) -> None:
+        self._text = text or ""
+        self._timer.start()
+
+    def submit(self, text: Optional[str] = None) -> None:
+        self._timer.stop()
+        q = (self._text if text is None else text or "").strip()
+        self._text = q
+        local = self._from_cache(q)
+        if local is not None:
+            self._runner.cancel(self._key())
+            self._set_busy(False)
+            self.results.emit(q, local)
+            return
+
+        self._set_busy(True)
+        self._runner.run(
+            self._key(), self.fetch, q,
+            on_done=lambda rows: self._on_done(q, rows),
+            on_error=lambda msg: self._on_failed(q, msg),
+            owner=self,
+        )
+
+    def invalidate(self) -> None:
+        """Czyści cache (np. po zmianie stanów)."""
+        self._cache.clear()
+
+    # ---------- wewnętrzne ----------
+    def _key(self):
+        return (id(self), "typeahead")
+
+    def _complete(self, rows: list) -> bool:
+        return self.limit is None or len(rows) < int(self.limit)
+
+    def _from_cache(self, q: str) -> Optional[list]:
+        now = time.monotonic()
+        hit = self._cache.get(q)
+        if hit is not None and now - hit[0] <= self.max_age_s:
+            return list(hit[1])
+        found = self._cache.find(
+            lambda k, v: q.startswith(k) and now - v[0] <= self.max_age_s and self._complete(v[1])
+        )
+        if found is None:
+            return None
+        q0, (ts, cached) = found
+        rows = self.refine(cached, q0, q)
+        if rows is None:
+            return None
+        self._cache.put(q, (ts, rows))
+        return rows
+
+    def _on_done(self, q: str, rows: Any) -> None:
+        rows = list(rows or [])
+        self._cache.put(q, (time.monotonic(), rows))
+        self._set_busy(False)
+        self.results.emit(q, rows)
+
+    def _on_failed(self, q: str, msg: str) -> None:
+        self._set_busy(False)
+        self.failed.emit(q, msg)
+
+    def _set_busy(self, busy: bool) -> None:
+        if busy != self._busy:
+            self._busy = busy
+            self.busyChanged.emit(busy)
@@ -0,0 +1,62 @@
+"""
+SQLite w roli MariaDB dla testów zapytań pisanych tekstem (sqlalchemy.text).
+
+Tłumaczy składnię, której SQLite nie zna: FOR UPDATE, INSERT IGNORE,
+ON DUPLICATE KEY UPDATE / VALUES(col), CURRENT_TIMESTAMP(), NOW() ± INTERVAL,
+SET TRANSACTION / START TRANSACTION WITH CONSISTENT SNAPSHOT (-> BEGIN),
+oraz rejestruje funkcje GREATEST / NOW / DATE_FORMAT. Upsert wymaga w tabeli
+testowej klucza (PRIMARY KEY / UNIQUE) takiego jak w schemacie MariaDB.
+"""
+from __future__ import annotations
+
+import re
+import sqlite3
+from decimal import Decimal
+
+from sqlalchemy import create_engine, event
+
+# parametry Decimal (ilości) jak w PyMySQL – tekstem, bez zaokrąglenia do float
+sqlite3.register_adapter(Decimal, str)
+
+_INTERVAL = re.compile(
+    r"(CURRENT_TIMESTAMP|NOW\(\))\s*([+-])\s*INTERVAL\s+(\?|\d+)\s+(SECOND|MINUTE|HOUR|DAY)",
+    re.IGNORECASE,
+)
+_ON_DUP = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+
+
+def _translate(sql: str) -> str:
+    if re.match(r"\s*SET\s+TRANSACTION\b", sql, flags=re.IGNORECASE):
+        return "SELECT 1"  # poziom izolacji – SQLite ma jeden
+    if re.match(r"\s*START\s+TRANSACTION\b", sql, flags=re.IGNORECASE):
+        return "BEGIN"
+    sql = re.sub(r"\bFOR\s+UPDATE\b", "", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bCURRENT_TIMESTAMP\(\)", "CURRENT_TIMESTAMP", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bNOW\(\)", "CURRENT_TIMESTAMP", sql, flags=re.IGNORECASE)
+    sql = _INTERVAL.sub(
+        lambda m: f"datetime({m.group(1)}, '{m.group(2)}' || {m.group(3)} || ' {m.group(4).lower()}s')", sql
+    )
+    m = _ON_DUP.search(sql)
+    if m:
+        head, tail = sql[:m.start()], sql[m.end():]
+        tail = re.sub(r"\bVALUES\((\w+)\)", r"excluded.\1", tail, flags=re.IGNORECASE)
+        if not re.search(r"\bVALUES\s*\(", head, flags=re.IGNORECASE):
+            head += " WHERE true"  # INSERT … SELECT: upsert SQLite wymaga WHERE przed ON CONFLICT
+        sql = f"{head} ON CONFLICT DO UPDATE SET {tail}"
+    return sql
+
+
+def sqlite_engine(url: str = "sqlite://"):
+    eng = create_engine(url)
+
+    @event.listens_for(eng, "connect")
+    def _functions(dbapi_conn, _rec):
+        dbapi_conn.create_function("GREATEST", -1, lambda *a: max(a, key=float))
+        dbapi_conn.create_function("DATE_FORMAT", 2, lambda ts, _fmt: str(ts)[:7] + "-01")
+
+    @event.listens_for(eng, "before_cursor_execute", retval=True)
+    def _rewrite(conn, cursor, statement, parameters, context, executemany):
+        return _translate(statement), parameters
+
+    return eng
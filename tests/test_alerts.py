@@ -0,0 +1,84 @@
+from sqlalchemy import create_engine, event, text
+
+from app.appsvc.alerts import StockAlertEngine
+from app.infra.events import EventBus
+
+
+def test_movement_event_defers_check_and_reads_items_from_allocations():
+    eng = create_engine("sqlite://")
+    with eng.begin() as conn:
+        conn.execute(text("CREATE TABLE movements (id INTEGER PRIMARY KEY, item_id INTEGER)"))
+        conn.execute(text("CREATE TABLE lots (id INTEGER PRIMARY KEY, item_id INTEGER)"))
+        conn.execute(text("CREATE TABLE movement_allocations (movement_id INTEGER, lot_id INTEGER)"))
+        conn.execute(text("INSERT INTO lots VALUES (10, 1), (11, 2), (12, 3)"))
+        # 1: stary ruch, 2: ISSUE towaru 3, 3: zwrot wielopozycyjny (item_id NULL)
+        conn.execute(text("INSERT INTO movements VALUES (1, 3), (2, 3), (3, NULL)"))
+        conn.execute(text("INSERT INTO movement_allocations VALUES (1, 12), (2, 12), (3, 10), (3, 11)"))
+
+    alerts = StockAlertEngine(eng, bus=EventBus())
+    alerts._last_movement_id = 1
+    queries = []
+    event.listen(eng, "before_cursor_execute", lambda *a: queries.append(1))
+
+    # handler zdarzenia (wątek UI) tylko zgłasza pracę
+    alerts._on_movements("movements.changed", {"source": "return"})
+    assert queries == []
+    assert alerts._scan and alerts._wake.is_set()
+
+    assert sorted(alerts._items_since_last_check()) == [1, 2, 3]
+    assert alerts._last_movement_id == 3
+    assert alerts._items_since_last_check() == []
+
+
+def _stock_engine():
+    eng = create_engine("sqlite://")
+    with eng.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, code TEXT, name TEXT, min_stock INTEGER)"))
+        conn.execute(text("CREATE TABLE lots (id INTEGER PRIMARY KEY, item_id INTEGER, qty_available NUMERIC)"))
+        conn.execute(text("CREATE TABLE item_reservations (item_id INTEGER PRIMARY KEY, qty_reserved NUMERIC)"))
+        conn.execute(text("INSERT INTO items VALUES (1, 'W-6', 'Wiertło 6', 5), (2, 'F-8', 'Frez 8', 0)"))
+        conn.execute(text("INSERT INTO lots VALUES (10, 1, 4), (11, 2, 0)"))
+        conn.execute(text("INSERT INTO item_reservations VALUES (1, 1)"))
+    return eng
+
+
+def _set_lot(eng, qty):
+    with eng.begin() as conn:
+        conn.execute(text("UPDATE lots SET qty_available = :q WHERE id = 10"), {"q": qty})
+
+
+def test_check_items_raises_updates_and_clears_alerts():
+    eng = _stock_engine()
+    bus = EventBus()
+    published = []
+    bus.subscribe("stock.alerts_changed", lambda _t, p: published.append(p))
+    alerts = StockAlertEngine(eng, bus=bus)
+    persisted = []
+    # INSERT … ON DUPLICATE KEY UPDATE (MariaDB) – zapis sprawdzamy na argumentach
+    alerts._persist = lambda conn, raised, cleared: persisted.append(
+        ([(a.item_id, a.qty_available) for a in raised], cleared)
+    )
+
+    # 4 - 1 zarezerwowane < 5 -> alert; towar 2 bez progu
+    assert alerts.check_items([1, 2]) == 1
+    first = alerts.active_alerts()[0]
+    assert (first.item_id, first.code, first.qty_available) == (1, "W-6", 3)
+
+    # bez zmiany stanu – nic do zapisu ani publikacji
+    assert alerts.check_items([1]) == 0
+
+    # nadal poniżej progu, inna ilość – aktualizacja z zachowaniem raised_at
+    _set_lot(eng, 2)
+    assert alerts.check_items([1]) == 1
+    updated = alerts.active_alerts()[0]
+    assert (updated.qty_available, updated.raised_at) == (1, first.raised_at)
+
+    # uzupełniony stan – alert gaśnie
+    _set_lot(eng, 10)
+    assert alerts.check_items([1]) == 1
+    assert alerts.active_alerts() == []
+
+    assert persisted == [([(1, 3)], []), ([], []), ([(1, 1)], []), ([], [1])]
+    assert [(p["raised"], p["cleared"], p["active"]) for p in published] == [
+        ([1], [], 1), ([1], [], 1), ([], [1], 0),
+    ]
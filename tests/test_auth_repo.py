@@ -0,0 +1,35 @@
+from sqlalchemy import create_engine
+
+from app.core.auth import REPEATABLE_READ, AuthRepo
+
+
+def test_shared_engine_keeps_repeatable_read_for_repo_transactions():
+    # silnik ze startu (make_engine) ma READ COMMITTED – repo wraca do domyślnego MariaDB
+    shared = create_engine("mysql+pymysql://u:p@localhost/db", isolation_level="READ COMMITTED")
+    repo = AuthRepo({"db": {}}, engine=shared)
+    assert repo.engine.get_execution_options()["isolation_level"] == REPEATABLE_READ
+    assert repo.engine.pool is shared.pool
+
+
+def test_posting_methods_publish_touched_items(monkeypatch):
+    from app.core import auth
+    from app.infra import events
+
+    monkeypatch.setattr(auth, "svc_scrap_protocol", lambda raw, emp, lines, **kw: {"status": "success"})
+    monkeypatch.setattr(
+        auth, "svc_shift_return_bundle", lambda raw, entries, **kw: {"status": "partial", "failed": [{}]}
+    )
+    repo = AuthRepo({"db": {}}, engine=create_engine("sqlite://"))
+    seen = []
+    unsubscribe = events.subscribe(events.MOVEMENTS_CHANGED, lambda _t, p: seen.append(p))
+    try:
+        repo.scrap_protocol(7, [(3, 1), (1, 2), (3, 1)])
+        repo.shift_return_bundle([(7, [(2, 1)], [(5, 1)]), (8, [], [(2, 1)])])
+        monkeypatch.setattr(auth, "svc_scrap_protocol", lambda *a, **kw: {"status": "duplicate"})
+        repo.scrap_protocol(7, [(3, 1)])
+    finally:
+        unsubscribe()
+    assert seen == [
+        {"source": "scrap", "item_ids": [1, 3]},
+        {"source": "shift_return", "item_ids": [2, 5]},
+    ]
@@ -0,0 +1,33 @@
+from app.infra.cache import LRUCache, TTLCache
+
+
+def test_lru_evicts_least_recently_used():
+    c = LRUCache(2)
+    c.put("a", 1)
+    c.put("b", 2)
+    assert c.get("a") == 1  # "a" staje się najświeższe
+    c.put("c", 3)
+    assert "b" not in c
+    assert list(c) == ["a", "c"]
+
+
+def test_find_returns_newest_match_without_reordering():
+    c = LRUCache(4)
+    c.put("wi", [1, 2, 3])
+    c.put("wie", [1, 2])
+    c.put("x", [])
+    hit = c.find(lambda k, v: "wiert".startswith(k))
+    assert hit == ("wie", [1, 2])
+    assert list(c) == ["wi", "wie", "x"]
+
+
+def test_ttl_cache_expires_entries():
+    now = [100.0]
+    c = TTLCache(4, ttl_s=10, clock=lambda: now[0])
+    c.put("a", 1)
+    c.put("b", 2, ttl_s=30)
+    now[0] += 15
+    assert c.get("a") is None
+    assert "a" not in c
+    assert c.get("b") == 2
+    assert c.find(lambda k, v: v == 2) == ("b", 2)
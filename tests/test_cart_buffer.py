@@ -0,0 +1,220 @@
+import unittest
+
+from contextlib import contextmanager
+
+from app.appsvc.cart import CartBuffer, CheckoutService
+from app.infra import events
+
+
+class FakeCart:
+    def __init__(self, lines=None, states=None):
+        self.lines = list(lines or [])
+        self.syncs = []
+        self.states = dict(states or {})
+        self.cancelled = []
+
+    def session_state(self, session_id):
+        return self.states.get(session_id, "OPEN")
+
+    def cancel_expired(self, session_id):
+        self.cancelled.append(session_id)
+        return True
+
+    def list_lines(self, session_id):
+        return list(self.lines)
+
+    def sync_lines(self, session_id, changes):
+        self.syncs.append((session_id, dict(changes)))
+
+
+class CartBufferTests(unittest.TestCase):
+    def test_edits_are_batched_until_flush(self):
+        cart = FakeCart([{"item_id": 1, "sku": "A", "name": "A", "uom": "SZT", "qty_reserved": 2}])
+        buf = CartBuffer(cart, 10)
+        buf.load()
+
+        buf.add(1, +1)
+        buf.add(1, +1)
+        buf.set_qty(2, 3, {"sku": "B", "name": "B"})
+        buf.remove(2)
+        buf.add(3, +1, {"sku": "C"})
+
+        self.assertEqual(cart.syncs, [])
+        self.assertTrue(buf.has_pending)
+        self.assertEqual(buf.reserved_map(), {1: 4.0, 3: 1.0})
+
+        self.assertEqual(buf.flush(), 3)
+        self.assertEqual(cart.syncs, [(10, {1: 4.0, 2: 0.0, 3: 1.0})])
+        self.assertFalse(buf.has_pending)
+        self.assertEqual(buf.flush(), 0)
+        self.assertEqual(len(cart.syncs), 1)
+
+    def test_synced_map_holds_only_flushed_quantities(self):
+        cart = FakeCart([{"item_id": 1, "qty_reserved": 2}])
+        buf = CartBuffer(cart, 10)
+        buf.load()
+        buf.add(1, +3)
+        buf.add(2, +1)
+        self.assertEqual(buf.synced_map(), {1: 2.0})
+        buf.flush()
+        self.assertEqual(buf.synced_map(), {1: 5.0, 2: 1.0})
+        buf.remove(1)
+        buf.flush()
+        self.assertEqual(buf.synced_map(), {2: 1.0})
+
+    def test_rebind_flushes_pending_changes_of_old_session(self):
+        cart = FakeCart()
+        buf = CartBuffer(cart, 1)
+        buf.add(5, +2)
+        buf.rebind(2)
+        self.assertEqual(cart.syncs, [(1, {5: 2.0})])
+        self.assertEqual(buf.session_id, 2)
+        self.assertEqual(buf.lines(), [])
+
+    def test_rebind_moves_clean_buffer_when_old_session_closed(self):
+        line = {"item_id": 5, "sku": "W", "name": "W", "uom": "SZT", "qty_reserved": 2}
+        for state in ("CANCELLED", "EXPIRED"):
+            cart = FakeCart([line], states={1: state})
+            buf = CartBuffer(cart, 1)
+            buf.load()
+            cart.lines = []            # nowa sesja jest pusta
+            self.assertFalse(buf.has_pending)
+            buf.rebind(2)
+            self.assertEqual(buf.session_id, 2)
+            self.assertEqual(buf.reserved_map(), {5: 2.0})
+            self.assertEqual(cart.syncs, [(2, {5: 2.0})])
+            self.assertEqual(cart.cancelled, [1] if state == "EXPIRED" else [])
+
+    def test_rebind_after_confirmation_loads_new_session(self):
+        cart = FakeCart([{"item_id": 5, "qty_reserved": 2}], states={1: "CONFIRMED"})
+        buf = CartBuffer(cart, 1)
+        buf.load()
+        cart.lines = []
+        buf.rebind(2)
+        self.assertEqual((buf.lines(), cart.syncs), ([], []))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+class _Result:
+    def __init__(self, row):
+        self.row = row
+
+    def first(self):
+        return self.row
+
+
+class _FakeEngine:
+    def __init__(self, row):
+        self.row = row
+        self.sql = []
+
+    @contextmanager
+    def begin(self):
+        yield self
+
+    def execute(self, stmt, params=None):
+        self.sql.append(str(stmt))
+        return _Result(self.row)
+
+
+class _FakeAuth:
+    def __init__(self, fail_items=()):
+        self.calls = []
+        self.fail_items = set(fail_items)
+
+    def issue_tool(self, **kw):
+        self.calls.append(kw)
+        if kw["item_id"] in self.fail_items:
+            return {"status": "error", "error": "boom"}
+        return {}
+
+
+class _Rows:
+    def __init__(self, rows=(), rowcount=1):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def all(self):
+        return list(self.rows)
+
+    def scalar(self):
+        return self.rows[0][0] if self.rows else None
+
+    def scalars(self):
+        return _Rows([r[0] for r in self.rows])
+
+
+class _SessionEngine:
+    """Otwarta sesja z liniami 1 i 2; `posted` – operation_uuid już w transactions."""
+
+    def __init__(self, posted=()):
+        self.posted = list(posted)
+        self.sql = []
+
+    @contextmanager
+    def begin(self):
+        yield self
+
+    def execute(self, stmt, params=None):
+        sql = str(stmt)
+        self.sql.append(sql)
+        if "FROM issue_session_lines WHERE session_id" in sql:
+            return _Rows([(1, 2), (2, 1)])
+        if "FROM transactions" in sql:
+            return _Rows([(u,) for u in self.posted if u in params["uuids"]])
+        if "SELECT status FROM" in sql:
+            return _Rows([("OPEN",)])
+        if "FROM issue_sessions" in sql:
+            return _Rows([("OPEN", 0)])
+        return _Rows()
+
+
+class _NoConflicts(CheckoutService):
+    def check_availability(self, session_id, lines, **kw):
+        self.checked = [ln["item_id"] for ln in lines]
+        return []
+
+
+class CheckoutGuardTests(unittest.TestCase):
+    def test_finalize_refuses_closed_or_expired_session(self):
+        for row in [("CANCELLED", 0), ("OPEN", 1), None]:
+            engine, auth = _FakeEngine(row), _FakeAuth()
+            res = CheckoutService(engine, auth).finalize_issue(10, 5)
+            self.assertEqual(res["status"], "expired")
+            self.assertEqual(auth.calls, [])
+            self.assertIn("FOR UPDATE", engine.sql[0])
+
+    def test_failed_line_keeps_session_open_and_retry_skips_posted(self):
+        auth = _FakeAuth(fail_items={2})
+        res = _NoConflicts(_SessionEngine(), auth).finalize_issue(10, 5)
+        self.assertEqual((res["status"], res["posted"]), ("error", 1))
+        uuids = [c["operation_uuid"] for c in auth.calls]
+        self.assertEqual(uuids, [CheckoutService.line_operation_uuid(10, i) for i in (1, 2)])
+
+        # linia 1 jest już w transactions – ponowienie wydaje tylko linię 2
+        engine, auth = _SessionEngine(posted=uuids[:1]), _FakeAuth()
+        svc = _NoConflicts(engine, auth)
+        res = svc.finalize_issue(10, 5)
+        self.assertEqual(res["status"], "success")
+        self.assertEqual(svc.checked, [2])
+        self.assertEqual([c["item_id"] for c in auth.calls], [2])
+        self.assertTrue(any("status='CONFIRMED'" in sql for sql in engine.sql))
+
+    def test_finalize_publishes_issued_items_once(self):
+        seen = []
+        unsubscribe = events.subscribe(events.MOVEMENTS_CHANGED, lambda _t, p: seen.append(p))
+        try:
+            _NoConflicts(_SessionEngine(), _FakeAuth(fail_items={2})).finalize_issue(10, 5)
+            _NoConflicts(_SessionEngine(), _FakeAuth()).finalize_issue(10, 5)
+        finally:
+            unsubscribe()
+        self.assertEqual(seen, [
+            {"source": "checkout", "item_ids": [1]},
+            {"source": "checkout", "item_ids": [1, 2]},
+        ])
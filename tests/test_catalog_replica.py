@@ -0,0 +1,92 @@
+from sqlalchemy import create_engine, text
+
+from app.dal.catalog_replica import CatalogReplica
+
+
+def _remote():
+    eng = create_engine("sqlite://")
+    with eng.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE items (id INTEGER PRIMARY KEY, code TEXT, name TEXT, unit TEXT,"
+            " active INTEGER, updated_at TEXT)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE employees (id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT,"
+            " username TEXT, role TEXT, active INTEGER, pin_hash TEXT, updated_at TEXT)"
+        ))
+        conn.execute(text(
+            "INSERT INTO items VALUES"
+            " (1, 'W-25', 'Wiertło 2,5', 'SZT', 1, '2026-10-19 08:00:00'),"
+            " (2, 'F-10', 'Frez VHM 10', 'SZT', 1, '2026-10-19 08:00:01')"
+        ))
+        conn.execute(text(
+            "INSERT INTO employees VALUES"
+            " (7, 'Jan', 'Kowalski', 'jkow', 'operator', 1, 'secret', '2026-10-19 08:00:00')"
+        ))
+    return eng
+
+
+def test_initial_and_delta_sync(tmp_path):
+    remote = _remote()
+    rep = CatalogReplica(remote, tmp_path / "catalog.sqlite3", overlap_s=0)
+    assert not rep.ready
+    assert rep.sync() == {"items": 2, "employees": 1}
+    assert rep.ready
+    assert rep.get_item_by_code("w-25")["id"] == 1
+    assert [r["id"] for r in rep.find_items("wiertlo")] == [1]
+    assert rep.employees("kowal") == [
+        {"id": 7, "first_name": "Jan", "last_name": "Kowalski", "login": "jkow"}
+    ]
+
+    with remote.begin() as conn:
+        conn.execute(text(
+            "UPDATE items SET name = 'Frez HSS 10', updated_at = '2026-10-19 09:00:00' WHERE id = 2"
+        ))
+    assert rep.sync() == {"items": 1, "employees": 0}
+    assert [r["id"] for r in rep.find_items("hss")] == [2]
+    assert rep.find_items("vhm") == []
+
+
+
+def test_matching_ignores_case_and_polish_diacritics(tmp_path):
+    remote = _remote()
+    with remote.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO items VALUES (3, 'ŁK-5', 'Łącznik', 'SZT', 1, '2026-10-19 08:00:02')"
+        ))
+        conn.execute(text(
+            "INSERT INTO employees VALUES"
+            " (8, 'Łukasz', 'Żółć', 'lzolc', 'operator', 1, NULL, '2026-10-19 08:00:01')"
+        ))
+    rep = CatalogReplica(remote, tmp_path / "catalog.sqlite3", overlap_s=0)
+    rep.sync()
+    assert rep.get_item_by_code("łk-5")["id"] == 3
+    assert [r["id"] for r in rep.find_items("k-5")] == [3]     # podciąg kodu
+    assert [r["id"] for r in rep.find_items("f-10")] == [2]
+    assert [e["id"] for e in rep.employees("ŻÓŁ")] == [8]
+
+def test_reconcile_drops_deleted_rows(tmp_path):
+    remote = _remote()
+    rep = CatalogReplica(remote, tmp_path / "catalog.sqlite3")
+    rep.sync()
+    with remote.begin() as conn:
+        conn.execute(text("DELETE FROM items WHERE id = 1"))
+    assert rep.reconcile() == 1
+    assert rep.get_item_by_code("W-25") is None
+
+
+def test_overlap_rechecks_window_without_refetching(tmp_path):
+    remote = _remote()
+    rep = CatalogReplica(remote, tmp_path / "catalog.sqlite3", overlap_s=2)
+    assert rep.sync() == {"items": 2, "employees": 1}
+    # bez zmian: okno nakładki porównuje tylko znaczniki
+    assert rep.sync() == {"items": 0, "employees": 0}
+
+    # wiersz zatwierdzony później ze znacznikiem sprzed ostatniej synchronizacji
+    with remote.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO items VALUES (3, 'P-1', 'Płytka', 'SZT', 1, '2026-10-19 08:00:00')"
+        ))
+    assert rep.sync() == {"items": 1, "employees": 0}
+    assert rep.get_item_by_code("P-1")["id"] == 3
+    assert rep.sync() == {"items": 0, "employees": 0}
@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy import create_engine, event, text
+
+from app.dal.catalog_search import filter_rows, item_tokens, ranked_search, reindex_items
+
+SQL = """
+    SELECT i.id, i.code, i.name
+      FROM items i
+     WHERE {match}
+     ORDER BY {rank}, i.name
+     LIMIT :lim
+"""
+
+
+def _engine():
+    eng = create_engine("sqlite://")
+    with eng.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE items (id INTEGER PRIMARY KEY, code TEXT, name TEXT, search_key TEXT)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE item_search_tokens (token TEXT, item_id INTEGER, PRIMARY KEY (token, item_id))"
+        ))
+        conn.execute(
+            text("INSERT INTO items(id, code, name) VALUES (:id, :code, :name)"),
+            [
+                {"id": 1, "code": "WKR-10", "name": "Wkrętak płaski"},
+                {"id": 2, "code": "WKR", "name": "Klucz"},
+                {"id": 3, "code": "X1", "name": "Oprawka wkrętaka"},
+                {"id": 4, "code": "X2", "name": "Nasadka dwkrx"},
+            ],
+        )
+        reindex_items(conn)
+    return eng
+
+
+def test_item_tokens_fold_and_compact_code():
+    assert item_tokens("0 641-210", "Wiertło NWKa") == {"0", "641", "210", "0641210", "wiertlo", "nwka"}
+
+
+def test_ranking_exact_code_prefix_token_without_substring_scan():
+    eng = _engine()
+    statements = []
+    event.listen(eng, "before_cursor_execute", lambda conn, cur, st, *a: statements.append(st))
+    with eng.connect() as conn:
+        rows = ranked_search(conn, SQL, "wkr", limit=10)
+    # 'dwkrx' (podciąg) nie dopełnia trafień z indeksu – jedno zapytanie, bez skanu
+    assert [r["id"] for r in rows] == [2, 1, 3]
+    assert len(statements) == 1
+
+
+def test_substring_only_when_index_finds_nothing():
+    with _engine().connect() as conn:
+        assert [r["id"] for r in ranked_search(conn, SQL, "krę", limit=10)] == [3, 1]
+        assert ranked_search(conn, SQL, "kr", limit=10) == []   # za krótkie na skan
+
+
+def test_unindexed_item_found_by_name_substring():
+    eng = _engine()
+    with eng.begin() as conn:
+        # dodany poza aplikacją – bez search_key i tokenów
+        conn.execute(text("INSERT INTO items(id, code, name) VALUES (5, 'G8', 'Gwintownik M8')"))
+    with eng.connect() as conn:
+        rows = ranked_search(conn, SQL, "gwintow", limit=10)
+    assert [r["id"] for r in rows] == [5]
+
+
+def test_client_side_filter_rows_agrees_with_ranked_search():
+    eng = _engine()
+    with eng.connect() as conn:
+        items = [dict(r) for r in conn.execute(text("SELECT id, code, name FROM items")).mappings()]
+        for q in ("wkr", "wk", "kl", "płas", "krę", "x2", "oprawka wk", "WKR-1", "asa", "--"):
+            server = {r["id"] for r in ranked_search(conn, SQL, q, limit=100)}
+            assert {r["id"] for r in filter_rows(q, items)} == server, q
+
+
+def test_typeahead_refines_cache_only_when_result_is_certain():
+    pytest.importorskip("PySide6")
+    from app.ui.widgets.typeahead import default_refine
+
+    rows = [
+        {"id": 1, "sku": "WKR-10", "name": "Wkrętak płaski"},
+        {"id": 3, "sku": "X1", "name": "Oprawka wkrętaka"},
+    ]
+    assert [r["id"] for r in default_refine(rows, "wkr", "wkręt")] == [1, 3]
+    # 'wkr' obsłużony indeksem – podciągu 'wkrx' w cache nie ma, trzeba zapytać bazę
+    assert default_refine(rows, "wkr", "wkrx") is None
+    # 'krę' obsłużony podciągiem – zawężenie lokalne tym samym trybem
+    assert [r["id"] for r in default_refine(rows, "krę", "krętaka")] == [3]
@@ -0,0 +1,117 @@
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import text
+
+from app.dal import consumption_facts
+from sqlite_mariadb import sqlite_engine
+
+SEP = date(2026, 9, 1)
+
+
+def _engine(watermark=2):
+    eng = sqlite_engine()
+    with eng.begin() as conn:
+        for ddl in (
+            "CREATE TABLE locations (id INTEGER PRIMARY KEY, employee_id INTEGER)",
+            "CREATE TABLE lots (id INTEGER PRIMARY KEY, item_id INTEGER)",
+            "CREATE TABLE movements (id INTEGER PRIMARY KEY, ts TEXT,"
+            " created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP, item_id INTEGER, qty NUMERIC,"
+            " from_location_id INTEGER, to_location_id INTEGER, movement_type TEXT)",
+            "CREATE TABLE movement_allocations (movement_id INTEGER, lot_id INTEGER,"
+            " qty NUMERIC, unit_cost_netto NUMERIC)",
+            "CREATE TABLE fact_watermarks (name TEXT PRIMARY KEY, last_id INTEGER)",
+            "CREATE TABLE fact_consumption_monthly (month DATE, item_id INTEGER, employee_id INTEGER,"
+            " movement_type TEXT, qty NUMERIC, value_fifo NUMERIC, movements INTEGER,"
+            " PRIMARY KEY (month, item_id, employee_id, movement_type))",
+        ):
+            conn.execute(text(ddl))
+        conn.execute(text("INSERT INTO locations VALUES (1, NULL), (2, 7)"))
+        conn.execute(text("INSERT INTO lots VALUES (10, 1), (11, 2)"))
+        _add(conn, 1, "2026-09-03 08:00:00", 1, 3, 1, 2, "ISSUE", [(10, 3, 2.5)])
+        _add(conn, 2, "2026-09-20 14:00:00", None, None, 2, 1, "RETURN", [(10, 1, 2.5), (11, 2, 4)])
+        if watermark is not None:
+            conn.execute(text("INSERT INTO fact_watermarks VALUES (:n, :w)"), {"n": consumption_facts.FACT, "w": watermark})
+    return eng
+
+
+def _add(conn, mid, ts, item_id, qty, loc_from, loc_to, mtype, allocs, *, age_s=3600):
+    # created_at nadaje baza; tu cofnięty o age_s, by ruch był starszy niż lag
+    conn.execute(
+        text(
+            "INSERT INTO movements VALUES (:id, :ts, datetime(CURRENT_TIMESTAMP, :age), :item, :qty, :f, :t, :mt)"
+        ),
+        {"id": mid, "ts": ts, "age": f"-{age_s} seconds", "item": item_id, "qty": qty,
+         "f": loc_from, "t": loc_to, "mt": mtype},
+    )
+    for lot_id, q, cost in allocs:
+        conn.execute(
+            text("INSERT INTO movement_allocations VALUES (:m, :l, :q, :c)"),
+            {"m": mid, "l": lot_id, "q": q, "c": cost},
+        )
+
+
+def _facts(conn):
+    rows = conn.execute(text(
+        "SELECT item_id, movement_type, qty, movements FROM fact_consumption_monthly"
+        " ORDER BY item_id, movement_type"
+    )).all()
+    return [(i, t, Decimal(str(q)), n) for i, t, q, n in rows]
+
+
+def test_multi_item_return_is_split_per_item_from_allocations():
+    with _engine().begin() as conn:
+        ledger = {m.key: m.ledger for m in consumption_facts.check(conn)}
+
+    assert ledger == {
+        (SEP, 1, 7, "ISSUE"): (Decimal("3"), Decimal("7.5"), 1),
+        (SEP, 1, 7, "RETURN"): (Decimal("1"), Decimal("2.5"), 1),
+        (SEP, 2, 7, "RETURN"): (Decimal("2"), Decimal("8"), 1),
+    }
+
+
+def test_watermark_row_is_created_on_first_use():
+    with _engine(watermark=None).begin() as conn:
+        assert consumption_facts.watermark(conn) == 0
+        assert conn.execute(text("SELECT last_id FROM fact_watermarks")).scalar() == 0
+
+
+def test_refresh_adds_movements_once_and_skips_young_ones():
+    eng = _engine(watermark=0)
+    with eng.begin() as conn:
+        assert consumption_facts.refresh(conn, max_batch=1) == 2
+        assert consumption_facts.check(conn) == []
+        # ruch zapisany przed chwilą (zegar bazy) – poza granicą lag, czeka
+        _add(conn, 3, "2026-09-21 09:00:00", 1, 1, 1, 2, "ISSUE", [(10, 1, 2.5)], age_s=0)
+        assert consumption_facts.refresh(conn) == 2
+        assert consumption_facts.refresh(conn, lag_s=0) == 3
+        # ponowne odświeżenie niczego nie dolicza drugi raz
+        assert consumption_facts.refresh(conn, lag_s=0) == 3
+        assert _facts(conn) == [
+            (1, "ISSUE", Decimal("4"), 2), (1, "RETURN", Decimal("1"), 1), (2, "RETURN", Decimal("2"), 1),
+        ]
+        assert consumption_facts.check(conn) == []
+
+
+def test_bound_uses_database_time_not_client_ts():
+    eng = _engine(watermark=0)
+    with eng.begin() as conn:
+        # ts z zegara stanowiska daleko w przyszłości nie wstrzymuje przyrostu
+        _add(conn, 3, "2099-01-01 00:00:00", 1, 1, 1, 2, "ISSUE", [])
+        assert consumption_facts.refresh(conn) == 3
+
+
+def test_rebuild_repairs_drift_from_month_or_from_scratch():
+    eng = _engine(watermark=0)
+    with eng.begin() as conn:
+        consumption_facts.refresh(conn)
+        conn.execute(text("UPDATE fact_consumption_monthly SET qty = 99 WHERE movement_type = 'ISSUE'"))
+        assert [m.key for m in consumption_facts.check(conn)] == [(SEP, 1, 7, "ISSUE")]
+
+        assert consumption_facts.rebuild(conn, since=date(2026, 9, 15)) == 2
+        assert consumption_facts.check(conn) == []
+
+        conn.execute(text("DELETE FROM fact_consumption_monthly WHERE item_id = 2"))
+        assert consumption_facts.rebuild(conn) == 2
+        assert consumption_facts.check(conn) == []
+        assert len(_facts(conn)) == 3
@@ -0,0 +1,19 @@
+from app.infra.events import EventBus
+
+
+def test_publish_reaches_subscribers_and_isolates_errors():
+    bus = EventBus()
+    got = []
+
+    def boom(topic, payload):
+        raise RuntimeError("x")
+
+    bus.subscribe("movements.changed", boom)
+    unsub = bus.subscribe("movements.changed", lambda t, p: got.append((t, p)))
+
+    assert bus.publish("movements.changed", source="issue") == 2
+    assert got == [("movements.changed", {"source": "issue"})]
+
+    unsub()
+    assert bus.publish("movements.changed") == 1
+    assert bus.publish("other") == 0
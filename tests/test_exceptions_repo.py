@@ -0,0 +1,24 @@
+from sqlalchemy import create_engine, text
+
+from app.dal.exceptions_repo import ExceptionsRepo
+
+
+def test_list_exceptions_since_pages_past_limit():
+    eng = create_engine("sqlite://")
+    with eng.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE vw_exceptions (id INTEGER PRIMARY KEY, operation_uuid TEXT,"
+            " item_id INTEGER, quantity NUMERIC, created_at TEXT)"
+        ))
+        for i in range(1, 9):
+            conn.execute(
+                text("INSERT INTO vw_exceptions VALUES (:i, :u, 1, 1, '2026-10-19 08:00:00')"),
+                {"i": i, "u": f"op-{i}"},
+            )
+    repo = ExceptionsRepo(eng)
+    repo._cols_cache = {"id", "operation_uuid", "item_id", "quantity", "created_at"}
+
+    rows = repo.list_exceptions_since(2, limit=3)
+    # 6 wierszy przy stronie 3 – nic nie ginie, kolejność od najnowszych
+    assert [r["id"] for r in rows] == [8, 7, 6, 5, 4, 3]
+    assert repo.list_exceptions_since(8, limit=3) == []
@@ -0,0 +1,68 @@
+import os
+import re
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.appsvc import export
+from app.appsvc.export import ExportCancelled, export_rows, write_csv
+from app.dal.stream import stream_query
+
+COLUMNS = [("id", "ID"), ("ts", "Czas"), ("qty", "Ilość")]
+
+
+def _engine(n):
+    eng = create_engine("sqlite://")
+    with eng.begin() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, ts TEXT, qty NUMERIC)"))
+        conn.execute(
+            text("INSERT INTO t VALUES (:id, :ts, :qty)"),
+            [{"id": i, "ts": f"2026-01-{1 + i % 28:02d}", "qty": i * 1.5} for i in range(n)],
+        )
+    return eng
+
+
+def test_stream_query_to_csv(tmp_path):
+    eng = _engine(1200)
+    seen = []
+    path = tmp_path / "out.csv"
+    n = write_csv(
+        stream_query(eng, "SELECT id, ts, qty FROM t ORDER BY id", batch_size=100),
+        COLUMNS, path, progress=seen.append,
+    )
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert n == 1200
+    assert lines[0] == "ID,Czas,Ilość"
+    assert lines[3] == "2,2026-01-03,3"
+    assert len(lines) == 1201
+    assert seen == [500, 1000, 1200]
+
+
+def test_cell_formatting():
+    assert export.cell(None) == ""
+    assert export.cell(datetime(2026, 1, 2, 3, 4, 5)) == "2026-01-02 03:04:05"
+    assert export.cell(Decimal("10.000")) == "10"
+    assert export.cell(2.0) == "2"
+
+
+def test_cancel_stops_export(tmp_path):
+    rows = ({"id": i} for i in range(10_000))
+    with pytest.raises(ExportCancelled):
+        write_csv(rows, COLUMNS, tmp_path / "x.csv", cancelled=lambda: True)
+
+
+def test_pdf_pages(tmp_path):
+    QtWidgets = pytest.importorskip("PySide6.QtWidgets")
+    QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    path = tmp_path / "out.pdf"
+    n = export_rows(({"id": i, "ts": "x", "qty": i} for i in range(300)), COLUMNS, path, title="Test")
+    data = path.read_bytes()
+    assert n == 300
+    assert data.startswith(b"%PDF")
+    assert len(re.findall(rb"/Type\s*/Page\b", data)) >= 2  # stronicowanie
@@ -0,0 +1,69 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.appsvc.inventory_session import InventorySession
+
+
+def _session(tmp_path):
+    return InventorySession.create(
+        tmp_path / "spis.sqlite3",
+        [(1, "W-6", "Wiertło 6", 5000), (2, "F-10", "Frez 10", 2500), (3, "P-1", "Płytka", 0)],
+        movement_mark=40,
+    )
+
+
+def test_counts_and_diffs(tmp_path):
+    s = _session(tmp_path)
+    s.record(1, "4.5")
+    s.scan("f-10")
+    s.scan("F-10", 2)
+    assert s.progress() == (2, 3)
+
+    diffs = {d.item_id: d for d in s.diffs()}
+    assert diffs[1].diff == Decimal("-0.5")
+    assert diffs[2].qty_counted == Decimal("3") and diffs[2].diff == Decimal("0.5")
+    assert 3 not in diffs
+    assert {d.item_id for d in s.diffs(include_uncounted=True)} == {1, 2}
+
+    with pytest.raises(KeyError):
+        s.scan("NIEZNANY")
+    with pytest.raises(FileExistsError):
+        InventorySession.create(s.path, [], movement_mark=0)
+
+    # buforem jest plik – liczenia przetrwają ponowne otwarcie
+    s.close()
+    again = InventorySession(tmp_path / "spis.sqlite3")
+    assert again.movement_mark == 40
+    assert len(again.diffs()) == 2
+
+
+def test_post_requires_single_confirmation(tmp_path):
+    s = _session(tmp_path)
+    asked = []
+    assert s.post(None, confirm=lambda: asked.append(1) or True)["status"] == "nothing"
+    s.record(1, 1)
+    res = s.post(None, confirm=lambda: asked.append(1) or False)
+    assert res == {"status": "rfid_unconfirmed", "posted": 0}
+    assert asked == [1]
+    assert s.op_uuid(1) == s.op_uuid(1) != s.op_uuid(2)
+
+
+def test_refresh_moved_includes_multi_item_returns(tmp_path):
+    eng = create_engine("sqlite://")
+    with eng.begin() as conn:
+        conn.execute(text("CREATE TABLE lots (id INTEGER PRIMARY KEY, item_id INTEGER)"))
+        conn.execute(text("CREATE TABLE movements (id INTEGER PRIMARY KEY, item_id INTEGER, movement_type TEXT)"))
+        conn.execute(text("CREATE TABLE movement_allocations (movement_id INTEGER, lot_id INTEGER)"))
+        conn.execute(text("INSERT INTO lots VALUES (10, 1), (20, 2), (30, 3)"))
+        # 39: przed migawką, 41: zwrot wielopozycyjny (item_id NULL), 42: ADJUST
+        conn.execute(text(
+            "INSERT INTO movements VALUES (39, 3, 'ISSUE'), (41, NULL, 'RETURN'), (42, 3, 'ADJUST')"
+        ))
+        conn.execute(text("INSERT INTO movement_allocations VALUES (39, 30), (41, 10), (41, 20), (42, 30)"))
+    s = _session(tmp_path)
+    s.record(1, 5)
+    s.record(3, 1)
+    assert s.refresh_moved(eng) == 2
+    assert {d.item_id: d.moved_after_snapshot for d in s.diffs(only_nonzero=False)} == {1: True, 3: False}
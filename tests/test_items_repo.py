@@ -44,11 +44,19 @@ class ItemsRepoTests(unittest.TestCase):
 
     def test_find_items_query(self):
         self.repo.find_items("ABC")
+        # 1) indeks tokenów z rankingiem (dokładny kod -> prefiks)
+        sql, params = self.engine.log[0]
+        lower = sql.lower()
+        self.assertIn("item_search_tokens", lower)
+        self.assertRegex(lower, r"when\s+i\.sku\s*=\s*:cs_q")
+        self.assertEqual(params["cs_q"], "ABC")
+        self.assertEqual(params["cs_t0"], "abc%")
+        # 2) za mało wyników -> dopełnienie podciągiem w kodzie/nazwie
         sql, params = self.engine.log[-1]
         lower = sql.lower()
         self.assertRegex(lower, r"sku\s+like")
-        self.assertRegex(lower, r"name\s+like")
-        self.assertEqual(params["q"], "ABC")
+        self.assertRegex(lower, r"search_key\s+like")
+        self.assertEqual(params["cs_sub"], "%abc%")
 
     def test_get_item_id_by_sku_query(self):
         self.repo.get_item_id_by_sku("X1")
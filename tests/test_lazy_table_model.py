@@ -0,0 +1,89 @@
+import os
+import sys
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from sqlalchemy import create_engine, text
+
+QtCore = pytest.importorskip("PySide6.QtCore")
+QtWidgets = pytest.importorskip("PySide6.QtWidgets")
+
+from app.dal.keyset import keyset_where, next_bookmark
+from app.ui.table_model import LazyTableModel
+from app.ui.widgets.query_runner import QueryRunner
+
+
+def _app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def _wait_idle(runner, timeout_ms=3000):
+    loop = QtCore.QEventLoop()
+    runner.busyChanged.connect(lambda busy: None if busy else loop.quit())
+    QtCore.QTimer.singleShot(timeout_ms, loop.quit)
+    if runner.is_busy():
+        loop.exec()
+
+
+def test_keyset_pages_cover_ties_exactly_once():
+    eng = create_engine("sqlite://")
+    with eng.begin() as conn:
+        conn.execute(text("CREATE TABLE t (d INTEGER, u TEXT, i INTEGER)"))
+        conn.execute(
+            text("INSERT INTO t VALUES (:d, :u, :i)"),
+            [{"d": n // 4, "u": f"u{n // 2}", "i": n} for n in range(23)],
+        )
+    keys = ("d", "u", "i")
+    seen, after = [], None
+    with eng.connect() as conn:
+        while True:
+            cond, kp = keyset_where(keys, after)
+            rows = [
+                dict(r)
+                for r in conn.execute(
+                    text(f"SELECT d, u, i FROM t WHERE {cond} ORDER BY d DESC, u DESC, i DESC LIMIT 5"),
+                    kp,
+                ).mappings()
+            ]
+            seen += [r["i"] for r in rows]
+            after = next_bookmark(rows, keys, 5)
+            if after is None:
+                break
+    assert sorted(seen) == list(range(23))
+    assert len(seen) == 23
+
+
+def test_lazy_model_fetches_blocks_on_demand():
+    _app()
+    runner = QueryRunner(pool=QtCore.QThreadPool())
+    data = [{"id": n, "name": f"r{n}"} for n in range(25)]
+    calls = []
+
+    def fetch_page(after, limit):
+        calls.append(after)
+        start = after[0] + 1 if after else 0
+        rows = data[start:start + limit]
+        return rows, ((rows[-1]["id"],) if len(rows) == limit else None)
+
+    model = LazyTableModel([("id", "ID"), ("name", "Nazwa")], block_size=10, runner=runner)
+    model.set_source(fetch_page)
+    _wait_idle(runner)
+    assert model.rowCount() == 10
+    assert model.canFetchMore()
+
+    while model.canFetchMore():
+        model.fetchMore()
+        _wait_idle(runner)
+
+    assert model.rowCount() == 25
+    assert calls == [None, (9,), (19,)]
+    assert model.row_dict(24) == {"id": 24, "name": "r24"}
+    assert model.data(model.index(3, 1)) == "r3"
+
+    # nowsze wiersze na górze, duplikaty (już w buforze) pomijane
+    assert model.prepend_rows([{"id": 30, "name": "r30"}, {"id": 24, "name": "r24"}], key="id") == 1
+    assert model.rowCount() == 26
+    assert model.row_dict(0) == {"id": 30, "name": "r30"}
+    assert model.row_dict(1) == {"id": 0, "name": "r0"}
@@ -0,0 +1,53 @@
+from sqlalchemy import create_engine, event, text
+
+from app.dal.locations import LocationDirectory, directory
+from app.infra import events
+
+
+def _engine():
+    eng = create_engine("sqlite://")
+    with eng.begin() as conn:
+        conn.execute(text("CREATE TABLE locations (id INTEGER PRIMARY KEY, name TEXT, type TEXT, employee_id INTEGER)"))
+        conn.execute(text("INSERT INTO locations (name, type, employee_id) VALUES ('Magazyn', 'WAREHOUSE', NULL), ('Jan', 'EMPLOYEE', 7)"))
+    return eng
+
+
+def test_directory_caches_and_forgets_rolled_back_locations():
+    eng = _engine()
+    d = LocationDirectory()
+    queries = []
+    event.listen(eng, "before_cursor_execute", lambda *a: queries.append(a[2]))
+
+    with eng.begin() as conn:
+        assert d.warehouse_id(conn) == 1
+        assert d.employee_location_id(conn, 7) == 2
+        assert d.warehouse_id(conn) == 1
+    assert len(queries) == 1   # jedno wczytanie tabeli
+
+    # złom utworzony w wycofanej transakcji nie zostaje w pamięci
+    conn = eng.connect()
+    trans = conn.begin()
+    assert d.scrap_id(conn) == 3
+    trans.rollback()
+    conn.close()
+    with eng.begin() as conn:
+        assert d.scrap_id(conn) == 3
+        assert conn.execute(text("SELECT COUNT(*) FROM locations WHERE type = 'SCRAP'")).scalar() == 1
+
+
+def test_employee_entries_invalidated_by_event():
+    directory.remember_employee(41, 900)
+    events.bus.publish(events.EMPLOYEES_CHANGED, employee_id=41)
+    assert directory.cached_employee(41) is None
+
+
+def test_employee_edit_in_auth_repo_publishes_event():
+    from app.core.auth import AuthRepo
+
+    eng = create_engine("sqlite://")
+    with eng.begin() as conn:
+        conn.execute(text("CREATE TABLE employees (id INTEGER PRIMARY KEY, rfid_uid TEXT)"))
+        conn.execute(text("INSERT INTO employees (id) VALUES (41)"))
+    directory.remember_employee(41, 900)
+    AuthRepo({"db": {}}, engine=eng).assign_card(41, None)
+    assert directory.cached_employee(41) is None
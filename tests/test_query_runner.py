@@ -0,0 +1,98 @@
+import os
+import sys
+import threading
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+QtCore = pytest.importorskip("PySide6.QtCore")
+QtWidgets = pytest.importorskip("PySide6.QtWidgets")
+
+from app.ui.widgets.query_runner import QueryRunner
+
+
+def _app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def _wait(runner, timeout_ms=3000):
+    loop = QtCore.QEventLoop()
+    runner.busyChanged.connect(lambda busy: None if busy else loop.quit())
+    QtCore.QTimer.singleShot(timeout_ms, loop.quit)
+    if runner.is_busy():
+        loop.exec()
+    # sygnały z zakończonych (porzuconych) zadań
+    QtCore.QCoreApplication.processEvents()
+
+
+def test_newer_request_discards_stale_result():
+    _app()
+    pool = QtCore.QThreadPool()
+    runner = QueryRunner(pool=pool)
+    gate = threading.Event()
+    got, errors = [], []
+
+    def slow():
+        gate.wait(2)
+        return "old"
+
+    runner.run("k", slow, on_done=got.append)
+    runner.run("k", lambda: "new", on_done=got.append, on_error=errors.append)
+    gate.set()
+    _wait(runner)
+    pool.waitForDone(2000)
+    QtCore.QCoreApplication.processEvents()
+
+    assert got == ["new"]
+    assert errors == []
+    assert not runner.is_busy()
+    assert all(key == "k" for key, _ms, _ok in runner.timings)
+
+
+def test_error_goes_to_on_error_and_is_timed():
+    _app()
+    runner = QueryRunner(pool=QtCore.QThreadPool())
+    errors = []
+
+    def boom():
+        raise RuntimeError("db down")
+
+    runner.run(("w", "reports.rw"), boom, on_error=errors.append)
+    _wait(runner)
+
+    assert errors == ["db down"]
+    assert runner.timings[-1][0] == "reports.rw"
+    assert runner.timings[-1][2] is False
+
+
+def test_typeahead_goes_through_runner_and_refines_from_cache():
+    from app.ui.widgets.typeahead import TypeaheadController
+
+    _app()
+    runner = QueryRunner(pool=QtCore.QThreadPool())
+    gate = threading.Event()
+    calls, got = [], []
+    rows = [{"id": 1, "sku": "WKR-10", "name": "Wkrętak płaski"}, {"id": 2, "sku": "KL-8", "name": "Klucz"}]
+
+    def fetch(q):
+        calls.append(q)
+        if q == "k":
+            gate.wait(2)
+        return [r for r in rows if q.lower() in (r["sku"] + " " + r["name"]).lower()]
+
+    ctl = TypeaheadController(fetch, runner=runner, limit=10)
+    ctl.results.connect(lambda q, r: got.append((q, [x["id"] for x in r])))
+    ctl.submit("k")
+    ctl.submit("wkr")  # zastępuje "k" – wynik "k" odrzucony przez runner
+    gate.set()
+    _wait(runner)
+    runner._pool.waitForDone(2000)
+    QtCore.QCoreApplication.processEvents()
+    assert got == [("wkr", [1])]
+
+    ctl.submit("wkręt")  # zawężenie kompletnego wyniku – bez zapytania
+    assert got[-1] == ("wkręt", [1])
+    assert calls.count("wkręt") == 0
+    assert not runner.is_busy()
@@ -0,0 +1,230 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("pymysql")  # app.dal.retry (sterownik MariaDB)
+
+from sqlalchemy import BigInteger, create_engine, event, func, select, text  # noqa: E402
+from sqlalchemy.ext.compiler import compiles  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.dal import lots as lots_mod  # noqa: E402
+from app.dal import repo_movements as rm  # noqa: E402
+from app.dal.locations import directory  # noqa: E402
+from app.dal.models import Base, Document, DocumentLine, Lot, Movement, MovementAllocation  # noqa: E402
+
+
+@compiles(BigInteger, "sqlite")
+def _bigint_sqlite(type_, compiler, **kw):
+    return "INTEGER"  # autoinkrementacja kluczy BIGINT w SQLite
+
+
+EMP = 7
+
+
+def _engine():
+    eng = create_engine("sqlite://")
+    Base.metadata.create_all(eng)
+    with eng.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO locations (id, name, type, employee_id) VALUES"
+            " (1, 'Magazyn', 'WAREHOUSE', NULL), (2, 'Jan', 'EMPLOYEE', :emp)"
+        ), {"emp": EMP})
+    directory.clear()
+    return eng
+
+
+def _receive(s, item_id, qty, cost="2.5"):
+    d = rm.create_document(s, doc_type="PRZYJECIE", number=f"P{item_id}", doc_date=date.today())
+    _dl, lot, _mv = rm.receipt_from_document_line(
+        s, document_id=d.id, item_id=item_id, qty=Decimal(qty),
+        unit_price_netto=Decimal(cost), line_netto=Decimal(qty) * Decimal(cost),
+    )
+    lot.ts = datetime.now()
+    s.flush()
+    return lot
+
+
+def _issue(s, item_id, qty):
+    mv = rm.issue_to_employee.__wrapped__(
+        s, employee_id=EMP, employee_name="Jan", item_id=item_id, qty=Decimal(qty)
+    )
+    s.flush()
+    rows = s.execute(
+        select(MovementAllocation.lot_id, MovementAllocation.qty)
+        .where(MovementAllocation.movement_id == mv.id).order_by(MovementAllocation.lot_id)
+    ).all()
+    return mv, rows
+
+
+def _return(s, allocs, **kw):
+    mv = rm.return_from_employee.__wrapped__(
+        s, employee_id=EMP, employee_name="Jan", allocations_to_return=allocs, **kw
+    )
+    s.flush()
+    return mv
+
+
+def _count_queries(eng, fn):
+    n = []
+    listener = lambda *a: n.append(1)  # noqa: E731
+    event.listen(eng, "before_cursor_execute", listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(eng, "before_cursor_execute", listener)
+    return result, len(n)
+
+
+def test_return_validates_set_based_and_writes_in_bulk():
+    eng = _engine()
+    with Session(eng) as s:
+        a = _receive(s, 1, 4)
+        b = _receive(s, 1, 5, cost="3")
+        c = _receive(s, 2, 5, cost="1")
+        mv1, _ = _issue(s, 1, 3)                     # A:3
+        mv2, rows2 = _issue(s, 1, 4)                 # A:1, B:3
+        mv3, _ = _issue(s, 2, 2)                     # C:2
+        assert rows2 == [(a.id, Decimal("1")), (b.id, Decimal("3"))]
+
+        ret, n_big = _count_queries(eng, lambda: _return(s, [
+            {"movement_id": mv1.id, "lot_id": a.id, "qty": 1},
+            {"movement_id": mv1.id, "lot_id": a.id, "qty": "1"},   # ten sam (ruch, partia) – scalony
+            {"movement_id": mv2.id, "lot_id": a.id, "qty": 1},
+            {"movement_id": mv2.id, "lot_id": b.id, "qty": 2},
+            {"movement_id": mv3.id, "lot_id": c.id, "qty": 2},
+        ], reuse_lots=False))
+
+        doc = s.execute(select(Document).where(Document.doc_type == "ZWROT")).scalar_one()
+        assert doc.suma_netto == Decimal("15.50")   # 3 * 2.5 + 2 * 3 + 2 * 1
+        lines = s.execute(
+            select(DocumentLine.id, DocumentLine.item_id, DocumentLine.qty, DocumentLine.unit_price_netto)
+            .where(DocumentLine.document_id == doc.id).order_by(DocumentLine.id)
+        ).all()
+        assert [(it, qty, cost) for _i, it, qty, cost in lines] == [
+            (1, Decimal("3"), Decimal("2.5")), (1, Decimal("2"), Decimal("3")), (2, Decimal("2"), Decimal("1")),
+        ]
+        new_lots = s.execute(
+            select(Lot.id, Lot.document_line_id, Lot.qty_available)
+            .where(Lot.document_line_id.in_([ln.id for ln in lines])).order_by(Lot.id)
+        ).all()
+        assert [(dl, qty) for _l, dl, qty in new_lots] == [(ln.id, ln.qty) for ln in lines]
+        allocs = s.execute(
+            select(MovementAllocation.lot_id, MovementAllocation.qty)
+            .where(MovementAllocation.movement_id == ret.id).order_by(MovementAllocation.lot_id)
+        ).all()
+        assert allocs == [(lot_id, qty) for lot_id, _dl, qty in new_lots]
+        stored = s.get(Movement, ret.id)
+        assert (stored.movement_type, stored.item_id, stored.qty) == ("RETURN", None, None)
+
+        # wcześniejsze zwroty (tu do nowych partii) pomniejszają to, co można jeszcze oddać
+        with pytest.raises(ValueError, match="Za duża ilość do zwrotu"):
+            _return(s, [{"movement_id": mv1.id, "lot_id": a.id, "qty": 2}])
+        with pytest.raises(ValueError, match="Za duża ilość do zwrotu"):
+            _return(s, [{"movement_id": mv3.id, "lot_id": c.id, "qty": "0.5"}])
+
+        # liczba zapytań nie zależy od liczby pozycji
+        _ret, n_small = _count_queries(
+            eng, lambda: _return(s, [{"movement_id": mv1.id, "lot_id": a.id, "qty": 1}], reuse_lots=False)
+        )
+        assert n_big == n_small
+
+
+def test_return_reuses_return_lot_unless_archived():
+    eng = _engine()
+    with Session(eng) as s:
+        lot = _receive(s, 1, 10)
+        mv, _ = _issue(s, 1, 4)
+
+        def return_lot(ret):
+            return s.execute(
+                select(Lot).join(MovementAllocation, MovementAllocation.lot_id == Lot.id)
+                .where(MovementAllocation.movement_id == ret.id)
+            ).scalar_one()
+
+        # pierwszy zwrot zakłada partię zwrotów, partia z przyjęcia bez zmian
+        first = return_lot(_return(s, [{"movement_id": mv.id, "lot_id": lot.id, "qty": 1}]))
+        assert first.id != lot.id
+        assert (first.item_id, first.qty_available, first.unit_cost_netto) == (1, Decimal("1"), Decimal("2.5"))
+
+        # kolejny zwrot tego samego (towar, koszt) trafia do tej samej partii zwrotów
+        assert return_lot(_return(s, [{"movement_id": mv.id, "lot_id": lot.id, "qty": 1}])).id == first.id
+        s.refresh(first)
+        assert (first.qty_available, first.qty_received) == (Decimal("2"), Decimal("2"))
+        s.refresh(lot)
+        assert (lot.qty_available, lot.qty_received) == (Decimal("6"), Decimal("10"))
+
+        # zarchiwizowana partia zwrotów – zwrot zakłada nową
+        first.archived = True
+        s.flush()
+        new_lot = return_lot(_return(s, [{"movement_id": mv.id, "lot_id": lot.id, "qty": 1}]))
+        assert new_lot.id not in (lot.id, first.id)
+        assert new_lot.qty_available == Decimal("1")
+
+
+def test_compact_archives_old_empty_lots_in_batches():
+    eng = _engine()
+    old = datetime.now() - timedelta(days=40)
+    with Session(eng) as s:
+        for i in range(1, 6):
+            lot = _receive(s, i, 1)
+            lot.ts = old
+            lot.qty_available = 0
+        young = _receive(s, 6, 1)
+        young.qty_available = 0
+        _receive(s, 7, 1).ts = old  # niezużyta – zostaje
+        s.commit()
+
+    assert lots_mod.compact(eng, min_age_days=30, dry_run=True) == 5
+    assert lots_mod.compact(eng, min_age_days=30, batch_size=2) == 5
+    with eng.connect() as conn:
+        assert lots_mod.stats(conn) == lots_mod.LotStats(active=2, empty_active=1, archived=5)
+    assert lots_mod.compact(eng, min_age_days=30, batch_size=2) == 0
+
+
+def test_return_never_touches_receipt_lot():
+    eng = _engine()
+    with Session(eng) as s:
+        a = _receive(s, 1, 2)
+        _receive(s, 1, 10)
+        mv1, _ = _issue(s, 1, 4)     # 2 z partii a, 2 z drugiej
+        _issue(s, 1, 2)
+        # saldo liczone per (towar, koszt) – ta sama alokacja ISSUE oddana dwa razy
+        _return(s, [{"movement_id": mv1.id, "lot_id": a.id, "qty": 2}])
+        _return(s, [{"movement_id": mv1.id, "lot_id": a.id, "qty": 2}])
+        s.refresh(a)
+        assert (a.qty_available, a.qty_received) == (Decimal("0"), Decimal("2"))
+        returned = s.execute(
+            select(Lot.qty_available, Lot.qty_received)
+            .join(DocumentLine, DocumentLine.id == Lot.document_line_id)
+            .join(Document, Document.id == DocumentLine.document_id)
+            .where(Document.doc_type == "ZWROT")
+        ).all()
+        assert returned == [(Decimal("4"), Decimal("4"))]
+
+
+def test_scrap_rejects_tools_already_returned_to_new_lot():
+    eng = _engine()
+    with Session(eng) as s:
+        lot = _receive(s, 1, 10)
+        mv, _ = _issue(s, 1, 3)
+        # zwrot alokuje do partii zwrotów, partia źródłowa bez zmian
+        _return(s, [{"movement_id": mv.id, "lot_id": lot.id, "qty": 2}])
+
+        with pytest.raises(ValueError, match="Za duża ilość do złomowania"):
+            rm.scrap_batch.__wrapped__(
+                s, employee_id=EMP, employee_name="Jan",
+                allocations_to_scrap=[{"lot_id": lot.id, "qty": 2}],
+            )
+        scrap = rm.scrap_batch.__wrapped__(
+            s, employee_id=EMP, employee_name="Jan",
+            allocations_to_scrap=[{"lot_id": lot.id, "qty": 1}], reason="Złamane ostrze",
+        )
+        s.flush()
+        s.refresh(scrap)
+        assert scrap.reason == "Złamane ostrze"
+        assert s.execute(
+            select(MovementAllocation.lot_id, MovementAllocation.qty)
+            .where(MovementAllocation.movement_id == scrap.id)
+        ).all() == [(lot.id, Decimal("1"))]
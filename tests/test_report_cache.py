@@ -0,0 +1,48 @@
+from datetime import date
+
+from sqlalchemy import create_engine, text
+
+from app.repo.report_cache import ReportCache, cached_report
+
+
+class _Repo:
+    def __init__(self, cache):
+        self.cache = cache
+        self.calls = 0
+
+    @cached_report("demo")
+    def report(self, date_from, date_to, limit=10):
+        self.calls += 1
+        return [{"n": self.calls}]
+
+
+def _engine():
+    eng = create_engine("sqlite://")
+    with eng.begin() as c:
+        for t in ("movements", "transactions", "documents"):
+            c.execute(text(f"CREATE TABLE {t} (id INTEGER PRIMARY KEY)"))
+    return eng
+
+
+def test_report_cache_hits_until_watermark_moves():
+    eng = _engine()
+    repo = _Repo(ReportCache(eng))
+    d1, d2 = date(2026, 1, 1), date(2026, 2, 1)
+
+    first = repo.report(d1, d2)
+    first[0]["n"] = 99  # kopia – nie psuje cache
+    assert repo.report(d1, d2, limit=10) == [{"n": 1}]
+    assert repo.calls == 1
+    repo.report(d1, d2, limit=20)
+    assert repo.calls == 2
+
+    with eng.begin() as c:
+        c.execute(text("INSERT INTO movements (id) VALUES (1)"))
+    assert repo.report(d1, d2) == [{"n": 3}]
+
+
+def test_report_cache_bypassed_without_watermark():
+    repo = _Repo(ReportCache(create_engine("sqlite://")))
+    repo.report(1, 2)
+    repo.report(1, 2)
+    assert repo.calls == 2
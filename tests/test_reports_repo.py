@@ -0,0 +1,139 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from app.repo.reports_repo import ReportsRepo
+
+
+def _engine():
+    eng = create_engine("sqlite://")
+    with eng.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, code TEXT, name TEXT)"))
+        conn.execute(text(
+            "CREATE TABLE fact_consumption_monthly (month DATE, item_id INTEGER, employee_id INTEGER,"
+            " movement_type TEXT, qty NUMERIC, value_fifo NUMERIC, movements INTEGER)"
+        ))
+        conn.execute(text("INSERT INTO items VALUES (1, 'W-6', 'Wiertło 6')"))
+        conn.execute(text(
+            "INSERT INTO fact_consumption_monthly VALUES ('2026-09-01', 1, 7, 'ISSUE', 3, 7.5, 2)"
+        ))
+    return eng
+
+
+def test_monthly_consumption_reads_facts_without_refresh():
+    repo = ReportsRepo(_engine(), cache=False)
+    rows = repo.monthly_consumption(date(2026, 9, 1), date(2026, 10, 1))
+    assert [(r["code"], r["movement_type"], r["movements"]) for r in rows] == [("W-6", "ISSUE", 2)]
+
+    # jawne odświeżenie nie ukrywa błędu (tu: brak tabeli movements / znaku wody)
+    with pytest.raises(OperationalError):
+        repo.monthly_consumption(date(2026, 9, 1), date(2026, 10, 1), refresh=True)
+
+
+def test_monthly_consumption_rounds_date_to_down_to_month():
+    repo = ReportsRepo(_engine(), cache=False)
+    # [2026-09-01, 2026-09-15) -> pełne miesiące przed wrześniem, czyli nic
+    assert repo.monthly_consumption(date(2026, 8, 1), date(2026, 9, 15)) == []
+
+
+def _card_engine(*, summary=True):
+    eng = create_engine("sqlite://")
+    with eng.begin() as conn:
+        conn.execute(text("CREATE TABLE employees (id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT)"))
+        conn.execute(text("INSERT INTO employees VALUES (7, 'Jan', 'Kowalski')"))
+        conn.execute(text(
+            "CREATE TABLE vw_employee_card (employee_id INTEGER, item_id INTEGER,"
+            " balance_qty NUMERIC, first_op TEXT, last_op TEXT)"
+        ))
+        conn.execute(text("INSERT INTO vw_employee_card VALUES (7, 2, 1, '2026-09-02', '2026-09-03')"))
+        if summary:
+            conn.execute(text(
+                "CREATE TABLE employee_item_summary (employee_id INTEGER, item_id INTEGER,"
+                " balance_qty NUMERIC, first_op TEXT, last_op TEXT, ops_count INTEGER)"
+            ))
+            conn.execute(text(
+                "INSERT INTO employee_item_summary VALUES"
+                " (7, 1, 3, '2026-09-01', '2026-09-05', 2), (7, 2, 0, '2026-08-01', '2026-08-02', 2)"
+            ))
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("INSERT INTO items VALUES (1, 'Wiertło 6'), (2, 'Frez 8')"))
+        conn.execute(text(
+            "CREATE TABLE transactions (id INTEGER PRIMARY KEY, employee_id INTEGER,"
+            " operation_uuid TEXT, movement_type TEXT, created_at TEXT)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE transaction_items (operation_uuid TEXT, item_id INTEGER, direction TEXT, quantity NUMERIC)"
+        ))
+        for n in range(1, 6):
+            conn.execute(text(
+                "INSERT INTO transactions VALUES (:id, 7, :u, 'ISSUE', :ts)"
+            ), {"id": n, "u": f"op-{n}", "ts": f"2026-09-0{n} 10:00:00"})
+            conn.execute(text(
+                "INSERT INTO transaction_items VALUES (:u, 1, 'OUT', 1), (:u, 2, 'OUT', 2)"
+            ), {"u": f"op-{n}"})
+        conn.execute(text("INSERT INTO transactions VALUES (6, 8, 'op-6', 'ISSUE', '2026-09-03 10:00:00')"))
+    return eng
+
+
+def _as_mariadb_missing_table(eng):
+    """SQLite zgłasza brak tabeli jako OperationalError – odwzoruj błąd 1146 MariaDB."""
+    from pymysql.err import ProgrammingError as PyMySQLProgrammingError
+
+    statements = []
+
+    @event.listens_for(eng, "before_cursor_execute")
+    def _log(conn, cursor, statement, *a):
+        statements.append(statement)
+
+    @event.listens_for(eng, "handle_error")
+    def _translate(ctx):
+        if "no such table" in str(ctx.original_exception):
+            raise ProgrammingError(
+                ctx.statement, ctx.parameters,
+                PyMySQLProgrammingError(1146, "Table 'employee_item_summary' doesn't exist"),
+            )
+
+    return statements
+
+
+def test_employee_card_reads_summary():
+    repo = ReportsRepo(_card_engine(), cache=False)
+    rows = repo.employee_card(7, date(2026, 9, 1), date(2026, 10, 1))
+    assert [(r["item_id"], r["last_name"]) for r in rows] == [(1, "Kowalski")]
+
+
+def test_employee_card_falls_back_to_view_once_on_missing_table():
+    pytest.importorskip("pymysql")
+    eng = _card_engine(summary=False)
+    statements = _as_mariadb_missing_table(eng)
+    repo = ReportsRepo(eng, cache=False)
+
+    for _ in range(2):
+        rows = repo.employee_card(7, date(2026, 9, 1), date(2026, 10, 1))
+        assert [r["item_id"] for r in rows] == [2]
+    # brak tabeli zapamiętany – drugie wywołanie idzie od razu do widoku
+    assert sum("employee_item_summary" in st for st in statements) == 1
+
+
+def test_employee_card_does_not_swallow_other_errors():
+    eng = _card_engine(summary=False)
+    repo = ReportsRepo(eng, cache=False)
+    # SQLite: brak tabeli to OperationalError, nie 1146 – błąd nie jest połykany
+    with pytest.raises(OperationalError):
+        repo.employee_card(7, date(2026, 9, 1), date(2026, 10, 1))
+
+
+def test_employee_history_page_walks_keyset_pages():
+    repo = ReportsRepo(_card_engine(), cache=False)
+    seen, after = [], None
+    while True:
+        rows, after = repo.employee_history_page(
+            7, date(2026, 9, 2), date(2026, 9, 5), after=after, limit=3
+        )
+        seen += [(r["id"], r["item_id"]) for r in rows]
+        if after is None:
+            break
+    # tylko pracownik 7, zakres [2 – 5) wrzesień, malejąco (created_at, id, item_id)
+    assert seen == [(4, 2), (4, 1), (3, 2), (3, 1), (2, 2), (2, 1)]
@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+from sqlalchemy import text
+
+from app.appsvc.reservations import ReservationSweeper
+from sqlite_mariadb import sqlite_engine
+
+
+def _engine():
+    eng = sqlite_engine()
+    with eng.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE issue_sessions (id INTEGER PRIMARY KEY, status TEXT,"
+            " started_at TEXT, expires_at TEXT)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE issue_session_lines (session_id INTEGER, item_id INTEGER, qty_reserved NUMERIC,"
+            " PRIMARY KEY (session_id, item_id))"
+        ))
+        conn.execute(text("CREATE TABLE item_reservations (item_id INTEGER PRIMARY KEY, qty_reserved NUMERIC)"))
+        conn.execute(text(
+            "INSERT INTO issue_sessions VALUES"
+            " (1, 'OPEN', datetime('now', '-1 hour'), datetime('now', '-1 minute')),"   # wygasła
+            " (2, 'OPEN', datetime('now'), datetime('now', '+20 minutes')),"           # aktywna
+            " (3, 'OPEN', datetime('now', '-2 hours'), NULL),"                          # bez expires_at, po TTL
+            " (4, 'CONFIRMED', datetime('now', '-2 hours'), datetime('now', '-1 hour'))"
+        ))
+        conn.execute(text(
+            "INSERT INTO issue_session_lines VALUES (1, 1, 2.5), (1, 2, 1), (2, 1, 1), (3, 2, 0.5), (4, 1, 7)"
+        ))
+        conn.execute(text("INSERT INTO item_reservations VALUES (1, 3.5), (2, 1.5)"))
+    return eng
+
+
+def _state(eng):
+    with eng.connect() as conn:
+        status = dict(conn.execute(text("SELECT id, status FROM issue_sessions")).all())
+        counters = {
+            iid: Decimal(str(q)) for iid, q in conn.execute(text("SELECT item_id, qty_reserved FROM item_reservations"))
+        }
+    return status, counters
+
+
+def test_sweeper_cancels_expired_sessions_and_releases_counters():
+    eng = _engine()
+    sweeper = ReservationSweeper(eng, batch_size=1)
+    assert sweeper.sweep_once() == 2
+    status, counters = _state(eng)
+    assert status == {1: "CANCELLED", 2: "OPEN", 3: "CANCELLED", 4: "CONFIRMED"}
+    assert counters == {1: Decimal("1"), 2: Decimal("0")}
+    assert sweeper.sweep_once() == 0
+
+
+def test_rebuild_counters_recomputes_from_open_sessions():
+    eng = _engine()
+    with eng.begin() as conn:
+        conn.execute(text("UPDATE item_reservations SET qty_reserved = 99"))
+    ReservationSweeper(eng).rebuild_counters()
+    # sesje 1–3 są jeszcze OPEN (sweeper nie przeszedł), 4 zatwierdzona
+    assert _state(eng)[1] == {1: Decimal("3.5"), 2: Decimal("1.5")}
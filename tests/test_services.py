@@ -30,6 +30,7 @@ return_service = importlib.import_module('app.domain.services.return')
 scrap = importlib.import_module('app.domain.services.scrap')
 inventory = importlib.import_module('app.domain.services.inventory')
 rw = importlib.import_module('app.domain.services.rw')
+bundle = importlib.import_module('app.domain.services.bundle')
 
 
 class FakeCursor:
@@ -106,6 +107,64 @@ class ServiceTests(unittest.TestCase):
     def test_rw(self):
         self._test_service(rw.record_rw_receipt, (10, 2, 3), 'sp_rw_receipt', (10, 2, '3', 'op1'))
 
+    def test_scrap_protocol(self):
+        proto = '6f1c2a4e-0000-4000-8000-000000000001'
+        res = scrap.scrap_protocol(
+            self.db, 1, [(5, 1), (4, '0.5'), (5, 2), (6, 0)],
+            reason='zużyte', protocol_uuid=proto, rfid_confirmed=True,
+        )
+        self.assertEqual((res['status'], res['lines']), ('success', 2))
+        self.assertEqual([a[:4] for _n, a in self.db.log], [(1, 4, '0.5', 'zużyte'), (1, 5, '3', 'zużyte')])
+        self.assertEqual(self.db.commit_count, 1)
+        res = scrap.scrap_protocol(self.db, 1, [(5, 1)], protocol_uuid=proto, rfid_confirmed=True)
+        self.assertEqual(res['status'], 'duplicate')
+
+
+class ShiftCursor(FakeCursor):
+    def __init__(self, log, sql, balances):
+        super().__init__(log)
+        self.sql = sql
+        self.balances = balances
+
+    def callproc(self, name, args):
+        if args[0] == 99:
+            raise RuntimeError("sp failed")
+        super().callproc(name, args)
+
+    def execute(self, sql, params=()):
+        self.sql.append((sql.split()[0], params))
+
+    def fetchall(self):
+        return self.balances
+
+
+class ShiftBundleTests(unittest.TestCase):
+    def test_chunks_and_set_based_flags(self):
+        db = FakeDB()
+        db.rollback_count = 0
+        db.sql = []
+
+        def rollback():
+            db.rollback_count += 1
+        db.rollback = rollback
+        db.cursor = lambda: ShiftCursor(db.log, db.sql, [(1, 10, 2), (2, 10, 0), (1, 11, 5)])
+
+        res = bundle.shift_return_bundle(
+            db,
+            [(1, [(10, 1)], [(10, 2)]), (2, [(10, 1)], [(10, 1)]), (99, [], [(10, 1)])],
+            chunk_size=2,
+            rfid_confirmed=True,
+        )
+        self.assertEqual(res['status'], 'partial')
+        self.assertEqual((res['returns'], res['issues'], res['chunks']), (2, 2, 1))
+        self.assertEqual(res['flagged'], [(1, 10)])
+        self.assertEqual(res['failed'][0]['employees'], [99])
+        self.assertEqual((db.commit_count, db.rollback_count), (1, 1))
+        # jedno zapytanie o salda i po jednym UPDATE na wartość flagi dla całej porcji
+        self.assertEqual([k for k, _p in db.sql], ['SELECT', 'UPDATE', 'UPDATE'])
+        self.assertEqual(db.sql[1][1][0], 1)
+        self.assertEqual(len(db.sql[1][1]), 2)
+
 
 if __name__ == '__main__':
     unittest.main()
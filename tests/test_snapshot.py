@@ -0,0 +1,90 @@
+from array import array
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import text
+
+from app.appsvc.inventory_session import InventorySession
+from app.appsvc.valuation import StockValuation
+from app.dal.snapshot import StockSnapshot, take_snapshot
+from sqlite_mariadb import sqlite_engine
+
+
+def _snapshot():
+    return StockSnapshot(
+        taken_at=datetime(2026, 10, 19, 8, 0),
+        movement_mark=120,
+        warehouse_id=1,
+        items={
+            1: ("W-6", "Wiertło 6", 10, True),
+            2: ("F-10", "Frez 10", 0, True),
+            3: ("P-1", "Płytka", 5, False),
+        },
+        lot_id=array("q", [11, 12, 13]),
+        lot_item=array("q", [1, 1, 2]),
+        lot_qty=array("q", [4000, 2500, 1000]),
+        lot_cost=array("q", [20000, 25000, 100000]),
+        hold_item=array("q", [1]),
+        hold_loc=array("q", [7]),
+        hold_qty=array("q", [1000]),
+        hold_cost=array("q", [20000]),
+        reserved={1: 500},
+    )
+
+
+def test_snapshot_aggregates_feed_valuation_and_count_sheet(tmp_path):
+    snap = _snapshot()
+    assert snap.on_hand() == {1: 6500, 2: 1000, 3: 0}
+    assert snap.available() == {1: 6000, 2: 1000, 3: 0}
+    assert snap.held() == {1: 1000}
+
+    val = StockValuation.from_snapshot(snap)
+    assert val.totals("location") == {1: (7500, 4000 * 20000 + 2500 * 25000 + 1000 * 100000), 7: (1000, 1000 * 20000)}
+
+    # arkusz spisu: tylko aktywne towary, znak wody z migawki
+    s = InventorySession.from_snapshot(tmp_path / "spis.sqlite3", snap)
+    assert s.movement_mark == 120
+    assert s.progress() == (0, 2)
+    s.record(1, "6")
+    assert [(d.item_id, d.diff) for d in s.diffs()] == [(1, Decimal("-0.5"))]
+
+
+def _engine():
+    eng = sqlite_engine()
+    with eng.begin() as conn:
+        for ddl in (
+            "CREATE TABLE locations (id INTEGER PRIMARY KEY, type TEXT, name TEXT)",
+            "CREATE TABLE items (id INTEGER PRIMARY KEY, code TEXT, name TEXT, min_stock INTEGER, active INTEGER)",
+            "CREATE TABLE lots (id INTEGER PRIMARY KEY, item_id INTEGER, qty_available NUMERIC, unit_cost_netto NUMERIC)",
+            "CREATE TABLE item_reservations (item_id INTEGER PRIMARY KEY, qty_reserved NUMERIC)",
+            "CREATE TABLE movements (id INTEGER PRIMARY KEY, ts TEXT, from_location_id INTEGER, to_location_id INTEGER)",
+            "CREATE TABLE movement_allocations (movement_id INTEGER, lot_id INTEGER, qty NUMERIC, unit_cost_netto NUMERIC)",
+        ):
+            conn.execute(text(ddl))
+        conn.execute(text("INSERT INTO locations VALUES (1, 'WAREHOUSE', 'Magazyn'), (7, 'EMPLOYEE', 'Kowalski')"))
+        conn.execute(text(
+            "INSERT INTO items VALUES (1, 'W-6', 'Wiertło 6', 10, 1), (2, 'F-10', 'Frez 10', NULL, 1),"
+            " (3, 'P-1', 'Płytka', 5, 0)"
+        ))
+        conn.execute(text("INSERT INTO lots VALUES (11, 1, 4, 2), (12, 1, 2.5, 2.5), (13, 2, 1, 10), (14, 3, 0, 1)"))
+        conn.execute(text("INSERT INTO item_reservations VALUES (1, 0.5), (2, 0)"))
+        # wydanie 2 szt. z partii 11 pracownikowi, zwrot 1 szt.
+        conn.execute(text("INSERT INTO movements VALUES (119, '2026-10-18', 1, 7), (120, '2026-10-18', 7, 1)"))
+        conn.execute(text("INSERT INTO movement_allocations VALUES (119, 11, 2, 2), (120, 11, 1, 2)"))
+    return eng
+
+
+def test_take_snapshot_reads_stock_in_one_pass():
+    snap = take_snapshot(_engine(), batch_size=2)
+    assert snap.movement_mark == 120
+    assert snap.warehouse_id == 1
+    assert snap.items == {
+        1: ("W-6", "Wiertło 6", 10, True),
+        2: ("F-10", "Frez 10", 0, True),
+        3: ("P-1", "Płytka", 5, False),
+    }
+    assert list(snap.lot_id) == [11, 12, 13]
+    assert snap.on_hand() == {1: 6500, 2: 1000, 3: 0}
+    assert snap.available() == {1: 6000, 2: 1000, 3: 0}
+    assert snap.held() == {1: 1000}
+    assert list(snap.positions())[-1] == (1, 7, 1000, 20000)
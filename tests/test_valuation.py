@@ -0,0 +1,28 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from app.appsvc.valuation import COST_SCALE, QTY_SCALE, StockValuation, fixed, to_pln
+
+
+def test_fixed_point_totals_match_exact_decimal():
+    lots = [
+        (1, 10, "2.500", "3.3333"),
+        (1, 20, "1.000", "0.0050"),
+        (2, 10, "0.001", "12345.6789"),
+        (2, 10, "0", "99.0000"),  # pusta partia – pomijana
+    ]
+    val = StockValuation()
+    val.extend((i, loc, fixed(qty, QTY_SCALE), fixed(cost, COST_SCALE)) for i, loc, qty, cost in lots)
+    assert len(val) == 3
+
+    by_item = val.totals("item")
+    exact = sum(Decimal(q) * Decimal(c) for i, _l, q, c in lots if i == 1)
+    assert by_item[1][0] == 3500
+    assert to_pln(by_item[1][1]) == exact.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+    by_loc = val.totals("location")
+    assert set(by_loc) == {10, 20}
+
+
+def test_to_pln_rounds_half_up_once():
+    assert to_pln(50_000) == Decimal("0.01")   # 0.005 PLN
+    assert to_pln(49_999) == Decimal("0.00")
@@ -0,0 +1,126 @@
+"""
+Benchmark wyszukiwania w kartotece: LIKE '%q%' vs indeks tokenów (catalog_search).
+Działa na SQLite w pamięci – bez konfiguracji bazy:
+
+    python tools/bench_catalog_search.py --items 50000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, event, text
+
+# Ensure project root is importable when running via absolute path
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.dal.catalog_search import ranked_search, reindex_items
+
+WORDS = [
+    "Wiertło", "Frez", "Gwintownik", "Płytka", "Oprawka", "Nóż", "Rozwiertak",
+    "Pogłębiacz", "Tuleja", "Klucz", "Ściernica", "Piła", "Trzpień", "Głowica",
+    "HSS", "VHM", "NWKa", "kobalt", "TiN", "węglik", "tokarski", "kręty", "spiralny",
+]
+
+LEGACY_SQL = """
+    SELECT i.id, i.code AS sku, i.name
+      FROM items i
+     WHERE (i.code LIKE :q OR i.name LIKE :q)
+     ORDER BY i.name
+     LIMIT :lim
+"""
+RANKED_SQL = """
+    SELECT i.id, i.code AS sku, i.name
+      FROM items i
+     WHERE {match}
+     ORDER BY {rank}, i.name
+     LIMIT :lim
+"""
+
+
+def _build(engine, n: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    codes: list[str] = []
+    rows = []
+    for i in range(1, n + 1):
+        code = f"{rnd.randint(0, 9)} {rnd.randint(100, 999)} {rnd.randint(100, 999)} {i:06d}"
+        name = " ".join(rnd.sample(WORDS, 3)) + f" FI {rnd.randint(1, 40)},{rnd.randint(0, 9)}"
+        codes.append(code)
+        rows.append({"id": i, "code": code, "name": name})
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE items (id INTEGER PRIMARY KEY, code VARCHAR(64) NOT NULL UNIQUE,"
+            " name VARCHAR(255) NOT NULL, search_key VARCHAR(255))"
+        ))
+        conn.execute(text("CREATE INDEX idx_items_search_key ON items(search_key)"))
+        conn.execute(text(
+            "CREATE TABLE item_search_tokens (token VARCHAR(64) NOT NULL, item_id INTEGER NOT NULL,"
+            " PRIMARY KEY (token, item_id))"
+        ))
+        conn.execute(text("CREATE INDEX idx_item_search_tokens_item ON item_search_tokens(item_id, token)"))
+        conn.execute(text("INSERT INTO items(id, code, name) VALUES (:id, :code, :name)"), rows)
+        t0 = time.perf_counter()
+        reindex_items(conn)
+        print(f"index build: {n} items in {(time.perf_counter() - t0):.2f}s")
+    return codes
+
+
+def _time(fn, repeat: int) -> tuple[float, int]:
+    times = []
+    rows = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        rows = fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return statistics.median(times), len(rows)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Catalog search benchmark (SQLite, in-memory).")
+    parser.add_argument("--items", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def _pragma(dbapi_conn, _):  # tokeny są już znormalizowane – jak COLLATE utf8mb4_bin
+        dbapi_conn.execute("PRAGMA case_sensitive_like = ON")
+
+    codes = _build(engine, args.items, args.seed)
+    queries = [
+        ("exact code", codes[len(codes) // 2]),
+        ("code prefix", codes[len(codes) // 3][:5]),
+        ("word prefix", "wiert"),
+        ("two words", "frez vhm"),
+        ("diacritics", "płytka węglik"),
+        ("substring", "ierc"),
+        ("no match", "zzzz"),
+    ]
+
+    print(f"{'query':<14}{'q':<22}{'LIKE ms':>10}{'rows':>7}{'index ms':>10}{'rows':>7}")
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA case_sensitive_like = OFF")  # LIKE '%q%' jak w MySQL *_ci
+        for label, q in queries:
+            legacy = lambda: conn.execute(  # noqa: E731
+                text(LEGACY_SQL), {"q": f"%{q}%", "lim": args.limit}
+            ).fetchall()
+            t_like, n_like = _time(legacy, args.repeat)
+            conn.exec_driver_sql("PRAGMA case_sensitive_like = ON")
+            ranked = lambda: ranked_search(conn, RANKED_SQL, q, limit=args.limit)  # noqa: E731
+            t_idx, n_idx = _time(ranked, args.repeat)
+            conn.exec_driver_sql("PRAGMA case_sensitive_like = OFF")
+            print(f"{label:<14}{q[:20]:<22}{t_like:>10.2f}{n_like:>7}{t_idx:>10.2f}{n_idx:>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
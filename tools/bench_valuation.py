@@ -0,0 +1,83 @@
+"""
+Benchmark wyceny FIFO: Decimal per wiersz (jak q() w repo_movements) vs kolumny
+stałoprzecinkowe (app/appsvc/valuation.py). Dane syntetyczne w pamięci:
+
+    python tools/bench_valuation.py --lots 2000000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+# Ensure project root is importable when running via absolute path
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.appsvc.valuation import StockValuation, to_pln
+
+DEC2 = Decimal("0.01"); DEC3 = Decimal("0.001"); DEC4 = Decimal("0.0001")
+
+
+def q(x: Decimal, qexp=DEC3) -> Decimal:
+    """Jak app.dal.repo_movements.q (bez importu warstwy ORM/pymysql)."""
+    return x.quantize(qexp)
+
+
+def _rows(n: int, items: int, locations: int, seed: int) -> list[tuple[int, int, int, int]]:
+    rnd = random.Random(seed)
+    return [
+        (rnd.randrange(1, items), rnd.randrange(1, locations), rnd.randrange(1, 500_000), rnd.randrange(100, 50_000_000))
+        for _ in range(n)
+    ]
+
+
+def _decimal(rows) -> tuple[dict, Decimal]:
+    """Jak zapytania raportowe: Decimal na wiersz i zaokrąglenie wartości pozycji."""
+    per_item: dict[int, Decimal] = {}
+    total = Decimal(0)
+    for item, _loc, qm, ce in rows:
+        v = (q(Decimal(qm) / 1000) * q(Decimal(ce) / 10000, DEC4)).quantize(DEC2)
+        per_item[item] = per_item.get(item, Decimal(0)) + v
+        total += v
+    return per_item, total
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark FIFO valuation (Decimal vs fixed-point columns).")
+    parser.add_argument("--lots", type=int, default=1_000_000)
+    parser.add_argument("--items", type=int, default=20_000)
+    parser.add_argument("--locations", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rows = _rows(args.lots, args.items, args.locations, args.seed)
+    print(f"Lots: {len(rows)}")
+
+    t0 = time.perf_counter()
+    _per_item, dec_total = _decimal(rows)
+    t_dec = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    val = StockValuation()
+    val.extend(rows)
+    t_load = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    by_item = val.totals("item")
+    by_loc = val.totals("location")
+    _qty, exact = val.grand_total()
+    t_fix = time.perf_counter() - t0
+
+    print(f"Decimal per row:       {t_dec:8.2f} s  total={dec_total}")
+    print(f"Fixed-point load:      {t_load:8.2f} s")
+    print(f"Fixed-point totals:    {t_fix:8.2f} s  total={to_pln(exact)} "
+          f"({len(by_item)} items, {len(by_loc)} locations)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure project root is importable when running via absolute path
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.dal import lots
+from app.dal.db import make_engine
+from app.infra.config import load_app_config
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Archive fully consumed lots (qty_available = 0) out of the FIFO index."
+    )
+    parser.add_argument(
+        "--min-age-days", type=int, default=lots.DEFAULT_MIN_AGE_DAYS,
+        help="Keep lots younger than N days (they may still receive returns)",
+    )
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows archived per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Only count candidate lots")
+    args = parser.parse_args(argv)
+
+    base_dir = Path(__file__).resolve().parents[1]
+    settings = load_app_config(base_dir)
+    engine = make_engine(settings.model_dump())
+
+    n = lots.compact(
+        engine, min_age_days=args.min_age_days, batch_size=args.batch_size, dry_run=args.dry_run
+    )
+    print(f"{'Candidates' if args.dry_run else 'Archived'}: {n}")
+    with engine.connect() as conn:
+        st = lots.stats(conn)
+    print(f"Lots: active={st.active} (empty {st.empty_active}), archived={st.archived}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
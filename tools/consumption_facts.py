@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+# Ensure project root is importable when running via absolute path
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.dal import consumption_facts as facts
+from app.dal.db import make_engine
+from app.infra.config import load_app_config
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Maintain the monthly consumption fact table (fact_consumption_monthly)."
+    )
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_ref = sub.add_parser("refresh", help="Add movements newer than the stored watermark")
+    p_ref.add_argument("--lag", type=int, default=facts.DEFAULT_LAG_S, help="Skip movements younger than N seconds")
+    p_bf = sub.add_parser("backfill", help="Rebuild facts from the movement ledger")
+    p_bf.add_argument("--since", type=date.fromisoformat, help="Rebuild only months from YYYY-MM-DD on")
+    p_chk = sub.add_parser("check", help="Compare facts with the movement ledger")
+    p_chk.add_argument("--from", dest="date_from", type=date.fromisoformat)
+    p_chk.add_argument("--to", dest="date_to", type=date.fromisoformat)
+    args = parser.parse_args(argv)
+
+    base_dir = Path(__file__).resolve().parents[1]
+    settings = load_app_config(base_dir)
+    engine = make_engine(settings.model_dump())
+
+    with engine.begin() as conn:
+        if args.cmd == "refresh":
+            print(f"Watermark: {facts.refresh(conn, lag_s=args.lag)}")
+        elif args.cmd == "backfill":
+            print(f"Watermark: {facts.rebuild(conn, since=args.since)}")
+        else:
+            diffs = facts.check(conn, date_from=args.date_from, date_to=args.date_to)
+            for d in diffs:
+                print(f"{d.key}: facts={d.fact} ledger={d.ledger}")
+            print(f"Mismatches: {len(diffs)}")
+            return 1 if diffs else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure project root is importable when running via absolute path
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.dal.catalog_search import reindex_items, reindex_missing
+from app.dal.db import make_engine
+from app.infra.config import load_app_config
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Build the catalog search index (items.search_key + item_search_tokens)."
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Rebuild every item (default: only items without search_key)",
+    )
+    args = parser.parse_args(argv)
+
+    base_dir = Path(__file__).resolve().parents[1]
+    settings = load_app_config(base_dir)
+    engine = make_engine(settings.model_dump())
+
+    with engine.begin() as conn:
+        n = reindex_items(conn) if args.all else reindex_missing(conn)
+    print(f"Indexed items: {n}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
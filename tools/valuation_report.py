@@ -0,0 +1,55 @@
+"""
+Raport wyceny zapasu FIFO (app/appsvc/valuation.py) – stan bieżący albo na dzień:
+
+    python tools/valuation_report.py --by location
+    python tools/valuation_report.py --as-of 2026-09-30 --csv wycena.csv
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+from datetime import date
+from pathlib import Path
+
+# Ensure project root is importable when running via absolute path
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.appsvc.valuation import GROUPS, valuation_report
+from app.dal.db import make_engine
+from app.dal.snapshot import take_snapshot
+from app.infra.config import load_app_config
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="FIFO stock valuation report (fixed-point totals).")
+    parser.add_argument("--by", choices=GROUPS, default="item", help="Group totals by item or location")
+    parser.add_argument("--as-of", type=date.fromisoformat, help="Stock at the end of YYYY-MM-DD (default: now)")
+    parser.add_argument("--csv", type=Path, help="Write rows to a CSV file instead of stdout")
+    args = parser.parse_args(argv)
+
+    base_dir = Path(__file__).resolve().parents[1]
+    settings = load_app_config(base_dir)
+    engine = make_engine(settings.model_dump())
+
+    # stan bieżący – pozycje i nazwy z jednej spójnej migawki
+    snapshot = take_snapshot(engine) if args.as_of is None else None
+    rows = valuation_report(engine, by=args.by, as_of=args.as_of, snapshot=snapshot)
+    total = sum(r["value"] for r in rows)
+    if args.csv:
+        with args.csv.open("w", newline="", encoding="utf-8-sig") as fh:
+            w = csv.DictWriter(fh, fieldnames=["key", "name", "qty", "value"], delimiter=";")
+            w.writeheader()
+            w.writerows(rows)
+        print(f"Rows: {len(rows)} -> {args.csv}")
+    else:
+        for r in rows:
+            print(f"{r['key']:>8}  {r['name'][:50]:<50} {r['qty']:>14} {r['value']:>14}")
+    print(f"Sum of rows: {total} PLN")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())